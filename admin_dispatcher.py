@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+admin_dispatcher.py - שליחת התראות אדמין בלי לחסום את ה-event loop
+====================================================================
+
+send_admin_notification שלח כל התראה ב-requests.post סינכרוני (עד TELEGRAM_SEND_TIMEOUT שניות),
+גם מתוך קוד async - טלגרם איטי עצר את כל הבוט. עכשיו ההתראה רק נכנסת לתור, ולולאה אחת
+ב-event loop הראשי שולחת אותה:
+
+- session HTTP אחד (httpx.AsyncClient, כבר תלות של python-telegram-bot) לכל ההתראות
+- איחוד פרצים: התראות שמגיעות בתוך ADMIN_NOTIFY_COALESCE_SECONDS יוצאות כהודעת digest אחת
+  (עד 4096 תווים - מגבלת טלגרם). התראה דחופה לא ממתינה לחלון האיחוד
+- token bucket לפי מגבלת טלגרם (ADMIN_NOTIFY_MESSAGES_PER_MINUTE / ADMIN_NOTIFY_BURST),
+  ו-429 מטלגרם מכובד לפי retry_after; 400 על HTML לא תקין - שליחה חוזרת כטקסט רגיל
+- תור חסום (ADMIN_NOTIFY_QUEUE_MAX_SIZE) - מה שנזרק נספר ומדווח בהודעה הבאה
+- submit בטוח מכל thread (executor של ה-DB, thread התזכורות) דרך call_soon_threadsafe
+
+כשהמשגר לא רץ (סקריפטים, לפני ה-lifespan) submit מחזיר False והקורא שולח סינכרונית כמו קודם.
+
+שימוש:
+    from admin_dispatcher import admin_dispatcher
+    await admin_dispatcher.start()            # ב-lifespan
+    admin_dispatcher.submit("🚨 ...", urgent=True)
+    await admin_dispatcher.stop()             # בכיבוי - שולח את מה שנשאר
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from config import (
+    ADMIN_BOT_TELEGRAM_TOKEN,
+    ADMIN_NOTIFICATION_CHAT_ID,
+    ADMIN_NOTIFY_MESSAGES_PER_MINUTE,
+    ADMIN_NOTIFY_BURST,
+    ADMIN_NOTIFY_COALESCE_SECONDS,
+    ADMIN_NOTIFY_QUEUE_MAX_SIZE,
+)
+from simple_config import TimeoutConfig
+from simple_logger import logger
+
+TELEGRAM_MAX_MESSAGE_CHARS = 4096
+DIGEST_SEPARATOR = "\n\n➖➖➖➖➖➖\n\n"
+_MAX_SEND_ATTEMPTS = 3  # כולל המתנות retry_after על 429
+
+
+@dataclass
+class AdminMessage:
+    text: str
+    parse_mode: Optional[str] = "HTML"
+    urgent: bool = False
+    coalesce: bool = True  # False - נשלחת לבד (למשל התראת אינטראקציה מלאה)
+
+
+def _default_client_factory():
+    import httpx
+    return httpx.AsyncClient(timeout=TimeoutConfig.TELEGRAM_SEND_TIMEOUT)
+
+
+class AdminNotificationDispatcher:
+    """תור יוצא להתראות אדמין: איחוד ל-digest, הגבלת קצב ו-session HTTP אחד"""
+
+    def __init__(self, bot_token: str = ADMIN_BOT_TELEGRAM_TOKEN, chat_id: Any = ADMIN_NOTIFICATION_CHAT_ID,
+                 messages_per_minute: float = ADMIN_NOTIFY_MESSAGES_PER_MINUTE,
+                 burst: int = ADMIN_NOTIFY_BURST,
+                 coalesce_seconds: float = ADMIN_NOTIFY_COALESCE_SECONDS,
+                 max_size: int = ADMIN_NOTIFY_QUEUE_MAX_SIZE,
+                 client_factory: Callable[[], Any] = _default_client_factory):
+        self.bot_token = bot_token
+        self.chat_id = chat_id
+        self.rate = max(messages_per_minute, 0.1) / 60.0  # הודעות לשנייה
+        self.burst = max(1, burst)
+        self.coalesce_seconds = coalesce_seconds
+        self.max_size = max(1, max_size)
+        self._client_factory = client_factory
+        self._client = None
+        self._pending: "deque[AdminMessage]" = deque()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._tokens = float(self.burst)
+        self._tokens_updated = time.monotonic()
+        self._dropped_unreported = 0
+        self._stats_lock = threading.Lock()
+        self._stats = {"queued": 0, "sent": 0, "messages_sent": 0, "digests": 0, "dropped": 0,
+                       "failed": 0, "rate_limited_waits": 0, "telegram_429": 0, "plain_text_fallbacks": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done() and not self._stopping
+
+    async def start(self) -> None:
+        """הפעלת לולאת השליחה על ה-event loop הנוכחי"""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        if self._client is None:
+            self._client = self._client_factory()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    def submit(self, text: str, parse_mode: Optional[str] = "HTML", urgent: bool = False, coalesce: bool = True) -> bool:
+        """
+        הכנסת התראה לתור - לא חוסם, בטוח מכל thread.
+        מחזיר False אם המשגר לא רץ (הקורא צריך לשלוח בעצמו).
+        """
+        loop = self._loop
+        if not self.running or loop is None or loop.is_closed():
+            return False
+        message = AdminMessage(text, parse_mode, urgent, coalesce)
+        try:
+            current_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            current_loop = None
+        if current_loop is loop:
+            self._enqueue(message)
+        else:
+            try:
+                loop.call_soon_threadsafe(self._enqueue, message)
+            except RuntimeError:  # ה-loop נסגר בינתיים
+                return False
+        return True
+
+    def _enqueue(self, message: AdminMessage) -> None:
+        with self._stats_lock:
+            if len(self._pending) >= self.max_size:
+                self._dropped_unreported += 1
+                self._stats["dropped"] += 1
+                return
+            self._stats["queued"] += 1
+        self._pending.append(message)
+        self._wakeup.set()
+
+    def _next_digest(self) -> AdminMessage:
+        """הוצאת ההודעה הבאה מהתור - יחד עם כל מה שאפשר לאחד אליה עד מגבלת האורך"""
+        first = self._pending.popleft()
+        parts = [first.text]
+        length = len(first.text)
+        urgent = first.urgent
+        if first.coalesce:
+            while self._pending:
+                candidate = self._pending[0]
+                if not candidate.coalesce or candidate.parse_mode != first.parse_mode:
+                    break
+                if length + len(DIGEST_SEPARATOR) + len(candidate.text) > TELEGRAM_MAX_MESSAGE_CHARS - 200:
+                    break
+                self._pending.popleft()
+                parts.append(candidate.text)
+                length += len(DIGEST_SEPARATOR) + len(candidate.text)
+                urgent = urgent or candidate.urgent
+        text = DIGEST_SEPARATOR.join(parts)
+        if len(parts) > 1:
+            text = f"📦 {len(parts)} התראות מאוחדות\n\n{text}"
+            with self._stats_lock:
+                self._stats["digests"] += 1
+        with self._stats_lock:
+            dropped, self._dropped_unreported = self._dropped_unreported, 0
+            self._stats["messages_sent"] += len(parts)
+        if dropped:
+            text = f"⚠️ {dropped} התראות נזרקו (התור היה מלא)\n\n{text}"
+        return AdminMessage(text, first.parse_mode, urgent, first.coalesce)
+
+    async def _acquire_token(self) -> None:
+        waited = False
+        while True:
+            now = time.monotonic()
+            self._tokens = min(float(self.burst), self._tokens + (now - self._tokens_updated) * self.rate)
+            self._tokens_updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            if not waited:
+                waited = True
+                with self._stats_lock:
+                    self._stats["rate_limited_waits"] += 1
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    async def _send(self, message: AdminMessage) -> bool:
+        url = f"https://api.telegram.org/bot{self.bot_token}/sendMessage"
+        data = {"chat_id": self.chat_id, "text": message.text}
+        if message.parse_mode:
+            data["parse_mode"] = message.parse_mode
+        for _ in range(_MAX_SEND_ATTEMPTS):
+            try:
+                response = await self._client.post(url, data=data)
+            except Exception as e:
+                logger.warning(f"⚠️ [ADMIN_DISPATCH] שליחת התראה נכשלה: {e}", source="admin_dispatcher")
+                break
+            if response.status_code == 200:
+                with self._stats_lock:
+                    self._stats["sent"] += 1
+                return True
+            if response.status_code == 429:
+                with self._stats_lock:
+                    self._stats["telegram_429"] += 1
+                try:
+                    retry_after = float(response.json().get("parameters", {}).get("retry_after", 1))
+                except Exception:
+                    retry_after = 1.0
+                await asyncio.sleep(retry_after)
+                continue
+            if response.status_code == 400 and "parse_mode" in data:
+                # HTML לא תקין באחת ההתראות (למשל ב-digest) - שולחים שוב כטקסט רגיל במקום לאבד את כולן
+                with self._stats_lock:
+                    self._stats["plain_text_fallbacks"] += 1
+                logger.warning(f"⚠️ [ADMIN_DISPATCH] טלגרם דחה את ה-{data['parse_mode']} (400) - שולח כטקסט רגיל", source="admin_dispatcher")
+                data.pop("parse_mode")
+                continue
+            logger.warning(f"⚠️ [ADMIN_DISPATCH] טלגרם החזיר {response.status_code} להתראה", source="admin_dispatcher")
+            break
+        with self._stats_lock:
+            self._stats["failed"] += 1
+        return False
+
+    async def _run(self) -> None:
+        while True:
+            if not self._pending:
+                if self._stopping:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            if not self._stopping and self.coalesce_seconds > 0 and not any(m.urgent for m in self._pending):
+                # חלון איחוד - מה שמגיע בינתיים יוצא באותה הודעה
+                await asyncio.sleep(self.coalesce_seconds)
+            message = self._next_digest()
+            await self._acquire_token()
+            await self._send(message)
+
+    async def stop(self, drain_timeout: float = 10.0) -> None:
+        """שליחת מה שנשאר בתור (עד drain_timeout שניות) וסגירת ה-session"""
+        if self._task is not None and not self._task.done():
+            self._stopping = True
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(self._task, timeout=drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"⚠️ [ADMIN_DISPATCH] {len(self._pending)} התראות לא נשלחו בכיבוי", source="admin_dispatcher")
+        self._task = None
+        self._pending.clear()
+        if self._client is not None:
+            try:
+                await self._client.aclose()
+            except Exception:
+                pass
+            self._client = None
+        self._stopping = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["pending"] = len(self._pending)
+        stats["running"] = self.running
+        return stats
+
+
+# 🌐 מופע יחיד לכל התהליך
+admin_dispatcher = AdminNotificationDispatcher()
@@ -167,8 +167,8 @@ def send_admin_notification(message, urgent=False):
         if urgent:
             message = f"🚨 **דחוף** 🚨\n\n{message}"
         
-        # שליחה עם הבוט הייעודי
-        _send_telegram_message_admin_sync(ADMIN_BOT_TELEGRAM_TOKEN, ADMIN_NOTIFICATION_CHAT_ID, message)
+        # שליחה עם הבוט הייעודי - דרך תור ההתראות (לא חוסם)
+        deliver_admin_message(message, urgent=urgent)
         
     except Exception as e:
         logger.error(f"🚨 שגיאה בשליחת התראה לאדמין: {e}")
@@ -184,7 +184,7 @@ def send_admin_notification_raw(message):
             logger.info(f"📨 [ADMIN_RAW] {message}")
             return
             
-        _send_telegram_message_admin_sync(ADMIN_BOT_TELEGRAM_TOKEN, ADMIN_NOTIFICATION_CHAT_ID, message)
+        deliver_admin_message(message, coalesce=False)
         
     except Exception as e:
         logger.error(f"�� שגיאה בשליחת התראה גולמית: {e}")
@@ -328,15 +328,26 @@ async def _send_telegram_message_admin(bot_token, chat_id, text):
     except Exception as e:
         logger.error(f"🚨 שגיאה בשליחה אסינכרונית לאדמין: {e}")
 
-def _send_telegram_message_admin_sync(bot_token, chat_id, text):
+def deliver_admin_message(text, parse_mode="HTML", urgent=False, coalesce=True):
+    """
+    שליחת טקסט לאדמין דרך admin_dispatcher (תור async - לא חוסם את הקורא).
+    אם המשגר לא רץ (סקריפט / לפני עליית השרת) - שליחה סינכרונית כמו קודם.
+    """
+    from admin_dispatcher import admin_dispatcher
+    if admin_dispatcher.submit(text, parse_mode=parse_mode, urgent=urgent, coalesce=coalesce):
+        return
+    _send_telegram_message_admin_sync(ADMIN_BOT_TELEGRAM_TOKEN, ADMIN_NOTIFICATION_CHAT_ID, text, parse_mode)
+
+def _send_telegram_message_admin_sync(bot_token, chat_id, text, parse_mode="HTML"):
     """שולח הודעה סינכרונית לאדמין"""
     try:
         url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
         data = {
             "chat_id": chat_id,
-            "text": text,
-            "parse_mode": "HTML"
+            "text": text
         }
+        if parse_mode:
+            data["parse_mode"] = parse_mode
         
         response = requests.post(url, data=data, timeout=TimeoutConfig.TELEGRAM_SEND_TIMEOUT)
         if response.status_code == 200:
@@ -390,238 +401,239 @@ def alert_system_status(message, level="info"):
 # �️ הפונקציה הישנה הוסרה - עכשיו משתמשים ב-send_admin_notification_from_db
 # שמורה כהערה היסטורית בלבד 
 
-def send_admin_notification_from_db(interaction_id: int) -> bool:
+# עמודות interactions_log שנדרשות להתראה (שליפה מה-DB רק כשאין רשומה בזיכרון)
+INTERACTION_NOTIFICATION_COLUMNS = (
+    "serial_number", "chat_id", "user_msg", "bot_msg", "full_system_prompts",
+    "gpt_a_model", "gpt_a_processing_time",
+    "gpt_b_activated", "gpt_b_reply", "gpt_b_model",
+    "gpt_c_activated", "gpt_c_reply", "gpt_c_model",
+    "gpt_d_activated", "gpt_d_reply", "gpt_d_model",
+    "gpt_e_activated", "gpt_e_reply", "gpt_e_model",
+    "user_to_bot_response_time", "background_processing_time", "total_cost_agorot",
+    "history_user_messages_count", "history_bot_messages_count", "timestamp",
+)
+
+def format_interaction_notification(record: dict, profile_summary: Optional[str]) -> str:
     """
-    🔥 שליחת התראה לאדמין מנתוני אמת מטבלת interactions_log
+    בניית טקסט התראת "התכתבות חדשה" מרשומת interactions_log (dict לפי שמות העמודות).
+    בלי גישה ל-DB - הרשומה מגיעה מהזיכרון (send_admin_interaction_notification) או מהטבלה.
+    """
+    from utils import safe_str
+    chat_id = record.get("chat_id")
+    history_user_count = record.get("history_user_messages_count") or 0
+    history_bot_count = record.get("history_bot_messages_count") or 0
+    gpt_a_time = record.get("gpt_a_processing_time")
+    user_to_bot_time = record.get("user_to_bot_response_time") or 0
+    background_time = record.get("background_processing_time") or 0
+    
+    # יצירת chat_id מוסווה עם 4 ספרות אחרונות
+    chat_suffix = ""
+    if chat_id:
+        safe_chat_id = safe_str(chat_id)
+        if len(safe_chat_id) > 4:
+            # מיסוך כל הספרות חוץ מ-4 האחרונות
+            masked_part = "X" * (len(safe_chat_id) - 4)
+            last_4_digits = safe_chat_id[-4:]
+            masked_chat_id = masked_part + last_4_digits
+            chat_suffix = f" (`{masked_chat_id}`)"
+        else:
+            chat_suffix = f" (`{safe_chat_id}`)"
+
+    # יצירת ID עם 7 ספרות
+    formatted_id = f"{record['serial_number']:07d}"
+    
+    # בניית תוכן ההתראה בפורמט הישן
+    notification_text = f"💬 <b>התכתבות חדשה{chat_suffix}</b> 💬\n\n"
+    notification_text += f"📚 <b>היסטוריה:</b> {history_user_count} משתמש + {history_bot_count} בוט\n"
+    
+    # הוספת מידע על סיסטם פרומפטים האמיתיים מהרשומה
+    full_system_prompts = record.get("full_system_prompts")
+    if full_system_prompts:
+        # פיצול הסיסטם פרומפטים לפי המפריד
+        system_prompts_list = full_system_prompts.split('\n\n--- SYSTEM PROMPT SEPARATOR ---\n\n')
+        for i, prompt in enumerate(system_prompts_list, 1):
+            if prompt.strip():
+                if len(prompt) > 30:
+                    prompt_preview = prompt[:30] + "..."
+                    remaining_chars = len(prompt) - 30
+                    notification_text += f"<b>סיסטם פרומפט {i}:</b> {prompt_preview} (+{remaining_chars})\n"
+                else:
+                    notification_text += f"<b>סיסטם פרומפט {i}:</b> {prompt}\n"
+    else:
+        notification_text += f"<b>סיסטם פרומפט:</b> לא נמצאו סיסטם פרומפטים בטבלה\n"
+    
+    notification_text += f"\n➖➖➖➖➖     <b>הודעת משתמש</b>     ➖➖➖➖➖\n\n"
+    notification_text += f"{record.get('user_msg')}\n\n"
+    
+    notification_text += f"➖➖➖➖➖       <b>תשובת הבוט</b>       ➖➖➖➖➖\n\n"
+    notification_text += f"{record.get('bot_msg')}\n\n"
+    
+    notification_text += f"➖➖➖➖➖➖    <b>עוד נתונים</b>   ➖➖➖➖➖➖\n\n"
+    
+    # GPT-B / GPT-C / GPT-D - התשובה המלאה (לא קטועה)
+    for gpt_type in ("b", "c", "d"):
+        notification_text += f"<b><u>מודל gpt_{gpt_type}:</u></b>     (מודל {record.get(f'gpt_{gpt_type}_model') or 'לא זמין'})\n"
+        if record.get(f"gpt_{gpt_type}_activated") and record.get(f"gpt_{gpt_type}_reply"):
+            notification_text += f"{record.get(f'gpt_{gpt_type}_reply')}\n\n"
+        else:
+            notification_text += f"לא הופעל\n\n"
+    
+    # GPT-E - תיקון המונה
+    notification_text += f"<b><u>מודל gpt_e:</u></b>     (מודל {record.get('gpt_e_model') or 'לא זמין'})\n"
+    if record.get("gpt_e_activated") and record.get("gpt_e_reply"):
+        # הצגת התשובה המלאה של GPT-E (לא קטועה)
+        notification_text += f"{record.get('gpt_e_reply')}"
+    else:
+        # חישוב מונה נכון - כל 10 הודעות מופעל GPT-E
+        current_msg_count = history_user_count if history_user_count > 0 else 1
+        from gpt_e_handler import GPT_E_RUN_EVERY_MESSAGES
+        counter_display = current_msg_count % GPT_E_RUN_EVERY_MESSAGES
+        notification_text += f"לא הופעל - מופעל לפי מונה הודעות כרגע המונה עומד על {counter_display} מתוך {GPT_E_RUN_EVERY_MESSAGES}"
+    
+    notification_text += f"\n\n"
+    
+    # הוספת סיכום פרופיל רגשי תמיד (None = שגיאה בשליפה)
+    notification_text += f"➖➖➖➖ <b>סיכום פרופיל רגשי</b> ➖➖➖➖➖➖\n"
+    if profile_summary is None:
+        notification_text += f"שגיאה בשליפת פרופיל\n\n"
+    elif profile_summary.strip():
+        notification_text += f"{profile_summary}\n\n"
+    else:
+        notification_text += f"חסר (אין פרופיל למשתמש)\n\n"
+    
+    # הפרדה לפני נתוני אמת
+    notification_text += f"➖➖➖➖➖➖    <b>עוד נתונים</b>   ➖➖➖➖➖➖\n\n"
+    
+    # נתוני אמת - למטה
+    notification_text += f"📊 <b>נתוני אמת מהמסד:</b>\n"
+    notification_text += f"💰 <b>עלות כוללת לכל האינטרקציה:</b> {record.get('total_cost_agorot') or 0:.1f} אגורות\n"
+    
+    # תיקון חישוב הזמנים - 3 שורות נפרדות
+    notification_text += f"⏱️ <b>זמן שלקח לבינה:</b> {gpt_a_time or 0:.2f}s\n"
+    notification_text += f"      <b>זמן שלקח למשתמש לקבל:</b> {user_to_bot_time:.2f}s\n"
+    
+    # חישוב פער קוד נכון
+    if gpt_a_time and user_to_bot_time:
+        code_gap = user_to_bot_time - gpt_a_time
+        notification_text += f"      <b>פער קוד:</b> {code_gap:.2f}s\n"
+    else:
+        notification_text += f"      <b>פער קוד:</b> {background_time:.2f}s\n"
+    
+    notification_text += f"📊 <b>מספר הודעות משתמש כולל:</b> {history_user_count or 1}\n"
+    
+    # המרה לזמן ישראל עם pytz
+    import pytz
+    israel_tz = pytz.timezone('Asia/Jerusalem')
+    timestamp = record.get("timestamp") or get_israel_time()
+    
+    # המרה נכונה מUTC לזמן ישראל
+    if timestamp.tzinfo is None:
+        # אם אין timezone, נניח שזה UTC
+        utc_tz = pytz.timezone('UTC')
+        timestamp_utc = utc_tz.localize(timestamp)
+    else:
+        timestamp_utc = timestamp
+    
+    israel_time = timestamp_utc.astimezone(israel_tz)
+    notification_text += f"🕐 <b>ההודעה נשלחה ב:</b> {israel_time.strftime('%d/%m/%y %H:%M')} ישראל\n\n"
+    
+    # גישה מהירה לטבלה
+    notification_text += f"🔗 <b>לגישה מהירה לטבלה:</b>\n"
+    notification_text += f"```sql\n"
+    notification_text += f"SELECT * FROM interactions_log WHERE serial_number = {formatted_id};\n"
+    notification_text += f"```"
+    return notification_text
+
+def send_admin_interaction_notification(record: dict) -> bool:
+    """
+    🔥 שליחת התראת "התכתבות חדשה" לאדמין מרשומת האינטראקציה שבזיכרון
+    (interactions_logger.interaction_record) - בלי לקרוא שוב את השורה מהטבלה.
+    רץ ב-executor של ה-DB: סיכום הפרופיל מגיע מ-profile_cache, ונוסח ההתראה נשמר בשורה.
     
-    Args:
-        interaction_id: מזהה אינטראקציה בטבלת interactions_log
-        
     Returns:
-        bool: האם ההתראה נשלחה בהצלחה
+        bool: האם ההתראה נכנסה לשליחה
     """
+    serial_number = record.get("serial_number")
     try:
         if is_test_environment():
-            logger.info(f"📨 [DB_NOTIFICATION] בסביבת בדיקה, לא שולח התראה לאדמין | interaction_id={interaction_id}")
+            logger.info(f"📨 [DB_NOTIFICATION] בסביבת בדיקה, לא שולח התראה לאדמין | interaction_id={serial_number}")
             return True
-
-        # חיבור למסד הנתונים
-        from config import get_config
-        import psycopg2
-        config = get_config()
-        db_url = config.get("DATABASE_EXTERNAL_URL") or config.get("DATABASE_URL")
         
-        if not db_url:
-            logger.error("[DB_NOTIFICATION] לא נמצא URL למסד הנתונים")
-            return False
-        
-        conn = psycopg2.connect(db_url)
-        cur = conn.cursor()
-        
-        # שליפת נתוני האינטראקציה המלאים כולל הסיסטם פרומפטים
-        cur.execute("""
-            SELECT 
-                serial_number, chat_id, user_msg, bot_msg, full_system_prompts,
-                gpt_a_model, gpt_a_processing_time, gpt_a_tokens_input, gpt_a_tokens_output, gpt_a_tokens_cached,
-                gpt_b_activated, gpt_b_reply, gpt_b_model, gpt_b_processing_time, gpt_b_tokens_input, gpt_b_tokens_output, gpt_b_tokens_cached,
-                gpt_c_activated, gpt_c_reply, gpt_c_model, gpt_c_processing_time, gpt_c_tokens_input, gpt_c_tokens_output, gpt_c_tokens_cached,
-                gpt_d_activated, gpt_d_reply, gpt_d_model, gpt_d_processing_time, gpt_d_tokens_input, gpt_d_tokens_output, gpt_d_tokens_cached,
-                gpt_e_activated, gpt_e_reply, gpt_e_model, gpt_e_processing_time, gpt_e_tokens_input, gpt_e_tokens_output, gpt_e_tokens_cached, gpt_e_counter,
-                user_to_bot_response_time, background_processing_time, total_cost_agorot,
-                history_user_messages_count, history_bot_messages_count, timestamp
-            FROM interactions_log 
-            WHERE serial_number = %s
-        """, (interaction_id,))
-        
-        row = cur.fetchone()
-        if not row:
-            logger.error(f"[DB_NOTIFICATION] לא נמצאה אינטראקציה {interaction_id}")
-            cur.close()
-            conn.close()
-            return False
-        
-        # פירוק הנתונים כולל הסיסטם פרומפטים
-        (serial_num, chat_id, user_msg, bot_msg, full_system_prompts,
-         gpt_a_model, gpt_a_time, gpt_a_input, gpt_a_output, gpt_a_cached,
-         gpt_b_activated, gpt_b_reply, gpt_b_model, gpt_b_time, gpt_b_input, gpt_b_output, gpt_b_cached,
-         gpt_c_activated, gpt_c_reply, gpt_c_model, gpt_c_time, gpt_c_input, gpt_c_output, gpt_c_cached,
-         gpt_d_activated, gpt_d_reply, gpt_d_model, gpt_d_time, gpt_d_input, gpt_d_output, gpt_d_cached,
-         gpt_e_activated, gpt_e_reply, gpt_e_model, gpt_e_time, gpt_e_input, gpt_e_output, gpt_e_cached, gpt_e_counter,
-         user_to_bot_time, background_time, total_cost_agorot,
-         history_user_count, history_bot_count, timestamp) = row
-        
-        cur.close()
-        conn.close()
-        
-        # יצירת chat_id מוסווה עם 4 ספרות אחרונות
-        chat_suffix = ""
-        if chat_id:
-            from utils import safe_str
-            safe_chat_id = safe_str(chat_id)
-            if len(safe_chat_id) > 4:
-                # מיסוך כל הספרות חוץ מ-4 האחרונות
-                masked_part = "X" * (len(safe_chat_id) - 4)
-                last_4_digits = safe_chat_id[-4:]
-                masked_chat_id = masked_part + last_4_digits
-                chat_suffix = f" (`{masked_chat_id}`)"
-            else:
-                chat_suffix = f" (`{safe_chat_id}`)"
-
-        # יצירת ID עם 7 ספרות
-        formatted_id = f"{serial_num:07d}"
-        
-        # בניית תוכן ההתראה בפורמט הישן
-        notification_text = f"💬 <b>התכתבות חדשה{chat_suffix}</b> 💬\n\n"
-        notification_text += f"📚 <b>היסטוריה:</b> {history_user_count} משתמש + {history_bot_count} בוט\n"
-        
-        # הוספת מידע על סיסטם פרומפטים האמיתיים מהטבלה
-        if full_system_prompts:
-            # פיצול הסיסטם פרומפטים לפי המפריד
-            system_prompts_list = full_system_prompts.split('\n\n--- SYSTEM PROMPT SEPARATOR ---\n\n')
-            for i, prompt in enumerate(system_prompts_list, 1):
-                if prompt.strip():
-                    if len(prompt) > 30:
-                        prompt_preview = prompt[:30] + "..."
-                        remaining_chars = len(prompt) - 30
-                        notification_text += f"<b>סיסטם פרומפט {i}:</b> {prompt_preview} (+{remaining_chars})\n"
-                    else:
-                        notification_text += f"<b>סיסטם פרומפט {i}:</b> {prompt}\n"
-        else:
-            notification_text += f"<b>סיסטם פרומפט:</b> לא נמצאו סיסטם פרומפטים בטבלה\n"
-        
-        notification_text += f"\n➖➖➖➖➖     <b>הודעת משתמש</b>     ➖➖➖➖➖\n\n"
-        notification_text += f"{user_msg}\n\n"
-        
-        notification_text += f"➖➖➖➖➖       <b>תשובת הבוט</b>       ➖➖➖➖➖\n\n"
-        notification_text += f"{bot_msg}\n\n"
-        
-        notification_text += f"➖➖➖➖➖➖    <b>עוד נתונים</b>   ➖➖➖➖➖➖\n\n"
-        
-        # GPT-B
-        notification_text += f"<b><u>מודל gpt_b:</u></b>     (מודל {gpt_b_model or 'לא זמין'})\n"
-        if gpt_b_activated and gpt_b_reply:
-            # הצגת התשובה המלאה של GPT-B (לא קטועה)
-            notification_text += f"{gpt_b_reply}\n\n"
-        else:
-            notification_text += f"לא הופעל\n\n"
-        
-        # GPT-C
-        notification_text += f"<b><u>מודל gpt_c:</u></b>     (מודל {gpt_c_model or 'לא זמין'})\n"
-        if gpt_c_activated and gpt_c_reply:
-            # הצגת התשובה המלאה של GPT-C (לא קטועה)
-            notification_text += f"{gpt_c_reply}\n\n"
-        else:
-            notification_text += f"לא הופעל\n\n"
-        
-        # GPT-D
-        notification_text += f"<b><u>מודל gpt_d:</u></b>     (מודל {gpt_d_model or 'לא זמין'})\n"
-        if gpt_d_activated and gpt_d_reply:
-            # הצגת התשובה המלאה של GPT-D (לא קטועה)
-            notification_text += f"{gpt_d_reply}\n\n"
-        else:
-            notification_text += f"לא הופעל\n\n"
-        
-        # GPT-E - תיקון המונה
-        notification_text += f"<b><u>מודל gpt_e:</u></b>     (מודל {gpt_e_model or 'לא זמין'})\n"
-        if gpt_e_activated and gpt_e_reply:
-            # הצגת התשובה המלאה של GPT-E (לא קטועה)
-            notification_text += f"{gpt_e_reply}"
-        else:
-            # חישוב מונה נכון - כל 10 הודעות מופעל GPT-E
-            current_msg_count = history_user_count if history_user_count > 0 else 1
-            from gpt_e_handler import GPT_E_RUN_EVERY_MESSAGES
-            counter_display = current_msg_count % GPT_E_RUN_EVERY_MESSAGES
-            notification_text += f"לא הופעל - מופעל לפי מונה הודעות כרגע המונה עומד על {counter_display} מתוך {GPT_E_RUN_EVERY_MESSAGES}"
-        
-        notification_text += f"\n\n"
-        
-        # הוספת סיכום פרופיל רגשי תמיד
-        # שליפת פרופיל המשתמש
         try:
-            profile_conn = psycopg2.connect(db_url)
-            profile_cur = profile_conn.cursor()
-            profile_cur.execute("SELECT summary FROM user_profiles WHERE chat_id = %s", (safe_str(chat_id),))
-            user_profile = profile_cur.fetchone()
-            
-            notification_text += f"➖➖➖➖ <b>סיכום פרופיל רגשי</b> ➖➖➖➖➖➖\n"
-            if user_profile and user_profile[0] and user_profile[0].strip():
-                notification_text += f"{user_profile[0]}\n\n"
-            else:
-                notification_text += f"חסר (אין פרופיל למשתמש)\n\n"
-            
-            profile_cur.close()
-            profile_conn.close()
+            from profile_utils import get_user_profile
+            from utils import safe_str
+            profile_summary = get_user_profile(safe_str(record.get("chat_id"))).get("summary") or ""
         except Exception as profile_err:
             logger.warning(f"[DB_NOTIFICATION] שגיאה בשליפת פרופיל: {profile_err}")
-            notification_text += f"➖➖➖➖ <b>סיכום פרופיל רגשי</b> ➖➖➖➖➖➖\n"
-            notification_text += f"שגיאה בשליפת פרופיל\n\n"
+            profile_summary = None
         
-        # הפרדה לפני נתוני אמת מהמסד
-        notification_text += f"➖➖➖➖➖➖    <b>עוד נתונים</b>   ➖➖➖➖➖➖\n\n"
+        notification_text = format_interaction_notification(record, profile_summary)
         
-        # נתוני אמת מהמסד - למטה
-        notification_text += f"📊 <b>נתוני אמת מהמסד:</b>\n"
-        notification_text += f"💰 <b>עלות כוללת לכל האינטרקציה:</b> {total_cost_agorot:.1f} אגורות\n"
-        
-        # תיקון חישוב הזמנים - 3 שורות נפרדות
-        notification_text += f"⏱️ <b>זמן שלקח לבינה:</b> {gpt_a_time or 0:.2f}s\n"
-        notification_text += f"      <b>זמן שלקח למשתמש לקבל:</b> {user_to_bot_time:.2f}s\n"
-        
-        # חישוב פער קוד נכון
-        if gpt_a_time and user_to_bot_time:
-            code_gap = user_to_bot_time - gpt_a_time
-            notification_text += f"      <b>פער קוד:</b> {code_gap:.2f}s\n"
-        else:
-            notification_text += f"      <b>פער קוד:</b> {background_time:.2f}s\n"
-        
-        notification_text += f"📊 <b>מספר הודעות משתמש כולל:</b> {history_user_count or 1}\n"
-        
-        # המרה לזמן ישראל עם pytz
-        import pytz
-        israel_tz = pytz.timezone('Asia/Jerusalem')
-        
-        # המרה נכונה מUTC לזמן ישראל
-        if timestamp.tzinfo is None:
-            # אם אין timezone, נניח שזה UTC
-            utc_tz = pytz.timezone('UTC')
-            timestamp_utc = utc_tz.localize(timestamp)
-        else:
-            timestamp_utc = timestamp
-        
-        israel_time = timestamp_utc.astimezone(israel_tz)
-        notification_text += f"🕐 <b>ההודעה נשלחה ב:</b> {israel_time.strftime('%d/%m/%y %H:%M')} ישראל\n\n"
-        
-        # גישה מהירה לטבלה
-        notification_text += f"🔗 <b>לגישה מהירה לטבלה:</b>\n"
-        notification_text += f"```sql\n"
-        notification_text += f"SELECT * FROM interactions_log WHERE serial_number = {formatted_id};\n"
-        notification_text += f"```"
-
-        # שליחת ההתראה לאדמין
+        # שליחת ההתראה לאדמין (נכנסת לתור - לא ממתינים לטלגרם)
         send_admin_notification_raw(notification_text)
-        success = True  # נניח שהשליחה הצליחה אם לא הייתה exception
         
-        if success:
-            # עדכון הטבלה עם הנוסח שנשלח
+        # עדכון הטבלה עם הנוסח שנשלח
+        try:
+            from db_pool import get_connection
+            conn = get_connection()
             try:
-                conn = psycopg2.connect(db_url)
                 cur = conn.cursor()
                 cur.execute("""
                     UPDATE interactions_log 
                     SET admin_notification_text = %s
                     WHERE serial_number = %s
-                """, (notification_text, serial_num))
+                """, (notification_text, serial_number))
                 conn.commit()
                 cur.close()
+            finally:
                 conn.close()
-                
-                logger.info(f"✅ [DB_NOTIFICATION] התראה נשלחה ועודכנה בטבלה | interaction_id={interaction_id} | formatted_id={formatted_id}")
-                
-            except Exception as update_err:
-                logger.warning(f"[DB_NOTIFICATION] שגיאה בעדכון הטבלה: {update_err}")
+            
+            logger.info(f"✅ [DB_NOTIFICATION] התראה נשלחה ועודכנה בטבלה | interaction_id={serial_number}")
+            
+        except Exception as update_err:
+            logger.warning(f"[DB_NOTIFICATION] שגיאה בעדכון הטבלה: {update_err}")
+        
+        return True
+        
+    except Exception as e:
+        logger.error(f"❌ [DB_NOTIFICATION] שגיאה בשליחת התראה: {e}")
+        return False
+
+def send_admin_notification_from_db(interaction_id: int) -> bool:
+    """
+    🔥 שליחת התראה לאדמין מנתוני אמת מטבלת interactions_log
+    (למסלולים שאין בהם רשומה בזיכרון - אחרת send_admin_interaction_notification)
+    
+    Args:
+        interaction_id: מזהה אינטראקציה בטבלת interactions_log
+        
+    Returns:
+        bool: האם ההתראה נשלחה בהצלחה
+    """
+    try:
+        if is_test_environment():
+            logger.info(f"📨 [DB_NOTIFICATION] בסביבת בדיקה, לא שולח התראה לאדמין | interaction_id={interaction_id}")
+            return True
+
+        from db_pool import get_connection
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                f"SELECT {', '.join(INTERACTION_NOTIFICATION_COLUMNS)} FROM interactions_log WHERE serial_number = %s",
+                (interaction_id,),
+            )
+            row = cur.fetchone()
+            cur.close()
+        finally:
+            conn.close()
+        
+        if not row:
+            logger.error(f"[DB_NOTIFICATION] לא נמצאה אינטראקציה {interaction_id}")
+            return False
         
-        return success
+        return send_admin_interaction_notification(dict(zip(INTERACTION_NOTIFICATION_COLUMNS, row)))
         
     except Exception as e:
         logger.error(f"❌ [DB_NOTIFICATION] שגיאה בשליחת התראה מהטבלה: {e}")
-        return False 
\ No newline at end of file
+        return False
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+approval_cache.py - cache לסטטוס אישור משתמש (approved / pending_code / pending_approval / not_found)
+==================================================================================================
+
+check_user_approved_status_db נקראת בכל הודעה נכנסת, אבל הסטטוס משתנה רק בכמה
+פונקציות כתיבה (register_user_with_code_db, approve_user_db_new, increment_code_try_db_new,
+clear_user_profile_only ויצירת שורה במונה ההודעות). כל אחת מהן קוראת ל-invalidate אחרי commit,
+וה-TTL הוא רק רשת ביטחון לכתיבות שלא עוברות דרך הפונקציות האלה (למשל עדכון ידני ב-DB).
+
+- negative caching: גם "not_found" נשמר, עם TTL קצר יותר (APPROVAL_CACHE_NEGATIVE_TTL_SECONDS)
+- "error" לעולם לא נשמר
+- קריאה שהתחילה לפני invalidate לא שומרת תוצאה ישנה (מונה generation)
+- thread-safe: הבדיקה רצה ב-executor של ה-DB
+
+שימוש:
+    from approval_cache import approval_cache
+    status = approval_cache.get(chat_id)     # None אם אין / פג תוקף
+    approval_cache.set(chat_id, "approved")
+    approval_cache.invalidate(chat_id)
+
+🔧 הגדרות: APPROVAL_CACHE_TTL_SECONDS / APPROVAL_CACHE_NEGATIVE_TTL_SECONDS / APPROVAL_CACHE_MAX_SIZE ב-config.py
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from config import APPROVAL_CACHE_TTL_SECONDS, APPROVAL_CACHE_NEGATIVE_TTL_SECONDS, APPROVAL_CACHE_MAX_SIZE
+from user_friendly_errors import safe_str
+
+CACHEABLE_STATUSES = ("approved", "pending_code", "pending_approval", "not_found")
+
+
+class ApprovalCache:
+    """LRU חסום עם TTL לכל רשומה; TTL קצר יותר לסטטוס not_found"""
+
+    def __init__(self, ttl_seconds: float = APPROVAL_CACHE_TTL_SECONDS,
+                 negative_ttl_seconds: float = APPROVAL_CACHE_NEGATIVE_TTL_SECONDS,
+                 max_size: int = APPROVAL_CACHE_MAX_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.max_size = max(1, max_size)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # chat_id -> (expires_at, status)
+        self._lock = threading.Lock()
+        self._generation = 0  # עולה בכל invalidate
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0, "stale_writes_skipped": 0}
+
+    def get(self, chat_id: Any) -> Optional[str]:
+        key = safe_str(chat_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() >= entry[0]:
+                if entry is not None:
+                    del self._entries[key]
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[1]
+
+    @property
+    def generation(self) -> int:
+        """לקרוא לפני השאילתה ולהעביר ל-set - כך תוצאה שנקראה לפני כתיבה לא נשמרת אחריה"""
+        return self._generation
+
+    def set(self, chat_id: Any, status: str, generation: Optional[int] = None) -> None:
+        if status not in CACHEABLE_STATUSES:
+            return
+        ttl = self.negative_ttl_seconds if status == "not_found" else self.ttl_seconds
+        key = safe_str(chat_id)
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                self._stats["stale_writes_skipped"] += 1
+                return
+            self._entries[key] = (time.monotonic() + ttl, status)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, chat_id: Any) -> None:
+        """נקרא אחרי כל כתיבה שיכולה לשנות את הסטטוס"""
+        key = safe_str(chat_id)
+        with self._lock:
+            self._generation += 1
+            if self._entries.pop(key, None) is not None:
+                self._stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
+
+
+# 🌐 מופע יחיד לכל התהליך
+approval_cache = ApprovalCache()
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+background_jobs.py - תור משימות רקע חסום עם מאגר workers
+==========================================================
+
+העיבוד שאחרי התשובה (GPT-B/C/D/E, שמירת היסטוריה, רישום, התראות) רץ דרך תור אחד
+במקום asyncio.create_task חופשי לכל הודעה:
+- תור חסום (BACKGROUND_QUEUE_MAX_SIZE) - כשהוא מלא, submit ממתין (backpressure) במקום לצבור משימות בלי סוף;
+  קורא שאסור לו להמתין הרבה (worker של צ'אט) מגיש עם timeout - אם עדיין אין מקום, המשימה נזרקת
+  (לוג + מונה shed) ולא רצה מחוץ לתור, כך שמספר המשימות הרצות נשאר חסום
+- ממתינים למקום מקבלים אותו לפי סדר ההגעה - הגשה חדשה לא עוקפת את מי שכבר ממתין
+- BACKGROUND_WORKERS משימות לכל היותר רצות במקביל - מסלול התשובה הראשי לא מורעב
+- סדר לפי צ'אט - משימות של אותו צ'אט רצות אחת אחרי השנייה, לפי סדר ההגשה
+- ניסיון חוזר עם backoff (BACKGROUND_JOB_RETRY_BASE_DELAY * 2^n) למשימה שזרקה חריגה
+- שמירה אופציונלית ב-Postgres (BACKGROUND_JOBS_PERSIST) - משימות שלא הסתיימו משוחזרות בעלייה
+
+שימוש:
+    from background_jobs import background_jobs, BackgroundJob
+    job = BackgroundJob("post_reply", chat_id, handle_background_tasks, args=(...))
+    await background_jobs.submit(job, timeout=BACKGROUND_SUBMIT_TIMEOUT_SECONDS)  # False = נזרקה
+
+שחזור אחרי restart אפשרי רק למשימות עם persist_payload (JSON) ו-handler רשום:
+    background_jobs.register_handler("post_reply_recovery", recover_func)   # recover_func(**payload)
+"""
+
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set, Tuple
+
+from config import (
+    BACKGROUND_QUEUE_MAX_SIZE,
+    BACKGROUND_WORKERS,
+    BACKGROUND_JOB_MAX_ATTEMPTS,
+    BACKGROUND_JOB_RETRY_BASE_DELAY,
+    BACKGROUND_JOBS_PERSIST,
+)
+from simple_logger import logger
+from user_friendly_errors import safe_str
+
+_NO_CHAT = "__no_chat__"
+
+
+@dataclass
+class BackgroundJob:
+    """משימת רקע אחת - func היא פונקציית async שנקראת עם args/kwargs"""
+    job_type: str
+    chat_id: Optional[str]
+    func: Callable[..., Awaitable[Any]]
+    args: tuple = ()
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    persist_payload: Optional[Dict[str, Any]] = None  # JSON לשחזור אחרי restart (דרך handler רשום)
+    persist_as: Optional[str] = None                  # שם ה-handler לשחזור (ברירת מחדל: job_type)
+    max_attempts: int = BACKGROUND_JOB_MAX_ATTEMPTS
+    timeout: Optional[float] = None
+    attempts: int = 0
+    persisted_id: Optional[int] = None
+    submitted_at: float = field(default_factory=time.time)
+
+
+class BackgroundJobQueue:
+    """תור חסום עם workers, סדר לפי צ'אט, retry ו-persistence אופציונלי"""
+
+    def __init__(self, max_size: int = BACKGROUND_QUEUE_MAX_SIZE, workers: int = BACKGROUND_WORKERS,
+                 retry_base_delay: float = BACKGROUND_JOB_RETRY_BASE_DELAY, persist: bool = BACKGROUND_JOBS_PERSIST):
+        self.max_size = max(1, max_size)
+        self.workers = max(1, workers)
+        self.retry_base_delay = retry_base_delay
+        self.persist = persist
+
+        self._handlers: Dict[str, Callable[..., Awaitable[Any]]] = {}
+        self._chats: Dict[str, Deque[BackgroundJob]] = {}
+        self._scheduled: Set[str] = set()   # צ'אטים שנמצאים בתור המוכנים / בעיבוד / ממתינים ל-retry
+        self._pending = 0
+        self._waiting = 0                   # הגשות שממתינות למקום בתור
+        self._ready: Optional[asyncio.Queue] = None
+        self._not_full: Optional[asyncio.Condition] = None
+        self._idle: Optional[asyncio.Event] = None
+        self._worker_tasks = []
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "retried": 0,
+                       "backpressure_waits": 0, "rejected": 0, "shed": 0, "restored": 0}
+
+    # ------------------------------------------------------------------
+    # מחזור חיים
+    # ------------------------------------------------------------------
+
+    def register_handler(self, job_type: str, handler: Callable[..., Awaitable[Any]]) -> None:
+        """רישום handler לשחזור משימות שמורות מסוג job_type (נקרא עם **payload)"""
+        self._handlers[job_type] = handler
+
+    def _ensure_started(self) -> Tuple[asyncio.Queue, asyncio.Condition, asyncio.Event]:
+        """הפעלה עצלה של ה-workers בתוך ה-event loop הנוכחי - מחזיר (ready, not_full, idle)"""
+        if self._worker_tasks and not all(t.done() for t in self._worker_tasks):
+            return self._primitives()
+        # workers של event loop קודם (שנסגר) - המצב שלהם לא שמיש יותר
+        self._chats.clear()
+        self._scheduled.clear()
+        self._pending = 0
+        self._waiting = 0
+        self._ready = asyncio.Queue()
+        self._not_full = asyncio.Condition()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(i), name=f"background_worker_{i}") for i in range(self.workers)
+        ]
+        logger.info(f"⏳ [BG_JOBS] הופעלו {self.workers} workers | תור מקסימלי: {self.max_size}", source="background_jobs")
+        return self._primitives()
+
+    def _primitives(self) -> Tuple[asyncio.Queue, asyncio.Condition, asyncio.Event]:
+        """ה-primitives של ה-event loop הנוכחי - קיימים רק אחרי _ensure_started"""
+        if self._ready is None or self._not_full is None or self._idle is None:
+            raise RuntimeError("BackgroundJobQueue לא הופעל - חסרה קריאה ל-_ensure_started")
+        return self._ready, self._not_full, self._idle
+
+    async def start(self) -> int:
+        """הפעלת ה-workers ושחזור משימות שנשמרו בריצה הקודמת - מחזיר כמה שוחזרו"""
+        self._ensure_started()
+        if not self.persist:
+            return 0
+        return await self.restore_pending()
+
+    async def stop(self, drain_timeout: float = 10.0) -> None:
+        """
+        כיבוי: ממתין עד drain_timeout שניות לסיום המשימות ואז עוצר את ה-workers.
+        משימות שמורות שלא הסתיימו נשארות ב-DB לעלייה הבאה.
+        """
+        if not self._worker_tasks:
+            return
+        _, _, idle = self._primitives()
+        if self._pending:
+            try:
+                await asyncio.wait_for(idle.wait(), timeout=drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"⚠️ [BG_JOBS] כיבוי עם {self._pending} משימות שלא הסתיימו", source="background_jobs")
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    # ------------------------------------------------------------------
+    # הגשה
+    # ------------------------------------------------------------------
+
+    def _has_room(self) -> bool:
+        """יש מקום להגשה חדשה - רק אם אין מי שכבר ממתין לפניה"""
+        return self._pending < self.max_size and not self._waiting
+
+    async def submit(self, job: BackgroundJob, timeout: Optional[float] = None) -> bool:
+        """
+        הוספת משימה; כשהתור מלא - ממתין למקום פנוי (backpressure).
+        עם timeout - ממתין לכל היותר timeout שניות; אם עדיין אין מקום המשימה נזרקת
+        (לוג + מונה shed) ומוחזר False. timeout=0 - בלי המתנה בכלל.
+        """
+        _, not_full, idle = self._ensure_started()
+        async with not_full:
+            if not self._has_room():
+                self._stats["backpressure_waits"] += 1
+                logger.warning(f"⏳ [BG_JOBS] התור מלא ({self._pending}/{self.max_size}) - ממתין למקום | job={job.job_type}", source="background_jobs")
+                self._waiting += 1
+                try:
+                    if timeout is None:
+                        await not_full.wait_for(lambda: self._pending < self.max_size)
+                    else:
+                        await asyncio.wait_for(not_full.wait_for(lambda: self._pending < self.max_size), timeout=max(0.0, timeout))
+                except asyncio.TimeoutError:
+                    self._stats["shed"] += 1
+                    logger.error(f"❌ [BG_JOBS] התור עדיין מלא אחרי {timeout}s - {job.job_type} נזרקה | chat_id={safe_str(job.chat_id)}", source="background_jobs")
+                    if self._pending < self.max_size:
+                        not_full.notify()  # מקום שהתפנה ברגע ה-timeout עובר לממתין הבא
+                    return False
+                finally:
+                    self._waiting -= 1
+            self._pending += 1
+            idle.clear()
+        self._stats["submitted"] += 1
+
+        if self.persist and job.persist_payload is not None and job.persisted_id is None:
+            job.persisted_id = await self._persist(job)
+        self._enqueue(job)
+        return True
+
+    def try_submit(self, job: BackgroundJob) -> bool:
+        """
+        הוספה בלי המתנה - מחזיר False אם התור מלא (לקורא שחייב לחזור מיד, כמו ה-webhook).
+        ⚠️ לא שומר ב-DB - persist_payload נתמך רק דרך submit.
+        """
+        _, _, idle = self._ensure_started()
+        if not self._has_room():
+            self._stats["rejected"] += 1
+            return False
+        self._pending += 1
+        idle.clear()
+        self._stats["submitted"] += 1
+        self._enqueue(job)
+        return True
+
+    def _enqueue(self, job: BackgroundJob) -> None:
+        key = safe_str(job.chat_id) if job.chat_id is not None else _NO_CHAT
+        ready, _, _ = self._primitives()
+        self._chats.setdefault(key, deque()).append(job)
+        if key not in self._scheduled:
+            self._scheduled.add(key)
+            ready.put_nowait(key)
+
+    # ------------------------------------------------------------------
+    # workers
+    # ------------------------------------------------------------------
+
+    async def _worker(self, index: int) -> None:
+        ready, _, _ = self._primitives()
+        while True:
+            key = await ready.get()
+            jobs = self._chats.get(key)
+            if not jobs:
+                self._scheduled.discard(key)
+                continue
+            job = jobs.popleft()
+            finished = await self._run(job)
+
+            if not finished:
+                # retry: המשימה חוזרת לראש התור של הצ'אט (שומר על הסדר) והצ'אט מתוזמן מחדש אחרי backoff
+                jobs.appendleft(job)
+                delay = self.retry_base_delay * (2 ** (job.attempts - 1))
+                asyncio.get_running_loop().call_later(delay, ready.put_nowait, key)
+                continue
+
+            if jobs:
+                ready.put_nowait(key)  # חוזר לסוף התור - הוגנות בין צ'אטים
+            else:
+                self._chats.pop(key, None)
+                self._scheduled.discard(key)
+            await self._release_slot()
+
+    async def _run(self, job: BackgroundJob) -> bool:
+        """הרצת ניסיון אחד - מחזיר True אם המשימה הסתיימה (הצלחה או כישלון סופי)"""
+        job.attempts += 1
+        try:
+            coro = job.func(*job.args, **job.kwargs)
+            if job.timeout:
+                await asyncio.wait_for(coro, timeout=job.timeout)
+            else:
+                await coro
+            self._stats["completed"] += 1
+            await self._forget(job)
+            return True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if job.attempts < job.max_attempts:
+                self._stats["retried"] += 1
+                logger.warning(f"🔁 [BG_JOBS] {job.job_type} נכשלה (ניסיון {job.attempts}/{job.max_attempts}): {e!r} | chat_id={safe_str(job.chat_id)}", source="background_jobs")
+                await self._record_attempt(job)
+                return False
+            self._stats["failed"] += 1
+            logger.error(f"❌ [BG_JOBS] {job.job_type} נכשלה סופית אחרי {job.attempts} ניסיונות: {e!r} | chat_id={safe_str(job.chat_id)}", source="background_jobs")
+            await self._forget(job)
+            return True
+
+    async def _release_slot(self) -> None:
+        _, not_full, idle = self._primitives()
+        async with not_full:
+            self._pending -= 1
+            if self._pending == 0:
+                idle.set()
+            not_full.notify()
+
+    # ------------------------------------------------------------------
+    # persistence
+    # ------------------------------------------------------------------
+
+    async def _persist(self, job: BackgroundJob) -> Optional[int]:
+        from db_manager import save_background_job
+        from db_pool import run_db_async
+        try:
+            return await run_db_async(save_background_job, job.persist_as or job.job_type, job.chat_id, job.persist_payload)
+        except Exception as e:
+            # שמירה היא רשת ביטחון בלבד - המשימה רצה גם בלעדיה
+            logger.warning(f"⚠️ [BG_JOBS] לא הצלחתי לשמור משימה ב-DB: {e}", source="background_jobs")
+            return None
+
+    async def _record_attempt(self, job: BackgroundJob) -> None:
+        if job.persisted_id is None:
+            return
+        from db_manager import update_background_job_attempts
+        from db_pool import run_db_async
+        try:
+            await run_db_async(update_background_job_attempts, job.persisted_id, job.attempts)
+        except Exception as e:
+            logger.warning(f"⚠️ [BG_JOBS] לא הצלחתי לעדכן ניסיונות משימה: {e}", source="background_jobs")
+
+    async def _forget(self, job: BackgroundJob) -> None:
+        if job.persisted_id is None:
+            return
+        from db_manager import delete_background_job
+        from db_pool import run_db_async
+        try:
+            await run_db_async(delete_background_job, job.persisted_id)
+        except Exception as e:
+            logger.warning(f"⚠️ [BG_JOBS] לא הצלחתי למחוק משימה שהסתיימה: {e}", source="background_jobs")
+
+    async def restore_pending(self) -> int:
+        """שחזור משימות שנשמרו ולא הסתיימו (למשל בגלל restart) דרך ה-handlers הרשומים"""
+        from db_manager import load_pending_background_jobs
+        from db_pool import run_db_async
+        try:
+            rows = await run_db_async(load_pending_background_jobs)
+        except Exception as e:
+            logger.warning(f"⚠️ [BG_JOBS] לא הצלחתי לטעון משימות שמורות: {e}", source="background_jobs")
+            return 0
+
+        restored = 0
+        for job_id, job_type, chat_id, payload, attempts in rows:
+            handler = self._handlers.get(job_type)
+            if handler is None:
+                logger.warning(f"⚠️ [BG_JOBS] אין handler למשימה שמורה מסוג {job_type} (id={job_id})", source="background_jobs")
+                continue
+            job = BackgroundJob(job_type, chat_id, handler, kwargs=dict(payload or {}),
+                                persist_payload=payload, attempts=attempts or 0, persisted_id=job_id)
+            if job.attempts >= job.max_attempts:
+                await self._forget(job)
+                continue
+            await self.submit(job)
+            restored += 1
+        self._stats["restored"] += restored
+        if restored:
+            logger.info(f"♻️ [BG_JOBS] שוחזרו {restored} משימות רקע מהריצה הקודמת", source="background_jobs")
+        return restored
+
+    # ------------------------------------------------------------------
+    # ניטור
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, int]:
+        stats = dict(self._stats)
+        stats["pending"] = self._pending
+        stats["waiting"] = self._waiting
+        stats["chats"] = len(self._chats)
+        stats["max_size"] = self.max_size
+        stats["workers"] = self.workers
+        return stats
+
+
+# 🌐 תור אחד לכל התהליך
+background_jobs = BackgroundJobQueue()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+billing_ledger.py - מוני חיוב משותפים לכל ה-workers, ששורדים restart
+=====================================================================
+
+BillingProtection החזיק את ההוצאה היומית/החודשית ב-dict בזיכרון (השמירה הושבתה):
+כל restart איפס את התקציב, וכל worker חשב שכל התקציב שלו. עכשיו כל מונה הוא שורה
+בטבלת billing_ledger:
+
+- add - O(1): רק הוספה לסכום ממתין בזיכרון. thread רקע כותב את כל מה שהצטבר כל
+  BILLING_LEDGER_FLUSH_SECONDS ב-INSERT ... ON CONFLICT אחד שמוסיף בתוך ה-DB
+  (amount = amount + EXCLUDED.amount) - אטומי גם מול workers אחרים
+- get - O(1) בלי DB: הסכום הכולל האחרון שה-DB החזיר + מה שעוד לא נכתב.
+  הוצאה של workers אחרים נראית אחרי flush אחד לכל היותר
+- כשה-DB לא זמין - הסכומים הממתינים נשארים בזיכרון ונכתבים בניסיון הבא
+
+מפתחות:
+    usd:day:2025-01-20 / usd:month:2025-01 - עלות בדולרים (BillingProtection)
+    free_calls:2025-01-20:<model>        - קריאות מוצלחות למודל חינמי ביום
+
+שימוש:
+    from billing_ledger import billing_ledger
+    billing_ledger.add("usd:day:2025-01-20", 0.003)
+    spent = billing_ledger.get("usd:day:2025-01-20")
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from config import BILLING_LEDGER_FLUSH_SECONDS
+from simple_logger import logger
+
+_MAX_WATCHED_KEYS = 256  # מפתחות שנקראו לאחרונה ומתרעננים מה-DB בכל flush
+
+
+class BillingLedger:
+    """מונים מצטברים - Postgres + סכומים ממתינים בזיכרון"""
+
+    def __init__(self, flush_interval: float = BILLING_LEDGER_FLUSH_SECONDS):
+        self.flush_interval = flush_interval
+        self._totals: Dict[str, float] = {}    # הסכום הכולל האחרון שנקרא מה-DB
+        self._pending: Dict[str, float] = {}   # הוספות שעוד לא נכתבו
+        self._inflight: Dict[str, float] = {}  # הוספות שנכתבות עכשיו (כדי ש-get לא "יאבד" אותן באמצע flush)
+        self._watched: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._table_ready = False
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {"adds": 0, "flushes": 0, "flush_errors": 0, "refreshes": 0}
+
+    def add(self, key: str, amount: float) -> None:
+        """הוספה למונה - נכתב ל-DB ב-flush הבא"""
+        if not amount:
+            return
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0.0) + amount
+            self._watch(key)
+            self._stats["adds"] += 1
+        self._ensure_flusher()
+
+    def get(self, key: str) -> float:
+        """הסכום הכולל הידוע (כל ה-workers, עד flush אחורה) כולל הוספות מקומיות שעוד לא נכתבו"""
+        with self._lock:
+            self._watch(key)
+            total = self._totals.get(key, 0.0) + self._inflight.get(key, 0.0) + self._pending.get(key, 0.0)
+        self._ensure_flusher()
+        return total
+
+    def _watch(self, key: str) -> None:
+        self._watched[key] = None
+        self._watched.move_to_end(key)
+        while len(self._watched) > _MAX_WATCHED_KEYS:
+            old_key, _ = self._watched.popitem(last=False)
+            self._totals.pop(old_key, None)
+
+    def _ensure_flusher(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._flush_loop, daemon=True, name="billing_ledger_flush")
+            self._thread.start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            self.flush()  # קודם כל - טעינת הסכומים הקיימים, כדי שתקציב לא יתאפס אחרי restart
+            time.sleep(self.flush_interval)
+
+    def _ensure_table(self) -> None:
+        if self._table_ready:
+            return
+        import db_manager
+        db_manager.ensure_billing_ledger_table()
+        self._table_ready = True
+
+    def flush(self) -> int:
+        """כתיבת ההוספות הממתינות ורענון הסכומים של המפתחות הנצפים. מחזיר כמה מפתחות נכתבו"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._inflight = batch
+                watched = list(self._watched)
+            try:
+                self._ensure_table()
+                import db_manager
+                totals = db_manager.increment_billing_ledger(batch) if batch else {}
+                missing = [key for key in watched if key not in totals]
+                if missing:
+                    totals.update(db_manager.get_billing_ledger_totals(missing))
+            except Exception as e:
+                with self._lock:
+                    for key, amount in batch.items():
+                        self._pending[key] = self._pending.get(key, 0.0) + amount
+                    self._inflight = {}
+                    self._stats["flush_errors"] += 1
+                logger.error(f"❌ [BILLING_LEDGER] כתיבת מוני חיוב נכשלה ({len(batch)} מפתחות): {e}", source="billing_ledger")
+                return 0
+            with self._lock:
+                for key in watched:
+                    self._totals[key] = totals.get(key, 0.0)
+                for key in batch:
+                    if key in totals:
+                        self._totals[key] = totals[key]
+                self._inflight = {}
+                self._stats["refreshes"] += 1
+                if batch:
+                    self._stats["flushes"] += 1
+            return len(batch)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending_keys"] = len(self._pending)
+            stats["watched_keys"] = len(self._watched)
+        return stats
+
+
+# 🌐 מופע יחיד לכל התהליך
+billing_ledger = BillingLedger()
@@ -402,6 +402,14 @@ def setup_admin_reports(): # מתזמן דוחות אוטומטיים לאדמי
     
     time_scheduler_step("הוספת תזמון סיכום יומי", add_daily_summary_job)
 
+    # הוספת תזמון סנכרון מוני הודעות (תיקון סטיות של total_messages_count)
+    def add_message_count_reconcile_job():
+        from db_manager import reconcile_user_message_counts
+        scheduler.add_job(reconcile_user_message_counts, 'cron', hour=4, minute=0)
+        return "תזמון סנכרון מוני הודעות נוסף"
+
+    time_scheduler_step("הוספת תזמון סנכרון מוני הודעות", add_message_count_reconcile_job)
+
     # הפעלת המתזמן
     def start_scheduler():
         scheduler.start()
@@ -25,9 +25,10 @@ from config import (
     MAX_OLD_LOG_LINES,
     gpt_log_path,
     MAX_TRACEBACK_LENGTH,
+    GPT_A_PROMPT_LAYOUT,
 )
 from config import should_log_debug_prints, should_log_message_debug
-from db_manager import save_chat_message, get_chat_history, get_chat_history_enhanced, get_reminder_states_data, save_reminder_state, get_errors_stats_data, save_errors_stats_data
+from db_manager import save_chat_message, get_chat_history, get_balanced_chat_rows, get_chat_history_enhanced, get_reminder_states_data, save_reminder_state, get_errors_stats_data, save_errors_stats_data
 from user_friendly_errors import safe_str
 
 # NOTE: circular import is safe here – utils only contains the base primitives
@@ -44,6 +45,11 @@ __all__: List[str] = [
     # 🆕 מערכת ספירת הודעות מערכתית
     "get_total_user_messages_count",
         "get_recent_history_for_gpt", 
+    # ⚡ גרסאות אסינכרוניות ל-event loop
+    "update_chat_history_async",
+    "get_total_user_messages_count_async",
+    "get_balanced_history_for_gpt_async",
+    "get_chat_history_for_users_async",
     "count_user_messages_in_history",
     # context & greeting helpers
     "create_human_context_for_gpt",
@@ -53,6 +59,7 @@ __all__: List[str] = [
     # holiday / system helpers
     "get_holiday_system_message",
     "build_complete_system_messages",  # 🆕 פונקציה מרכזית לבניית סיסטם פרומפטים
+    "build_gpt_a_messages",
     # log / admin / health helpers
     "clean_old_logs",
     "health_check",
@@ -184,7 +191,8 @@ def get_total_user_messages_count(chat_id: str) -> int:
     🎯 מחזיר מספר כולל של הודעות משתמש מהמסד נתונים
     
     ⚠️ זו הפונקציה הרשמית למספר הודעות כולל!
-    עודכנה לחשב ישירות מהמסד נתונים במקום להסתמך על מונה שעלול להיות לא מעודכן.
+    ⚡ קוראת את המונה המתוחזק (user_profiles.total_messages_count, מקודם אטומית
+    ב-save_chat_message); COUNT(*) מלא רק למשתמש שהמונה שלו עוד לא אותחל.
     
     Args:
         chat_id: מזהה המשתמש
@@ -197,21 +205,23 @@ def get_total_user_messages_count(chat_id: str) -> int:
         >>> print(f"המשתמש שלח {total} הודעות")
     """
     try:
-        # 🔧 תיקון: חישוב ישיר מהמסד נתונים עם כל ההודעות (לא מוגבל)
-        import psycopg2
-        from config import config
+        from db_pool import get_connection
         
-        DB_URL = config.get("DATABASE_EXTERNAL_URL") or config.get("DATABASE_URL")
-        conn = psycopg2.connect(DB_URL)
+        conn = get_connection()
         cur = conn.cursor()
         
-        # ספירת כל הודעות המשתמש הלא ריקות
-        cur.execute("""
-            SELECT COUNT(*) FROM chat_messages 
-            WHERE chat_id = %s AND user_msg IS NOT NULL AND user_msg != ''
-        """, (safe_str(chat_id),))
+        cur.execute("SELECT total_messages_count FROM user_profiles WHERE chat_id = %s", (safe_str(chat_id),))
+        row = cur.fetchone()
         
-        user_message_count = cur.fetchone()[0]
+        if row and row[0] is not None:
+            user_message_count = row[0]
+        else:
+            # 🔧 מונה לא מאותחל - ספירת כל הודעות המשתמש הלא ריקות
+            cur.execute("""
+                SELECT COUNT(*) FROM chat_messages 
+                WHERE chat_id = %s AND user_msg IS NOT NULL AND user_msg != ''
+            """, (safe_str(chat_id),))
+            user_message_count = cur.fetchone()[0]
         
         cur.close()
         conn.close()
@@ -241,11 +251,8 @@ def get_recent_history_for_gpt(chat_id: str, user_limit: int = 20, bot_limit: in
     """
     try:
         # קבלת הודעות מהמסד נתונים
-        import psycopg2
-        from config import load_config
-        config = load_config()
-        DB_URL = config.get("DATABASE_EXTERNAL_URL") or config.get("DATABASE_URL")
-        conn = psycopg2.connect(DB_URL)
+        from db_pool import get_connection
+        conn = get_connection()
         cur = conn.cursor()
         
         # שאילתה לקבלת הודעות האחרונות
@@ -324,72 +331,36 @@ def get_balanced_history_for_gpt(chat_id: str, user_limit: int = 20, bot_limit:
     עם סיכומי GPT-B במקום התשובות המלאות (אם יש סיכום)
     
     🔧 מתוקן: לא מוסיף טיימסטאפ לתוכן ההודעה
+    ⚡ שאילתה אחת חסומה (get_balanced_chat_rows) במקום קריאות חוזרות עם limit גדל
     """
     try:
         messages = []
         user_count = 0
         bot_count = 0
-        batch_size = 50  # כמה הודעות לקרוא בכל פעם
-        current_limit = batch_size
         
-        # ממשיכים לקרוא עד שיש לנו מספיק הודעות משני הסוגים
-        while (user_count < user_limit or bot_count < bot_limit) and current_limit <= 500:
-            # קריאה מהמסד נתונים
-            rows = get_chat_history(chat_id, current_limit)
-            if not rows:
-                break
-                
-            # איפוס המונים לחישוב מחדש
-            temp_messages = []
-            temp_user_count = 0
-            temp_bot_count = 0
-            
-            for row in rows:
-                user_content = row[0] or ""  # user_msg
-                bot_content = row[1] or ""   # bot_msg
-                timestamp = row[2]           # timestamp
-                
-                # סינון הודעות פנימיות (כמו בפונקציה המקורית)
-                if bot_content and any(marker in bot_content for marker in [
-                    "[עדכון פרופיל]", "[הודעה אוטומטית מהבוט]", "[הודעה מערכת]", "[תשובת GPT-A]"
-                ]):
-                    continue
-                
-                if user_content and user_content.startswith("[הודעה"):
-                    continue
-                
-                # הוספת הודעות משתמש עד למגבלה - בלי טיימסטאפ בתוכן
-                if user_content.strip() and temp_user_count < user_limit:
-                    temp_messages.append({
-                        "role": "user", 
-                        "content": user_content.strip(),
-                        "timestamp": timestamp
-                    })
-                    temp_user_count += 1
-                
-                # הוספת הודעות בוט עד למגבלה - בלי טיימסטאפ בתוכן
-                if bot_content.strip() and temp_bot_count < bot_limit:
-                    temp_messages.append({
-                        "role": "assistant", 
-                        "content": bot_content.strip(),
-                        "timestamp": timestamp
-                    })
-                    temp_bot_count += 1
-            
-            # עדכון המונים והודעות
-            messages = temp_messages
-            user_count = temp_user_count
-            bot_count = temp_bot_count
+        # השורות כבר מסוננות מהודעות פנימיות ומסודרות מהישן לחדש
+        rows = get_balanced_chat_rows(chat_id, user_limit=user_limit, bot_limit=bot_limit)
+        
+        for user_msg, bot_msg, timestamp, user_rank, bot_rank in rows:
+            user_content = (user_msg or "").strip()
+            bot_content = (bot_msg or "").strip()
             
-            # אם יש לנו מספיק הודעות משני הסוגים - יוצאים
-            if user_count >= user_limit and bot_count >= bot_limit:
-                break
+            # הוספת הודעות בלי טיימסטאפ בתוכן - רק האחרונות מכל תפקיד
+            if user_content and user_rank <= user_limit:
+                messages.append({
+                    "role": "user", 
+                    "content": user_content,
+                    "timestamp": timestamp
+                })
+                user_count += 1
             
-            # הגדלת הגבלה לקריאה הבאה
-            current_limit += batch_size
-        
-        # מיון לפי זמן (הישנות ביותר קודם)
-        messages.sort(key=lambda x: x["timestamp"] if x["timestamp"] else datetime.min)
+            if bot_content and bot_rank <= bot_limit:
+                messages.append({
+                    "role": "assistant", 
+                    "content": bot_content,
+                    "timestamp": timestamp
+                })
+                bot_count += 1
         
         # החזרת הודעות בלי טיימסטאפ בתוכן - רק content ו-role
         result = []
@@ -1069,8 +1040,8 @@ def _ensure_timezone_aware(dt):
         logger.warning(f"Error ensuring timezone: {e}", source="TIMEZONE_ENSURE")
         return dt
 
-def should_send_weekday_context(chat_id: str, user_msg: Optional[str] = None) -> bool:
-    """בדיקה אם יש לשלוח הקשר יום השבוע"""
+def should_send_weekday_context(chat_id: str, user_msg: Optional[str] = None, history_rows: Optional[list] = None) -> bool:
+    """בדיקה אם יש לשלוח הקשר יום השבוע (history_rows - שורות שכבר נטענו, חוסך שליפה)"""
     try:
         weekday_words = ["שבת", "ראשון", "שני", "שלישי", "רביעי", "חמישי", "שישי"]
 
@@ -1086,7 +1057,7 @@ def should_send_weekday_context(chat_id: str, user_msg: Optional[str] = None) ->
 
         # בדיקה אם הבוט כבר הזכיר יום שבוע היום (רק בהודעות הבוט)
         try:
-            rows = get_chat_history(chat_id, 30)
+            rows = history_rows[-30:] if history_rows is not None else get_chat_history(chat_id, 30)
             history = [{"user": row[0], "bot": row[1], "timestamp": row[2]} for row in rows]
         except Exception:
             return False
@@ -1197,13 +1168,13 @@ def get_holiday_content() -> str:
         return ""
 
 
-def should_send_time_greeting(chat_id: str, user_msg: Optional[str] = None) -> bool:
-    """בדיקה אם יש לשלוח ברכה לפי זמן"""
+def should_send_time_greeting(chat_id: str, user_msg: Optional[str] = None, history_rows: Optional[list] = None) -> bool:
+    """בדיקה אם יש לשלוח ברכה לפי זמן (history_rows - שורות שכבר נטענו, חוסך שליפה)"""
     try:
         # בדיקה אם הבוט כבר הזכיר יום שבוע היום (רק בהודעות הבוט)
         try:
-            # שליפה מ-SQL באמצעות db_manager
-            rows = get_chat_history(chat_id, 30)
+            # שליפה מ-SQL באמצעות db_manager (אלא אם ההקשר כבר טען את השורות)
+            rows = history_rows[-30:] if history_rows is not None else get_chat_history(chat_id, 30)
             if not rows:
                 return False
         except Exception:
@@ -1257,7 +1228,7 @@ def should_send_time_greeting(chat_id: str, user_msg: Optional[str] = None) -> b
 # 🎯 SYSTEM PROMPTS REGISTRY - מרכז אחד לכל הסיסטם פרומפטים
 # ---------------------------------------------------------------------------
 
-def get_system_prompts_registry():
+def get_system_prompts_registry(context=None):
     """
     🎯 מרכז אחד לכל הסיסטם פרומפטים - פשוט, ברור, ניתן לתחזוקה
     
@@ -1265,22 +1236,28 @@ def get_system_prompts_registry():
     - תנאי: מתי לשלוח
     - תוכן: מה לשלוח
     - סדר: באיזה סדר לשלוח
+    - stable: האם התוכן זהה בין הודעות (חלק מהתחילית ל-prompt caching) או משתנה לפי זמן/הודעה
     
     זה מבטיח שלא יהיו הפתעות, כפילויות או לוגיקה מוסתרת
+    
+    context: ConversationContext אופציונלי - אם קיים, ההיסטוריה והסיכום נלקחים ממנו
     """
     from prompts import SYSTEM_PROMPT
     from profile_utils import get_user_summary_fast
     
+    def _history_rows():
+        return context.get_recent_rows() if context is not None else None
+    
     def always_true(chat_id, user_msg):
         return True
     
     def should_send_time_greeting_check(chat_id, user_msg):
         """בדיקה אם יש לשלוח ברכה לפי זמן"""
-        return should_send_time_greeting(chat_id, user_msg)
+        return should_send_time_greeting(chat_id, user_msg, history_rows=_history_rows())
 
     def should_send_weekday_check(chat_id, user_msg):
         """בדיקה אם יש לשלוח הקשר יום השבוע"""
-        return should_send_weekday_context(chat_id, user_msg)
+        return should_send_weekday_context(chat_id, user_msg, history_rows=_history_rows())
 
     def should_send_holiday_check(chat_id, user_msg):
         """בדיקה אם יש לשלוח הודעת חג"""
@@ -1301,7 +1278,10 @@ def get_system_prompts_registry():
     def get_user_summary_content(chat_id, user_msg):
         """מחזיר סיכום המשתמש"""
         try:
-            current_summary = get_user_summary_fast(safe_str(chat_id)) or ""
+            if context is not None:
+                current_summary = context.get_profile_summary()
+            else:
+                current_summary = get_user_summary_fast(safe_str(chat_id)) or ""
             if current_summary:
                 logger.info(f"[SUMMARY_DEBUG] Added summary system prompt for user {safe_str(chat_id)}: '{current_summary[:50]}{'...' if len(current_summary) > 50 else ''}'", source="chat_utils")
                 return f"🎯 מידע על המשתמש: {current_summary}"
@@ -1319,6 +1299,7 @@ def get_system_prompts_registry():
             "condition": always_true,
             "content": lambda chat_id, user_msg: SYSTEM_PROMPT,
             "order": 1,
+            "stable": True,
             "description": "הפרומפט הראשי של דניאל - תמיד נשלח"
         },
         {
@@ -1326,6 +1307,7 @@ def get_system_prompts_registry():
             "condition": always_true,
             "content": get_user_summary_content,
             "order": 2,
+            "stable": True,
             "description": "סיכום המשתמש - תמיד נשלח אם יש"
         },
         {
@@ -1333,6 +1315,7 @@ def get_system_prompts_registry():
             "condition": should_send_time_greeting_check,
             "content": get_time_greeting_content,
             "order": 3,
+            "stable": False,
             "description": "ברכות זמן - רק אם הודעת ברכה או עברו 3+ שעות"
         },
         {
@@ -1340,6 +1323,7 @@ def get_system_prompts_registry():
             "condition": should_send_weekday_check, 
             "content": get_weekday_content_wrapper,
             "order": 4,
+            "stable": False,
             "description": "יום השבוע - רק בשעות 05:00-21:00 ואם לא הוזכר כבר"
         },
         {
@@ -1347,12 +1331,13 @@ def get_system_prompts_registry():
             "condition": should_send_holiday_check,
             "content": get_holiday_content_wrapper, 
             "order": 5,
+            "stable": False,
             "description": "הודעות חגים - רק בשעות פעילות ואם יש חג היום"
         }
     ] 
 
 
-def build_complete_system_messages(chat_id: str, user_msg: str = "", include_main_prompt: bool = True) -> List[Dict[str, str]]:
+def build_complete_system_messages(chat_id: str, user_msg: str = "", include_main_prompt: bool = True, context=None, stable: Optional[bool] = None) -> List[Dict[str, str]]:
     """
     🎯 פונקציה מרכזית שבונה את כל הסיסטם פרומפטים במקום אחד
     
@@ -1363,6 +1348,8 @@ def build_complete_system_messages(chat_id: str, user_msg: str = "", include_mai
         chat_id: מזהה המשתמש
         user_msg: הודעת המשתמש (לצורך הקשר)
         include_main_prompt: האם לכלול את הפרומפט הראשי של דניאל
+        context: ConversationContext של הבקשה (אופציונלי) - חוסך שליפות חוזרות מה-DB
+        stable: True - רק הפרומפטים היציבים, False - רק המשתנים, None - כולם
     
     Returns:
         רשימה של הודעות סיסטם מוכנות ל-GPT
@@ -1371,7 +1358,7 @@ def build_complete_system_messages(chat_id: str, user_msg: str = "", include_mai
     
     try:
         # קבלת הרישום המרכזי של כל הפרומפטים
-        prompts_registry = get_system_prompts_registry()
+        prompts_registry = get_system_prompts_registry(context)
         
         # מעבר על כל פרומפט לפי הסדר
         for prompt_config in sorted(prompts_registry, key=lambda x: x["order"]):
@@ -1379,6 +1366,8 @@ def build_complete_system_messages(chat_id: str, user_msg: str = "", include_mai
                 # דילוג על הפרומפט הראשי אם לא נדרש
                 if prompt_config["name"] == "main_prompt" and not include_main_prompt:
                     continue
+                if stable is not None and prompt_config["stable"] != stable:
+                    continue
                 
                 # בדיקת התנאי
                 if prompt_config["condition"](safe_str(chat_id), user_msg):
@@ -1406,11 +1395,29 @@ def build_complete_system_messages(chat_id: str, user_msg: str = "", include_mai
         if include_main_prompt:
             try:
                 from prompts import SYSTEM_PROMPT
-                return [{"role": "system", "content": SYSTEM_PROMPT}]
+                return [{"role": "system", "content": SYSTEM_PROMPT}] if stable is not False else []
             except Exception:
                 return []
         return [] 
 
+def build_gpt_a_messages(chat_id: str, user_msg: str, history_messages: Optional[List[Dict[str, str]]] = None, context=None, layout: Optional[str] = None) -> List[Dict[str, str]]:
+    """
+    🧱 כל ההודעות לקריאת GPT-A: סיסטם פרומפטים, היסטוריה והודעת המשתמש הנוכחית.
+    
+    layout "legacy" (ברירת מחדל, GPT_A_PROMPT_LAYOUT): כל הסיסטם פרומפטים לפני ההיסטוריה, כמו קודם.
+    layout "cache_friendly": פרומפט ראשי → סיכום משתמש → היסטוריה → הקשר משתנה (ברכת זמן / יום / חג)
+    → הודעת המשתמש. התחילית זהה בייט-בייט בין הודעות של אותו משתמש, כך שהספק מחייב אותה
+    כ-cached_tokens (זול ומהיר יותר) - אבל GPT-A רואה את ההקשר המשתנה במקום אחר.
+    """
+    layout = (layout or GPT_A_PROMPT_LAYOUT).lower()
+    history_messages = history_messages or []
+    current = [{"role": "user", "content": user_msg}]
+    if layout != "cache_friendly":
+        return build_complete_system_messages(chat_id, user_msg, include_main_prompt=True, context=context) + history_messages + current
+    prefix = build_complete_system_messages(chat_id, user_msg, include_main_prompt=True, context=context, stable=True)
+    dynamic = build_complete_system_messages(chat_id, user_msg, include_main_prompt=True, context=context, stable=False)
+    return prefix + history_messages + dynamic + current
+
 def get_chat_history_for_gpt(chat_id: str, limit: int = 32) -> list:
     """
     🎯 מחזיר היסטוריה בלי טיימסטאפ בתוכן ההודעה - התיקון הסופי!
@@ -1484,6 +1491,44 @@ def get_chat_history_for_gpt(chat_id: str, limit: int = 32) -> list:
         logger.error(f"GPT History Error: chat_id={safe_str(chat_id)} | שגיאה: {e}", source="GPT_HISTORY_ERROR")
         return []
 
+def format_history_rows_for_users(rows) -> list:
+    """
+    🎯 המרת שורות chat_messages (user_msg, bot_msg, timestamp) לפורמט get_chat_history_for_users,
+    בלי שליפה - משמש גם את ConversationContext עם שורות שכבר נטענו
+    """
+    messages = []
+    for row in rows:
+        user_content = row[0] or ""  # user_msg
+        bot_content = row[1] or ""   # bot_msg
+        timestamp = row[2]           # timestamp
+        
+        # סינון הודעות פנימיות
+        if bot_content and any(marker in bot_content for marker in [
+            "[עדכון פרופיל]", "[הודעה אוטומטית מהבוט]", "[הודעה מערכת]", "[תשובת GPT-A]"
+        ]):
+            continue
+        
+        if user_content and user_content.startswith("[הודעה"):
+            continue
+        
+        # הוספת הודעות בלי טיימסטמפ בתוכן ההודעה - עבור משתמשים
+        if user_content.strip():
+            messages.append({
+                "role": "user", 
+                "content": user_content.strip(),
+                "timestamp": timestamp.isoformat() if timestamp else None
+            })
+        
+        if bot_content.strip():
+            messages.append({
+                "role": "assistant", 
+                "content": bot_content.strip(),
+                "timestamp": timestamp.isoformat() if timestamp else None
+            })
+    
+    return messages
+
+
 def get_chat_history_for_users(chat_id: str, limit: int = 32) -> list:
     """
     🎯 מחזיר היסטוריה בלי טיימסטאפ בתוכן ההודעה - עבור משתמשים ואדמין
@@ -1501,47 +1546,46 @@ def get_chat_history_for_users(chat_id: str, limit: int = 32) -> list:
         if not rows:
             return []
         
-        # 2. איפוס מונים
-        messages = []
-        user_count = 0
-        assistant_count = 0
-        
-        for row in rows:
-            user_content = row[0] or ""  # user_msg
-            bot_content = row[1] or ""   # bot_msg
-            timestamp = row[2]           # timestamp
-            
-            # 3. סינון הודעות פנימיות
-            if bot_content and any(marker in bot_content for marker in [
-                "[עדכון פרופיל]", "[הודעה אוטומטית מהבוט]", "[הודעה מערכת]", "[תשובת GPT-A]"
-            ]):
-                continue
-            
-            if user_content and user_content.startswith("[הודעה"):
-                continue
-            
-            # 4. הוספת הודעות בלי טיימסטמפ בתוכן ההודעה - עבור משתמשים
-            if user_content.strip():
-                messages.append({
-                    "role": "user", 
-                    "content": user_content.strip(),
-                    "timestamp": timestamp.isoformat() if timestamp else None
-                })
-                user_count += 1
-            
-            if bot_content.strip():
-                messages.append({
-                    "role": "assistant", 
-                    "content": bot_content.strip(),
-                    "timestamp": timestamp.isoformat() if timestamp else None
-                })
-                assistant_count += 1
+        # 2. סינון והמרה
+        messages = format_history_rows_for_users(rows)
+        user_count = sum(1 for msg in messages if msg["role"] == "user")
+        assistant_count = len(messages) - user_count
         
-        # 5. לוג
+        # 3. לוג
         logger.info(f"User History: chat_id={safe_str(chat_id)} | בקשה: {limit} | קיבל: {len(messages)} (user={user_count}, assistant={assistant_count})", source="USER_HISTORY")
         
         return messages
         
     except Exception as e:
         logger.error(f"User History Error: chat_id={safe_str(chat_id)} | שגיאה: {e}", source="USER_HISTORY_ERROR")
-        return []
\ No newline at end of file
+        return []
+
+
+# ============================================================================
+# ⚡ גרסאות אסינכרוניות - לשימוש מתוך ה-event loop (message_handler)
+# ============================================================================
+# הפונקציות הסינכרוניות רצות ב-executor של db_pool, כך שקריאת DB איטית
+# של משתמש אחד לא עוצרת את הטיפול בהודעות של שאר המשתמשים
+
+async def update_chat_history_async(chat_id: str, user_msg: str, bot_msg: str, **kwargs) -> bool:
+    """גרסה אסינכרונית ל-update_chat_history"""
+    from db_pool import run_db_async
+    return await run_db_async(update_chat_history, chat_id, user_msg, bot_msg, **kwargs)
+
+
+async def get_total_user_messages_count_async(chat_id: str) -> int:
+    """גרסה אסינכרונית ל-get_total_user_messages_count"""
+    from db_pool import run_db_async
+    return await run_db_async(get_total_user_messages_count, chat_id)
+
+
+async def get_balanced_history_for_gpt_async(chat_id: str, user_limit: int = 20, bot_limit: int = 20) -> List[Dict[str, str]]:
+    """גרסה אסינכרונית ל-get_balanced_history_for_gpt"""
+    from db_pool import run_db_async
+    return await run_db_async(get_balanced_history_for_gpt, chat_id, user_limit=user_limit, bot_limit=bot_limit)
+
+
+async def get_chat_history_for_users_async(chat_id: str, limit: int = 32) -> list:
+    """גרסה אסינכרונית ל-get_chat_history_for_users"""
+    from db_pool import run_db_async
+    return await run_db_async(get_chat_history_for_users, chat_id, limit=limit)
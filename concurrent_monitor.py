@@ -170,6 +170,8 @@ class UserSession:
     stage: str  # "queued", "processing", "gpt_a", "background", "completed"
     queue_position: int  # FIFO position
     max_allowed_time: float = TimeoutConfig.CONCURRENT_SESSION_TIMEOUT  # 🔧 תיקון: משתמש בתצורה מרכזית
+    priority: str = "approved"  # מסלול הכניסה: approved / registration
+    wait_time: float = 0.0  # כמה זמן חיכה בתור הכניסה לפני שהסשן התחיל
     
     def is_timeout(self) -> bool:
         """בדיקה אם הסשן עבר timeout"""
@@ -188,6 +190,16 @@ class PerformanceMetrics:
     memory_usage_mb: float
     rejected_users: int  # משתמשים שנדחו בגלל עומס
 
+@dataclass
+class AdmissionWaiter:
+    """משתמש שממתין בתור הכניסה - future מקבל True כשמתפנה לו מקום"""
+    chat_id: str
+    priority: str
+    future: asyncio.Future
+    enqueued_at: float
+
+ADMISSION_LANES = ("approved", "registration")
+
 class MemoryMonitor:
     """מערכת ניטור זיכרון מתקדמת"""
     
@@ -269,22 +281,42 @@ class ConcurrentMonitor:
     
     עקרונות פעולה:
     1. FIFO: כל משתמש מקבל מספר בתור לפי סדר הגעה
-    2. Timeout Protection: סשנים לא יכולים לרוץ יותר מ-50 שניות (GPT timeout + 5s buffer)
-    3. Circuit Breaker: בעומס גבוה - דחיית בקשות חדשות
-    4. Auto Recovery: ניקוי אוטומטי של סשנים תקועים
-    5. Memory Protection: מגבלות על שמירת היסטוריה
+    2. Admission control: כשאין מקום - המתנה בתור הוגן (עד ADMISSION_MAX_WAIT_SECONDS) במקום דחייה מיידית.
+       שני מסלולים: משתמשים מאושרים ו-registration, במשקל ADMISSION_APPROVED_WEIGHT:1
+    3. סדר לפי צ'אט: לכל צ'אט סשן אחד לכל היותר - הודעה נוספת ממתינה לסיום הקודמת
+    4. מקביליות אדפטיבית: כשזמן הסשן הממוצע (בעיקר GPT-A) עולה מעל ADMISSION_TARGET_LATENCY
+       המגבלה יורדת (עד ADMISSION_MIN_CONCURRENCY), וכשהוא יורד היא עולה בהדרגה חזרה ל-max_users
+    5. Timeout Protection: סשנים לא יכולים לרוץ יותר מ-50 שניות (GPT timeout + 5s buffer)
+    6. Auto Recovery: ניקוי אוטומטי של סשנים תקועים
+    7. Memory Protection: מגבלות על שמירת היסטוריה
     """
     
     def __init__(self, max_users: int = 25):
+        from config import (ADMISSION_MAX_WAIT_SECONDS, ADMISSION_MIN_CONCURRENCY, ADMISSION_TARGET_LATENCY,
+                            ADMISSION_APPROVED_WEIGHT, ADMISSION_NOTIFY_AFTER_SECONDS)
         # הגדרות בסיסיות
         self.max_users = max_users
         self.active_sessions: Dict[str, UserSession] = {}
-        self.user_queue: List[str] = []  # FIFO queue
         self.next_queue_position = 1
         
+        # 🚦 Admission control
+        self.concurrency_limit = max_users  # מגבלה אדפטיבית - בין min_concurrency ל-max_users
+        self.min_concurrency = max(1, min(ADMISSION_MIN_CONCURRENCY, max_users))
+        self.max_wait_seconds = ADMISSION_MAX_WAIT_SECONDS
+        self.target_latency = ADMISSION_TARGET_LATENCY
+        self.approved_weight = max(1, ADMISSION_APPROVED_WEIGHT)
+        self.notify_after_seconds = ADMISSION_NOTIFY_AFTER_SECONDS
+        self._lanes: Dict[str, Deque[AdmissionWaiter]] = {lane: deque() for lane in ADMISSION_LANES}
+        self._reserved_chats = set()  # צ'אטים שקיבלו מקום ועוד לא פתחו סשן
+        self._approved_streak = 0
+        self._latency_ewma: Optional[float] = None
+        self._last_limit_decrease = 0.0
+        self.queued_users = 0
+        self.wait_times: Deque[float] = deque(maxlen=500)
+        
         # מדדי ביצועים
         self.total_requests = 0
-        self.response_times: List[float] = []
+        self.response_times: Deque[float] = deque(maxlen=500)  # חלון אחרון - לא גדל בלי סוף
         self.error_count = 0
         self.timeout_count = 0
         self.rejected_users = 0
@@ -352,13 +384,14 @@ class ConcurrentMonitor:
             except Exception as e:
                 logging.debug(f"[ConcurrentMonitor] Error removing task from active list: {e}")
         
-    async def start_user_session(self, chat_id: str, message_id: str, update_obj=None) -> bool:
+    async def start_user_session(self, chat_id: str, message_id: str, update_obj=None, priority: str = "approved") -> bool:
         """
         🚪 התחלת סשן משתמש חדש עם FIFO ובדיקות בטיחות
+        כשאין מקום פנוי - ממתין בתור הכניסה (לפי priority) עד max_wait_seconds.
         
         Returns:
             True - הסשן התחיל בהצלחה
-            False - הסשן נדחה (עומס גבוה)
+            False - הסשן נדחה (לא התפנה מקום בזמן)
         """
         try:
             # התחלת background tasks אם צריך
@@ -366,12 +399,15 @@ class ConcurrentMonitor:
             
             # Circuit Breaker מבוטל לחלוטין - אין חסימות כלל
             
-            # 🚨 בדיקת קיבולת מקסימלית - זה מה שמגן על המערכת!
-            # בלי הבדיקה הזו, Google Sheets API יקרוס מעודף בקשות
-            if len(self.active_sessions) >= self.max_users:
-                self.rejected_users += 1
-                await self._send_rejection_alert(chat_id, "max_capacity")
-                return False  # 🛡️ דוחה משתמש כדי להגן על המערכת
+            # 🚨 בדיקת קיבולת - זה מה שמגן על המערכת!
+            # אין מקום (או שיש כבר ממתינים / סשן פעיל לאותו צ'אט) → תור הוגן במקום דחייה מיידית
+            wait_time = 0.0
+            if not self._can_admit_now(chat_id):
+                admitted, wait_time = await self._wait_for_admission(chat_id, priority, update_obj)
+                if not admitted:
+                    self.rejected_users += 1
+                    await self._send_rejection_alert(chat_id, "max_capacity")
+                    return False  # 🛡️ דוחה משתמש כדי להגן על המערכת
             
             # יצירת סשן חדש עם FIFO position
             session = UserSession(
@@ -379,11 +415,12 @@ class ConcurrentMonitor:
                 start_time=time.time(),
                 message_id=message_id,
                 stage="queued",
-                queue_position=self.next_queue_position
+                queue_position=self.next_queue_position,
+                priority=priority if priority in self._lanes else "approved",
+                wait_time=wait_time
             )
             
-            # הוספה לתור FIFO ולסשנים פעילים
-            self.user_queue.append(chat_id)
+            self._reserved_chats.discard(chat_id)
             self.active_sessions[chat_id] = session
             self.next_queue_position += 1
             self.total_requests += 1
@@ -396,7 +433,8 @@ class ConcurrentMonitor:
                 logging.warning(f"[ConcurrentMonitor] Failed to start progressive notifications for {chat_id}: {notif_err}")
             
             logging.info(f"[ConcurrentMonitor] ✅ Started session for user {chat_id}. "
-                        f"Queue position: {session.queue_position}, Active: {len(self.active_sessions)}")
+                        f"Queue position: {session.queue_position}, Active: {len(self.active_sessions)}/{self.concurrency_limit}, "
+                        f"Waited: {wait_time:.2f}s")
             
             # התראה אם מתקרבים לקיבולת מקסימלית
             if len(self.active_sessions) >= self.max_users * 0.8:
@@ -406,9 +444,143 @@ class ConcurrentMonitor:
             
         except Exception as e:
             logging.error(f"[ConcurrentMonitor] Error starting session for {chat_id}: {e}")
+            self._reserved_chats.discard(chat_id)
+            self._dispatch_waiters()
             self._send_error_alert("start_session_error", {"chat_id": chat_id, "error": str(e)})
             return False
     
+    # ------------------------------------------------------------------
+    # 🚦 Admission control
+    # ------------------------------------------------------------------
+    
+    def _occupied_slots(self) -> int:
+        return len(self.active_sessions) + len(self._reserved_chats)
+    
+    def get_queue_length(self) -> int:
+        """כמה משתמשים ממתינים כרגע בתור הכניסה"""
+        return sum(len(lane) for lane in self._lanes.values())
+    
+    def _can_admit_now(self, chat_id: str) -> bool:
+        """כניסה מיידית רק אם יש מקום, אין מי שממתין לפני (הוגנות) ולצ'אט אין סשן פעיל"""
+        return (self._occupied_slots() < self.concurrency_limit
+                and self.get_queue_length() == 0
+                and chat_id not in self.active_sessions
+                and chat_id not in self._reserved_chats)
+    
+    def estimate_wait_seconds(self, position: int) -> float:
+        """הערכת זמן המתנה לפי זמני הסשן האחרונים: כל "גל" של concurrency_limit משתמשים לוקח סשן ממוצע"""
+        recent = list(self.response_times)[-50:]
+        avg_session = sum(recent) / len(recent) if recent else self.target_latency / 2
+        waves = -(-max(1, position) // max(1, self.concurrency_limit))
+        return avg_session * waves
+    
+    def _queue_position(self, waiter: AdmissionWaiter) -> int:
+        lane = self._lanes[waiter.priority]
+        position = lane.index(waiter) + 1 if waiter in lane else 1
+        if waiter.priority == "registration":
+            position += len(self._lanes["approved"])
+        return position
+    
+    async def _wait_for_admission(self, chat_id: str, priority: str, update_obj=None):
+        """המתנה בתור הכניסה - מחזיר (admitted, wait_seconds)"""
+        lane = priority if priority in self._lanes else "approved"
+        waiter = AdmissionWaiter(chat_id, lane, asyncio.get_running_loop().create_future(), time.time())
+        self._lanes[lane].append(waiter)
+        self.queued_users += 1
+        # ייתכן שהתפנה מקום אבל הממתינים שלפנינו שייכים לצ'אטים עם סשן פעיל
+        self._dispatch_waiters()
+        
+        if not waiter.future.done():
+            position = self._queue_position(waiter)
+            eta = self.estimate_wait_seconds(position)
+            logging.info(f"[ConcurrentMonitor] 🚦 User {chat_id} queued ({lane}) at position {position}, ETA ~{eta:.1f}s, "
+                         f"Active: {len(self.active_sessions)}/{self.concurrency_limit}")
+            if update_obj is not None and eta >= self.notify_after_seconds:
+                message = TimeoutConfig.PROGRESSIVE_COMMUNICATION.get_queue_message(position, eta)
+                await _progressive_notifier._send_user_notification(chat_id, message, update_obj)
+        
+        try:
+            await asyncio.wait_for(waiter.future, timeout=self.max_wait_seconds)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            self._abandon_waiter(waiter)
+            raise
+        
+        wait_time = time.time() - waiter.enqueued_at
+        if waiter.future.done() and not waiter.future.cancelled():
+            self.wait_times.append(wait_time)
+            return True, wait_time
+        
+        self._abandon_waiter(waiter)
+        logging.warning(f"[ConcurrentMonitor] ⏰ User {chat_id} waited {wait_time:.1f}s without a free slot - rejecting")
+        return False, wait_time
+    
+    def _abandon_waiter(self, waiter: AdmissionWaiter):
+        """הסרת ממתין שוויתר (timeout/ביטול); אם כבר קיבל מקום - המקום עובר לבא בתור"""
+        try:
+            self._lanes[waiter.priority].remove(waiter)
+        except ValueError:
+            pass
+        if waiter.future.done() and not waiter.future.cancelled():
+            self._reserved_chats.discard(waiter.chat_id)
+        elif not waiter.future.done():
+            waiter.future.cancel()
+        self._dispatch_waiters()
+    
+    def _next_waiter(self) -> Optional[AdmissionWaiter]:
+        """
+        בחירת הממתין הבא: approved_weight משתמשים מאושרים ואז registration אחד (אם יש).
+        בתוך כל מסלול - FIFO, תוך דילוג על צ'אטים שכבר יש להם סשן פעיל.
+        """
+        if self._approved_streak < self.approved_weight:
+            order = ("approved", "registration")
+        else:
+            order = ("registration", "approved")
+        for lane_name in order:
+            lane = self._lanes[lane_name]
+            for waiter in list(lane):
+                if waiter.future.done():
+                    lane.remove(waiter)
+                    continue
+                if waiter.chat_id in self.active_sessions or waiter.chat_id in self._reserved_chats:
+                    continue
+                lane.remove(waiter)
+                self._approved_streak = self._approved_streak + 1 if lane_name == "approved" else 0
+                return waiter
+        return None
+    
+    def _dispatch_waiters(self):
+        """מתן מקומות פנויים לממתינים לפי הסדר ההוגן"""
+        while self._occupied_slots() < self.concurrency_limit:
+            waiter = self._next_waiter()
+            if waiter is None:
+                break
+            self._reserved_chats.add(waiter.chat_id)
+            waiter.future.set_result(True)
+    
+    def _adapt_concurrency(self, response_time: float):
+        """
+        AIMD לפי זמן הסשן (שבעיקרו זמן GPT-A): מעל היעד - הורדה ב-25% (לכל היותר פעם ב-CONCURRENT_CLEANUP_INTERVAL),
+        מתחת ליעד - עלייה של 1 עד max_users.
+        """
+        if self._latency_ewma is None:
+            self._latency_ewma = response_time
+        else:
+            self._latency_ewma = 0.8 * self._latency_ewma + 0.2 * response_time
+        
+        now = time.time()
+        if self._latency_ewma > self.target_latency:
+            if now - self._last_limit_decrease >= TimeoutConfig.CONCURRENT_CLEANUP_INTERVAL:
+                new_limit = max(self.min_concurrency, int(self.concurrency_limit * 0.75))
+                if new_limit < self.concurrency_limit:
+                    logging.warning(f"[ConcurrentMonitor] 📉 Avg session {self._latency_ewma:.1f}s > {self.target_latency}s - "
+                                    f"concurrency limit {self.concurrency_limit} → {new_limit}")
+                    self.concurrency_limit = new_limit
+                self._last_limit_decrease = now
+        elif self.concurrency_limit < self.max_users:
+            self.concurrency_limit += 1
+    
     async def update_user_stage(self, chat_id: str, stage: str):
         """📍 עדכון שלב עיבוד של משתמש עם לוגים מפורטים"""
         try:
@@ -416,23 +588,12 @@ class ConcurrentMonitor:
                 old_stage = self.active_sessions[chat_id].stage
                 self.active_sessions[chat_id].stage = stage
                 
-                # מעבר מ-queued ל-processing
-                if old_stage == "queued" and stage == "processing":
-                    self._remove_from_queue(chat_id)
-                
                 logging.debug(f"[ConcurrentMonitor] 📍 User {chat_id}: {old_stage} → {stage}")
             else:
                 logging.warning(f"[ConcurrentMonitor] User {chat_id} not found in active sessions")
         except Exception as e:
             logging.error(f"[ConcurrentMonitor] Error updating user stage for {chat_id}: {e}")
     
-    def _remove_from_queue(self, chat_id: str):
-        """הסרת משתמש מתור FIFO"""
-        try:
-            self.user_queue.remove(chat_id)
-        except ValueError:
-            pass  # המשתמש כבר לא בתור
-    
     async def end_user_session(self, chat_id: str, success: bool = True):
         """
         🏁 סיום סשן משתמש עם איסוף נתונים לניתוח
@@ -459,8 +620,9 @@ class ConcurrentMonitor:
             except Exception as save_err:
                 logging.warning(f"Could not save concurrent metrics: {save_err}")
             
-            # עדכון זמני תגובה
+            # עדכון זמני תגובה + התאמת המקביליות לעומס
             self.response_times.append(response_time)
+            self._adapt_concurrency(response_time)
             
             if not success:
                 self.error_count += 1
@@ -485,10 +647,10 @@ class ConcurrentMonitor:
                 except Exception as e:
                     logging.error(f"[ConcurrentMonitor] Failed to send timeout alert: {e}")
             
-            # הסרת הסשן
-            self._remove_from_queue(chat_id)
+            # הסרת הסשן ומסירת המקום לבא בתור
             if chat_id in self.active_sessions:
                 del self.active_sessions[chat_id]
+            self._dispatch_waiters()
             
             logging.info(f"[ConcurrentMonitor] 🏁 Ended session for user {chat_id}. "
                         f"Duration: {response_time:.2f}s, Success: {success}, Active: {len(self.active_sessions)}")
@@ -499,9 +661,9 @@ class ConcurrentMonitor:
             try:
                 # ביטול הודעות מתדרגות גם במקרה שגיאה
                 await _progressive_notifier.cancel_notifications(chat_id)
-                self._remove_from_queue(chat_id)
                 if chat_id in self.active_sessions:
                     del self.active_sessions[chat_id]
+                self._dispatch_waiters()
             except Exception as cleanup_error:
                 logging.error(f"[ConcurrentMonitor] Failed to manually clean session {chat_id}: {cleanup_error}")
     
@@ -534,9 +696,9 @@ class ConcurrentMonitor:
                         logging.error(f"[ConcurrentMonitor] Error cleaning stale session {chat_id}: {e}")
                         # הסרה ידנית אם end_user_session נכשל
                         try:
-                            self._remove_from_queue(chat_id)
                             if chat_id in self.active_sessions:
                                 del self.active_sessions[chat_id]
+                            self._dispatch_waiters()
                         except Exception as cleanup_error:
                             logging.error(f"[ConcurrentMonitor] Failed to manually clean session {chat_id}: {cleanup_error}")
                 
@@ -603,7 +765,7 @@ class ConcurrentMonitor:
         return PerformanceMetrics(
             timestamp=get_israel_time(),
             active_users=len(self.active_sessions),
-            queue_length=len(self.user_queue),
+            queue_length=self.get_queue_length(),
             avg_response_time=avg_response_time,
             max_response_time=max(self.response_times) if self.response_times else 0,
             sheets_operations_per_minute=0,  # יש לחבר למערכת Sheets
@@ -659,6 +821,10 @@ class ConcurrentMonitor:
             "total_requests": self.total_requests,
             "active_sessions": {id: s.stage for id, s in self.active_sessions.items()},
             "queue_length": metrics.queue_length,
+            "queue_by_lane": {lane: len(waiters) for lane, waiters in self._lanes.items()},
+            "concurrency_limit": self.concurrency_limit,
+            "queued_users": self.queued_users,
+            "avg_wait_time": sum(self.wait_times) / len(self.wait_times) if self.wait_times else 0,
             "rejected_users": metrics.rejected_users,
             "timeout_count": self.timeout_count
         }
@@ -672,8 +838,9 @@ class ConcurrentMonitor:
 ⏰ זמן יצירה: {get_israel_time().strftime('%d/%m/%Y %H:%M:%S')}
 
 👥 **משתמשים:**
-   • פעילים כעת: {stats['active_users']}/{stats['max_users']}
+   • פעילים כעת: {stats['active_users']}/{stats['max_users']} (מגבלה נוכחית: {stats['concurrency_limit']})
    • סה"כ בקשות: {stats['total_requests']}
+   • ממתינים בתור: {stats['queue_length']} | המתינו עד כה: {stats['queued_users']} (ממוצע {stats['avg_wait_time']:.1f}s)
    • נדחו בגלל עומס: {stats['rejected_users']}
 
 ⏱️ **זמני תגובה:**
@@ -814,8 +981,8 @@ def get_concurrent_monitor():
     return _concurrent_monitor_instance
 
 # פונקציות עזר לשימוש בקוד
-async def start_monitoring_user(chat_id: str, message_id: str, update_obj=None) -> bool:
-    """התחלת ניטור משתמש"""
+async def start_monitoring_user(chat_id: str, message_id: str, update_obj=None, priority: str = "approved") -> bool:
+    """התחלת ניטור משתמש - ממתין בתור הכניסה אם אין מקום (priority: approved / registration)"""
     try:
         logging.debug(f"[ConcurrentMonitor] Starting monitoring for user {chat_id}")
         monitor = get_concurrent_monitor()
@@ -825,7 +992,7 @@ async def start_monitoring_user(chat_id: str, message_id: str, update_obj=None)
             logging.error(f"[ConcurrentMonitor] Monitor instance missing start_user_session method")
             return False
             
-        result = await monitor.start_user_session(chat_id, message_id, update_obj)
+        result = await monitor.start_user_session(chat_id, message_id, update_obj, priority=priority)
         logging.debug(f"[ConcurrentMonitor] start_user_session returned: {result}")
         return result
     except Exception as e:
@@ -101,6 +101,9 @@ else:
     _lazy = _types.ModuleType("lazy_litellm")
     _lazy.completion = lambda *args, **kwargs: None  # type: ignore[attr-defined]
     _lazy.embedding = lambda *args, **kwargs: None  # type: ignore[attr-defined]
+    async def _dummy_acompletion(*args, **kwargs):
+        return None
+    _lazy.acompletion = _dummy_acompletion  # type: ignore[attr-defined]
     _sys.modules.setdefault("lazy_litellm", _lazy)
     # הגדרות dummy לסביבת CI
     from fields_dict import FIELDS_DICT
@@ -511,6 +514,12 @@ def get_config_snapshot():
 # ================================
 # הגדרות לניהול עומסי משתמשים מרובים
 MAX_CONCURRENT_USERS = 50  # מספר משתמשים מקסימלי במקביל (הוגדל ל-50 - הרבה מקום)
+# 🚦 Admission control (concurrent_monitor) - כשאין מקום ממתינים בתור הוגן במקום לקבל "הבוט עמוס"
+ADMISSION_MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", 30))    # המתנה מקסימלית בתור לפני דחייה
+ADMISSION_MIN_CONCURRENCY = int(os.getenv("ADMISSION_MIN_CONCURRENCY", 5))          # רצפה למגבלה האדפטיבית
+ADMISSION_TARGET_LATENCY = float(os.getenv("ADMISSION_TARGET_LATENCY", 20.0))      # זמן סשן ממוצע (שניות) שמעליו מקטינים מקביליות
+ADMISSION_APPROVED_WEIGHT = int(os.getenv("ADMISSION_APPROVED_WEIGHT", 3))          # משתמשים מאושרים שנכנסים לפני כל משתמש בהרשמה
+ADMISSION_NOTIFY_AFTER_SECONDS = float(os.getenv("ADMISSION_NOTIFY_AFTER_SECONDS", 3.0))  # הודעת "מקום בתור" רק אם ההמתנה הצפויה ארוכה מזה
 MAX_SHEETS_OPERATIONS_PER_MINUTE = 60  # מגבלת Google Sheets (60% מ-100)
 SHEETS_QUEUE_SIZE = 100  # גודל תור לפעולות Sheets
 SHEETS_BATCH_SIZE = 10  # כמות פעולות לעיבוד במקביל (הוגדל מ-5 ל-10 לטיפול בשימוש מוגזם)
@@ -551,6 +560,93 @@ MAX_OLD_LOG_LINES = 1000     # לניקוי לוגים ישנים
 MAX_CHAT_HISTORY_MESSAGES = 30000  # מגבלת היסטוריית שיחה
 MAX_TRACEBACK_LENGTH = 500   # אורך מקסימלי של traceback בהודעות שגיאה
 
+# 🗄️ מאגר חיבורים (connection pool) למסד הנתונים - משותף לכל התהליך
+# ניתן לעקוף עם משתני סביבה: DB_POOL_MIN_SIZE / DB_POOL_MAX_SIZE
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 1))   # חיבורים שנפתחים מראש
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 10))  # תקרת חיבורים פתוחים במקביל
+
+# 👤 cache פרופילים בזיכרון (LRU + TTL) - ניתן לעקוף עם PROFILE_CACHE_MAX_SIZE / PROFILE_CACHE_TTL_SECONDS
+PROFILE_CACHE_MAX_SIZE = int(os.getenv("PROFILE_CACHE_MAX_SIZE", 1000))          # מקסימום פרופילים בזיכרון
+PROFILE_CACHE_TTL_SECONDS = int(os.getenv("PROFILE_CACHE_TTL_SECONDS", 600))     # תוקף רשומה בשניות
+
+# ✅ cache לסטטוס אישור משתמש (approval_cache.py) - מתבטל בכל כתיבה, ה-TTL רק רשת ביטחון
+APPROVAL_CACHE_TTL_SECONDS = int(os.getenv("APPROVAL_CACHE_TTL_SECONDS", 300))                # approved / pending_*
+APPROVAL_CACHE_NEGATIVE_TTL_SECONDS = int(os.getenv("APPROVAL_CACHE_NEGATIVE_TTL_SECONDS", 30))  # not_found
+APPROVAL_CACHE_MAX_SIZE = int(os.getenv("APPROVAL_CACHE_MAX_SIZE", 5000))
+
+# ✍️ GPT-A בסטרימינג: הודעה ראשונה אחרי באפר קצר, ואז עריכות מווסתות (טלגרם מגביל קצב edit)
+GPT_A_STREAMING_ENABLED = os.getenv("GPT_A_STREAMING_ENABLED", "false").lower() == "true"
+GPT_A_STREAM_FIRST_CHUNK_CHARS = int(os.getenv("GPT_A_STREAM_FIRST_CHUNK_CHARS", 60))      # כמה תווים לצבור לפני ההודעה הראשונה
+GPT_A_STREAM_FIRST_SEND_DELAY = float(os.getenv("GPT_A_STREAM_FIRST_SEND_DELAY", 0.7))     # או כמה זמן (שניות) מהטוקן הראשון
+GPT_A_STREAM_EDIT_INTERVAL = float(os.getenv("GPT_A_STREAM_EDIT_INTERVAL", 1.5))           # מרווח מינימלי בין עריכות
+
+# 🧱 סדר ההודעות ל-GPT-A (chat_utils.build_gpt_a_messages): "legacy" (ברירת מחדל) - כל הסיסטם פרומפטים
+# לפני ההיסטוריה, כמו תמיד. "cache_friendly" - קודם החלקים היציבים (פרומפט ראשי, סיכום משתמש, היסטוריה)
+# ורק אחריהם הקשר משתנה (ברכת זמן, יום, חג), כך שהתחילית זהה בין הודעות ו-prompt caching של הספק תופס.
+# ⚠️ cache_friendly משנה את מה ש-GPT-A רואה (ההקשר המשתנה מגיע אחרי ההיסטוריה) - להפעיל אחרי בדיקת איכות התשובות
+GPT_A_PROMPT_LAYOUT = os.getenv("GPT_A_PROMPT_LAYOUT", "legacy").lower()
+
+# ⏳ תור משימות רקע (background_jobs.py) - עיבוד אחרי התשובה (GPT-B/C/D/E, רישום, התראות)
+BACKGROUND_QUEUE_MAX_SIZE = int(os.getenv("BACKGROUND_QUEUE_MAX_SIZE", 200))             # משימות ממתינות מקסימום - מעבר לזה backpressure
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", 4))                             # כמה משימות רצות במקביל
+BACKGROUND_JOB_MAX_ATTEMPTS = int(os.getenv("BACKGROUND_JOB_MAX_ATTEMPTS", 3))           # ניסיונות למשימה שנכשלה
+BACKGROUND_JOB_RETRY_BASE_DELAY = float(os.getenv("BACKGROUND_JOB_RETRY_BASE_DELAY", 2.0))  # backoff: 2s, 4s, 8s...
+BACKGROUND_JOBS_PERSIST = os.getenv("BACKGROUND_JOBS_PERSIST", "false").lower() == "true"  # שמירת משימות ממתינות ב-Postgres
+BACKGROUND_SUBMIT_TIMEOUT_SECONDS = float(os.getenv("BACKGROUND_SUBMIT_TIMEOUT_SECONDS", 2.0))  # המתנה מקסימלית למקום בתור ממסלול ההודעה - אחריה המשימה נזרקת
+
+# 📥 קליטת עדכוני webhook (update_ingestion.py) - ה-webhook מחזיר 200 מיד והעיבוד רץ בתור לפי צ'אט
+WEBHOOK_QUEUE_MAX_SIZE = int(os.getenv("WEBHOOK_QUEUE_MAX_SIZE", 500))                   # עדכונים ממתינים מקסימום - מעבר לזה עיבוד ישיר ב-webhook
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", 8))                                   # כמה הודעות (של צ'אטים שונים) מעובדות במקביל
+
+# 🔁 מניעת עיבוד כפול של אותה הודעה (dedup_store.py)
+DEDUP_TTL_SECONDS = float(os.getenv("DEDUP_TTL_SECONDS", 300))                          # כמה זמן הודעה נחשבת "כבר טופלה"
+DEDUP_MAX_ENTRIES = int(os.getenv("DEDUP_MAX_ENTRIES", 10000))                         # תקרת זיכרון - הישנים נזרקים ראשונים
+DEDUP_BACKEND = os.getenv("DEDUP_BACKEND", "memory").lower()                           # memory / postgres (משותף בין workers ושורד restart)
+
+# 🧾 כתיבה מקובצת ל-interactions_log (interactions_logger.interactions_writer)
+INTERACTIONS_LOG_BATCH_SIZE = int(os.getenv("INTERACTIONS_LOG_BATCH_SIZE", 50))        # שורות מקסימום ב-INSERT אחד
+INTERACTIONS_LOG_FLUSH_SECONDS = float(os.getenv("INTERACTIONS_LOG_FLUSH_SECONDS", 1.0))  # המתנה מקסימלית של שורה לפני כתיבה
+
+# 📝 תפיסת פלט ל-deployment_logs (deployment_logger.BatchedLogWriter) - COPY מקובץ על חיבור קבוע
+DEPLOY_LOG_QUEUE_MAX_SIZE = int(os.getenv("DEPLOY_LOG_QUEUE_MAX_SIZE", 10000))           # שורות ממתינות - מעבר לזה PRINT/INFO/DEBUG נזרקות
+DEPLOY_LOG_BATCH_SIZE = int(os.getenv("DEPLOY_LOG_BATCH_SIZE", 500))                     # שורות מקסימום ב-COPY אחד
+DEPLOY_LOG_FLUSH_SECONDS = float(os.getenv("DEPLOY_LOG_FLUSH_SECONDS", 2.0))             # המתנה מקסימלית של שורה לפני כתיבה
+
+# 🎛️ מדיניות תפיסה ל-deployment_logs (log_capture_policy.py) - WARNING ומעלה לא נדגמות ולא מוגבלות
+DEPLOY_LOG_LEVEL_SAMPLE_RATES = os.getenv("DEPLOY_LOG_LEVEL_SAMPLE_RATES", "DEBUG=0.1")    # "DEBUG=0.1,PRINT=0.5" - חסר = 1.0
+DEPLOY_LOG_SOURCE_SAMPLE_RATES = os.getenv("DEPLOY_LOG_SOURCE_SAMPLE_RATES", "")           # "python_logging_httpx=0.1"
+DEPLOY_LOG_SOURCE_RATE_PER_SECOND = float(os.getenv("DEPLOY_LOG_SOURCE_RATE_PER_SECOND", 20))  # token bucket לכל מקור (0 = ללא הגבלה)
+DEPLOY_LOG_SOURCE_BURST = float(os.getenv("DEPLOY_LOG_SOURCE_BURST", 200))                 # גודל ה-bucket - פרצים קצרים עוברים
+DEPLOY_LOG_REPEAT_WINDOW_SECONDS = float(os.getenv("DEPLOY_LOG_REPEAT_WINDOW_SECONDS", 30))  # שורה זהה לקודמת בחלון הזה - נספרת במקום להישמר
+
+# ⏰ מצב תזכורות עדינות (reminder_store.py) - סימון פעילות בזיכרון, כתיבה מקובצת לטבלת reminder_activity
+REMINDER_ACTIVITY_FLUSH_SECONDS = float(os.getenv("REMINDER_ACTIVITY_FLUSH_SECONDS", 5.0))  # כל כמה זמן פעילות ממתינה נכתבת
+
+# 📨 התראות אדמין (admin_dispatcher.py) - תור יוצא, איחוד פרצים ל-digest והגבלת קצב לפי מגבלות טלגרם
+ADMIN_NOTIFY_MESSAGES_PER_MINUTE = float(os.getenv("ADMIN_NOTIFY_MESSAGES_PER_MINUTE", 20))  # טלגרם: עד 20 הודעות לדקה לקבוצה
+ADMIN_NOTIFY_BURST = int(os.getenv("ADMIN_NOTIFY_BURST", 3))                                  # הודעות רצופות מותרות לפני שההגבלה נכנסת
+ADMIN_NOTIFY_COALESCE_SECONDS = float(os.getenv("ADMIN_NOTIFY_COALESCE_SECONDS", 2.0))        # המתנה לאיסוף התראות נוספות לאותו digest
+ADMIN_NOTIFY_QUEUE_MAX_SIZE = int(os.getenv("ADMIN_NOTIFY_QUEUE_MAX_SIZE", 500))              # התראות ממתינות - מעבר לזה נזרקות (ונספרות)
+
+# 🏁 hedged requests ל-GPT-A (gpt_utils.hedged_completion) - מודל הגיבוי יוצא לדרך כשהראשי איטי מהאחוזון שלו
+GPT_HEDGE_ENABLED = os.getenv("GPT_HEDGE_ENABLED", "false").lower() == "true"  # כבוי כברירת מחדל - הגיבוי מכפיל קריאות למודל
+GPT_HEDGE_LATENCY_PERCENTILE = float(os.getenv("GPT_HEDGE_LATENCY_PERCENTILE", 0.9))    # אחוזון זמן התגובה של המודל שאחריו יוצא הגיבוי
+GPT_HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("GPT_HEDGE_DEFAULT_DELAY_SECONDS", 8.0))  # עד שנאספו מספיק מדידות למודל
+GPT_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("GPT_HEDGE_MIN_DELAY_SECONDS", 3.0))      # לא מכפילים קריאות מהר מזה
+GPT_HEDGE_MAX_DELAY_SECONDS = float(os.getenv("GPT_HEDGE_MAX_DELAY_SECONDS", 15.0))     # זנב הזמן המקסימלי לפני גיבוי
+GPT_HEDGE_MIN_SAMPLES = int(os.getenv("GPT_HEDGE_MIN_SAMPLES", 20))                     # מדידות מינימליות לחישוב אחוזון
+GPT_HEDGE_LATENCY_WINDOW = int(os.getenv("GPT_HEDGE_LATENCY_WINDOW", 200))              # מדידות אחרונות שנשמרות לכל מודל
+
+# 💰 ספר חיובים משותף (billing_ledger.py) - צבירה בזיכרון, הוספה אטומית לטבלת billing_ledger ברקע
+BILLING_LEDGER_FLUSH_SECONDS = float(os.getenv("BILLING_LEDGER_FLUSH_SECONDS", 5.0))  # כל כמה זמן עלויות נכתבות ונקראים סכומי workers אחרים
+
+# 🗃️ cache לתוצאות GPT-B/GPT-C (llm_result_cache.py) - אותו קלט, אותו מודל ואותו פרומפט → בלי קריאה ל-LLM
+LLM_RESULT_CACHE_ENABLED = os.getenv("LLM_RESULT_CACHE_ENABLED", "true").lower() == "true"
+LLM_RESULT_CACHE_TTL_SECONDS = float(os.getenv("LLM_RESULT_CACHE_TTL_SECONDS", 7 * 24 * 3600))  # תוקף תוצאה שמורה
+LLM_RESULT_CACHE_MAX_ENTRIES = int(os.getenv("LLM_RESULT_CACHE_MAX_ENTRIES", 5000))           # תקרת זיכרון - הישנים נזרקים ראשונים
+LLM_RESULT_CACHE_MAX_INPUT_CHARS = int(os.getenv("LLM_RESULT_CACHE_MAX_INPUT_CHARS", 500))     # קלט ארוך כמעט לא חוזר - לא נשמר
+LLM_RESULT_CACHE_BACKEND = os.getenv("LLM_RESULT_CACHE_BACKEND", "memory").lower()             # memory / postgres (משותף בין workers ושורד restart)
+
 # 🚀 הגדרת פורט דינמית - תואמת לפלטפורמות cloud
 # בפלטפורמות כמו Render, Heroku, Railway - הפלטפורמה מגדירה את הפורט דינמית
 PRODUCTION_PORT = int(os.getenv("PORT", 8000))     # פורט דינמי מהפלטפורמה או 8000
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+conversation_context.py - הקשר שיחה לבקשה אחת (update אחד מטלגרם)
+=====================================================================
+
+הודעה אחת עוברת דרך message_handler → chat_utils.build_complete_system_messages →
+gpt_a_handler.get_main_response → handle_background_tasks, וכל שלב שלף בעצמו
+היסטוריה/פרופיל/מונה הודעות מה-DB. ConversationContext טוען כל נתון פעם אחת
+(בטעינה עצלה + שמירה בזיכרון) ומתעדכן במקום אחרי שההודעה החדשה נשמרה.
+
+שימוש:
+    ctx = ConversationContext(chat_id, user_msg)
+    await ctx.preload_async()                    # שליפה אחת ב-executor של db_pool
+    build_complete_system_messages(chat_id, user_msg, context=ctx)
+    ...
+    ctx.record_saved_message(user_msg, bot_reply)
+
+⚠️ האובייקט חי רק לאורך טיפול בהודעה אחת - לא לשמור אותו בין הודעות.
+"""
+
+from typing import Any, Dict, List, Optional
+
+from simple_logger import logger
+from user_friendly_errors import safe_str
+from utils import get_israel_time
+
+# כמה שורות אחרונות נשמרות בהקשר (ברכת זמן / יום שבוע / היסטוריה לאדמין)
+RECENT_ROWS_LIMIT = 32
+BALANCED_USER_LIMIT = 20
+BALANCED_BOT_LIMIT = 20
+
+
+class ConversationContext:
+    """נתוני השיחה של בקשה אחת - כל שליפה מתבצעת לכל היותר פעם אחת"""
+
+    def __init__(self, chat_id: Any, user_msg: str = "", approval_status: Optional[Dict] = None):
+        self.chat_id = safe_str(chat_id)
+        self.user_msg = user_msg or ""
+        self.approval_status = approval_status
+        self._recent_rows: Optional[List[tuple]] = None
+        self._balanced_history: Optional[List[Dict[str, str]]] = None
+        self._message_count: Optional[int] = None
+        self._profile_summary: Optional[str] = None
+        self.db_reads = 0
+
+    # ------------------------------------------------------------------
+    # טעינה עצלה
+    # ------------------------------------------------------------------
+
+    def get_recent_rows(self) -> List[tuple]:
+        """שורות (user_msg, bot_msg, timestamp) אחרונות מהישן לחדש - כמו get_chat_history"""
+        if self._recent_rows is None:
+            from db_manager import get_chat_history
+            try:
+                self._recent_rows = list(get_chat_history(self.chat_id, RECENT_ROWS_LIMIT) or [])
+            except Exception as e:
+                logger.warning(f"[CONTEXT] שגיאה בטעינת היסטוריה אחרונה: {e}", source="conversation_context")
+                self._recent_rows = []
+            self.db_reads += 1
+        return self._recent_rows
+
+    def get_balanced_history(self) -> List[Dict[str, str]]:
+        """היסטוריה מאוזנת ל-GPT (20 משתמש + 20 בוט)"""
+        if self._balanced_history is None:
+            import chat_utils
+            self._balanced_history = chat_utils.get_balanced_history_for_gpt(
+                self.chat_id, user_limit=BALANCED_USER_LIMIT, bot_limit=BALANCED_BOT_LIMIT
+            ) or []
+            self.db_reads += 1
+        return self._balanced_history
+
+    def get_message_count(self) -> int:
+        """מספר הודעות המשתמש הכולל (המונה המתוחזק)"""
+        if self._message_count is None:
+            from chat_utils import get_total_user_messages_count
+            self._message_count = get_total_user_messages_count(self.chat_id)
+            self.db_reads += 1
+        return self._message_count
+
+    def get_profile_summary(self) -> str:
+        """סיכום הפרופיל של המשתמש"""
+        if self._profile_summary is None:
+            from profile_utils import get_user_summary_fast
+            try:
+                self._profile_summary = get_user_summary_fast(self.chat_id) or ""
+            except Exception as e:
+                logger.warning(f"[CONTEXT] שגיאה בטעינת סיכום פרופיל: {e}", source="conversation_context")
+                self._profile_summary = ""
+            self.db_reads += 1
+        return self._profile_summary
+
+    def preload(self) -> "ConversationContext":
+        """טעינת כל מה שבניית ההודעות ל-GPT צריכה - סינכרוני, להרצה ב-executor"""
+        self.get_message_count()
+        self.get_balanced_history()
+        self.get_recent_rows()
+        self.get_profile_summary()
+        return self
+
+    async def preload_async(self) -> "ConversationContext":
+        """טעינה מוקדמת בלי לחסום את ה-event loop"""
+        from db_pool import run_db_async
+        return await run_db_async(self.preload)
+
+    # ------------------------------------------------------------------
+    # עדכון במקום אחרי שמירה
+    # ------------------------------------------------------------------
+
+    def record_saved_message(self, user_msg: str, bot_msg: str, timestamp=None) -> None:
+        """עדכון ההקשר אחרי שהשורה החדשה נשמרה ב-chat_messages - בלי שליפה חוזרת"""
+        timestamp = timestamp or get_israel_time()
+        if self._recent_rows is not None:
+            self._recent_rows.append((user_msg, bot_msg, timestamp))
+            del self._recent_rows[:-RECENT_ROWS_LIMIT]
+        if self._message_count is not None and user_msg:
+            self._message_count += 1
+
+    def set_profile_summary(self, summary: Optional[str]) -> None:
+        """עדכון הסיכום אחרי שינוי פרופיל (למשל אחרי GPT-D)"""
+        self._profile_summary = summary or ""
+
+    def get_history_for_users(self) -> List[Dict[str, Any]]:
+        """ההיסטוריה האחרונה בפורמט get_chat_history_for_users - מתוך השורות שכבר נטענו"""
+        from chat_utils import format_history_rows_for_users
+        return format_history_rows_for_users(self.get_recent_rows())
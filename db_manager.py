@@ -15,10 +15,12 @@ from decimal import Decimal
 from contextlib import contextmanager
 
 from config import config
+from db_pool import get_connection, run_db_async
 from simple_logger import logger
 from user_friendly_errors import safe_str, safe_operation, safe_chat_id, handle_database_error
 from fields_dict import FIELDS_DICT, get_user_profile_fields
 from utils import get_israel_time
+from approval_cache import approval_cache
 
 # 🎯 ייבוא מרכזי של פונקציות בטוחות
 from user_friendly_errors import safe_str, safe_operation
@@ -113,10 +115,53 @@ CHAT_MESSAGES_SCHEMA = '''
     );
 '''
 
+# === אינדקסים ל-chat_messages - דפוס הגישה היחיד הוא "ההודעות האחרונות של צ'אט" ===
+# (chat_id, timestamp, id) מאפשר ל-ORDER BY timestamp DESC LIMIT ולעימוד keyset לקרוא רק את העמוד המבוקש
+CHAT_MESSAGES_INDEXES = {
+    "idx_chat_messages_chat_id_timestamp_id": "chat_messages (chat_id, timestamp DESC, id DESC)",
+}
+
 def create_chat_messages_table_only(cursor):
-    """יוצר את טבלת chat_messages - פונקציה מרכזית"""
+    """
+    יוצר את טבלת chat_messages - פונקציה מרכזית.
+    ⚠️ נקרא גם בכל שמירת הודעה - בלי DDL של אינדקסים כאן; הם נבנים פעם אחת בעלייה (ensure_chat_messages_indexes)
+    """
     cursor.execute(CHAT_MESSAGES_SCHEMA)
 
+def ensure_chat_messages_indexes():
+    """
+    מיגרציה לטבלה קיימת: יוצר את אינדקסי chat_messages בלי לנעול כתיבות (CONCURRENTLY).
+    אינדקס שנשאר INVALID מבנייה שנקטעה נמחק ונבנה מחדש. בטוח להרצה בכל עלייה.
+    """
+    conn = get_connection()
+    # CREATE INDEX CONCURRENTLY לא יכול לרוץ בתוך טרנזקציה - autocommit על החיבור של psycopg2 עצמו,
+    # ומוחזר לקדמותו לפני שהחיבור חוזר ל-pool
+    raw_conn = getattr(conn, "raw_connection", conn)
+    previous_autocommit = raw_conn.autocommit
+    try:
+        raw_conn.autocommit = True
+        cur = conn.cursor()
+        created = []
+        for index_name, index_target in CHAT_MESSAGES_INDEXES.items():
+            cur.execute("""
+                SELECT i.indisvalid FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid
+                WHERE c.relname = %s
+            """, (index_name,))
+            row = cur.fetchone()
+            if row is not None and row[0]:
+                continue
+            if row is not None:
+                cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
+            cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} ON {index_target}")
+            created.append(index_name)
+        cur.close()
+        if created:
+            logger.info(f"🗂️ [DB] נוצרו אינדקסים ל-chat_messages: {', '.join(created)}", source="db_manager")
+        return created
+    finally:
+        raw_conn.autocommit = previous_autocommit
+        conn.close()
+
 def insert_chat_message_only(cursor, chat_id, user_msg, bot_msg, timestamp=None):
     """מכניס הודעה לטבלת chat_messages - פונקציה מרכזית"""
     if timestamp is None:
@@ -136,7 +181,7 @@ def insert_chat_message_only(cursor, chat_id, user_msg, bot_msg, timestamp=None)
 
 # === יצירת טבלאות (אם לא קיימות) ===
 def create_tables():
-    conn = psycopg2.connect(DB_URL)
+    conn = get_connection()
     cur = conn.cursor()
     
     # 🟢 טבלאות קריטיות - נשארות
@@ -200,7 +245,7 @@ def save_chat_message(chat_id, user_msg, bot_msg, timestamp=None, source_file=No
     # 🎯 נרמול chat_id לטיפוס אחיד
     chat_id = validate_chat_id(chat_id)
     
-    conn = psycopg2.connect(DB_URL)
+    conn = get_connection()
     cur = conn.cursor()
     
     # 🔧 הגדרת timezone למסד הנתונים לזמן ישראל
@@ -213,6 +258,9 @@ def save_chat_message(chat_id, user_msg, bot_msg, timestamp=None, source_file=No
     cur.execute("SELECT lastval()")
     message_id = cur.fetchone()[0]
     
+    # ⚡ קידום מונה ההודעות באותה טרנזקציה - הקריאה שלו O(1) במקום COUNT(*)
+    _bump_user_message_count(cur, chat_id, user_msg)
+    
     conn.commit()
     cur.close()
     conn.close()
@@ -229,12 +277,13 @@ def get_chat_history(chat_id, limit=100):
     # 🎯 נרמול chat_id לטיפוס אחיד
     chat_id = validate_chat_id(chat_id)
     
-    conn = psycopg2.connect(DB_URL)
+    conn = get_connection()
     cur = conn.cursor()
     
     # 🔧 שליפה מהטבלה הקריטית chat_messages (כמו שהקוד מצפה)
+    # id כשובר שוויון - סדר דטרמיניסטי שנקרא ישירות מהאינדקס (chat_id, timestamp, id)
     cur.execute(
-        "SELECT user_msg, bot_msg, timestamp FROM chat_messages WHERE chat_id = %s ORDER BY timestamp DESC LIMIT %s",
+        "SELECT user_msg, bot_msg, timestamp FROM chat_messages WHERE chat_id = %s ORDER BY timestamp DESC, id DESC LIMIT %s",
         (chat_id, limit)
     )
     
@@ -245,6 +294,103 @@ def get_chat_history(chat_id, limit=100):
     # החזרה בפורמט הישן שהקוד מצפה - מהישן לחדש
     return rows[::-1]
 
+# סימונים של הודעות פנימיות שלא נכנסות להיסטוריה שנשלחת ל-GPT
+INTERNAL_BOT_MARKERS = ("[עדכון פרופיל]", "[הודעה אוטומטית מהבוט]", "[הודעה מערכת]", "[תשובת GPT-A]")
+INTERNAL_USER_PREFIX = "[הודעה"
+
+def get_balanced_chat_rows(chat_id, user_limit=20, bot_limit=20, scan_limit=500):
+    """
+    שליפה מאוזנת בשאילתה אחת: השורות שמכילות את user_limit הודעות המשתמש האחרונות
+    ואת bot_limit הודעות הבוט האחרונות, אחרי סינון הודעות פנימיות.
+    
+    Returns:
+        שורות (user_msg, bot_msg, timestamp, user_rank, bot_rank) מהישן לחדש.
+        user_rank/bot_rank - מיקום ההודעה מהסוף (1 = האחרונה); חלק שה-rank שלו מעל
+        המגבלה (או ריק) לא אמור להיכנס להיסטוריה
+    """
+    # 🎯 נרמול chat_id לטיפוס אחיד
+    chat_id = validate_chat_id(chat_id)
+    
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        # המונה הרץ (ROWS) סופר כמה הודעות לא ריקות מכל תפקיד יש מהשורה הנוכחית עד הסוף;
+        # הסריקה חסומה ב-scan_limit שורות אחרונות ונקראת מהאינדקס (chat_id, timestamp, id)
+        cur.execute("""
+            SELECT user_msg, bot_msg, timestamp, user_rank, bot_rank FROM (
+                SELECT id, user_msg, bot_msg, timestamp,
+                    SUM(CASE WHEN btrim(COALESCE(user_msg, ''), E' \\t\\r\\n') <> '' THEN 1 ELSE 0 END)
+                        OVER recent_first AS user_rank,
+                    SUM(CASE WHEN btrim(COALESCE(bot_msg, ''), E' \\t\\r\\n') <> '' THEN 1 ELSE 0 END)
+                        OVER recent_first AS bot_rank
+                FROM (
+                    SELECT id, user_msg, bot_msg, timestamp FROM chat_messages
+                    WHERE chat_id = %s
+                    AND NOT EXISTS (
+                        SELECT 1 FROM unnest(%s::text[]) AS marker
+                        WHERE strpos(COALESCE(bot_msg, ''), marker) > 0
+                    )
+                    AND left(COALESCE(user_msg, ''), %s) <> %s
+                    ORDER BY timestamp DESC, id DESC
+                    LIMIT %s
+                ) recent
+                WINDOW recent_first AS (ORDER BY timestamp DESC, id DESC ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW)
+            ) ranked
+            WHERE user_rank <= %s OR bot_rank <= %s
+            ORDER BY timestamp ASC, id ASC
+        """, (chat_id, list(INTERNAL_BOT_MARKERS), len(INTERNAL_USER_PREFIX), INTERNAL_USER_PREFIX,
+              scan_limit, user_limit, bot_limit))
+        rows = cur.fetchall()
+        cur.close()
+    finally:
+        conn.close()
+    return rows
+
+def get_chat_history_page(chat_id, limit=50, before=None):
+    """
+    עימוד keyset להיסטוריית צ'אט - עלות קבועה לעמוד, בלי קשר לכמות ההודעות של המשתמש.
+    
+    Args:
+        chat_id: מזהה הצ'אט
+        limit: גודל העמוד
+        before: סמן (timestamp, id) מהעמוד הקודם; None לעמוד האחרון (החדש ביותר)
+    
+    Returns:
+        (rows, next_cursor): שורות (id, user_msg, bot_msg, timestamp) מהישן לחדש,
+        וסמן לעמוד הישן יותר - או None אם אין עוד הודעות
+    """
+    # 🎯 נרמול chat_id לטיפוס אחיד
+    chat_id = validate_chat_id(chat_id)
+    
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        if before is None:
+            cur.execute(
+                "SELECT id, user_msg, bot_msg, timestamp FROM chat_messages WHERE chat_id = %s "
+                "ORDER BY timestamp DESC, id DESC LIMIT %s",
+                (chat_id, limit)
+            )
+        else:
+            before_timestamp, before_id = before
+            cur.execute(
+                "SELECT id, user_msg, bot_msg, timestamp FROM chat_messages WHERE chat_id = %s "
+                "AND (timestamp, id) < (%s, %s) ORDER BY timestamp DESC, id DESC LIMIT %s",
+                (chat_id, before_timestamp, before_id, limit)
+            )
+        rows = cur.fetchall()
+        cur.close()
+    finally:
+        conn.close()
+    
+    next_cursor = None
+    if len(rows) == limit and rows:
+        oldest = rows[-1]
+        next_cursor = (oldest[3], oldest[0])
+    
+    # מהישן לחדש - כמו get_chat_history
+    return rows[::-1], next_cursor
+
 # ✅ הוסרו פונקציות deprecated: save_user_profile, get_user_profile, get_user_profile_fast, update_user_profile_fast
 # כל הפונקציות הועברו ל-profile_utils והן פעילות שם
 
@@ -297,7 +443,7 @@ def save_reminder_state(chat_id, reminder_info):
     # 🎯 נרמול chat_id לטיפוס אחיד
     chat_id = validate_chat_id(chat_id)
     try:
-        conn = psycopg2.connect(DB_URL)
+        conn = get_connection()
         cur = conn.cursor()
         
         # יצירת טבלה אם לא קיימת
@@ -376,7 +522,7 @@ def save_errors_stats_data(errors_data):
 def save_bot_error_log(entry):
     """שומר לוג שגיאות בוט ל-SQL"""
     try:
-        conn = psycopg2.connect(DB_URL)
+        conn = get_connection()
         cur = conn.cursor()
         
         # יצירת טבלה אם לא קיימת
@@ -417,7 +563,7 @@ def save_bot_error_log(entry):
 def save_bot_trace_log(entry):
     """שומר לוג trace בוט ל-SQL"""
     try:
-        conn = psycopg2.connect(DB_URL)
+        conn = get_connection()
         cur = conn.cursor()
         
         # יצירת טבלה אם לא קיימת
@@ -454,7 +600,7 @@ def save_bot_trace_log(entry):
 def save_sync_queue_data(sync_data):
     """שומר נתוני תור סנכרון ל-SQL"""
     try:
-        conn = psycopg2.connect(DB_URL)
+        conn = get_connection()
         cur = conn.cursor()
         
         # יצירת טבלה אם לא קיימת
@@ -481,10 +627,445 @@ def save_sync_queue_data(sync_data):
         print(f"שגיאה בשמירת תור סנכרון: {e}")
         raise
 
+# ⏳ משימות רקע ממתינות (background_jobs.py) - שורה נמחקת כשהמשימה הסתיימה, מה שנשאר משוחזר בעלייה
+BACKGROUND_JOBS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS background_jobs (
+        id BIGSERIAL PRIMARY KEY,
+        job_type VARCHAR(100) NOT NULL,
+        chat_id TEXT,
+        payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+def ensure_background_jobs_table():
+    """יוצר את טבלת background_jobs אם לא קיימת"""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(BACKGROUND_JOBS_SCHEMA)
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+
+def save_background_job(job_type, chat_id, payload):
+    """שומר משימת רקע ממתינה ומחזיר את ה-id שלה"""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT INTO background_jobs (job_type, chat_id, payload) VALUES (%s, %s, %s) RETURNING id",
+            (job_type, safe_str(chat_id) if chat_id is not None else None, json.dumps(payload, ensure_ascii=False, default=str))
+        )
+        job_id = cur.fetchone()[0]
+        conn.commit()
+        cur.close()
+        return job_id
+    finally:
+        conn.close()
+
+def update_background_job_attempts(job_id, attempts):
+    """עדכון מספר הניסיונות של משימה (כדי שמשימה שנכשלת שוב ושוב לא תשוחזר לנצח)"""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("UPDATE background_jobs SET attempts = %s WHERE id = %s", (attempts, job_id))
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+
+def delete_background_job(job_id):
+    """מחיקת משימה שהסתיימה (בהצלחה או אחרי כל הניסיונות)"""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM background_jobs WHERE id = %s", (job_id,))
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+
+def load_pending_background_jobs(limit=1000):
+    """משימות שנשארו מהריצה הקודמת, מהישנה לחדשה: (id, job_type, chat_id, payload, attempts)"""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(BACKGROUND_JOBS_SCHEMA)
+        cur.execute(
+            "SELECT id, job_type, chat_id, payload, attempts FROM background_jobs ORDER BY id LIMIT %s",
+            (limit,)
+        )
+        rows = cur.fetchall()
+        conn.commit()
+        cur.close()
+        return rows
+    finally:
+        conn.close()
+
+PROCESSED_UPDATES_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS processed_updates (
+        update_key TEXT PRIMARY KEY,
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+def ensure_processed_updates_table():
+    """יוצר את טבלת processed_updates (dedup משותף בין workers ו-restarts) אם לא קיימת"""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(PROCESSED_UPDATES_SCHEMA)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_processed_updates_created_at ON processed_updates (created_at)")
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+
+def claim_processed_update(update_key, ttl_seconds):
+    """
+    סימון עדכון כמטופל בשאילתה אחת - מחזיר True אם הוא חדש (או שהסימון הקודם פג),
+    False אם worker/ריצה אחרת כבר סימנה אותו בתוך ttl_seconds.
+    """
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            INSERT INTO processed_updates (update_key) VALUES (%s)
+            ON CONFLICT (update_key) DO UPDATE SET created_at = CURRENT_TIMESTAMP
+                WHERE processed_updates.created_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+            RETURNING update_key
+            """,
+            (update_key, ttl_seconds)
+        )
+        claimed = cur.fetchone() is not None
+        conn.commit()
+        cur.close()
+        return claimed
+    finally:
+        conn.close()
+
+def purge_processed_updates(ttl_seconds):
+    """מחיקת סימוני dedup שפג תוקפם - מחזיר כמה נמחקו"""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            "DELETE FROM processed_updates WHERE created_at < CURRENT_TIMESTAMP - make_interval(secs => %s)",
+            (ttl_seconds,)
+        )
+        deleted = cur.rowcount
+        conn.commit()
+        cur.close()
+        return deleted
+    finally:
+        conn.close()
+
+# ⏰ מצב תזכורות עדינות - שורה לכל משתמש, עם אינדקס על last_activity לסריקת "לא פעיל מאז X"
+REMINDER_ACTIVITY_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS reminder_activity (
+        chat_id TEXT PRIMARY KEY,
+        last_activity TIMESTAMP NOT NULL,
+        reminders_sent INTEGER NOT NULL DEFAULT 0,
+        last_reminder TIMESTAMP,
+        waiting_response BOOLEAN NOT NULL DEFAULT FALSE,
+        reminder_delayed BOOLEAN NOT NULL DEFAULT FALSE,
+        inactive BOOLEAN NOT NULL DEFAULT FALSE,
+        inactive_since TIMESTAMP,
+        inactive_count INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+def ensure_reminder_activity_table():
+    """יוצר את טבלת reminder_activity ואת אינדקס המועמדים לתזכורת אם לא קיימים"""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(REMINDER_ACTIVITY_SCHEMA)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_reminder_activity_due ON reminder_activity (last_activity)
+            WHERE NOT inactive AND NOT waiting_response
+        """)
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+
+def upsert_reminder_activity(activity):
+    """
+    סימון פעילות לכמה משתמשים ב-INSERT אחד: activity = [(chat_id, last_activity), ...].
+    המשתמש ענה - מאפס המתנה לתשובה, דחייה וסימון לא-פעיל.
+    """
+    if not activity:
+        return 0
+    from psycopg2.extras import execute_values
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        execute_values(cur, """
+            INSERT INTO reminder_activity (chat_id, last_activity) VALUES %s
+            ON CONFLICT (chat_id) DO UPDATE SET
+                last_activity = GREATEST(reminder_activity.last_activity, EXCLUDED.last_activity),
+                waiting_response = FALSE,
+                reminder_delayed = FALSE,
+                inactive = FALSE,
+                inactive_since = NULL,
+                inactive_count = 0,
+                updated_at = CURRENT_TIMESTAMP
+        """, [(safe_str(chat_id), last_activity) for chat_id, last_activity in activity])
+        conn.commit()
+        cur.close()
+        return len(activity)
+    finally:
+        conn.close()
+
+def import_legacy_reminder_state(rows):
+    """
+    ייבוא חד-פעמי מ-reminder_state.json הישן, כולל מצב התזכורות ולא רק last_activity:
+    rows = [(chat_id, last_activity, reminders_sent, last_reminder, waiting_response,
+             reminder_delayed, inactive, inactive_since, inactive_count), ...].
+    שורה שכבר קיימת בטבלה (פעילות חדשה יותר) לא נדרסת.
+    """
+    if not rows:
+        return 0
+    from psycopg2.extras import execute_values
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        execute_values(cur, """
+            INSERT INTO reminder_activity (
+                chat_id, last_activity, reminders_sent, last_reminder, waiting_response,
+                reminder_delayed, inactive, inactive_since, inactive_count
+            ) VALUES %s
+            ON CONFLICT (chat_id) DO NOTHING
+        """, [(safe_str(row[0]), *row[1:]) for row in rows])
+        imported = cur.rowcount
+        conn.commit()
+        cur.close()
+        return imported
+    finally:
+        conn.close()
+
+def get_reminder_candidates(inactive_before, active_after, limit=100):
+    """משתמשים שלא היו פעילים מאז inactive_before (אבל כן אחרי active_after) ולא ממתינים לתשובה"""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT chat_id FROM reminder_activity
+            WHERE NOT inactive AND NOT waiting_response
+              AND last_activity < %s AND last_activity > %s
+            ORDER BY last_activity
+            LIMIT %s
+        """, (inactive_before, active_after, limit))
+        rows = [row[0] for row in cur.fetchall()]
+        cur.close()
+        return rows
+    finally:
+        conn.close()
+
+def update_reminder_activity(chat_id, sent_at=None, delayed=None, inactive_at=None):
+    """
+    עדכון נקודתי לשורה קיימת:
+    sent_at - תזכורת נשלחה (ממתינים לתשובה), delayed - דחייה בגלל שעה, inactive_at - המשתמש חסם / לא קיים
+    """
+    assignments, params = ["updated_at = CURRENT_TIMESTAMP"], []
+    if sent_at is not None:
+        assignments += ["last_reminder = %s", "reminders_sent = reminders_sent + 1",
+                        "waiting_response = TRUE", "reminder_delayed = FALSE"]
+        params.append(sent_at)
+    if delayed is not None:
+        assignments.append("reminder_delayed = %s")
+        params.append(delayed)
+    if inactive_at is not None:
+        assignments += ["inactive = TRUE", "inactive_since = %s", "inactive_count = inactive_count + 1"]
+        params.append(inactive_at)
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(f"UPDATE reminder_activity SET {', '.join(assignments)} WHERE chat_id = %s",
+                    (*params, safe_str(chat_id)))
+        updated = cur.rowcount
+        conn.commit()
+        cur.close()
+        return updated
+    finally:
+        conn.close()
+
+def mark_stale_reminder_users_inactive(active_before, marked_at):
+    """סימון משתמשים שלא היו פעילים מאז active_before כלא פעילים - מחזיר כמה סומנו"""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            UPDATE reminder_activity
+            SET inactive = TRUE, inactive_since = %s, inactive_count = inactive_count + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE NOT inactive AND last_activity < %s
+        """, (marked_at, active_before))
+        marked = cur.rowcount
+        conn.commit()
+        cur.close()
+        return marked
+    finally:
+        conn.close()
+
+def get_inactive_reminder_users():
+    """chat_ids שמסומנים כלא פעילים"""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT chat_id FROM reminder_activity WHERE inactive")
+        rows = [row[0] for row in cur.fetchall()]
+        cur.close()
+        return rows
+    finally:
+        conn.close()
+
+# 💰 ספר חיובים - מונה מצטבר לכל מפתח (עלות יומית/חודשית, קריאות למודל חינמי ביום)
+BILLING_LEDGER_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS billing_ledger (
+        ledger_key TEXT PRIMARY KEY,
+        amount DOUBLE PRECISION NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+def ensure_billing_ledger_table():
+    """יוצר את טבלת billing_ledger אם לא קיימת"""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(BILLING_LEDGER_SCHEMA)
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+
+def increment_billing_ledger(deltas):
+    """
+    הוספה אטומית לכמה מונים ב-INSERT אחד: deltas = {ledger_key: amount}.
+    ההוספה נעשית בתוך ה-DB (amount = amount + EXCLUDED.amount), כך שכמה workers לא דורסים זה את זה.
+    מחזיר {ledger_key: הסכום הכולל אחרי ההוספה}.
+    """
+    if not deltas:
+        return {}
+    from psycopg2.extras import execute_values
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        rows = execute_values(cur, """
+            INSERT INTO billing_ledger (ledger_key, amount) VALUES %s
+            ON CONFLICT (ledger_key) DO UPDATE SET
+                amount = billing_ledger.amount + EXCLUDED.amount,
+                updated_at = CURRENT_TIMESTAMP
+            RETURNING ledger_key, amount
+        """, sorted(deltas.items()), fetch=True)
+        conn.commit()
+        cur.close()
+        return {key: float(amount) for key, amount in rows}
+    finally:
+        conn.close()
+
+def get_billing_ledger_totals(keys):
+    """הסכומים הנוכחיים של המונים המבוקשים - מפתח שלא קיים לא מוחזר"""
+    if not keys:
+        return {}
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT ledger_key, amount FROM billing_ledger WHERE ledger_key = ANY(%s)", (list(keys),))
+        rows = {key: float(amount) for key, amount in cur.fetchall()}
+        cur.close()
+        return rows
+    finally:
+        conn.close()
+
+# 🗃️ cache לתוצאות GPT-B/GPT-C - מפתח הוא hash של (שלב, מודל, פרומפט, קלט מנורמל)
+LLM_RESULT_CACHE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS llm_result_cache (
+        cache_key TEXT PRIMARY KEY,
+        stage TEXT NOT NULL,
+        result JSONB NOT NULL,
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+def ensure_llm_result_cache_table():
+    """יוצר את טבלת llm_result_cache אם לא קיימת"""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(LLM_RESULT_CACHE_SCHEMA)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_llm_result_cache_created_at ON llm_result_cache (created_at)")
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+
+def get_llm_result_cache(cache_key, ttl_seconds):
+    """התוצאה השמורה למפתח (dict) אם נשמרה בתוך ttl_seconds, אחרת None"""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT result FROM llm_result_cache
+            WHERE cache_key = %s AND created_at >= CURRENT_TIMESTAMP - make_interval(secs => %s)
+            """,
+            (cache_key, ttl_seconds)
+        )
+        row = cur.fetchone()
+        cur.close()
+        if row is None:
+            return None
+        return row[0] if isinstance(row[0], dict) else json.loads(row[0])
+    finally:
+        conn.close()
+
+def upsert_llm_result_cache(entries):
+    """שמירת כמה תוצאות ב-INSERT אחד: entries = [(cache_key, stage, result_dict), ...]"""
+    if not entries:
+        return 0
+    from psycopg2.extras import execute_values
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        execute_values(cur, """
+            INSERT INTO llm_result_cache (cache_key, stage, result) VALUES %s
+            ON CONFLICT (cache_key) DO UPDATE SET
+                result = EXCLUDED.result,
+                created_at = CURRENT_TIMESTAMP
+        """, [(key, stage, json.dumps(result, ensure_ascii=False)) for key, stage, result in entries])
+        conn.commit()
+        cur.close()
+        return len(entries)
+    finally:
+        conn.close()
+
+def purge_llm_result_cache(ttl_seconds):
+    """מחיקת תוצאות שפג תוקפן - מחזיר כמה נמחקו"""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            "DELETE FROM llm_result_cache WHERE created_at < CURRENT_TIMESTAMP - make_interval(secs => %s)",
+            (ttl_seconds,)
+        )
+        deleted = cur.rowcount
+        conn.commit()
+        cur.close()
+        return deleted
+    finally:
+        conn.close()
+
 def save_rollback_data(filename, rollback_data):
     """שומר נתוני rollback ל-SQL"""
     try:
-        conn = psycopg2.connect(DB_URL)
+        conn = get_connection()
         cur = conn.cursor()
         
         # יצירת טבלה אם לא קיימת
@@ -534,7 +1115,7 @@ def save_free_model_limits_data(limits_data):
 def save_temp_critical_user_data(filename, temp_data):
     """שומר נתוני קובץ זמני משתמש קריטי ל-SQL"""
     try:
-        conn = psycopg2.connect(DB_URL)
+        conn = get_connection()
         cur = conn.cursor()
         
         # יצירת טבלה אם לא קיימת
@@ -595,7 +1176,7 @@ def save_gpt_chat_message(chat_id, user_msg, bot_msg, gpt_data=None, timestamp=N
 
 def get_chat_statistics():
     """מחזיר סטטיסטיקות מורחבות על השיחות"""
-    conn = psycopg2.connect(DB_URL)
+    conn = get_connection()
     cur = conn.cursor()
     
     stats = {}
@@ -640,7 +1221,7 @@ def get_chat_history_enhanced(chat_id, limit=50):
     """מחזיר היסטוריית צ'אט - רק שדות רזים (כמו get_chat_history)"""
     # 🎯 נרמול chat_id לטיפוס אחיד
     chat_id = validate_chat_id(chat_id)
-    conn = psycopg2.connect(DB_URL)
+    conn = get_connection()
     cur = conn.cursor()
     
     cur.execute("""
@@ -737,7 +1318,7 @@ def get_critical_users_data():
 def get_reminder_states_data():
     """מחזיר מצבי תזכורות ממסד הנתונים"""
     try:
-        conn = psycopg2.connect(DB_URL)
+        conn = get_connection()
         cur = conn.cursor()
         
         cur.execute("""
@@ -786,39 +1367,62 @@ def save_gpt_usage_log(chat_id, model, usage, cost_agorot, timestamp=None):
         if should_log_debug_prints():
             print(f"⚠️ שגיאה בשמירת נתוני שימוש: {e}")
 
+def _count_user_messages(cur, chat_id):
+    """COUNT(*) מלא של הודעות המשתמש - רק לאתחול/סנכרון המונה, לא בנתיב החם"""
+    cur.execute("""
+        SELECT COUNT(*) FROM chat_messages 
+        WHERE chat_id = %s AND user_msg IS NOT NULL AND user_msg != ''
+    """, (chat_id,))
+    return cur.fetchone()[0]
+
+def _bump_user_message_count(cur, chat_id, user_msg):
+    """
+    קידום אטומי של user_profiles.total_messages_count באותה טרנזקציה של ה-INSERT.
+    מונה שעוד לא אותחל (NULL) נשאר NULL - האתחול נעשה ב-increment_user_message_count
+    """
+    if not user_msg:
+        return
+    cur.execute(
+        "UPDATE user_profiles SET total_messages_count = total_messages_count + 1 "
+        "WHERE chat_id = %s AND total_messages_count IS NOT NULL",
+        (chat_id,)
+    )
+
 def increment_user_message_count(chat_id):
     """
-    מעדכן את מונה ההודעות הכולל של המשתמש ב-+1
-    אם המשתמש לא קיים בטבלה, יוצר רשומה חדשה עם מונה 1
+    מוודא שלמשתמש יש מונה הודעות מאותחל (user_profiles.total_messages_count).
+    אם המשתמש לא קיים בטבלה, יוצר רשומה חדשה עם המספר האמיתי מ-chat_messages
     
-    🔧 עודכן לסנכרן את המונה עם המספר האמיתי מטבלת chat_messages
+    ⚡ המונה עצמו מקודם אטומית ב-save_chat_message - כאן נדרש COUNT(*) רק פעם אחת
+    לכל משתמש (מונה חסר); סטיות מתוקנות ב-reconcile_user_message_counts
     """
     # 🎯 נרמול chat_id לטיפוס אחיד
     chat_id = validate_chat_id(chat_id)
     try:
-        conn = psycopg2.connect(DB_URL)
+        conn = get_connection()
         cur = conn.cursor()
         
-        # 🔧 תיקון: חישוב המספר האמיתי מטבלת chat_messages
-        cur.execute("""
-            SELECT COUNT(*) FROM chat_messages 
-            WHERE chat_id = %s AND user_msg IS NOT NULL AND user_msg != ''
-        """, (chat_id,))
-        actual_count = cur.fetchone()[0]
-        
         # בדיקה אם המשתמש כבר קיים
         cur.execute("SELECT total_messages_count FROM user_profiles WHERE chat_id = %s", (chat_id,))
         result = cur.fetchone()
         
+        if result and result[0] is not None:
+            # מונה מאותחל - מתוחזק ב-save_chat_message, אין מה לעשות
+            cur.close()
+            conn.close()
+            return True
+        
+        # 🔧 אתחול: חישוב המספר האמיתי מטבלת chat_messages
+        actual_count = _count_user_messages(cur, chat_id)
+        
         if result:
-            # משתמש קיים - מעדכן את המונה למספר האמיתי
+            # משתמש קיים בלי מונה - מאתחל למספר האמיתי
             cur.execute(
                 "UPDATE user_profiles SET total_messages_count = %s, updated_at = %s WHERE chat_id = %s",
                 (actual_count, get_israel_time(), chat_id)
             )
             if should_log_debug_prints():
-                old_count = result[0] if result[0] is not None else 0
-                print(f"📊 [DB] Synced message count for {chat_id}: {old_count} → {actual_count}")
+                print(f"📊 [DB] Initialized message count for {chat_id}: {actual_count}")
         else:
             # משתמש חדש - יוצר רשומה עם המספר האמיתי
             from fields_dict import get_user_profile_fields
@@ -849,6 +1453,8 @@ def increment_user_message_count(chat_id):
         conn.commit()
         cur.close()
         conn.close()
+        if not result:
+            approval_cache.invalidate(chat_id)  # נוצרה שורה חדשה - not_found כבר לא נכון
         return True
         
     except Exception as e:
@@ -856,6 +1462,39 @@ def increment_user_message_count(chat_id):
             print(f"❌ שגיאה בעדכון מונה הודעות עבור {chat_id}: {e}")
         return False
 
+def reconcile_user_message_counts():
+    """
+    סנכרון כל מוני ההודעות מול chat_messages (למשל אחרי שחזור/מיגרציה שהכניסו שורות ישירות).
+    רץ ברקע מהמתזמן; מחזיר כמה מונים תוקנו
+    """
+    try:
+        conn = get_connection()
+        cur = conn.cursor()
+        cur.execute("""
+            UPDATE user_profiles p SET total_messages_count = COALESCE(c.actual_count, 0)
+            FROM user_profiles p2
+            LEFT JOIN (
+                SELECT chat_id, COUNT(*) AS actual_count FROM chat_messages
+                WHERE user_msg IS NOT NULL AND user_msg != ''
+                GROUP BY chat_id
+            ) c ON c.chat_id = p2.chat_id
+            WHERE p.id = p2.id
+            AND p.total_messages_count IS NOT NULL
+            AND p.total_messages_count IS DISTINCT FROM COALESCE(c.actual_count, 0)
+        """)
+        fixed = cur.rowcount
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        if fixed:
+            logger.warning(f"📊 [DB] תוקנו {fixed} מוני הודעות שסטו מ-chat_messages", source="db_manager")
+        return fixed
+        
+    except Exception as e:
+        logger.error(f"❌ שגיאה בסנכרון מוני הודעות: {e}", source="db_manager")
+        return 0
+
 def get_user_message_count(chat_id):
     """
     מחזיר את מספר ההודעות הכולל של המשתמש
@@ -863,7 +1502,7 @@ def get_user_message_count(chat_id):
     # 🎯 נרמול chat_id לטיפוס אחיד
     chat_id = validate_chat_id(chat_id)
     try:
-        conn = psycopg2.connect(DB_URL)
+        conn = get_connection()
         cur = conn.cursor()
         
         cur.execute("SELECT total_messages_count FROM user_profiles WHERE chat_id = %s", (chat_id,))
@@ -905,7 +1544,7 @@ def clear_user_profile_only(chat_id):
     print(f"🗑️ מוחק רק פרופיל (לא הודעות) עבור משתמש {chat_id}")
     
     try:
-        conn = psycopg2.connect(DB_URL)
+        conn = get_connection()
         cur = conn.cursor()
         
         # מחיקת רק הפרופיל, לא ההודעות!
@@ -915,6 +1554,7 @@ def clear_user_profile_only(chat_id):
         conn.commit()
         cur.close()
         conn.close()
+        approval_cache.invalidate(chat_id)
         
         # התראה לאדמין
         from admin_notifications import send_admin_notification
@@ -959,7 +1599,7 @@ def register_user_with_code_db(chat_id, code_input=None):
     # 🎯 נרמול chat_id לטיפוס אחיד
     chat_id = validate_chat_id(chat_id)
     try:
-        conn = psycopg2.connect(DB_URL)
+        conn = get_connection()
         cur = conn.cursor()
         
         if should_log_debug_prints():
@@ -985,6 +1625,7 @@ def register_user_with_code_db(chat_id, code_input=None):
             conn.commit()
             cur.close()
             conn.close()
+            approval_cache.invalidate(chat_id)
             
             if should_log_debug_prints():
                 print(f"✅ [DB] נוצרה שורה זמנית עבור {chat_id}")
@@ -1087,6 +1728,7 @@ def register_user_with_code_db(chat_id, code_input=None):
             conn.commit()
             cur.close()
             conn.close()
+            approval_cache.invalidate(chat_id)
             
             if should_log_debug_prints():
                 print(f"✅ [DB] מיזוג הצליח: {chat_id} <-> {code_input}, code_try={user_code_try}")
@@ -1112,10 +1754,25 @@ def check_user_approved_status_db(chat_id):
     
     :param chat_id: מזהה צ'אט
     :return: {"status": "approved"/"pending_approval"/"pending_code"/"not_found"}
+    
+    ⚡ נקרא בכל הודעה - התשובה נשמרת ב-approval_cache ומתבטלת בכל כתיבה שמשנה סטטוס
     """
+    cached_status = approval_cache.get(chat_id)
+    if cached_status is not None:
+        return {"status": cached_status}
+    return {"status": _load_user_approved_status(chat_id)}
+
+def _load_user_approved_status(chat_id):
+    """שאילתה ל-DB ושמירה ב-cache ("error" לא נשמר)"""
+    generation = approval_cache.generation
+    status = _query_user_approved_status(chat_id)
+    approval_cache.set(chat_id, status, generation)
+    return status
+
+def _query_user_approved_status(chat_id):
     try:
         # שימוש ישיר ב-chat_id כמספר (BIGINT)
-        conn = psycopg2.connect(DB_URL)
+        conn = get_connection()
         cur = conn.cursor()
         
         cur.execute("""
@@ -1129,26 +1786,26 @@ def check_user_approved_status_db(chat_id):
         conn.close()
         
         if not row:
-            return {"status": "not_found"}
+            return "not_found"
         
         code_approve, approved = row
         
         # 🔧 תיקון: בדיקת אישור קודמת לכל השאר!
         if approved:
-            return {"status": "approved"}
+            return "approved"
         
         # אם לא מאושר, בודקים אם יש קוד
         if not code_approve:
             # משתמש קיים אבל אין לו קוד (שורה זמנית) - צריך קוד
-            return {"status": "pending_code"}
+            return "pending_code"
         else:
             # משתמש קיים עם קוד אבל לא אישר תנאים - צריך אישור
-            return {"status": "pending_approval"}
+            return "pending_approval"
             
     except Exception as e:
         if should_log_debug_prints():
             print(f"❌ [DB] שגיאה ב-check_user_approved_status_db: {e}")
-        return {"status": "error"}
+        return "error"
 
 def increment_code_try_db_new(chat_id):
     """
@@ -1158,7 +1815,7 @@ def increment_code_try_db_new(chat_id):
     :return: int (מספר הניסיון החדש)
     """
     try:
-        conn = psycopg2.connect(DB_URL)
+        conn = get_connection()
         cur = conn.cursor()
         
         cur.execute("""
@@ -1183,6 +1840,8 @@ def increment_code_try_db_new(chat_id):
         conn.commit()
         cur.close()
         conn.close()
+        if new_attempt == 1:
+            approval_cache.invalidate(chat_id)  # ייתכן שנוצרה שורה זמנית (not_found → pending_code)
         
         if should_log_debug_prints():
             print(f"🔢 [DB] increment_code_try_db_new: {chat_id} -> {new_attempt}")
@@ -1201,7 +1860,7 @@ def approve_user_db_new(chat_id):
     # 🎯 נרמול chat_id לטיפוס אחיד
     chat_id = validate_chat_id(chat_id)
     try:
-        conn = psycopg2.connect(DB_URL)
+        conn = get_connection()
         cursor = conn.cursor()
         
         # 🔧 תיקון: שימוש ב-TRUE במקום 1 
@@ -1213,6 +1872,7 @@ def approve_user_db_new(chat_id):
         success = cursor.rowcount > 0
         conn.commit()
         conn.close()
+        approval_cache.invalidate(chat_id)
         
         if should_log_debug_prints():
             print(f"✅ [DB] approve_user_db_new: {chat_id} -> {'success' if success else 'failed'}")
@@ -1224,6 +1884,39 @@ def approve_user_db_new(chat_id):
             print(f"❌ [DB] שגיאה ב-approve_user_db_new: {e}")
         return {"success": False, "message": f"שגיאה: {e}"}
 
+# ================================
+# ⚡ גרסאות אסינכרוניות - לשימוש מתוך ה-event loop (message_handler)
+# ================================
+# כל פונקציה רצה ב-executor של db_pool כך ששאילתה איטית של משתמש אחד
+# לא עוצרת את הטיפול בשאר המשתמשים
+
+async def save_chat_message_async(chat_id, user_msg, bot_msg, timestamp=None, source_file=None, message_type=None):
+    """גרסה אסינכרונית ל-save_chat_message"""
+    return await run_db_async(save_chat_message, chat_id, user_msg, bot_msg, timestamp, source_file, message_type)
+
+async def get_chat_history_async(chat_id, limit=100):
+    """גרסה אסינכרונית ל-get_chat_history"""
+    return await run_db_async(get_chat_history, chat_id, limit)
+
+async def get_chat_history_page_async(chat_id, limit=50, before=None):
+    """גרסה אסינכרונית ל-get_chat_history_page"""
+    return await run_db_async(get_chat_history_page, chat_id, limit, before)
+
+async def increment_user_message_count_async(chat_id):
+    """גרסה אסינכרונית ל-increment_user_message_count"""
+    return await run_db_async(increment_user_message_count, chat_id)
+
+async def get_user_message_count_async(chat_id):
+    """גרסה אסינכרונית ל-get_user_message_count"""
+    return await run_db_async(get_user_message_count, chat_id)
+
+async def check_user_approved_status_db_async(chat_id):
+    """גרסה אסינכרונית ל-check_user_approved_status_db - פגיעה ב-cache חוזרת מיד, בלי executor"""
+    cached_status = approval_cache.get(chat_id)
+    if cached_status is not None:
+        return {"status": cached_status}
+    return {"status": await run_db_async(_load_user_approved_status, chat_id)}
+
 # DEPRECATED: תאימות לאחור בלבד
 def get_user_profile(chat_id):
     """
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+db_pool.py - מאגר חיבורים (connection pool) משותף לכל התהליך
+=============================================================
+
+במקום psycopg2.connect() חדש בכל פעולה (TCP + אימות בכל פעם), כל המודולים
+שואלים חיבור מה-pool ומחזירים אותו בסיום.
+
+שימוש:
+    from db_pool import get_connection
+    conn = get_connection()      # תחליף ישיר ל-psycopg2.connect(DB_URL)
+    cur = conn.cursor()
+    ...
+    conn.close()                 # מחזיר את החיבור ל-pool (לא סוגר אותו)
+
+או עם context manager:
+    from db_pool import db_connection
+    with db_connection() as conn:
+        ...
+
+מתוך קוד אסינכרוני (event loop) - לעולם לא לקרוא לפונקציית DB חוסמת ישירות:
+    from db_pool import run_db_async
+    result = await run_db_async(db_manager.get_chat_history, chat_id, 20)
+
+🔧 הגדרות: DB_POOL_MIN_SIZE / DB_POOL_MAX_SIZE ב-config.py,
+DATABASE_POOL_BORROW_TIMEOUT / DATABASE_POOL_HEALTH_CHECK_INTERVAL ב-simple_config.TimeoutConfig
+"""
+
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Optional
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+
+from config import config, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, should_log_debug_prints
+from simple_config import TimeoutConfig
+from simple_logger import logger
+
+DB_URL = config.get("DATABASE_EXTERNAL_URL") or config.get("DATABASE_URL")
+
+
+class PoolTimeoutError(psycopg2.pool.PoolError):
+    """אין חיבור פנוי ב-pool בתוך זמן ההמתנה המוגדר"""
+
+
+class PooledConnection:
+    """
+    עטיפה דקה לחיבור psycopg2 שהושאל מה-pool.
+    מתנהגת כמו חיבור רגיל - רק close() מחזיר את החיבור ל-pool במקום לסגור אותו.
+    """
+
+    def __init__(self, pool: "DatabaseConnectionPool", conn):
+        self._pool = pool
+        self._conn = conn
+        self._released = False
+
+    _OWN_ATTRIBUTES = ("_pool", "_conn", "_released")
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        # conn.autocommit = True וכו' חייבים להגיע לחיבור עצמו, לא לעטיפה
+        if name in self._OWN_ATTRIBUTES:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._conn, name, value)
+
+    @property
+    def raw_connection(self):
+        """החיבור המקורי של psycopg2 (ל-API שדורש אותו ישירות)"""
+        return self._conn
+
+    def close(self):
+        """החזרת החיבור ל-pool - בטוח לקריאה כפולה"""
+        if self._released:
+            return
+        self._released = True
+        self._pool.release(self._conn)
+
+    def discard(self):
+        """סגירה אמיתית של החיבור (למשל אחרי שגיאת רשת) במקום החזרה ל-pool"""
+        if self._released:
+            return
+        self._released = True
+        self._pool.release(self._conn, discard=True)
+
+    # כמו psycopg2: with conn -> commit/rollback של הטרנזקציה, בלי סגירה
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._conn.commit()
+        else:
+            self._conn.rollback()
+        return False
+
+    def __del__(self):
+        # חיבור שנשכח בלי close() (למשל אחרי exception) חוזר ל-pool ולא "נתקע"
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class DatabaseConnectionPool:
+    """Pool חיבורים thread-safe עם גודל מינימלי/מקסימלי, בדיקת תקינות ו-timeout להשאלה"""
+
+    def __init__(self, dsn: str, min_size: int = DB_POOL_MIN_SIZE, max_size: int = DB_POOL_MAX_SIZE,
+                 borrow_timeout: float = TimeoutConfig.DATABASE_POOL_BORROW_TIMEOUT,
+                 health_check_interval: float = TimeoutConfig.DATABASE_POOL_HEALTH_CHECK_INTERVAL):
+        if not dsn:
+            raise ValueError("No database URL found")
+        self.dsn = dsn
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.borrow_timeout = borrow_timeout
+        self.health_check_interval = health_check_interval
+
+        self._pool = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._last_used: Dict[int, float] = {}
+        self._stats = {"borrowed": 0, "released": 0, "discarded": 0, "timeouts": 0, "health_check_failures": 0}
+
+    def _get_pool(self):
+        """יצירה עצלה של ה-pool - רק בהשאלה הראשונה"""
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = psycopg2.pool.ThreadedConnectionPool(
+                        self.min_size, self.max_size, self.dsn,
+                        connect_timeout=TimeoutConfig.DATABASE_CONNECTION_TIMEOUT
+                    )
+                    if should_log_debug_prints():
+                        print(f"🗄️ [DB_POOL] נוצר pool: min={self.min_size}, max={self.max_size}")
+        return self._pool
+
+    def _is_healthy(self, conn) -> bool:
+        """בדיקת תקינות - חיבור סגור נפסל מיד, חיבור שלא נוצל זמן רב נבדק עם SELECT 1"""
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if last_used is None or time.time() - last_used < self.health_check_interval:
+            # חיבור חדש שזה עתה נפתח, או חיבור שהוחזר לאחרונה
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def acquire(self, timeout: Optional[float] = None) -> PooledConnection:
+        """השאלת חיבור תקין מה-pool; ממתין עד timeout שניות לחיבור פנוי"""
+        timeout = self.borrow_timeout if timeout is None else timeout
+        if not self._slots.acquire(timeout=timeout):
+            self._stats["timeouts"] += 1
+            raise PoolTimeoutError(f"No free database connection after {timeout}s (max={self.max_size})")
+
+        try:
+            pool = self._get_pool()
+            # ניסיון אחד נוסף אחרי פסילת חיבור לא תקין (למשל אחרי restart של השרת)
+            for _ in range(2):
+                conn = pool.getconn()
+                if self._is_healthy(conn):
+                    self._stats["borrowed"] += 1
+                    return PooledConnection(self, conn)
+                self._last_used.pop(id(conn), None)
+                pool.putconn(conn, close=True)
+                self._stats["health_check_failures"] += 1
+            conn = pool.getconn()
+            self._stats["borrowed"] += 1
+            return PooledConnection(self, conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn, discard: bool = False):
+        """החזרת חיבור ל-pool; טרנזקציה פתוחה מבוטלת כדי שהשואל הבא יקבל חיבור נקי"""
+        try:
+            if not discard and not conn.closed:
+                try:
+                    if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                        conn.rollback()
+                    if conn.autocommit:
+                        conn.autocommit = False
+                except Exception:
+                    discard = True
+            discard = discard or bool(conn.closed)
+
+            if discard:
+                self._last_used.pop(id(conn), None)
+                self._stats["discarded"] += 1
+            else:
+                self._last_used[id(conn)] = time.time()
+                self._stats["released"] += 1
+
+            if self._pool is not None:
+                self._pool.putconn(conn, close=discard)
+        except Exception as e:
+            logger.warning(f"שגיאה בהחזרת חיבור ל-pool: {e}", source="db_pool")
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """Context manager - השאלה והחזרה אוטומטית"""
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def get_stats(self) -> Dict[str, int]:
+        """סטטיסטיקות שימוש ב-pool (לניטור)"""
+        stats = dict(self._stats)
+        stats["in_use"] = stats["borrowed"] - stats["released"] - stats["discarded"]
+        stats["max_size"] = self.max_size
+        return stats
+
+    def close_all(self):
+        """סגירת כל החיבורים (בכיבוי התהליך)"""
+        with self._lock:
+            if self._pool is not None:
+                try:
+                    self._pool.closeall()
+                except Exception as e:
+                    logger.warning(f"שגיאה בסגירת pool: {e}", source="db_pool")
+                self._pool = None
+                self._last_used.clear()
+
+
+# 🌐 pool אחד לכל DSN בתהליך
+_pools: Dict[str, DatabaseConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_db_pool(dsn: Optional[str] = None) -> DatabaseConnectionPool:
+    """מחזיר את ה-pool המשותף עבור ה-DSN (ברירת מחדל: DB_URL מהקונפיג)"""
+    dsn = dsn or DB_URL
+    pool = _pools.get(dsn)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(dsn)
+            if pool is None:
+                pool = DatabaseConnectionPool(dsn)
+                _pools[dsn] = pool
+    return pool
+
+
+def get_connection(dsn: Optional[str] = None, timeout: Optional[float] = None) -> PooledConnection:
+    """תחליף ישיר ל-psycopg2.connect(DB_URL) - close() מחזיר את החיבור ל-pool"""
+    return get_db_pool(dsn).acquire(timeout)
+
+
+@contextmanager
+def db_connection(dsn: Optional[str] = None, timeout: Optional[float] = None):
+    """Context manager לחיבור מה-pool המשותף"""
+    with get_db_pool(dsn).connection(timeout) as conn:
+        yield conn
+
+
+def copy_text_value(value) -> str:
+    """ערך לשדה בפורמט text של COPY ... FROM STDIN (NULL = \\N, escape ל-\\ / tab / שורה חדשה)"""
+    if value is None:
+        return "\\N"
+    text = value.isoformat() if isinstance(value, datetime) else str(value)
+    return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def copy_text_row(values) -> str:
+    """שורה שלמה לפורמט text של COPY"""
+    return "\t".join(copy_text_value(value) for value in values) + "\n"
+
+
+def describe_dsn(dsn: str) -> str:
+    """host/dbname בלבד - בלי משתמש וסיסמה (ה-DSN המלא לא נחשף בסטטיסטיקות ובלוגים)"""
+    try:
+        params = psycopg2.extensions.parse_dsn(dsn)
+    except Exception:
+        return "unknown"
+    return f"{params.get('host', 'localhost')}/{params.get('dbname', '')}"
+
+
+def get_pool_stats() -> Dict[str, Dict[str, int]]:
+    """סטטיסטיקות כל ה-pools (מפתח: host/dbname)"""
+    return {describe_dsn(dsn): pool.get_stats() for dsn, pool in _pools.items()}
+
+
+# ⚡ Executor ייעודי לפעולות DB מתוך ה-event loop
+# בגודל ה-pool - כל thread מחזיק לכל היותר חיבור אחד, כך שאין המתנה כפולה
+_db_executor: Optional[ThreadPoolExecutor] = None
+_db_executor_lock = threading.Lock()
+
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """מחזיר את ה-executor המשותף לפעולות DB (נוצר בשימוש הראשון)"""
+    global _db_executor
+    if _db_executor is None:
+        with _db_executor_lock:
+            if _db_executor is None:
+                _db_executor = ThreadPoolExecutor(max_workers=max(1, DB_POOL_MAX_SIZE), thread_name_prefix="db_pool")
+    return _db_executor
+
+
+async def run_db_async(func, *args, **kwargs):
+    """
+    הרצת פונקציית DB חוסמת בלי לחסום את ה-event loop.
+    ביטול (cancel) של ה-await לא עוצר שאילתה שכבר רצה, אבל משחרר את הקורא מיד.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_db_executor(), functools.partial(func, *args, **kwargs))
+
+
+def close_all_pools():
+    """סגירת כל ה-pools וה-executor - לקריאה בכיבוי הבוט"""
+    global _db_executor
+    with _db_executor_lock:
+        if _db_executor is not None:
+            _db_executor.shutdown(wait=True)
+            _db_executor = None
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close_all()
+        _pools.clear()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+dedup_store.py - מניעת עיבוד כפול של אותה הודעה (redelivery של טלגרם)
+=====================================================================
+
+במקום לבנות מחדש את context.bot_data["processed_messages"] בכל הודעה (O(n)),
+המפתחות נשמרים ב-OrderedDict לפי סדר הכנסה: מפתח ישן תמיד בראש, כך שתפוגה היא
+popitem מההתחלה עד הרשומה הראשונה שעוד בתוקף - O(1) לשיעורין לכל הודעה.
+התקרה DEDUP_MAX_ENTRIES מגבילה את הזיכרון גם בפיק.
+
+מצב postgres (DEDUP_BACKEND=postgres) - שורד restart ומשותף בין כמה workers:
+אחרי בדיקה בזיכרון (מהירה), המפתח "נתפס" בטבלת processed_updates בשאילתת INSERT אחת.
+אם ה-DB לא זמין - נשארים עם התשובה מהזיכרון (עדיף עיבוד כפול נדיר על פני הודעה שנבלעת).
+
+שימוש:
+    from dedup_store import dedup_store
+    if await dedup_store.is_duplicate(f"{chat_id}_{message_id}"):
+        return
+
+🔧 הגדרות: DEDUP_TTL_SECONDS / DEDUP_MAX_ENTRIES / DEDUP_BACKEND ב-config.py
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict
+
+from config import DEDUP_TTL_SECONDS, DEDUP_MAX_ENTRIES, DEDUP_BACKEND
+from simple_logger import logger
+
+_PURGE_EVERY_CLAIMS = 500  # מחיקת רשומות שפג תוקפן מה-DB אחת לכמה הודעות
+
+
+class DedupStore:
+    """סט מפתחות עם TTL - בזיכרון, ואופציונלית גם ב-Postgres"""
+
+    def __init__(self, ttl_seconds: float = DEDUP_TTL_SECONDS, max_entries: int = DEDUP_MAX_ENTRIES,
+                 backend: str = DEDUP_BACKEND):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self.backend = backend
+        self._seen: "OrderedDict[str, float]" = OrderedDict()  # key -> זמן סימון (monotonic)
+        self._lock = threading.Lock()
+        self._table_ready = False
+        self._claims_since_purge = 0
+        self._stats = {"checked": 0, "duplicates": 0, "db_duplicates": 0, "expired": 0, "evicted": 0, "db_errors": 0}
+
+    def _expire(self, now: float) -> None:
+        """הסרת מפתחות שפג תוקפם מראש הסדר - נעצר ברשומה הראשונה שבתוקף"""
+        while self._seen:
+            key, marked_at = next(iter(self._seen.items()))
+            if now - marked_at < self.ttl_seconds:
+                break
+            self._seen.popitem(last=False)
+            self._stats["expired"] += 1
+
+    def check_and_mark(self, key: str) -> bool:
+        """בדיקה בזיכרון בלבד: True אם המפתח כבר סומן בתוך ה-TTL, אחרת מסמן ומחזיר False"""
+        now = time.monotonic()
+        with self._lock:
+            self._stats["checked"] += 1
+            self._expire(now)
+            if key in self._seen:
+                self._stats["duplicates"] += 1
+                return True
+            self._seen[key] = now
+            while len(self._seen) > self.max_entries:
+                self._seen.popitem(last=False)
+                self._stats["evicted"] += 1
+        return False
+
+    async def is_duplicate(self, key: str) -> bool:
+        """True אם ההודעה כבר טופלה (כאן או - במצב postgres - ב-worker/ריצה אחרת)"""
+        if self.check_and_mark(key):
+            return True
+        if self.backend != "postgres":
+            return False
+
+        from db_pool import run_db_async
+        try:
+            claimed = await run_db_async(self._claim_in_db, key)
+        except Exception as e:
+            self._stats["db_errors"] += 1
+            logger.warning(f"⚠️ [DEDUP] בדיקת כפילות ב-DB נכשלה - ממשיך לפי הזיכרון: {e}", source="dedup_store")
+            return False
+        if not claimed:
+            self._stats["db_duplicates"] += 1
+            return True
+        return False
+
+    def _claim_in_db(self, key: str) -> bool:
+        """רץ ב-executor של ה-DB: יצירת טבלה בפעם הראשונה, תפיסת המפתח וניקוי תקופתי"""
+        import db_manager
+        if not self._table_ready:
+            db_manager.ensure_processed_updates_table()
+            self._table_ready = True
+        claimed = db_manager.claim_processed_update(key, self.ttl_seconds)
+        self._claims_since_purge += 1
+        if self._claims_since_purge >= _PURGE_EVERY_CLAIMS:
+            self._claims_since_purge = 0
+            try:
+                db_manager.purge_processed_updates(self.ttl_seconds)
+            except Exception as e:
+                logger.warning(f"⚠️ [DEDUP] ניקוי processed_updates נכשל: {e}", source="dedup_store")
+        return claimed
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._seen)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """מונים לניטור"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._seen)
+        stats["backend"] = self.backend
+        stats["ttl_seconds"] = self.ttl_seconds
+        return stats
+
+
+# 🌐 מופע יחיד לכל התהליך
+dedup_store = DedupStore()
@@ -4,6 +4,10 @@
 שומר כל פלט טרמינל ומידע חשוב במסד הנתונים
 
 🎯 עדכון חדש: תופס כל print וכל פלט טרמינל ושומר לטבלה!
+⚡ הכתיבה מקובצת (BatchedLogWriter): COPY אחד לכל batch על חיבור קבוע, תור חסום,
+   וזריקת PRINT/INFO/DEBUG בעומס (WARNING ומעלה נשמרות)
+🎛️ CapturePolicy (log_capture_policy.py) מחליט לפני כל שורה: דגימה, הגבלת קצב וכיווץ כפילויות.
+   מיקום הקורא ומדדי psutil נאספים רק ל-WARNING ומעלה
 """
 
 import threading
@@ -21,6 +25,10 @@ import io
 
 # ייבוא מרכזיים
 from utils import get_israel_time
+from config import DEPLOY_LOG_QUEUE_MAX_SIZE, DEPLOY_LOG_BATCH_SIZE, DEPLOY_LOG_FLUSH_SECONDS
+from simple_config import TimeoutConfig
+from log_capture_policy import CapturePolicy, PRIORITY_LEVELS
+from db_pool import copy_text_row
 
 # Import with fallback for missing modules
 try:
@@ -31,6 +39,166 @@ except ImportError:
     PSYCOPG2_AVAILABLE = False
     psycopg2 = None
 
+# עמודות deployment_logs שנכתבות מכל log_entry - בסדר של COPY
+DEPLOY_LOG_COLUMNS = (
+    'timestamp', 'session_id', 'commit_hash', 'commit_message', 'branch_name',
+    'deployment_id', 'environment', 'log_level', 'source_module', 'source_function',
+    'source_line', 'message', 'user_id', 'error_type', 'stack_trace',
+    'performance_ms', 'memory_mb', 'cpu_percent', 'request_id', 'ip_address',
+    'user_agent', 'metadata'
+)
+_INTEGER_COLUMNS = ('source_line', 'performance_ms', 'memory_mb')  # COPY לא מעגל 12.5 ל-INTEGER כמו INSERT
+_PRIORITY_HEADROOM = 1000  # מקום שמור בתור רק ל-PRIORITY_LEVELS
+
+
+class BatchedLogWriter:
+    """
+    ניקוז התור של deployment_logs ב-batches:
+    - thread אחד אוסף עד batch_size שורות (או מה שהצטבר תוך flush_interval) וכותב ב-COPY אחד
+    - חיבור קבוע משלו (לא מה-pool של הבוט); אחרי שגיאה נפתח חיבור חדש ב-batch הבא
+    - תור חסום: מעל max_size נזרקות שורות PRINT/INFO/DEBUG; ל-WARNING ומעלה יש מקום שמור.
+      כמות הזריקות נרשמת כשורת WARNING אחת כשהתור מתפנה
+    """
+    
+    def __init__(self, connect, max_size: int = DEPLOY_LOG_QUEUE_MAX_SIZE,
+                 batch_size: int = DEPLOY_LOG_BATCH_SIZE, flush_interval: float = DEPLOY_LOG_FLUSH_SECONDS):
+        self._connect = connect  # פונקציה שמחזירה חיבור psycopg2 חדש או None
+        self.max_size = max(1, max_size)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=self.max_size + _PRIORITY_HEADROOM)
+        self._conn = None
+        self._lock = threading.Lock()
+        self._dropped_since_report = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {"queued": 0, "written": 0, "dropped": 0, "failed": 0, "batches": 0}
+    
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, daemon=True, name="deployment_logs_writer")
+            self._thread.start()
+    
+    def accepts(self, level: str) -> bool:
+        """בדיקה זולה לפני בניית השורה - False אם השורה תיזרק בגלל עומס"""
+        return level in PRIORITY_LEVELS or self.queue.qsize() < self.max_size
+    
+    def put(self, log_entry: Dict) -> bool:
+        """הכנסה לתור בלי לחסום - False אם השורה נזרקה"""
+        if self.accepts(log_entry.get('log_level')):
+            try:
+                self.queue.put_nowait(log_entry)
+                self._stats["queued"] += 1
+                return True
+            except queue.Full:
+                pass
+        self.record_drop()
+        return False
+    
+    def record_drop(self):
+        with self._lock:
+            self._dropped_since_report += 1
+            self._stats["dropped"] += 1
+    
+    def _take_dropped_count(self) -> int:
+        with self._lock:
+            dropped, self._dropped_since_report = self._dropped_since_report, 0
+        return dropped
+    
+    def _next_batch(self) -> list:
+        """המתנה לשורה ראשונה, ואז איסוף עד batch_size או עד flush_interval"""
+        try:
+            batch = [self.queue.get(timeout=TimeoutConfig.LOG_QUEUE_TIMEOUT)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get_nowait() if remaining <= 0 else self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+    
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            taken = len(batch)
+            try:
+                dropped = self._take_dropped_count()
+                if dropped:
+                    notice = dict(batch[-1])
+                    notice.update({
+                        'timestamp': get_israel_time(), 'log_level': "WARNING",
+                        'source_module': "deployment_logger", 'source_function': "_run", 'source_line': 0,
+                        'message': f"⚠️ deployment_logs saturated - dropped {dropped} log rows",
+                        'user_id': None, 'error_type': None, 'stack_trace': None, 'performance_ms': None,
+                        'request_id': None, 'ip_address': None, 'user_agent': None, 'metadata': None,
+                    })
+                    batch.append(notice)
+                self.write_batch(batch)
+            finally:
+                for _ in range(taken):
+                    self.queue.task_done()
+    
+    def write_batch(self, batch: list) -> bool:
+        """כתיבת batch ב-COPY אחד. שגיאה לא נזרקת הלאה - הבוט לא נעצר בגלל לוגים"""
+        buffer = io.StringIO()
+        for log_entry in batch:
+            values = []
+            for column in DEPLOY_LOG_COLUMNS:
+                value = log_entry.get(column)
+                if column in _INTEGER_COLUMNS and value is not None:
+                    value = int(round(value))
+                values.append(value)
+            buffer.write(copy_text_row(values))
+        buffer.seek(0)
+        
+        try:
+            if self._conn is None:
+                self._conn = self._connect()
+            if self._conn is None:
+                self._stats["failed"] += len(batch)
+                return False
+            cur = self._conn.cursor()
+            cur.copy_expert(f"COPY deployment_logs ({', '.join(DEPLOY_LOG_COLUMNS)}) FROM STDIN", buffer)
+            self._conn.commit()
+            cur.close()
+            self._stats["written"] += len(batch)
+            self._stats["batches"] += 1
+            return True
+        except Exception as e:
+            self._stats["failed"] += len(batch)
+            self._reset_connection()
+            print(f"[DEPLOY_LOG_ERROR] Batch save failed ({len(batch)} rows): {e}")
+            return False
+    
+    def _reset_connection(self):
+        try:
+            if self._conn is not None:
+                self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
+    
+    def flush(self, timeout: float = TimeoutConfig.LOG_FLUSH_TIMEOUT) -> bool:
+        """המתנה עד שכל מה שבתור נכתב (או עד timeout) - True אם התור התרוקן"""
+        deadline = time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+    
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats["pending"] = self.queue.qsize()
+        return stats
+
+
 class DatabaseLoggingHandler(logging.Handler):
     """Handler לתפיסת כל הלוגים מ-Python logging module"""
     
@@ -121,7 +289,6 @@ class DatabaseStdoutCapture:
 
 class DeploymentLogger:
     def __init__(self, capture_all_output=True):
-        self.log_queue = queue.Queue()
         self.session_id = f"session_{get_israel_time().strftime('%Y%m%d_%H%M%S')}"
         self.commit_hash = self._get_commit_hash()
         self.commit_message = self._get_commit_message()
@@ -133,9 +300,15 @@ class DeploymentLogger:
         # יצירת הטבלה אם לא קיימת
         self._create_table_if_not_exists()
         
-        # Thread רקע לעיבוד הלוגים
-        self.worker_thread = threading.Thread(target=self._process_logs, daemon=True)
-        self.worker_thread.start()
+        self.capture_policy = CapturePolicy()
+        # סיכומי חזרות לא מחכים לשורה הבאה - נרשמים גם כשהמקור השתתק
+        self._repeats_thread = threading.Thread(target=self._repeat_summary_loop, daemon=True, name="deployment_logs_repeats")
+        self._repeats_thread.start()
+        
+        # Thread רקע שמנקז את התור ב-batches
+        self.writer = BatchedLogWriter(self._open_copy_connection)
+        self.log_queue = self.writer.queue
+        self.writer.start()
         
         # רישום התחלת הסשן
         self.log("🚀 Deployment Logger initialized", "INFO", "deployment_logger")
@@ -225,7 +398,27 @@ class DeploymentLogger:
             if not db_url:
                 raise Exception("No database URL found")
             
-            return psycopg2.connect(db_url)
+            # חיבור מה-pool המשותף - close() מחזיר אותו ל-pool
+            from db_pool import get_connection
+            return get_connection(db_url)
+        except Exception as e:
+            print(f"[DEPLOY_LOG_ERROR] Database connection failed: {e}")
+            return None
+    
+    def _open_copy_connection(self):
+        """חיבור ייעודי ל-writer - מוחזק לאורך זמן, ולכן לא נלקח מה-pool של הבוט"""
+        if not PSYCOPG2_AVAILABLE:
+            return None
+        try:
+            from config import get_config
+            config = get_config()
+            db_url = config.get("DATABASE_EXTERNAL_URL") or config.get("DATABASE_URL")
+        except Exception:
+            db_url = os.getenv("DATABASE_URL")
+        if not db_url:
+            return None
+        try:
+            return psycopg2.connect(db_url, connect_timeout=TimeoutConfig.DATABASE_CONNECTION_TIMEOUT)
         except Exception as e:
             print(f"[DEPLOY_LOG_ERROR] Database connection failed: {e}")
             return None
@@ -344,7 +537,7 @@ class DeploymentLogger:
     def _get_caller_info(self):
         """קבלת מידע על הקורא (מודול, פונקציה, שורה)"""
         try:
-            frame = sys._getframe(3)  # 3 levels up from this function
+            frame = sys._getframe(4)  # 4 levels up: _enqueue -> log -> הקורא ל-log
             return {
                 'module': os.path.basename(frame.f_code.co_filename),
                 'function': frame.f_code.co_name,
@@ -370,8 +563,51 @@ class DeploymentLogger:
             request_id: str = None, metadata: Dict = None, **kwargs):
         """הוספת לוג לתור - לא חוסם!"""
         
-        caller_info = self._get_caller_info()
-        system_metrics = self._get_system_metrics()
+        # בעומס - זריקה לפני העבודה היקרה (frame, psutil)
+        if not self.writer.accepts(level):
+            self.writer.record_drop()
+            return
+        
+        decision = self.capture_policy.decide(level, source, message)
+        if decision.repeat_of is not None:
+            self._enqueue_repeat_summary(source, decision.repeat_of, decision.repeat_level, decision.repeat_count)
+        if not decision.keep:
+            return
+        self._enqueue(message, level, source, user_id, performance_ms, request_id, metadata, **kwargs)
+    
+    def _enqueue_repeat_summary(self, source: str, message: str, level: str, repeats: int):
+        """השורה הקודמת מהמקור הזה חזרה ודוכאה - רשומת סיכום אחת במקום N"""
+        self._enqueue(
+            f"🔁 [REPEATED x{repeats}] {message}", level, source,
+            metadata={"repeat_count": repeats, "collapsed": True}
+        )
+    
+    def flush_repeat_summaries(self, force: bool = False) -> int:
+        """רישום סיכומי חזרות שהחלון שלהם נגמר (או כולם עם force) - מחזיר כמה נרשמו"""
+        pending = self.capture_policy.take_pending_repeats(force=force)
+        for source, message, level, repeats in pending:
+            self._enqueue_repeat_summary(source, message, level, repeats)
+        return len(pending)
+    
+    def _repeat_summary_loop(self):
+        interval = max(1.0, self.capture_policy.repeat_window)
+        while True:
+            time.sleep(interval)
+            try:
+                self.flush_repeat_summaries()
+            except Exception as e:
+                print(f"[DEPLOY_LOG_ERROR] Repeat summary flush failed: {e}")
+    
+    def _enqueue(self, message: str, level: str, source: str, user_id: str = None,
+                 performance_ms: int = None, request_id: str = None, metadata: Dict = None, **kwargs):
+        """בניית הרשומה והכנסה לתור הכתיבה"""
+        # 📍 מיקום קורא ו-psutil עולים זמן בכל שורה - רק כשזה שווה את זה
+        if level in PRIORITY_LEVELS:
+            caller_info = self._get_caller_info()
+            system_metrics = self._get_system_metrics()
+        else:
+            caller_info = {'module': source, 'function': None, 'line': None}
+            system_metrics = {'memory_mb': None, 'cpu_percent': None}
         
         # זיהוי סוג שגיאה אם זה ERROR
         error_type = None
@@ -413,57 +649,12 @@ class DeploymentLogger:
             'metadata': json.dumps(metadata) if metadata else None
         }
         
-        self.log_queue.put(log_entry)
+        self.writer.put(log_entry)
     
-    def _process_logs(self):
-        """עיבוד לוגים ברקע"""
-        while True:
-            try:
-                from simple_config import TimeoutConfig
-                log_entry = self.log_queue.get(timeout=TimeoutConfig.LOG_QUEUE_TIMEOUT)
-                self._save_to_db(log_entry)
-                self.log_queue.task_done()
-            except queue.Empty:
-                continue
-            except Exception as e:
-                # אם יש שגיאה בשמירה - לא נעצור את הבוט!
-                print(f"[DEPLOY_LOG_ERROR] Failed to save log: {e}")
-    
-    def _save_to_db(self, log_entry: Dict):
-        """שמירת לוג למסד הנתונים"""
-        try:
-            conn = self._get_db_connection()
-            if not conn:
-                return
-            
-            cur = conn.cursor()
-            cur.execute('''
-            INSERT INTO deployment_logs (
-                timestamp, session_id, commit_hash, commit_message, branch_name,
-                deployment_id, environment, log_level, source_module, source_function,
-                source_line, message, user_id, error_type, stack_trace,
-                performance_ms, memory_mb, cpu_percent, request_id, ip_address,
-                user_agent, metadata
-            ) VALUES (
-                %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-            )
-            ''', (
-                log_entry['timestamp'], log_entry['session_id'], log_entry['commit_hash'],
-                log_entry['commit_message'], log_entry['branch_name'], log_entry['deployment_id'],
-                log_entry['environment'], log_entry['log_level'], log_entry['source_module'],
-                log_entry['source_function'], log_entry['source_line'], log_entry['message'],
-                log_entry['user_id'], log_entry['error_type'], log_entry['stack_trace'],
-                log_entry['performance_ms'], log_entry['memory_mb'], log_entry['cpu_percent'],
-                log_entry['request_id'], log_entry['ip_address'], log_entry['user_agent'],
-                log_entry['metadata']
-            ))
-            
-            conn.commit()
-            cur.close()
-            conn.close()
-            
-        except Exception as e:
-            print(f"[DEPLOY_LOG_ERROR] Database save failed: {e}")
+    def flush(self, timeout: float = TimeoutConfig.LOG_FLUSH_TIMEOUT) -> bool:
+        """המתנה לכתיבת כל הלוגים שבתור (לכיבוי), כולל סיכומי חזרות שעוד לא נרשמו"""
+        self.flush_repeat_summaries(force=True)
+        return self.writer.flush(timeout)
     
     def error(self, message: str, **kwargs):
         """לוג שגיאה"""
@@ -496,8 +687,8 @@ class DeploymentLogger:
         # השבת הסטרימים המקוריים
         self.disable_output_capture()
         
-        # המתנה לסיום עיבוד כל הלוגים
-        self.log_queue.join()
+        # המתנה לסיום עיבוד כל הלוגים (עם תקרת זמן - DB תקוע לא יתקע את הכיבוי)
+        self.flush()
 
 # יצירת instance גלובלי - תפיסת פלט מופעלת מיד ברנדר
 deployment_logger = DeploymentLogger(capture_all_output=True)
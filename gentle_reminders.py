@@ -5,10 +5,8 @@ gentle_reminders.py
 הועבר מ-notifications.py כדי לשמור על קוד lean ומסודר
 """
 
-import json
-import os
 import asyncio
-from datetime import datetime, timedelta
+from datetime import datetime
 from config import BOT_TOKEN
 from utils import get_israel_time
 from user_friendly_errors import safe_str
@@ -17,51 +15,13 @@ import pytz
 # 🚀 יבוא המערכת החדשה - פשוטה ועקבית
 from simple_logger import logger
 
-# קובץ לניהול מצבי תזכורות
-REMINDER_STATE_FILE = "data/reminder_state.json"
-
-def _load_reminder_state():
-    """טוען את מצב התזכורות מהקובץ"""
-    try:
-        if os.path.exists(REMINDER_STATE_FILE):
-            with open(REMINDER_STATE_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {}
-    except Exception as e:
-        logger.error(f"Error loading reminder state: {e}", source="gentle_reminders")
-        return {}
-
-def _save_reminder_state(state):
-    """שומר את מצב התזכורות לקובץ"""
-    try:
-        os.makedirs(os.path.dirname(REMINDER_STATE_FILE), exist_ok=True)
-        with open(REMINDER_STATE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(state, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        logger.error(f"Error saving reminder state: {e}", source="gentle_reminders")
+# מצב התזכורות נשמר בטבלת reminder_activity (במקום data/reminder_state.json)
+from reminder_store import reminder_store
 
 def mark_user_active(chat_id: str):
     """מסמן משתמש כפעיל (קיבל הודעה או שלח הודעה) ומאפס דגל תזכורת"""
     try:
-        state = _load_reminder_state()
-        user_id = safe_str(chat_id)
-        
-        current_time = get_israel_time()
-        
-        if user_id not in state:
-            state[user_id] = {}
-        
-        state[user_id].update({
-            "last_activity": current_time.isoformat(),
-            "reminders_sent": state[user_id].get("reminders_sent", 0),  # שומר את הספירה
-            "reminder_due": False,
-            "last_reminder": state[user_id].get("last_reminder"),  # שומר את הזמן האחרון
-            "inactive_count": 0,
-            "reminder_sent_waiting_response": False  # מאפס - המשתמש ענה!
-        })
-        
-        _save_reminder_state(state)
-        
+        reminder_store.mark_active(chat_id)  # בזיכרון בלבד - נכתב ל-DB ברקע
     except Exception as e:
         logger.error(f"Error marking user {safe_str(chat_id)} as active: {e}", source="gentle_reminders")
 
@@ -74,30 +34,14 @@ def _is_allowed_time() -> bool:
 def _mark_reminder_delayed(chat_id: str) -> None:
     """מסמן תזכורת כדחויה בגלל זמן לא מתאים"""
     try:
-        state = _load_reminder_state()
-        user_id = safe_str(chat_id)
-        
-        if user_id in state:
-            state[user_id]["reminder_delayed"] = True
-            state[user_id]["delay_reason"] = "inappropriate_time"
-            _save_reminder_state(state)
+        reminder_store.mark_reminder_delayed(chat_id)
     except Exception as e:
         logger.error(f"Error marking reminder delayed for {safe_str(chat_id)}: {e}", source="gentle_reminders")
 
 def _mark_reminder_sent(chat_id: str) -> None:
     """מסמן שתזכורת נשלחה למשתמש ואנחנו מחכים לתשובה"""
     try:
-        state = _load_reminder_state()
-        user_id = safe_str(chat_id)
-        
-        if user_id in state:
-            current_time = get_israel_time()
-            state[user_id]["last_reminder"] = current_time.isoformat()
-            state[user_id]["reminders_sent"] = state[user_id].get("reminders_sent", 0) + 1
-            state[user_id]["reminder_sent_waiting_response"] = True  # מחכים לתשובה
-            state[user_id]["reminder_due"] = False
-            state[user_id]["reminder_delayed"] = False
-            _save_reminder_state(state)
+        reminder_store.mark_reminder_sent(chat_id)
     except Exception as e:
         logger.error(f"Error marking reminder sent for {safe_str(chat_id)}: {e}", source="gentle_reminders")
 
@@ -160,48 +104,15 @@ async def send_gentle_reminder(chat_id: str) -> bool:
 def _mark_user_inactive(chat_id: str) -> None:
     """מסמן משתמש כלא פעיל"""
     try:
-        state = _load_reminder_state()
-        user_id = safe_str(chat_id)
-        
-        if user_id in state:
-            state[user_id]["inactive"] = True
-            state[user_id]["inactive_since"] = get_israel_time().isoformat()
-            state[user_id]["inactive_count"] = state[user_id].get("inactive_count", 0) + 1
-            _save_reminder_state(state)
-            
+        reminder_store.mark_inactive(chat_id)
     except Exception as e:
         logger.error(f"Error marking user {safe_str(chat_id)} as inactive: {e}", source="gentle_reminders")
 
 def cleanup_inactive_users():
-    """מנקה משתמשים לא פעילים מרשימת התזכורות"""
+    """מסמן כלא פעילים משתמשים שלא היו פעילים 30 יום (חוזרים לרשימה בהודעה הבאה שלהם)"""
     try:
-        state = _load_reminder_state()
-        current_time = get_israel_time()
-        cutoff_time = current_time - timedelta(days=30)  # 30 יום
-        
-        active_users = {}
-        removed_count = 0
-        
-        for user_id, user_state in state.items():
-            last_activity_str = user_state.get("last_activity")
-            
-            if last_activity_str:
-                try:
-                    last_activity = datetime.fromisoformat(last_activity_str.replace("Z", ""))
-                    if last_activity > cutoff_time and not user_state.get("inactive", False):
-                        active_users[user_id] = user_state
-                    else:
-                        removed_count += 1
-                        print(f"🗑️ מסיר משתמש לא פעיל {user_id}")
-                except:
-                    # אם יש בעיה עם הזמן, נשאיר את המשתמש
-                    active_users[user_id] = user_state
-            else:
-                # אם אין זמן פעילות, נשאיר את המשתמש
-                active_users[user_id] = user_state
-        
-        _save_reminder_state(active_users)
-        print(f"✅ נוקה רשימת תזכורות - הוסרו {removed_count} משתמשים לא פעילים")
+        removed_count = reminder_store.mark_stale_inactive(30)
+        print(f"✅ נוקה רשימת תזכורות - סומנו {removed_count} משתמשים לא פעילים")
         
     except Exception as e:
         print(f"🚨 שגיאה בניקוי משתמשים לא פעילים: {e}")
@@ -209,47 +120,17 @@ def cleanup_inactive_users():
 def auto_cleanup_old_users():
     """ניקוי אוטומטי של משתמשים ישנים"""
     try:
-        state = _load_reminder_state()
-        current_time = get_israel_time()
-        cutoff_time = current_time - timedelta(days=90)  # 90 יום
-        
-        updated_state = {}
-        removed_count = 0
-        
-        for user_id, user_data in state.items():
-            try:
-                last_activity_str = user_data.get("last_activity", "")
-                if not last_activity_str:
-                    # אם אין זמן פעילות, נשאיר את המשתמש
-                    updated_state[user_id] = user_data
-                    continue
-                
-                last_activity = datetime.fromisoformat(last_activity_str.replace("Z", ""))
-                
-                # הסרת משתמשים שלא פעילים יותר מ-90 יום
-                if last_activity > cutoff_time:
-                    updated_state[user_id] = user_data
-                else:
-                    removed_count += 1
-                    print(f"🗑️ ניקוי אוטומטי: הוסר משתמש {user_id} (לא פעיל מ-{last_activity_str[:10]})")
-                    
-            except Exception as parse_error:
-                print(f"⚠️ שגיאה בפרסור זמן למשתמש {user_id}: {parse_error}")
-                # במקרה של שגיאה, נשאיר את המשתמש
-                updated_state[user_id] = user_data
-        
-        _save_reminder_state(updated_state)
+        removed_count = reminder_store.mark_stale_inactive(90)
         
         if removed_count > 0:
-            print(f"✅ ניקוי אוטומטי הושלם - הוסרו {removed_count} משתמשים ישנים")
+            print(f"✅ ניקוי אוטומטי הושלם - סומנו {removed_count} משתמשים ישנים כלא פעילים")
             
             # שליחת דיווח לאדמין
             try:
                 from admin_notifications import send_admin_notification
                 send_admin_notification(
                     f"🧹 ניקוי אוטומטי של תזכורות הושלם\n"
-                    f"📊 הוסרו {removed_count} משתמשים לא פעילים (90+ יום)\n"
-                    f"👥 נשארו {len(updated_state)} משתמשים פעילים"
+                    f"📊 סומנו {removed_count} משתמשים לא פעילים (90+ יום)"
                 )
             except Exception as notification_error:
                 print(f"⚠️ שגיאה בשליחת דיווח ניקוי: {notification_error}")
@@ -307,41 +188,15 @@ async def check_and_send_gentle_reminders():
         
         print("🔄 מתחיל בדיקת תזכורות עדינות...")
         
-        state = _load_reminder_state()
-        if not state:
-            print("ℹ️ אין משתמשים ברשימת התזכורות")
-            return
-        
         current_time = get_israel_time()
-        reminder_threshold = current_time - timedelta(hours=24)  # 24 שעות מהפעילות האחרונה
         max_reminders_per_run = 5  # מקסימום 5 תזכורות בכל הרצה
         
         reminders_sent = 0
-        candidates = []
-        
-        # מציאת מועמדים לתזכורת
-        for user_id, user_state in state.items():
-            try:
-                # בדיקה אם המשתמש מסומן כלא פעיל
-                if user_state.get("inactive", False):
-                    continue
-                
-                # בדיקה אם כבר נשלחה תזכורת ועדיין לא ענה
-                if user_state.get("reminder_sent_waiting_response", False):
-                    continue  # לא שולח שוב עד שיענה
-                
-                # בדיקת פעילות אחרונה
-                last_activity_str = user_state.get("last_activity")
-                if last_activity_str:
-                    last_activity = datetime.fromisoformat(last_activity_str.replace("Z", ""))
-                    
-                    # אם המשתמש לא פעיל יותר מ-24 שעות ופחות מ-30 יום
-                    if last_activity < reminder_threshold and (current_time - last_activity).days < 30:
-                        candidates.append(user_id)
-                
-            except Exception as user_error:
-                print(f"⚠️ שגיאה בבדיקת משתמש {user_id}: {user_error}")
-                continue
+        # מועמדים: לא פעילים 24 שעות עד 30 יום, לא מסומנים כלא פעילים ולא ממתינים לתשובה - שאילתה אחת מול האינדקס
+        candidates = reminder_store.get_due_users(idle_hours=24, max_idle_days=30)
+        if not candidates:
+            print("ℹ️ אין משתמשים שזקוקים לתזכורת")
+            return
         
         print(f"📋 נמצאו {len(candidates)} מועמדים לתזכורות")
         
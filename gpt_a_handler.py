@@ -14,8 +14,8 @@ import threading
 import time
 import re
 from prompts import SYSTEM_PROMPT
-from config import GPT_MODELS, GPT_PARAMS, GPT_FALLBACK_MODELS, should_log_debug_prints
-from gpt_utils import normalize_usage_dict, billing_guard, measure_llm_latency, calculate_gpt_cost
+from config import GPT_MODELS, GPT_PARAMS, GPT_FALLBACK_MODELS, MODEL_ROUTES, GPT_HEDGE_ENABLED, should_log_debug_prints
+from gpt_utils import normalize_usage_dict, billing_guard, measure_llm_latency, calculate_gpt_cost, acompletion_with_timeout, hedged_completion
 from notifications import alert_billing_issue, send_error_notification
 from simple_config import TimeoutConfig
 from typing import TYPE_CHECKING
@@ -337,57 +337,124 @@ async def delete_temporary_message_and_send_new(update, temp_message, new_text):
         logger.error(f"❌ [DELETE_MSG] כשל בשליחה: {send_err}")
         return False
 
+def _parse_gpt_response(response, completion_params):
+    """חילוץ התשובה ונתוני השימוש מתשובת litellm"""
+    bot_reply = response.choices[0].message.content
+    usage = normalize_usage_dict(response.usage) if hasattr(response, 'usage') else {}
+    return {
+        "bot_reply": bot_reply,
+        "usage": usage,
+        "model": completion_params["model"],
+        "model_dump": response
+    }
+
 def _execute_gpt_call(completion_params, full_messages):
     """הפעלת קריאה ל-GPT באופן סינכרוני"""
     try:
         response = litellm.completion(**completion_params)
-        
-        # חילוץ התשובה
-        bot_reply = response.choices[0].message.content
-        
-        # חילוץ נתוני שימוש
-        usage = normalize_usage_dict(response.usage) if hasattr(response, 'usage') else {}
-        
-        return {
-            "bot_reply": bot_reply,
-            "usage": usage,
-            "model": completion_params["model"],
-            "model_dump": response
-        }
+        return _parse_gpt_response(response, completion_params)
     except Exception as e:
         logger.error(f"[gpt_a] שגיאה במודל {completion_params['model']}: {e}")
         raise e
 
-def get_main_response_sync(full_messages, chat_id, message_id=None, use_extra_emotion=True, filter_reason="", match_type="unknown"):
+def _gpt_a_hedge_candidates(model):
+    """סדר המרוץ: המודל שנבחר, ה-fallback המהיר, ובסוף fallback החירום בתשלום (MODEL_ROUTES)"""
+    routes = MODEL_ROUTES.get("gpt_a", {})
+    candidates = [(model, False)]
+    for fallback, is_paid in ((routes.get("fallback1"), False), (routes.get("fallback2"), True)):
+        if fallback and fallback not in [m for m, _ in candidates]:
+            candidates.append((fallback, is_paid))
+    return candidates
+
+async def _execute_gpt_call_async(completion_params, full_messages, timeout=None):
     """
-    💎 מנוע gpt_a הראשי - גרסה סינכרונית
+    הפעלת קריאה ל-GPT באופן אסינכרוני (acompletion) - ה-event loop ממשיך לשרת משתמשים אחרים.
+    עם GPT_HEDGE_ENABLED: מרוץ hedged מול מודלי ה-fallback - הזנב חסום בהשהיית ה-hedge
+    ולא בסכום ה-timeouts. timeout חל על המרוץ כולו.
     """
-    # מדידת זמן התחלה
-    total_start_time = time.time()
+    try:
+        if GPT_HEDGE_ENABLED:
+            timeout = TimeoutConfig.GPT_PROCESSING_TIMEOUT if timeout is None else timeout
+            response, winner_params = await asyncio.wait_for(
+                hedged_completion(_gpt_a_hedge_candidates(completion_params["model"]), completion_params,
+                                  call=lambda params: acompletion_with_timeout(params, timeout)),
+                timeout=timeout,
+            )
+            if winner_params["model"] != completion_params["model"]:
+                logger.info(f"🏁 [HEDGE] gpt_a נענה ע\"י {winner_params['model']} (במקום {completion_params['model']})")
+            completion_params["model"] = winner_params["model"]  # רישום ועלות לפי המודל שענה בפועל
+        else:
+            response = await acompletion_with_timeout(completion_params, timeout)
+        return _parse_gpt_response(response, completion_params)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"[gpt_a] שגיאה במודל {completion_params['model']}: {e!r}")
+        raise
+
+def _partial_display_text(text):
+    """טקסט חלקי להצגה בזמן stream - בלי הזנב הטכני (--- Self-correction וכו') ש-clean_bot_response מסיר בסוף"""
+    cut = text.find("---")
+    return text[:cut].rstrip() if cut != -1 else text
+
+async def _stream_gpt_call_async(completion_params, on_partial, timeout=None):
+    """
+    קריאה ל-GPT במצב stream: on_partial(text) נקרא עם הטקסט המצטבר אחרי כל delta.
+    ה-timeout חל על כל היצירה (לא רק על הטוקן הראשון).
+    """
+    timeout = TimeoutConfig.GPT_PROCESSING_TIMEOUT if timeout is None else timeout
+    stream_params = dict(completion_params, stream=True, stream_options={"include_usage": True})
     
-    # שלב 1: הכנת ההודעות
-    prep_start_time = time.time()
+    async def _consume():
+        chunks = []
+        parts = []
+        stream = await litellm.acompletion(**stream_params)
+        async for chunk in stream:
+            chunks.append(chunk)
+            delta = chunk.choices[0].delta.content if getattr(chunk, "choices", None) else None
+            if delta:
+                parts.append(delta)
+                try:
+                    on_partial(_partial_display_text("".join(parts)))
+                except Exception as cb_err:
+                    logger.warning(f"[gpt_a] שגיאה בעדכון stream: {cb_err}")
+        return chunks, "".join(parts)
     
-    # ההוספה של השדות החסרים מתבצעת כעת ב-message_handler.py
-    # כדי להימנע מכפילויות, הסרנו את הקוד מכאן
+    try:
+        chunks, bot_reply = await asyncio.wait_for(_consume(), timeout=timeout)
+    except (asyncio.CancelledError, asyncio.TimeoutError):
+        raise
+    except Exception as e:
+        logger.error(f"[gpt_a] שגיאה ב-stream של {completion_params['model']}: {e!r}")
+        raise
     
-    prep_time = time.time() - prep_start_time
-    print(f"⚡ [TIMING] Preparation time: {prep_time:.3f}s")
+    # usage מגיע ב-chunk האחרון (include_usage); אחרת litellm משחזר אותו מה-chunks
+    usage_obj = next((c.usage for c in reversed(chunks) if getattr(c, "usage", None)), None)
+    if usage_obj is None and chunks:
+        try:
+            usage_obj = litellm.stream_chunk_builder(chunks, messages=completion_params["messages"]).usage
+        except Exception as usage_err:
+            logger.warning(f"[gpt_a] לא הצלחתי לשחזר usage מה-stream: {usage_err}")
     
+    return {
+        "bot_reply": bot_reply,
+        "usage": normalize_usage_dict(usage_obj) if usage_obj else {},
+        "model": completion_params["model"],
+        "model_dump": None,
+        "streamed": True
+    }
+
+def _build_gpt_a_completion_params(full_messages, chat_id, message_id=None, use_extra_emotion=True, filter_reason=""):
+    """בחירת מודל + בניית פרמטרי הקריאה ל-GPT-A (משותף לגרסה הסינכרונית והאסינכרונית)"""
     metadata = {"gpt_identifier": "gpt_a", "chat_id": chat_id, "message_id": message_id}
     params = GPT_PARAMS["gpt_a"]
     
-    # 🔬 מדידת ביצועים מבוטלת זמנית
-    measurement_id = None
-    
     # בחירת מודל לפי הפילטר
     if use_extra_emotion:
         model = GPT_MODELS["gpt_a"]  # המודל המתקדם מ-config
-        model_tier = "premium"
         logger.info(f"🎯 [MODEL_SELECTION] משתמש במודל מתקדם: {model} | סיבה: {filter_reason}")
     else:
         model = GPT_FALLBACK_MODELS["gpt_a"]  # המודל המהיר מ-config
-        model_tier = "fast"
         logger.info(f"🚀 [MODEL_SELECTION] משתמש במודל מהיר: {model} | סיבה: {filter_reason}")
     
     completion_params = {
@@ -431,14 +498,117 @@ def get_main_response_sync(full_messages, chat_id, message_id=None, use_extra_em
     print(f"🚀 [SENDING] Request to {model}...")
     print(f"🔍 [GPT_REQUEST_DEBUG] === END ANALYSIS ===\n")
     
-    # שלב 2: הפעלת GPT ב-thread נפרד
+    return completion_params
+
+def _finalize_gpt_a_result(gpt_result, chat_id, completion_params, use_extra_emotion, filter_reason, match_type,
+                           gpt_duration, prep_time, total_start_time):
+    """עיבוד התשובה המיידי (ניקוי, פסק זמן לשאלות פרופיל) ובניית תוצאת GPT-A"""
+    processing_start_time = time.time()
+    
+    bot_reply = gpt_result["bot_reply"]
+    
+    # 🆕 ניקוי תשובה מטקסט טכני ומאחורי הקלעים
+    bot_reply = clean_bot_response(bot_reply)
+    
+    # ניקוי תגי HTML לא נתמכים שהמודל עלול להחזיר
+    # <br> תגים לא נתמכים ב-Telegram - צריך להמיר ל-\n
+    bot_reply = bot_reply.replace('<br>', '\n').replace('<br/>', '\n').replace('<br />', '\n')
+    # גם ניקוי תגי br עם attributes שונים
+    bot_reply = re.sub(r'<br\s*/?>', '\n', bot_reply)
+    
+    usage = gpt_result["usage"]
+    
+    processing_time = time.time() - processing_start_time
+    
+    # 🆕 בדיקה אם התשובה מכילה שאלת פרופיל והתחלת פסק זמן
+    if chat_id and detect_profile_question_in_response(bot_reply):
+        start_profile_question_cooldown(chat_id)
+        logger.info(f"✅ [PROFILE_QUESTION] הופעל פסק זמן! | chat_id={safe_str(chat_id)}", source="gpt_a_handler")
+    
+    # 🚀 החזרת תשובה מיד - כל השאר יעבור לרקע!
+    return {
+        "bot_reply": bot_reply, 
+        "usage": usage, 
+        "model": gpt_result["model"],
+        "used_extra_emotion": use_extra_emotion,
+        "filter_reason": filter_reason,
+        "match_type": match_type,
+        "gpt_pure_latency": gpt_duration,
+        "raw_gpt_result": gpt_result,  # נתונים גולמיים לעיבוד ברקע
+        "completion_params": completion_params,  # פרמטרים לרישום ברקע
+        "background_data": {  # נתונים לעיבוד ברקע
+            "prep_time": prep_time,
+            "processing_time": processing_time,
+            "start_times": {
+                "total": total_start_time,
+                "processing": processing_start_time
+            }
+        }
+    }
+
+def _gpt_a_error_result(e, full_messages, chat_id, model, use_extra_emotion, filter_reason, match_type, source_name):
+    """תשובת שגיאה ידידותית + התראה לאדמין (משותף לכל נתיבי GPT-A)"""
+    logger.error(f"[gpt_a] שגיאה במודל {model}: {e}")
+    
+    # שליחת הודעת שגיאה טכנית לאדמין
+    send_error_notification(
+        error_message=f"שגיאה כללית ב-{source_name}: {str(e)}",
+        chat_id=chat_id,
+        user_msg=full_messages[-1]["content"] if full_messages else "לא זמין", 
+        error_type="gpt_a_engine_error"
+    )
+    
+    error_reply = "מצטער, יש לי בעיה טכנית זמנית. העברתי את הפרטים לעומר שיבדוק את זה. נסה שוב בעוד כמה דקות 🔧"
+    # 🐛 DEBUG: שליחת הודעת שגיאה
+    print("=" * 80)
+    print("❌ ERROR MESSAGE DEBUG")
+    print("=" * 80)
+    print(f"📝 ERROR TEXT: {repr(error_reply)}")
+    print(f"📊 LENGTH: {len(error_reply)} chars")
+    print(f"📊 NEWLINES: {error_reply.count(chr(10))}")
+    print(f"📊 DOTS: {error_reply.count('.')}")
+    print(f"📊 QUESTIONS: {error_reply.count('?')}")
+    print(f"📊 EXCLAMATIONS: {error_reply.count('!')}")
+    print("=" * 80)
+    
+    # 🆕 בדיקה אם התשובה מכילה שאלת פרופיל והתחלת פסק זמן (גם במקרה שגיאה)
+    if chat_id and detect_profile_question_in_response(error_reply):
+        start_profile_question_cooldown(chat_id)
+    
+    return {
+        "bot_reply": error_reply, 
+        "usage": {}, 
+        "model": model,
+        "used_extra_emotion": use_extra_emotion,
+        "filter_reason": filter_reason,
+        "match_type": match_type,
+        "error": str(e)
+    }
+
+def get_main_response_sync(full_messages, chat_id, message_id=None, use_extra_emotion=True, filter_reason="", match_type="unknown"):
+    """
+    💎 מנוע gpt_a הראשי - גרסה סינכרונית
+    """
+    # מדידת זמן התחלה
+    total_start_time = time.time()
+    
+    # שלב 1: הכנת ההודעות
+    prep_start_time = time.time()
+    
+    # ההוספה של השדות החסרים מתבצעת כעת ב-message_handler.py
+    # כדי להימנע מכפילויות, הסרנו את הקוד מכאן
+    
+    prep_time = time.time() - prep_start_time
+    print(f"⚡ [TIMING] Preparation time: {prep_time:.3f}s")
+    
+    # 🔬 מדידת ביצועים מבוטלת זמנית
+    completion_params = _build_gpt_a_completion_params(full_messages, chat_id, message_id, use_extra_emotion, filter_reason)
+    
+    # שלב 2: הפעלת GPT
     gpt_start_time = time.time()
     log_memory_usage("before_gpt_call")
     
     try:
-        # 🚨 הגדלת timeout ל-45 שניות (במקום 30) לטיפול ב-latency גבוה
-        GPT_TIMEOUT_SECONDS = TimeoutConfig.GPT_PROCESSING_TIMEOUT
-        
         # הרצת GPT ישירות (ללא רקורסיה)
         gpt_result = _execute_gpt_call(completion_params, full_messages)
         
@@ -447,88 +617,78 @@ def get_main_response_sync(full_messages, chat_id, message_id=None, use_extra_em
         logger.info(f"⏱️ [GPT_TIMING] GPT הסתיים תוך {gpt_duration:.2f} שניות")
         
         # שלב 3: עיבוד התשובה המיידי בלבד
-        processing_start_time = time.time()
-        
-        bot_reply = gpt_result["bot_reply"]
-        
-        # 🆕 ניקוי תשובה מטקסט טכני ומאחורי הקלעים
-        bot_reply = clean_bot_response(bot_reply)
-        
-        # ניקוי תגי HTML לא נתמכים שהמודל עלול להחזיר
-        # <br> תגים לא נתמכים ב-Telegram - צריך להמיר ל-\n
-        bot_reply = bot_reply.replace('<br>', '\n').replace('<br/>', '\n').replace('<br />', '\n')
-        # גם ניקוי תגי br עם attributes שונים
-        bot_reply = re.sub(r'<br\s*/?>', '\n', bot_reply)
+        return _finalize_gpt_a_result(gpt_result, chat_id, completion_params, use_extra_emotion, filter_reason,
+                                      match_type, gpt_duration, prep_time, total_start_time)
         
-        usage = gpt_result["usage"]
-        
-        processing_time = time.time() - processing_start_time
-        
-        # 🆕 בדיקה אם התשובה מכילה שאלת פרופיל והתחלת פסק זמן
-        if chat_id and detect_profile_question_in_response(bot_reply):
-            start_profile_question_cooldown(chat_id)
-            logger.info(f"✅ [PROFILE_QUESTION] הופעל פסק זמן! | chat_id={safe_str(chat_id)}", source="gpt_a_handler")
-        
-        # 🚀 החזרת תשובה מיד - כל השאר יעבור לרקע!
-        result = {
-            "bot_reply": bot_reply, 
-            "usage": usage, 
-            "model": gpt_result["model"],
-            "used_extra_emotion": use_extra_emotion,
-            "filter_reason": filter_reason,
-            "match_type": match_type,
-            "gpt_pure_latency": gpt_duration,
-            "raw_gpt_result": gpt_result,  # נתונים גולמיים לעיבוד ברקע
-            "completion_params": completion_params,  # פרמטרים לרישום ברקע
-            "background_data": {  # נתונים לעיבוד ברקע
-                "prep_time": prep_time,
-                "processing_time": processing_time,
-                "start_times": {
-                    "total": total_start_time,
-                    "processing": processing_start_time
-                }
-            }
-        }
+    except Exception as e:
+        return _gpt_a_error_result(e, full_messages, chat_id, completion_params["model"], use_extra_emotion,
+                                   filter_reason, match_type, "get_main_response_sync")
+
+async def get_main_response_async(full_messages, chat_id, message_id=None, context=None, timeout=None, on_partial=None):
+    """
+    💎 מנוע gpt_a הראשי - גרסה אסינכרונית (litellm.acompletion).
+    הקריאה ל-LLM לא חוסמת את ה-event loop, כך שקריאות של משתמשים רבים רצות במקביל.
+    timeout - ברירת מחדל TimeoutConfig.GPT_PROCESSING_TIMEOUT; ביטול ה-task מבטל גם את הקריאה ל-LLM.
+    on_partial - אם הועבר, התשובה נקראת ב-stream ו-on_partial(text) מקבל את הטקסט המצטבר
+    (ראה streaming_reply.StreamingReply); התוצאה הסופית זהה למצב הרגיל.
+    """
+    total_start_time = time.time()
+    
+    # שלב 1: קביעת מודל לפי פילטר חכם
+    user_message = full_messages[-1]["content"] if full_messages else ""
+    if context is not None:
+        chat_history_length = context.get_message_count()
+    elif chat_id:
+        try:
+            from chat_utils import get_total_user_messages_count_async
+            chat_history_length = await get_total_user_messages_count_async(chat_id)
+        except Exception as e:
+            logger.warning(f"שגיאה בקבלת מספר הודעות מהמסד נתונים: {e}")
+            chat_history_length = len([msg for msg in full_messages if msg["role"] in ["user", "assistant"]])
+    else:
+        chat_history_length = len([msg for msg in full_messages if msg["role"] in ["user", "assistant"]])
+    
+    use_extra_emotion, filter_reason, match_type = should_use_extra_emotion_model(user_message, chat_history_length)
+    
+    prep_time = time.time() - total_start_time
+    completion_params = _build_gpt_a_completion_params(full_messages, chat_id, message_id, use_extra_emotion, filter_reason)
+    timeout = TimeoutConfig.GPT_PROCESSING_TIMEOUT if timeout is None else timeout
+    
+    # שלב 2: קריאה אסינכרונית ל-GPT
+    gpt_start_time = time.time()
+    try:
+        if on_partial is not None:
+            gpt_result = await _stream_gpt_call_async(completion_params, on_partial, timeout)
+        else:
+            gpt_result = await _execute_gpt_call_async(completion_params, full_messages, timeout)
         
-        return result
+        gpt_duration = time.time() - gpt_start_time
+        logger.info(f"⏱️ [GPT_TIMING] GPT הסתיים תוך {gpt_duration:.2f} שניות")
         
-    except Exception as e:
-        logger.error(f"[gpt_a] שגיאה במודל {gpt_result['model']}: {e}")
+        # שלב 3: עיבוד התשובה המיידי בלבד
+        return _finalize_gpt_a_result(gpt_result, chat_id, completion_params, use_extra_emotion, filter_reason,
+                                      match_type, gpt_duration, prep_time, total_start_time)
         
-        # שליחת הודעת שגיאה טכנית לאדמין
+    except asyncio.TimeoutError:
+        logger.error(f"[gpt_a] Timeout - GPT לא הגיב תוך {timeout} שניות")
         send_error_notification(
-            error_message=f"שגיאה כללית ב-get_main_response_sync: {str(e)}",
+            error_message=f"GPT timeout - לא הגיב תוך {timeout} שניות",
             chat_id=chat_id,
-            user_msg=full_messages[-1]["content"] if full_messages else "לא זמין", 
-            error_type="gpt_a_engine_error"
+            user_msg=user_message or "לא זמין", 
+            error_type="gpt_a_timeout_error"
         )
-        
-        error_reply = "מצטער, יש לי בעיה טכנית זמנית. העברתי את הפרטים לעומר שיבדוק את זה. נסה שוב בעוד כמה דקות 🔧"
-        # 🐛 DEBUG: שליחת הודעת שגיאה
-        print("=" * 80)
-        print("❌ ERROR MESSAGE DEBUG")
-        print("=" * 80)
-        print(f"📝 ERROR TEXT: {repr(error_reply)}")
-        print(f"📊 LENGTH: {len(error_reply)} chars")
-        print(f"📊 NEWLINES: {error_reply.count(chr(10))}")
-        print(f"📊 DOTS: {error_reply.count('.')}")
-        print(f"📊 QUESTIONS: {error_reply.count('?')}")
-        print(f"📊 EXCLAMATIONS: {error_reply.count('!')}")
-        print("=" * 80)
-        
-        # 🆕 בדיקה אם התשובה מכילה שאלת פרופיל והתחלת פסק זמן (גם במקרה שגיאה)
-        if chat_id and detect_profile_question_in_response(error_reply):
-            start_profile_question_cooldown(chat_id)
-        
         return {
-            "bot_reply": error_reply, 
+            "bot_reply": "מצטער, אני עסוק כרגע. נסה שוב בעוד כמה דקות 🔄", 
             "usage": {}, 
-            "model": gpt_result["model"],
+            "model": "timeout",
             "used_extra_emotion": use_extra_emotion,
             "filter_reason": filter_reason,
             "match_type": match_type,
-            "error": str(e)
+            "error": "timeout"
         }
+    except Exception as e:
+        return _gpt_a_error_result(e, full_messages, chat_id, completion_params["model"], use_extra_emotion,
+                                   filter_reason, match_type, "get_main_response_async")
 
 def process_gpt_a_background_tasks(gpt_result_data, chat_id, message_id=None):
     """
@@ -796,15 +956,18 @@ async def get_main_response_with_timeout(full_messages, chat_id, message_id=None
         }
 
 # פונקציה ישנה לתאימות לאחור
-def get_main_response(full_messages, chat_id, message_id=None):
+def get_main_response(full_messages, chat_id, message_id=None, context=None):
     """
     💎 גרסה סינכרונית ישנה - לתאימות לאחור
+    context: ConversationContext של הבקשה (אופציונלי) - מספר ההודעות נלקח ממנו בלי שליפה
     """
     user_message = full_messages[-1]["content"] if full_messages else ""
     
     # 🆕 קבלת מספר ההודעות האמיתי מהמסד נתונים
     chat_history_length = 0
-    if chat_id:
+    if context is not None:
+        chat_history_length = context.get_message_count()
+    elif chat_id:
         try:
             from chat_utils import get_total_user_messages_count
             chat_history_length = get_total_user_messages_count(chat_id)
@@ -11,8 +11,98 @@ import json
 import lazy_litellm as litellm
 from prompts import BOT_REPLY_SUMMARY_PROMPT
 from config import GPT_MODELS, GPT_PARAMS
-from gpt_utils import normalize_usage_dict, calculate_gpt_cost
+from gpt_utils import normalize_usage_dict, calculate_gpt_cost, acompletion_with_timeout
 from user_friendly_errors import safe_str
+from llm_result_cache import llm_result_cache
+
+def _build_gpt_b_completion_params(bot_reply, chat_id, message_id=None):
+    """בניית פרמטרי הקריאה ל-GPT-B - משותף לנתיב הסינכרוני והאסינכרוני"""
+    metadata = {"gpt_identifier": "gpt_b", "chat_id": safe_str(chat_id), "message_id": message_id}
+    params = GPT_PARAMS["gpt_b"]
+    
+    messages = [
+        {"role": "system", "content": BOT_REPLY_SUMMARY_PROMPT},
+        {"role": "user", "content": bot_reply}
+    ]
+    
+    completion_params = {
+        "model": GPT_MODELS["gpt_b"],
+        "messages": messages,
+        "temperature": params["temperature"],
+        "metadata": metadata
+    }
+    
+    # הוספת max_tokens רק אם הוא לא None
+    if params["max_tokens"] is not None:
+        completion_params["max_tokens"] = params["max_tokens"]
+    return completion_params
+
+def _gpt_b_cache_key(completion_params):
+    """מפתח cache לסיכום: מודל + פרומפט הסיכום + תשובת הבוט"""
+    messages = completion_params["messages"]
+    return llm_result_cache.make_key("gpt_b", completion_params["model"], messages[0]["content"], messages[1]["content"])
+
+def _gpt_b_cached_result(cached, completion_params):
+    logger.info("[gpt_b] cache hit - מדלג על קריאה ל-LLM", source="gpt_b_handler")
+    return {"summary": cached["summary"], "usage": {}, "model": completion_params["model"], "cache_hit": True}
+
+def _handle_gpt_b_response(response, completion_params, chat_id, message_id, start_time, cache_key=None):
+    """עיבוד תשובת GPT-B: סיכום, usage ועלות, ורישום ל-JSONL"""
+    import time
+    summary = response.choices[0].message.content.strip()
+    if summary:
+        llm_result_cache.set(cache_key, "gpt_b", {"summary": summary})
+    usage = normalize_usage_dict(response.usage, response.model)
+    
+    # הוספת חישוב עלות ל-usage
+    try:
+        cost_info = calculate_gpt_cost(
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0),
+            cached_tokens=usage.get("cached_tokens", 0),
+            model_name=response.model,
+            completion_response=response
+        )
+        usage.update(cost_info)
+    except Exception as _cost_e:
+        logger.warning(f"[gpt_b] Cost calc failed: {_cost_e}", source="gpt_b_handler")
+    result = {"summary": summary, "usage": usage, "model": response.model}
+    try:
+        from gpt_jsonl_logger import GPTJSONLLogger
+        # בניית response מלא עם כל המידע הנדרש
+        response_data = {
+            "id": getattr(response, "id", ""),
+            "choices": [
+                {
+                    "message": {
+                        "content": summary,
+                        "role": "assistant"
+                    }
+                }
+            ],
+            "usage": usage,
+            "model": response.model
+        }
+        gpt_duration = time.time() - start_time
+        GPTJSONLLogger.log_gpt_call(
+            log_path="data/openai_calls.jsonl",
+            gpt_type="B",
+            request=completion_params,
+            response=response_data,
+            cost_usd=usage.get("cost_total", 0),
+            extra={
+                "chat_id": safe_str(chat_id), 
+                "message_id": message_id,
+                "gpt_pure_latency": gpt_duration,
+                "processing_time_seconds": gpt_duration
+            }
+        )
+    except Exception as log_exc:
+        print(f"[LOGGING_ERROR] Failed to log GPT-B call: {log_exc}")
+    return result
+
+def _gpt_b_fallback_result(user_msg):
+    return {"summary": f"[סיכום: {user_msg[:50]}...]", "usage": {}, "model": GPT_MODELS["gpt_b"]}
 
 def get_summary(user_msg, bot_reply, chat_id, message_id=None):
     """
@@ -22,104 +112,40 @@ def get_summary(user_msg, bot_reply, chat_id, message_id=None):
     try:
         import time
         start_time = time.time()
-        
-        metadata = {"gpt_identifier": "gpt_b", "chat_id": safe_str(chat_id), "message_id": message_id}
-        params = GPT_PARAMS["gpt_b"]
-        model = GPT_MODELS["gpt_b"]
-        
-        messages = [
-            {"role": "system", "content": BOT_REPLY_SUMMARY_PROMPT},
-            {"role": "user", "content": bot_reply}
-        ]
-        
-        completion_params = {
-            "model": model,
-            "messages": messages,
-            "temperature": params["temperature"],
-            "metadata": metadata
-        }
-        
-        # הוספת max_tokens רק אם הוא לא None
-        if params["max_tokens"] is not None:
-            completion_params["max_tokens"] = params["max_tokens"]
+        completion_params = _build_gpt_b_completion_params(bot_reply, chat_id, message_id)
+        cache_key = _gpt_b_cache_key(completion_params)
+        cached = llm_result_cache.get(cache_key)
+        if cached:
+            return _gpt_b_cached_result(cached, completion_params)
         
         from gpt_utils import measure_llm_latency
-        with measure_llm_latency(model):
+        with measure_llm_latency(completion_params["model"]):
             response = litellm.completion(**completion_params)
-        summary = response.choices[0].message.content.strip()
-        usage = normalize_usage_dict(response.usage, response.model)
-        
-        # חישוב זמן עיבוד טהור
-        gpt_duration = time.time() - start_time
+        return _handle_gpt_b_response(response, completion_params, chat_id, message_id, start_time, cache_key)
         
-        # 💾 שמירת מטריקות זמן GPT-B למסד הנתונים
-        try:
-            # 🗑️ REMOVED: save_system_metrics disabled
-            # from db_manager import save_system_metrics
-            # save_system_metrics(
-            #     metric_type="gpt_timing",
-            #     chat_id=safe_str(chat_id),
-            #     gpt_latency_seconds=gpt_duration,
-            #     additional_data={
-            #         "message_id": message_id,
-            #         "gpt_type": "B",
-            #         "model": response.model,
-            #         "tokens_used": usage.get("total_tokens", 0),
-            #         "cost_usd": usage.get("cost_total", 0),
-            #         "operation": "summary"
-            #     }
-            # )
-            pass  # מבוטל זמנית
-        except Exception as save_err:
-            logger.warning(f"Could not save GPT-B timing metrics: {save_err}", source="gpt_b_handler")
+    except Exception as e:
+        logger.error(f"[gpt_b] Error: {e}", source="gpt_b_handler")
+        return _gpt_b_fallback_result(user_msg)
+
+async def get_summary_async(user_msg, bot_reply, chat_id, message_id=None, timeout=None):
+    """
+    ⚡ גרסה אסינכרונית של get_summary (litellm.acompletion) - רצה במקביל ל-GPT-C/E בלי לחסום את ה-loop.
+    timeout=None → TimeoutConfig.GPT_PROCESSING_TIMEOUT; חריגה מחזירה את סיכום ברירת המחדל.
+    """
+    try:
+        import time
+        start_time = time.time()
+        completion_params = _build_gpt_b_completion_params(bot_reply, chat_id, message_id)
+        cache_key = _gpt_b_cache_key(completion_params)
+        cached = await llm_result_cache.get_async(cache_key)
+        if cached:
+            return _gpt_b_cached_result(cached, completion_params)
         
-        # הוספת חישוב עלות ל-usage
-        try:
-            cost_info = calculate_gpt_cost(
-                prompt_tokens=usage.get("prompt_tokens", 0),
-                completion_tokens=usage.get("completion_tokens", 0),
-                cached_tokens=usage.get("cached_tokens", 0),
-                model_name=response.model,
-                completion_response=response
-            )
-            usage.update(cost_info)
-        except Exception as _cost_e:
-            logger.warning(f"[gpt_b] Cost calc failed: {_cost_e}", source="gpt_b_handler")
-        result = {"summary": summary, "usage": usage, "model": response.model}
-        try:
-            from gpt_jsonl_logger import GPTJSONLLogger
-            # בניית response מלא עם כל המידע הנדרש
-            response_data = {
-                "id": getattr(response, "id", ""),
-                "choices": [
-                    {
-                        "message": {
-                            "content": summary,
-                            "role": "assistant"
-                        }
-                    }
-                ],
-                "usage": usage,
-                "model": response.model
-            }
-            gpt_duration = time.time() - start_time
-            GPTJSONLLogger.log_gpt_call(
-                log_path="data/openai_calls.jsonl",
-                gpt_type="B",
-                request=completion_params,
-                response=response_data,
-                cost_usd=usage.get("cost_total", 0),
-                extra={
-                    "chat_id": safe_str(chat_id), 
-                    "message_id": message_id,
-                    "gpt_pure_latency": gpt_duration,
-                    "processing_time_seconds": gpt_duration
-                }
-            )
-        except Exception as log_exc:
-            print(f"[LOGGING_ERROR] Failed to log GPT-B call: {log_exc}")
-        return result
+        from gpt_utils import measure_llm_latency
+        with measure_llm_latency(completion_params["model"]):
+            response = await acompletion_with_timeout(completion_params, timeout=timeout)
+        return _handle_gpt_b_response(response, completion_params, chat_id, message_id, start_time, cache_key)
         
     except Exception as e:
-        logger.error(f"[gpt_b] Error: {e}", source="gpt_b_handler")
-        return {"summary": f"[סיכום: {user_msg[:50]}...]", "usage": {}, "model": model} 
\ No newline at end of file
+        logger.error(f"[gpt_b] Error: {e!r}", source="gpt_b_handler")
+        return _gpt_b_fallback_result(user_msg)
@@ -6,29 +6,24 @@ gpt_c_handler.py
 
 from simple_logger import logger
 from datetime import datetime
+import asyncio
 import json
 import time
 import lazy_litellm as litellm
 import re
 from prompts import build_profile_extraction_enhanced_prompt
 from config import GPT_MODELS, GPT_PARAMS, GPT_FALLBACK_MODELS, should_log_data_extraction_debug, should_log_gpt_cost_debug
-from gpt_utils import normalize_usage_dict, measure_llm_latency, calculate_gpt_cost, extract_json_from_text
+from gpt_utils import normalize_usage_dict, measure_llm_latency, calculate_gpt_cost, extract_json_from_text, acompletion_with_timeout
 from user_friendly_errors import safe_str
+from llm_result_cache import llm_result_cache
 
-def extract_user_info(user_msg, chat_id, message_id=None):
-    """
-    מחלץ מידע רלוונטי מהודעת המשתמש לעדכון הפרופיל שלו
-    כולל מערכת fallback למקרה של rate limit ב-Gemini.
-    """
-    start_time = time.time()  # מדידת זמן התחלה
-    
-    safe_chat_id = safe_str(chat_id)
+def _build_gpt_c_completion_params(user_msg, safe_chat_id, message_id=None):
+    """בניית פרמטרי הקריאה ל-gpt_c (משותף לגרסה הסינכרונית והאסינכרונית)"""
     metadata = {"gpt_identifier": "gpt_c", "chat_id": safe_chat_id, "message_id": message_id}
     params = GPT_PARAMS["gpt_c"]
-    model = GPT_MODELS["gpt_c"]
     
     completion_params = {
-        "model": model,
+        "model": GPT_MODELS["gpt_c"],
         "messages": [{"role": "system", "content": build_profile_extraction_enhanced_prompt()}, {"role": "user", "content": user_msg}],
         "temperature": params["temperature"],
         "metadata": metadata
@@ -37,283 +32,230 @@ def extract_user_info(user_msg, chat_id, message_id=None):
     # הוספת max_tokens רק אם הוא לא None
     if params["max_tokens"] is not None:
         completion_params["max_tokens"] = params["max_tokens"]
-    
-    # ניסיון עם המודל הראשי
+    return completion_params
+
+def _is_rate_limit_error(e):
+    """האם השגיאה היא rate limit / quota (מפעיל מעבר למודל fallback)"""
+    error_str = str(e)
+    return "429" in error_str or "quota" in error_str.lower() or "rate limit" in error_str.lower()
+
+def _log_gpt_c_call(completion_params, response_data, cost_usd, safe_chat_id, message_id, latency):
+    """רישום הקריאה ל-data/openai_calls.jsonl"""
     try:
-        with measure_llm_latency(model):
-            response = litellm.completion(**completion_params)
-        content_raw = response.choices[0].message.content.strip()
-        content = extract_json_from_text(content_raw)
+        from gpt_jsonl_logger import GPTJSONLLogger
+        GPTJSONLLogger.log_gpt_call(
+            log_path="data/openai_calls.jsonl",
+            gpt_type="C",
+            request=completion_params,
+            response=response_data,
+            cost_usd=cost_usd,
+            extra={
+                "chat_id": safe_chat_id, 
+                "message_id": message_id,
+                "gpt_pure_latency": latency,
+                "processing_time_seconds": latency
+            }
+        )
+    except Exception as log_exc:
+        print(f"[LOGGING_ERROR] Failed to log GPT-C call: {log_exc}")
 
-        usage = normalize_usage_dict(response.usage, response.model)
-        
-        # ניסיון לפרס JSON עם לוגים מפורטים
-        try:
-            if content and content.strip():
-                content_clean = content.strip()
-                if content_clean.startswith("{") and content_clean.endswith("}"):
-                    extracted_fields = json.loads(content_clean)
-                    if not isinstance(extracted_fields, dict):
-                        logger.warning(f"[GPT_C] JSON parsed but not a dict: {type(extracted_fields)}", source="gpt_c_handler")
-                        extracted_fields = {}
-                else:
-                    logger.warning(f"[GPT_C] Content doesn't look like JSON: {content_clean[:100]}...", source="gpt_c_handler")
+def _gpt_c_cache_key(completion_params):
+    """מפתח cache לחילוץ: מודל + פרומפט החילוץ + הודעת המשתמש"""
+    messages = completion_params["messages"]
+    return llm_result_cache.make_key("gpt_c", completion_params["model"], messages[0]["content"], messages[1]["content"])
+
+def _gpt_c_cached_result(cached, model):
+    extracted_fields = cached["extracted_fields"]
+    print(f"🔍 [GPT-C] cache hit - {len(extracted_fields)} שדות בלי קריאה ל-LLM: {list(extracted_fields.keys())}")
+    return {"extracted_fields": extracted_fields, "usage": {}, "model": model, "cache_hit": True}
+
+def _handle_gpt_c_response(response, completion_params, safe_chat_id, message_id, start_time, fallback_used=False, cache_key=None):
+    """פענוח תשובת gpt_c: JSON → שדות, חישוב עלות, לוגים ורישום JSONL"""
+    tag = "GPT_C FALLBACK" if fallback_used else "GPT_C"
+    print_tag = "GPT-C FALLBACK" if fallback_used else "GPT-C"
+    
+    content_raw = response.choices[0].message.content.strip()
+    content = extract_json_from_text(content_raw)
+
+    usage = normalize_usage_dict(response.usage, response.model)
+    
+    # ניסיון לפרס JSON עם לוגים מפורטים
+    try:
+        if content and content.strip():
+            content_clean = content.strip()
+            if content_clean.startswith("{") and content_clean.endswith("}"):
+                extracted_fields = json.loads(content_clean)
+                if not isinstance(extracted_fields, dict):
+                    logger.warning(f"[{tag}] JSON parsed but not a dict: {type(extracted_fields)}", source="gpt_c_handler")
                     extracted_fields = {}
+                elif not fallback_used:
+                    # רק תשובה שפוענחה תקין מהמודל הראשי נשמרת ב-cache
+                    llm_result_cache.set(cache_key, "gpt_c", {"extracted_fields": extracted_fields})
             else:
+                logger.warning(f"[{tag}] Content doesn't look like JSON: {content_clean[:100]}...", source="gpt_c_handler")
                 extracted_fields = {}
-        except json.JSONDecodeError as e:
-            logger.error(f"[GPT_C] JSON decode error: {e} | Content: {content[:200] if content else 'None'}...", source="gpt_c_handler")
-            extracted_fields = {}
-        except Exception as e:
-            logger.error(f"[GPT_C] Unexpected error parsing JSON: {e} | Content: {content[:200] if content else 'None'}...", source="gpt_c_handler")
+        else:
             extracted_fields = {}
-        
-        # הדפסת מידע חשוב על חילוץ נתונים (תמיד יופיע!)
-        print(f"🔍 [GPT-C] חולצו {len(extracted_fields)} שדות: {list(extracted_fields.keys())}")
-        if should_log_gpt_cost_debug():
-            print(f"💰 [GPT-C] עלות: {usage.get('cost_total', 0):.6f}$ | טוקנים: {usage.get('total_tokens', 0)}")
-        if should_log_data_extraction_debug():
-            print(f"📋 [GPT-C] נתונים שחולצו: {json.dumps(extracted_fields, ensure_ascii=False, indent=2)}")
-        
-        try:
-            cost_info = calculate_gpt_cost(
-                prompt_tokens=usage.get("prompt_tokens", 0),
-                completion_tokens=usage.get("completion_tokens", 0),
-                cached_tokens=usage.get("cached_tokens", 0),
-                model_name=response.model,
-                completion_response=response
-            )
-            usage.update(cost_info)
-        except Exception as _cost_e:
-            logger.warning(f"[gpt_c] Cost calc failed: {_cost_e}", source="gpt_c_handler")
-        
-        # חישוב זמן עיבוד טהור
-        gpt_duration = time.time() - start_time
-        
-        # 💾 שמירת מטריקות זמן GPT-C למסד הנתונים
-        try:
-            # 🗑️ REMOVED: save_system_metrics disabled
-            # from db_manager import save_system_metrics
-            # save_system_metrics(
-            #     metric_type="gpt_timing",
-            #     chat_id=safe_chat_id,
-            #     gpt_latency_seconds=gpt_duration,
-            #     additional_data={
-            #         "message_id": message_id,
-            #         "gpt_type": "C",
-            #         "model": response.model,
-            #         "tokens_used": usage.get("total_tokens", 0),
-            #         "cost_usd": usage.get("cost_total", 0),
-            #         "operation": "extract_user_info",
-            #         "extracted_fields_count": len(extracted_fields)
-            #     }
-            # )
-            pass
-        except Exception as save_err:
-            logger.warning(f"Could not save GPT-C timing metrics: {save_err}", source="gpt_c_handler")
-        
-        result = {"extracted_fields": extracted_fields, "usage": usage, "model": response.model}
-        try:
-            from gpt_jsonl_logger import GPTJSONLLogger
-            # בניית response מלא עם כל המידע הנדרש
-            response_data = {
-                "id": getattr(response, "id", ""),
-                "choices": [
-                    {
-                        "message": {
-                            "content": content_raw,
-                            "role": "assistant"
-                        }
-                    }
-                ],
-                "usage": usage,
-                "model": response.model
+    except json.JSONDecodeError as e:
+        logger.error(f"[{tag}] JSON decode error: {e} | Content: {content[:200] if content else 'None'}...", source="gpt_c_handler")
+        extracted_fields = {}
+    except Exception as e:
+        logger.error(f"[{tag}] Unexpected error parsing JSON: {e} | Content: {content[:200] if content else 'None'}...", source="gpt_c_handler")
+        extracted_fields = {}
+    
+    if fallback_used:
+        logger.info(f"[gpt_c] Fallback successful: {completion_params['model']}", source="gpt_c_handler")
+    
+    # הדפסת מידע חשוב על חילוץ נתונים (תמיד יופיע!)
+    print(f"🔍 [{print_tag}] חולצו {len(extracted_fields)} שדות: {list(extracted_fields.keys())}")
+    if should_log_gpt_cost_debug():
+        print(f"💰 [{print_tag}] עלות: {usage.get('cost_total', 0):.6f}$ | טוקנים: {usage.get('total_tokens', 0)}")
+    if should_log_data_extraction_debug():
+        print(f"📋 [{print_tag}] נתונים שחולצו: {json.dumps(extracted_fields, ensure_ascii=False, indent=2)}")
+    
+    try:
+        cost_info = calculate_gpt_cost(
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0),
+            cached_tokens=usage.get("cached_tokens", 0),
+            model_name=response.model,
+            completion_response=response
+        )
+        usage.update(cost_info)
+    except Exception as _cost_e:
+        logger.warning(f"[gpt_c] Cost calc failed: {_cost_e}", source="gpt_c_handler")
+    
+    result = {"extracted_fields": extracted_fields, "usage": usage, "model": response.model}
+    if fallback_used:
+        result["fallback_used"] = True
+    
+    # בניית response מלא עם כל המידע הנדרש
+    response_data = {
+        "id": getattr(response, "id", ""),
+        "choices": [
+            {
+                "message": {
+                    "content": content_raw,
+                    "role": "assistant"
+                }
             }
-            GPTJSONLLogger.log_gpt_call(
-                log_path="data/openai_calls.jsonl",
-                gpt_type="C",
-                request=completion_params,
-                response=response_data,
-                cost_usd=usage.get("cost_total", 0),
-                extra={
-                    "chat_id": safe_chat_id, 
-                    "message_id": message_id,
-                    "gpt_pure_latency": time.time() - start_time,
-                    "processing_time_seconds": time.time() - start_time
+        ],
+        "usage": usage,
+        "model": response.model
+    }
+    _log_gpt_c_call(completion_params, response_data, usage.get("cost_total", 0), safe_chat_id, message_id,
+                    time.time() - start_time)
+    return result
+
+def _gpt_c_error_result(error, model, completion_params, safe_chat_id, message_id):
+    """תוצאה ריקה במקרה שגיאה + רישום JSONL"""
+    # בניית response ריק במקרה שגיאה
+    response_data = {
+        "id": "",
+        "choices": [
+            {
+                "message": {
+                    "content": f"[שגיאה: {error}]",
+                    "role": "assistant"
                 }
-            )
-        except Exception as log_exc:
-            print(f"[LOGGING_ERROR] Failed to log GPT-C call: {log_exc}")
-        return result
+            }
+        ],
+        "usage": {},
+        "model": model
+    }
+    _log_gpt_c_call(completion_params, response_data, 0, safe_chat_id, message_id, 0)
+    return {"extracted_fields": {}, "usage": {}, "model": model}
+
+def _prepare_gpt_c_fallback(completion_params, model):
+    """מעבר למודל fallback אחרי rate limit - מחזיר את שם המודל"""
+    fallback_model = GPT_FALLBACK_MODELS["gpt_c"]
+    logger.warning(f"[gpt_c] Rate limit for {model}, trying fallback: {fallback_model}", source="gpt_c_handler")
+    completion_params["model"] = fallback_model
+    completion_params["metadata"]["fallback_used"] = True
+    return fallback_model
+
+def _log_gpt_c_failure(e, fallback_model=None):
+    """לוג שגיאה של gpt_c (מודל ראשי או fallback)"""
+    if fallback_model:
+        logger.error(f"[gpt_c] Fallback also failed: {e}", source="gpt_c_handler")
+        print(f"❌ [GPT-C] שגיאה גם ב-fallback: {e}")
+    else:
+        logger.error(f"[gpt_c] Error (not rate limit): {e}", source="gpt_c_handler")
+        print(f"❌ [GPT-C] שגיאה: {e}")
+
+def extract_user_info(user_msg, chat_id, message_id=None):
+    """
+    מחלץ מידע רלוונטי מהודעת המשתמש לעדכון הפרופיל שלו
+    כולל מערכת fallback למקרה של rate limit ב-Gemini.
+    """
+    start_time = time.time()  # מדידת זמן התחלה
+    
+    safe_chat_id = safe_str(chat_id)
+    completion_params = _build_gpt_c_completion_params(user_msg, safe_chat_id, message_id)
+    model = completion_params["model"]
+    cache_key = _gpt_c_cache_key(completion_params)
+    cached = llm_result_cache.get(cache_key)
+    if cached:
+        return _gpt_c_cached_result(cached, model)
+    
+    # ניסיון עם המודל הראשי
+    try:
+        with measure_llm_latency(model):
+            response = litellm.completion(**completion_params)
+        return _handle_gpt_c_response(response, completion_params, safe_chat_id, message_id, start_time, cache_key=cache_key)
         
     except Exception as e:
-        error_str = str(e)
-        is_rate_limit = "429" in error_str or "quota" in error_str.lower() or "rate limit" in error_str.lower()
+        if not (_is_rate_limit_error(e) and "gpt_c" in GPT_FALLBACK_MODELS):
+            _log_gpt_c_failure(e)
+            return _gpt_c_error_result(e, model, completion_params, safe_chat_id, message_id)
         
-        if is_rate_limit and "gpt_c" in GPT_FALLBACK_MODELS:
-            # ניסיון עם מודל fallback
-            fallback_model = GPT_FALLBACK_MODELS["gpt_c"]
-            logger.warning(f"[gpt_c] Rate limit for {model}, trying fallback: {fallback_model}", source="gpt_c_handler")
-            
-            try:
-                completion_params["model"] = fallback_model
-                completion_params["metadata"]["fallback_used"] = True
-                
-                with measure_llm_latency(fallback_model):
-                    response = litellm.completion(**completion_params)
-                content_raw = response.choices[0].message.content.strip()
-                content = extract_json_from_text(content_raw)
+        # ניסיון עם מודל fallback
+        fallback_model = _prepare_gpt_c_fallback(completion_params, model)
+        try:
+            with measure_llm_latency(fallback_model):
+                response = litellm.completion(**completion_params)
+            return _handle_gpt_c_response(response, completion_params, safe_chat_id, message_id, start_time, fallback_used=True)
+        except Exception as fallback_error:
+            _log_gpt_c_failure(fallback_error, fallback_model)
+            return _gpt_c_error_result(fallback_error, fallback_model, completion_params, safe_chat_id, message_id)
 
-                usage = normalize_usage_dict(response.usage, response.model)
-                
-                # ניסיון לפרס JSON עם לוגים מפורטים (fallback)
-                try:
-                    if content and content.strip():
-                        content_clean = content.strip()
-                        if content_clean.startswith("{") and content_clean.endswith("}"):
-                            extracted_fields = json.loads(content_clean)
-                            if not isinstance(extracted_fields, dict):
-                                logger.warning(f"[GPT_C FALLBACK] JSON parsed but not a dict: {type(extracted_fields)}", source="gpt_c_handler")
-                                extracted_fields = {}
-                        else:
-                            logger.warning(f"[GPT_C FALLBACK] Content doesn't look like JSON: {content_clean[:100]}...", source="gpt_c_handler")
-                            extracted_fields = {}
-                    else:
-                        extracted_fields = {}
-                except json.JSONDecodeError as e:
-                    logger.error(f"[GPT_C FALLBACK] JSON decode error: {e} | Content: {content[:200] if content else 'None'}...", source="gpt_c_handler")
-                    extracted_fields = {}
-                except Exception as e:
-                    logger.error(f"[GPT_C FALLBACK] Unexpected error parsing JSON: {e} | Content: {content[:200] if content else 'None'}...", source="gpt_c_handler")
-                    extracted_fields = {}
-                
-                logger.info(f"[gpt_c] Fallback successful: {fallback_model}", source="gpt_c_handler")
-                
-                # הדפסת מידע חשוב על חילוץ נתונים (תמיד יופיע!)
-                print(f"🔍 [GPT-C FALLBACK] חולצו {len(extracted_fields)} שדות: {list(extracted_fields.keys())}")
-                if should_log_gpt_cost_debug():
-                    print(f"💰 [GPT-C FALLBACK] עלות: {usage.get('cost_total', 0):.6f}$ | טוקנים: {usage.get('total_tokens', 0)}")
-                if should_log_data_extraction_debug():
-                    print(f"📋 [GPT-C FALLBACK] נתונים שחולצו: {json.dumps(extracted_fields, ensure_ascii=False, indent=2)}")
-                
-                try:
-                    cost_info = calculate_gpt_cost(
-                        prompt_tokens=usage.get("prompt_tokens", 0),
-                        completion_tokens=usage.get("completion_tokens", 0),
-                        cached_tokens=usage.get("cached_tokens", 0),
-                        model_name=response.model,
-                        completion_response=response
-                    )
-                    usage.update(cost_info)
-                except Exception as _cost_e:
-                    logger.warning(f"[gpt_c] Cost calc failed: {_cost_e}", source="gpt_c_handler")
-                
-                result = {"extracted_fields": extracted_fields, "usage": usage, "model": response.model, "fallback_used": True}
-                try:
-                    from gpt_jsonl_logger import GPTJSONLLogger
-                    # בניית response מלא עם כל המידע הנדרש
-                    response_data = {
-                        "id": getattr(response, "id", ""),
-                        "choices": [
-                            {
-                                "message": {
-                                    "content": content_raw,
-                                    "role": "assistant"
-                                }
-                            }
-                        ],
-                        "usage": usage,
-                        "model": response.model
-                    }
-                    GPTJSONLLogger.log_gpt_call(
-                        log_path="data/openai_calls.jsonl",
-                        gpt_type="C",
-                        request=completion_params,
-                        response=response_data,
-                        cost_usd=usage.get("cost_total", 0),
-                        extra={
-                            "chat_id": safe_chat_id, 
-                            "message_id": message_id,
-                            "gpt_pure_latency": time.time() - start_time,
-                            "processing_time_seconds": time.time() - start_time
-                        }
-                    )
-                except Exception as log_exc:
-                    print(f"[LOGGING_ERROR] Failed to log GPT-C call: {log_exc}")
-                return result
-                
-            except Exception as fallback_error:
-                logger.error(f"[gpt_c] Fallback also failed: {fallback_error}", source="gpt_c_handler")
-                print(f"❌ [GPT-C] שגיאה גם ב-fallback: {fallback_error}")
-                result = {"extracted_fields": {}, "usage": {}, "model": fallback_model}
-                try:
-                    from gpt_jsonl_logger import GPTJSONLLogger
-                    # בניית response ריק במקרה שגיאה
-                    response_data = {
-                        "id": "",
-                        "choices": [
-                            {
-                                "message": {
-                                    "content": f"[שגיאה: {fallback_error}]",
-                                    "role": "assistant"
-                                }
-                            }
-                        ],
-                        "usage": {},
-                        "model": fallback_model
-                    }
-                    GPTJSONLLogger.log_gpt_call(
-                        log_path="data/openai_calls.jsonl",
-                        gpt_type="C",
-                        request=completion_params,
-                        response=response_data,
-                        cost_usd=0,
-                        extra={
-                            "chat_id": safe_chat_id, 
-                            "message_id": message_id,
-                            "gpt_pure_latency": 0,
-                            "processing_time_seconds": 0
-                        }
-                    )
-                except Exception as log_exc:
-                    print(f"[LOGGING_ERROR] Failed to log GPT-C call: {log_exc}")
-                return result
-        else:
-            logger.error(f"[gpt_c] Error (not rate limit): {e}", source="gpt_c_handler")
-            print(f"❌ [GPT-C] שגיאה: {e}")
-            result = {"extracted_fields": {}, "usage": {}, "model": model}
-            try:
-                from gpt_jsonl_logger import GPTJSONLLogger
-                # בניית response ריק במקרה שגיאה
-                response_data = {
-                    "id": "",
-                    "choices": [
-                        {
-                            "message": {
-                                "content": f"[שגיאה: {e}]",
-                                "role": "assistant"
-                            }
-                        }
-                    ],
-                    "usage": {},
-                    "model": model
-                }
-                GPTJSONLLogger.log_gpt_call(
-                    log_path="data/openai_calls.jsonl",
-                    gpt_type="C",
-                    request=completion_params,
-                    response=response_data,
-                    cost_usd=0,
-                    extra={
-                        "chat_id": safe_chat_id, 
-                        "message_id": message_id,
-                        "gpt_pure_latency": 0,
-                        "processing_time_seconds": 0
-                    }
-                )
-            except Exception as log_exc:
-                print(f"[LOGGING_ERROR] Failed to log GPT-C call: {log_exc}")
-            return result
+async def extract_user_info_async(user_msg, chat_id, message_id=None, timeout=None):
+    """
+    גרסה אסינכרונית של extract_user_info (litellm.acompletion) - אותו fallback ואותה תוצאה,
+    בלי להחזיק thread של ה-executor לאורך כל הקריאה ל-LLM.
+    """
+    start_time = time.time()
+    
+    safe_chat_id = safe_str(chat_id)
+    completion_params = _build_gpt_c_completion_params(user_msg, safe_chat_id, message_id)
+    model = completion_params["model"]
+    cache_key = _gpt_c_cache_key(completion_params)
+    cached = await llm_result_cache.get_async(cache_key)
+    if cached:
+        return _gpt_c_cached_result(cached, model)
+    
+    try:
+        with measure_llm_latency(model):
+            response = await acompletion_with_timeout(completion_params, timeout)
+        return _handle_gpt_c_response(response, completion_params, safe_chat_id, message_id, start_time, cache_key=cache_key)
+        
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        if not (_is_rate_limit_error(e) and "gpt_c" in GPT_FALLBACK_MODELS):
+            _log_gpt_c_failure(e)
+            return _gpt_c_error_result(e, model, completion_params, safe_chat_id, message_id)
+        
+        fallback_model = _prepare_gpt_c_fallback(completion_params, model)
+        try:
+            with measure_llm_latency(fallback_model):
+                response = await acompletion_with_timeout(completion_params, timeout)
+            return _handle_gpt_c_response(response, completion_params, safe_chat_id, message_id, start_time, fallback_used=True)
+        except asyncio.CancelledError:
+            raise
+        except Exception as fallback_error:
+            _log_gpt_c_failure(fallback_error, fallback_model)
+            return _gpt_c_error_result(fallback_error, fallback_model, completion_params, safe_chat_id, message_id)
 
 def should_run_gpt_c(user_message):
     """
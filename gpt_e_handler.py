@@ -12,6 +12,7 @@ from decimal import Decimal
 import lazy_litellm as litellm
 
 from simple_logger import logger
+from db_pool import run_db_async
 from config import (
     GPT_MODELS,
     GPT_PARAMS,
@@ -22,15 +23,16 @@ from config import (
 # קבועים מקומיים
 GPT_E_RUN_EVERY_MESSAGES = 10  # כל כמה הודעות להפעיל GPT-E
 GPT_E_SCAN_LAST_MESSAGES = 15  # כמה הודעות אחרונות לסרוק
-from gpt_utils import normalize_usage_dict, calculate_gpt_cost, extract_json_from_text
+from gpt_utils import normalize_usage_dict, calculate_gpt_cost, extract_json_from_text, acompletion_with_timeout
 from prompts import build_profile_extraction_enhanced_prompt
 from user_friendly_errors import safe_str
+from chat_utils import get_total_user_messages_count_async  # ⚡ נדרש לבדיקת ההפעלה - לא ביבוא המותנה
 
 # יבוא מותנה לפונקציות DB
 try:
     from profile_utils import get_user_summary_fast
     from db_wrapper import update_user_summary_wrapper as update_user_summary_fast, reset_gpt_c_run_count_wrapper
-    from chat_utils import get_chat_history_messages, get_user_stats_and_history
+    from chat_utils import get_chat_history_messages
 except ImportError as e:
     logger.error(f"[gpt_e] Failed to import required modules: {e}", source="gpt_e_handler")
 
@@ -66,7 +68,7 @@ async def run_gpt_e(chat_id: str) -> Dict[str, Any]:
     try:
         # שלב 1: אספת היסטוריית שיחות
         logger.info(f"[gpt_e] Fetching chat history for chat_id={safe_chat_id}", source="gpt_e_handler")
-        chat_history = get_chat_history_messages(safe_chat_id, limit=GPT_E_SCAN_LAST_MESSAGES)
+        chat_history = await run_db_async(get_chat_history_messages, safe_chat_id, limit=GPT_E_SCAN_LAST_MESSAGES)
         
         if not chat_history:
             logger.warning(f"[gpt_e] No chat history found for chat_id={safe_chat_id}", source="gpt_e_handler")
@@ -74,7 +76,7 @@ async def run_gpt_e(chat_id: str) -> Dict[str, Any]:
         
         # שלב 2: אספת פרופיל נוכחי
         logger.info(f"[gpt_e] Fetching current profile for chat_id={safe_chat_id}", source="gpt_e_handler")
-        current_profile = get_user_summary_fast(safe_chat_id)
+        current_profile = await run_db_async(get_user_summary_fast, safe_chat_id)
         
         if should_log_data_extraction_debug():
             print(f"[DEBUG] gpt_e_profile | chat={safe_chat_id} | profile='{current_profile[:35]}{'...' if len(current_profile) > 35 else ''}'")
@@ -104,8 +106,8 @@ async def run_gpt_e(chat_id: str) -> Dict[str, Any]:
         if params["max_tokens"] is not None:
             completion_params["max_tokens"] = params["max_tokens"]
         
-        # שליחת בקשה ל-GPT
-        response = litellm.completion(**completion_params)
+        # שליחת בקשה ל-GPT (acompletion - לא חוסם את ה-event loop)
+        response = await acompletion_with_timeout(completion_params)
         
         if not response.choices or not response.choices[0].message.content:
             logger.error(f"[gpt_e] Empty response content from GPT for chat_id={safe_chat_id}", source="gpt_e_handler")
@@ -170,7 +172,7 @@ async def run_gpt_e(chat_id: str) -> Dict[str, Any]:
             try:
                 new_profile = changes.get("updated_profile", "")
                 if new_profile and new_profile.strip():
-                    update_user_summary_fast(safe_chat_id, new_profile)
+                    await run_db_async(update_user_summary_fast, safe_chat_id, new_profile)
                     logger.info(f"[gpt_e] Updated profile for chat_id={safe_chat_id}", source="gpt_e_handler")
                 else:
                     logger.info(f"[gpt_e] No meaningful changes found for chat_id={safe_chat_id}", source="gpt_e_handler")
@@ -255,8 +257,8 @@ async def execute_gpt_e_if_needed(chat_id: str) -> Optional[Dict[str, Any]]:
     safe_chat_id = safe_str(chat_id)
     logger.info(f"[gpt_e] Checking if should run for chat_id={safe_chat_id} (every {GPT_E_RUN_EVERY_MESSAGES} user messages)", source="gpt_e_handler")
     
-    stats, _ = get_user_stats_and_history(safe_chat_id)
-    total_messages = stats.get("total_messages", 0)
+    # ⚡ מונה מתוחזק - O(1), בלי לטעון היסטוריה (ובלי תקרת ההיסטוריה המוגבלת)
+    total_messages = await get_total_user_messages_count_async(safe_chat_id)
     
     if should_run_gpt_e(safe_chat_id, total_messages):
         logger.info(f"[gpt_e] Triggered for chat_id={safe_chat_id} (user sent {total_messages} messages)", source="gpt_e_handler")
@@ -935,89 +935,8 @@ class GPTEHandler:
 # 🛡️ מערכת הגנת חיוב
 # =================================
 
-class BillingProtection:
-    """מערכת הגנה מפני חיובים מופרזים"""
-    
-    def __init__(self, daily_limit_usd: float = 5.0, monthly_limit_usd: float = 50.0):
-        self.daily_limit_usd = daily_limit_usd
-        self.monthly_limit_usd = monthly_limit_usd
-        self.usage_data = self._load_usage()
-    
-    def _load_usage(self) -> Dict:
-        """טען נתוני שימוש"""
-        return {
-            "daily": {},
-            "monthly": {},
-            "alerts_sent": {}
-        }
-    
-    def _get_current_keys(self) -> tuple:
-        """מחזיר מפתחות תאריך נוכחיים"""
-        now = get_israel_time()
-        daily_key = now.strftime("%Y-%m-%d")
-        monthly_key = now.strftime("%Y-%m")
-        return daily_key, monthly_key
-    
-    def add_cost(self, cost_usd: float, model_name: str, tier_type: str = "unknown") -> Dict:
-        """מוסיף עלות לספירה ובודק מגבלות"""
-        daily_key, monthly_key = self._get_current_keys()
-        
-        # עדכון שימוש
-        if daily_key not in self.usage_data["daily"]:
-            self.usage_data["daily"][daily_key] = 0.0
-        if monthly_key not in self.usage_data["monthly"]:
-            self.usage_data["monthly"][monthly_key] = 0.0
-        
-        self.usage_data["daily"][daily_key] += cost_usd
-        self.usage_data["monthly"][monthly_key] += cost_usd
-        
-        # בדיקת מגבלות
-        daily_usage = self.usage_data["daily"][daily_key]
-        monthly_usage = self.usage_data["monthly"][monthly_key]
-        
-        status = {
-            "daily_usage": daily_usage,
-            "daily_limit": self.daily_limit_usd,
-            "daily_percent": (daily_usage / self.daily_limit_usd) * 100,
-            "monthly_usage": monthly_usage,
-            "monthly_limit": self.monthly_limit_usd,
-            "monthly_percent": (monthly_usage / self.monthly_limit_usd) * 100,
-            "cost_added": cost_usd,
-            "model": model_name,
-            "tier": tier_type,
-            "warnings": []
-        }
-        
-        # הוספת אזהרות
-        if daily_usage >= self.daily_limit_usd:
-            status["warnings"].append("🚨 עברת את המגבלה היומית!")
-        elif daily_usage >= self.daily_limit_usd * 0.8:
-            status["warnings"].append("⚠️ השימוש היומי מעל 80%")
-        
-        if monthly_usage >= self.monthly_limit_usd:
-            status["warnings"].append("🚨 עברת את המגבלה החודשית!")
-        elif monthly_usage >= self.monthly_limit_usd * 0.8:
-            status["warnings"].append("⚠️ השימוש החודשי מעל 80%")
-        
-        return status
-    
-    def get_current_status(self) -> Dict:
-        """מחזיר סטטוס נוכחי"""
-        daily_key, monthly_key = self._get_current_keys()
-        
-        daily_usage = self.usage_data["daily"].get(daily_key, 0.0)
-        monthly_usage = self.usage_data["monthly"].get(monthly_key, 0.0)
-        
-        return {
-            "daily_usage": daily_usage,
-            "daily_limit": self.daily_limit_usd,
-            "daily_remaining": max(0, self.daily_limit_usd - daily_usage),
-            "monthly_usage": monthly_usage,
-            "monthly_limit": self.monthly_limit_usd,
-            "monthly_remaining": max(0, self.monthly_limit_usd - monthly_usage),
-            "daily_percent": (daily_usage / self.daily_limit_usd) * 100,
-            "monthly_percent": (monthly_usage / self.monthly_limit_usd) * 100
-        }
+# אותו מימוש כמו ב-gpt_utils - הסכומים בספר החיובים המשותף (billing_ledger), לא במונה נפרד לכל מופע
+from gpt_utils import BillingProtection
 
 # =================================
 # 🧠 מנהל Gemini חכם
@@ -1,17 +1,33 @@
 from simple_logger import logger
 import lazy_litellm as litellm
+import asyncio
 import time
 import os
 import json
 import traceback
 from contextlib import contextmanager
 from datetime import datetime
+from collections import deque
 from config import GEMINI_API_KEY, DATA_DIR, config, should_log_gpt_cost_debug, should_log_debug_prints, GPT_MODELS
+from config import (
+    GPT_HEDGE_LATENCY_PERCENTILE, GPT_HEDGE_DEFAULT_DELAY_SECONDS, GPT_HEDGE_MIN_DELAY_SECONDS,
+    GPT_HEDGE_MAX_DELAY_SECONDS, GPT_HEDGE_MIN_SAMPLES, GPT_HEDGE_LATENCY_WINDOW
+)
 from db_manager import save_gpt_usage_log
+from billing_ledger import billing_ledger
 from user_friendly_errors import safe_str
 
 USD_TO_ILS = 3.7  # שער הדולר-שקל (יש לעדכן לפי הצורך)
 
+async def acompletion_with_timeout(completion_params, timeout=None):
+    """
+    ⚡ קריאת LLM אסינכרונית (litellm.acompletion) - לא חוסמת את ה-event loop.
+    חריגה מה-timeout זורקת asyncio.TimeoutError; ביטול של הקורא מבטל גם את בקשת ה-HTTP.
+    """
+    from simple_config import TimeoutConfig
+    timeout = TimeoutConfig.GPT_PROCESSING_TIMEOUT if timeout is None else timeout
+    return await asyncio.wait_for(litellm.acompletion(**completion_params), timeout=timeout)
+
 @contextmanager
 def measure_llm_latency(model_name):
     """Context manager למדידת זמן תגובה של מודל LLM"""
@@ -29,6 +45,137 @@ def measure_llm_latency(model_name):
             # TODO: Implement performance metric logging if needed
             pass
 
+# 🏁 hedged requests - מודל גיבוי יוצא לדרך כשהקודם איטי מהאחוזון שלו, הראשון שמצליח מנצח
+class ModelLatencyTracker:
+    """זמני תגובה אחרונים (הצלחות בלבד) לכל מודל + מונים של מרוצי hedging"""
+    
+    def __init__(self, percentile=GPT_HEDGE_LATENCY_PERCENTILE, default_delay=GPT_HEDGE_DEFAULT_DELAY_SECONDS,
+                 min_delay=GPT_HEDGE_MIN_DELAY_SECONDS, max_delay=GPT_HEDGE_MAX_DELAY_SECONDS,
+                 min_samples=GPT_HEDGE_MIN_SAMPLES, window=GPT_HEDGE_LATENCY_WINDOW):
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = max(1, min_samples)
+        self.window = max(1, window)
+        self._samples = {}  # model -> deque של זמנים בשניות
+        self._stats = {"races": 0, "hedges_launched": 0, "hedge_wins": 0, "cancelled": 0,
+                       "failures": 0, "paid_skipped": 0, "wins_by_model": {}}
+    
+    def record(self, model, seconds):
+        self._samples.setdefault(model, deque(maxlen=self.window)).append(seconds)
+    
+    def hedge_delay(self, model):
+        """כמה לחכות למודל לפני שמוציאים את הגיבוי: האחוזון שלו, בתוך [min_delay, max_delay]"""
+        samples = self._samples.get(model)
+        if not samples or len(samples) < self.min_samples:
+            return self.default_delay
+        ordered = sorted(samples)
+        value = ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+        return min(self.max_delay, max(self.min_delay, value))
+    
+    def count(self, key, amount=1):
+        self._stats[key] += amount
+    
+    def record_win(self, model, hedged):
+        wins = self._stats["wins_by_model"]
+        wins[model] = wins.get(model, 0) + 1
+        if hedged:
+            self._stats["hedge_wins"] += 1
+    
+    def get_stats(self):
+        stats = dict(self._stats, wins_by_model=dict(self._stats["wins_by_model"]))
+        stats["hedge_delay_by_model"] = {model: round(self.hedge_delay(model), 2) for model in self._samples}
+        return stats
+
+
+# 🌐 מופע יחיד לכל התהליך
+model_latency = ModelLatencyTracker()
+
+
+def _paid_model_allowed():
+    """BillingProtection: בחריגה מהמגבלה לא מפעילים מודל בתשלום בכלל"""
+    level, _ = billing_guard.get_alert_level()
+    return level != "critical"
+
+
+async def hedged_completion(candidates, completion_params, call=None, tracker=None):
+    """
+    מרוץ מודלים עם hedging במקום מעבר סדרתי ביניהם.
+    
+    candidates: [(model, is_paid), ...] לפי סדר עדיפות. הראשון יוצא מיד; הבא יוצא כשהקודם
+    לא ענה תוך tracker.hedge_delay(model) (האחוזון שלו), או מיד כשהקודם נכשל.
+    💰 מודל בתשלום לא יוצא ספקולטיבית (רק מודל קודם איטי) - רק אחרי כישלון אמיתי.
+    התשובה המוצלחת הראשונה מנצחת וכל השאר מבוטלות (ביטול acompletion מבטל גם את בקשת ה-HTTP).
+    call(params) - ברירת מחדל acompletion_with_timeout; ה-timeout הכולל באחריות הקורא.
+    
+    Returns:
+        (response, params) - params עם model של המנצח
+    Raises:
+        השגיאה של המודל הראשון אם כולם נכשלו
+    """
+    tracker = tracker or model_latency
+    call = call or acompletion_with_timeout
+    waiting = list(candidates)
+    running = {}  # task -> (params, started)
+    errors = []
+    last_launch = {"model": None, "at": 0.0}
+    tracker.count("races")
+    
+    def launch_next(speculative):
+        while waiting:
+            model, is_paid = waiting[0]
+            if is_paid and speculative:
+                return False  # ממתין לכישלון אמיתי - לא משלמים על קריאה כפולה
+            waiting.pop(0)
+            if is_paid and not _paid_model_allowed():
+                tracker.count("paid_skipped")
+                logger.info(f"💰 [HEDGE] מדלג על {model} - מגבלת חיוב")
+                continue
+            params = dict(completion_params, model=model)
+            running[asyncio.ensure_future(call(params))] = (params, time.monotonic())
+            last_launch.update(model=model, at=time.monotonic())
+            if speculative:
+                tracker.count("hedges_launched")
+                logger.info(f"🏁 [HEDGE] מודל גיבוי יצא לדרך: {model}")
+            return True
+        return False
+    
+    try:
+        launch_next(speculative=False)
+        while running:
+            delay = None
+            if waiting and not waiting[0][1]:
+                delay = max(0.0, tracker.hedge_delay(last_launch["model"]) - (time.monotonic() - last_launch["at"]))
+            done, _ = await asyncio.wait(list(running), timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                launch_next(speculative=True)
+                continue
+            failed = False
+            for task in done:
+                params, started = running.pop(task)
+                try:
+                    response = task.result()
+                except Exception as e:
+                    failed = True
+                    tracker.count("failures")
+                    errors.append(e)
+                    logger.warning(f"⚠️ [HEDGE] {params['model']} נכשל: {e!r}")
+                    continue
+                tracker.record(params["model"], time.monotonic() - started)
+                tracker.record_win(params["model"], hedged=params["model"] != candidates[0][0])
+                return response, params
+            if failed:
+                # כישלון = המודל הבא יוצא מיד, בלי לחכות להשהיית ה-hedge
+                launch_next(speculative=False)
+        if errors:
+            raise errors[0]
+        raise Exception("❌ אין מודל זמין למרוץ (כל המודלים דולגו)")
+    finally:
+        for task in running:
+            task.cancel()
+            tracker.count("cancelled")
+
 # 🧠 מערכת fallback חכמה - חינמי → בתשלום
 class SmartGeminiManager:
     """
@@ -235,6 +382,27 @@ def calculate_gpt_cost(prompt_tokens, completion_tokens, cached_tokens=0, model_
             "model": model_name
         }
 
+def extract_cached_tokens(usage):
+    """
+    טוקנים של הפרומפט שהספק הגיש מה-prompt cache - בכל אחד מהמקומות שבהם הם מגיעים:
+    prompt_tokens_details.cached_tokens (OpenAI / litellm), cache_read_input_tokens (Anthropic)
+    או cached_tokens ישירות. עובד גם על אובייקט usage וגם על dict.
+    """
+    def _get(obj, name):
+        value = obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return int(value)
+        return value
+    
+    candidates = []
+    details = _get(usage, 'prompt_tokens_details')
+    if details is not None:
+        candidates.append(_get(details, 'cached_tokens'))
+    candidates.append(_get(usage, 'cache_read_input_tokens'))
+    candidates.append(_get(usage, 'cached_tokens'))
+    candidates.append(_get(usage, 'prompt_tokens_cached'))
+    return max([value for value in candidates if isinstance(value, int)] or [0])
+
 def normalize_usage_dict(usage, model_name=""):
     """
     מנרמל מילון usage של gpt לפורמט אחיד (לוגים/דוחות).
@@ -252,14 +420,7 @@ def normalize_usage_dict(usage, model_name=""):
                 "total_tokens": safe_get_usage_value(usage, 'total_tokens', 0),
             }
             
-            # נחפש cached_tokens במקומות השונים שהם יכולים להיות
-            cached_tokens = 0
-            if hasattr(usage, 'prompt_tokens_details'):
-                cached_tokens = safe_get_usage_value(usage.prompt_tokens_details, 'cached_tokens', 0)
-            elif hasattr(usage, 'cached_tokens'):
-                cached_tokens = safe_get_usage_value(usage, 'cached_tokens', 0)
-            
-            result["cached_tokens"] = cached_tokens
+            result["cached_tokens"] = extract_cached_tokens(usage)
             result["model"] = model_name
             return result
         except Exception as e:
@@ -268,9 +429,10 @@ def normalize_usage_dict(usage, model_name=""):
             # fallback לנירמול פשוט
             return {"model": model_name, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cached_tokens": 0}
     
-    # אם זה כבר dict, פשוט נוסיף את המודל
+    # אם זה כבר dict, נוסיף את המודל (ו-cached_tokens מהמבנה המקונן אם צריך)
     if isinstance(usage, dict):
         result = dict(usage)
+        result["cached_tokens"] = extract_cached_tokens(usage)
         result["model"] = model_name
         return result
     
@@ -284,61 +446,17 @@ class BillingProtection:
     🛡️ מערכת הגנה מפני חיובים מופרזים
     """
     
-    def __init__(self, daily_limit_usd=5.0, monthly_limit_usd=50.0):
+    def __init__(self, daily_limit_usd=5.0, monthly_limit_usd=50.0, ledger=None):
         self.daily_limit_usd = daily_limit_usd      # מגבלה יומית: $5
         self.monthly_limit_usd = monthly_limit_usd  # מגבלה חודשית: $50
         
-        # הסרת הצורך בתיקיית data - כל הנתונים במסד הנתונים
-        self.usage_data = self._load_usage()
-    
-    def _ensure_data_dir(self):
-        """ודא שתיקיית data קיימת - לא נדרש יותר"""
-        pass  # לא נדרש יותר - מסד הנתונים
-    
-    def _load_usage(self):
-        """טען נתוני שימוש ממסד הנתונים"""
-        try:
-            # 🚫 DISABLED: billing_usage table הושבתה - נתוני חיוב מ-gpt_calls_log
-            if should_log_debug_prints():
-                print(f"🔄 [DISABLED] billing_usage disabled - using default billing data structure")
-            
-            # ברירת מחדל - נתוני חיוב ריקים (יתמלאו מ-gpt_calls_log בעתיד)
-            return {
-                "daily": {},    # {"2025-01-20": 1.25}
-                "monthly": {},  # {"2025-01": 15.30}
-                "alerts_sent": {}
-            }
-            
-            # הקוד הישן הושבת:
-            # from db_manager import get_billing_usage_data
-            # data = get_billing_usage_data()
-            
-        except Exception as e:
-            if should_log_debug_prints():
-                print(f"[WARNING] Error loading billing usage from DB: {e}")
-        
-        # ברירת מחדל
-        return {
-            "daily": {},    # {"2025-01-20": 1.25}
-            "monthly": {},  # {"2025-01": 15.30}
-            "alerts_sent": {}
-        }
+        # 💰 ההוצאה נספרת בספר החיובים המשותף (billing_ledger) - שורדת restart ומשותפת לכל ה-workers
+        self.ledger = ledger if ledger is not None else billing_ledger
     
-    def _save_usage(self):
-        """שמור נתוני שימוש למסד הנתונים"""
-        try:
-            # 🚫 DISABLED: billing_usage table הושבתה - נתוני חיוב נשמרים ב-gpt_calls_log
-            if should_log_debug_prints():
-                print(f"🔄 [DISABLED] billing_usage disabled - billing data saved in gpt_calls_log")
-            return  # לא שומר לטבלה המיותרת
-            
-            # הקוד הישן הושבת:
-            # from db_manager import save_billing_usage_data
-            # save_billing_usage_data(self.usage_data)
-            
-        except Exception as e:
-            if should_log_debug_prints():
-                print(f"⚠️ שגיאה בשמירת נתוני שימוש למסד הנתונים: {e}")
+    def _get_usage(self):
+        """הוצאה יומית וחודשית נוכחית - מהזיכרון בלבד (O(1), בלי DB)"""
+        daily_key, monthly_key = self._get_current_keys()
+        return self.ledger.get(f"usd:day:{daily_key}"), self.ledger.get(f"usd:month:{monthly_key}")
     
     def _get_current_keys(self):
         """מחזיר מפתחות תאריך נוכחיים"""
@@ -362,32 +480,13 @@ class BillingProtection:
         """
         daily_key, monthly_key = self._get_current_keys()
         
-        # עדכון שימוש יומי
-        if daily_key not in self.usage_data["daily"]:
-            self.usage_data["daily"][daily_key] = 0.0
-        self.usage_data["daily"][daily_key] += cost_usd
-        
-        # עדכון שימוש חודשי
-        if monthly_key not in self.usage_data["monthly"]:
-            self.usage_data["monthly"][monthly_key] = 0.0
-        self.usage_data["monthly"][monthly_key] += cost_usd
-        
-        # 🔧 תיקון זליגת זיכרון: הגבלת מספר רשומות ישנות
-        # שמירה על מקסימום 60 ימים של נתונים יומיים
-        if len(self.usage_data["daily"]) > 60:
-            old_keys = sorted(self.usage_data["daily"].keys())[:-30]  # שמור רק 30 ימים אחרונים
-            for old_key in old_keys:
-                del self.usage_data["daily"][old_key]
-        
-        # שמירה על מקסימום 12 חודשים של נתונים חודשיים  
-        if len(self.usage_data["monthly"]) > 12:
-            old_keys = sorted(self.usage_data["monthly"].keys())[:-6]  # שמור רק 6 חודשים אחרונים
-            for old_key in old_keys:
-                del self.usage_data["monthly"][old_key]
+        # עדכון שימוש יומי וחודשי - נכתב ל-DB ברקע (הוספה אטומית)
+        if cost_usd:
+            self.ledger.add(f"usd:day:{daily_key}", cost_usd)
+            self.ledger.add(f"usd:month:{monthly_key}", cost_usd)
         
         # בדיקת מגבלות
-        daily_usage = self.usage_data["daily"][daily_key]
-        monthly_usage = self.usage_data["monthly"][monthly_key]
+        daily_usage, monthly_usage = self._get_usage()
         
         status = {
             "daily_usage": daily_usage,
@@ -413,17 +512,11 @@ class BillingProtection:
         elif monthly_usage >= self.monthly_limit_usd * 0.8:
             status["warnings"].append("⚠️ השימוש החודשי מעל 80%")
         
-        # שמירה
-        self._save_usage()
-        
         return status
     
     def get_current_status(self):
         """מחזיר סטטוס נוכחי ללא הוספת עלות"""
-        daily_key, monthly_key = self._get_current_keys()
-        
-        daily_usage = self.usage_data["daily"].get(daily_key, 0.0)
-        monthly_usage = self.usage_data["monthly"].get(monthly_key, 0.0)
+        daily_usage, monthly_usage = self._get_usage()
         
         return {
             "daily_usage": daily_usage,
@@ -477,46 +570,30 @@ billing_guard = BillingProtection(
     monthly_limit_usd=50.0  # $50 לחודש
 )
 
+def _free_calls_key(model, day=None):
+    from utils import get_israel_time
+    return f"free_calls:{day or get_israel_time().strftime('%Y-%m-%d')}:{model}"
+
 def _load_daily_limits():
-    """טוען מגבלות יומיות ממסד הנתונים ומאפס אם יום חדש."""
+    """
+    מספר הקריאות היום לכל מודל חינמי - מספר החיובים המשותף (billing_ledger), בלי DB בנתיב החם.
+    מפתח התאריך הוא חלק מהמונה, כך שיום חדש מתחיל מאפס מעצמו.
+    """
     from utils import get_israel_time
     today_str = get_israel_time().strftime("%Y-%m-%d")
-    
-    try:
-        # 🚫 DISABLED: free_model_limits table הושבתה - מגבלות מנוהלות בקונפיג
-        if should_log_debug_prints():
-            print(f"🔄 [DISABLED] free_model_limits disabled - using config-based limits")
-        
-        daily_limits = {"date": today_str}  # ברירת מחדל
-        
-        # הקוד הישן הושבת:
-        # from db_manager import get_free_model_limits_data
-        # daily_limits = get_free_model_limits_data()
-        
-    except Exception as e:
-        if should_log_debug_prints():
-            print(f"[WARNING] Error loading limits from DB: {e}")
-        daily_limits = {}
-    
-    if daily_limits.get("date") != today_str:
-        daily_limits = {"date": today_str}
-        try:
-            # 🚫 DISABLED: free_model_limits table הושבתה
-            if should_log_debug_prints():
-                print(f"🔄 [DISABLED] free_model_limits disabled - limits managed in config")
-            
-            # הקוד הישן הושבת:
-            # from db_manager import save_free_model_limits_data
-            # save_free_model_limits_data(daily_limits)
-            
-        except Exception as e:
-            if should_log_debug_prints():
-                print(f"⚠️ שגיאה בשמירת מגבלות למסד הנתונים: {e}")
-        if should_log_debug_prints():
-            print(f"🔄 יום חדש! מאפס מגבלות חינמיות ({today_str})")
-    
+    daily_limits = {"date": today_str}
+    for model in config.get("FREE_MODELS", []):
+        daily_limits[model] = int(billing_ledger.get(_free_calls_key(model, today_str)))
     return daily_limits
 
+def _record_free_model_call(model, daily_limits, exhausted=False):
+    """עדכון מונה הקריאות של מודל חינמי - exhausted מסמן את המכסה היומית כמלאה (quota / rate limit)"""
+    free_limit = config.get("FREE_MODEL_DAILY_LIMIT", 100)
+    current = daily_limits.get(model, 0)
+    increment = max(free_limit - current, 0) if exhausted else 1
+    daily_limits[model] = current + increment
+    billing_ledger.add(_free_calls_key(model, daily_limits.get("date")), increment)
+
 def _try_single_model(model, full_messages, completion_params, is_paid=False):
     """מנסה מודל יחיד ומחזיר תגובה או None אם נכשל."""
     try:
@@ -532,7 +609,7 @@ def _try_single_model(model, full_messages, completion_params, is_paid=False):
         
         if should_log_debug_prints():
             print(f"✅ הצלחה עם מודל: {model}")
-        return response
+        return response, None
         
     except Exception as e:
         if should_log_debug_prints():
@@ -553,37 +630,13 @@ def try_free_models_first(full_messages, **completion_params):
         response, error = _try_single_model(free_model, full_messages, completion_params, is_paid=False)
         if response:
             # עדכון מונה השימוש
-            daily_limits[free_model] = daily_limits.get(free_model, 0) + 1
-            try:
-                # 🚫 DISABLED: free_model_limits table הושבתה
-                if should_log_debug_prints():
-                    print(f"🔄 [DISABLED] free_model_limits disabled - limits managed in memory")
-                
-                # הקוד הישן הושבת:
-                # from db_manager import save_free_model_limits_data
-                # save_free_model_limits_data(daily_limits)
-                
-            except Exception as e:
-                if should_log_debug_prints():
-                    print(f"⚠️ שגיאה בשמירת מגבלות למסד הנתונים: {e}")
+            _record_free_model_call(free_model, daily_limits)
             return response
         
         # טיפול בשגיאות מודל חינמי
         error_msg = str(error).lower()
         if "quota" in error_msg or "rate limit" in error_msg:
-            daily_limits[free_model] = config.get("FREE_MODEL_DAILY_LIMIT", 100)
-            try:
-                # 🚫 DISABLED: free_model_limits table הושבתה
-                if should_log_debug_prints():
-                    print(f"🔄 [DISABLED] free_model_limits disabled - limits managed in memory")
-                
-                # הקוד הישן הושבת:
-                # from db_manager import save_free_model_limits_data
-                # save_free_model_limits_data(daily_limits)
-                
-            except Exception as e:
-                if should_log_debug_prints():
-                    print(f"⚠️ שגיאה בשמירת מגבלות למסד הנתונים: {e}")
+            _record_free_model_call(free_model, daily_limits, exhausted=True)
     
     # מעבר למודלים בתשלום
     if should_log_debug_prints():
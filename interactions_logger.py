@@ -2,27 +2,72 @@
 """
 🔥 Interactions Logger - מערכת רישום מלא לכל אינטראקציה
 כל שורה = אינטראקציה מלאה עם כל הפרטים
+
+⚡ כתיבה מקובצת (interactions_writer): בדיקת מבנה הטבלה ו-commit hash נעשות פעם אחת
+בעלייה, והשורות נאספות ונכתבות ב-INSERT מרובה שורות אחד כשמצטברות
+INTERACTIONS_LOG_BATCH_SIZE שורות או אחרי INTERACTIONS_LOG_FLUSH_SECONDS.
 """
 import sys
 sys.path.append('.')
-from config import get_config
-import psycopg2
+import asyncio
+import os
+from config import get_config, INTERACTIONS_LOG_BATCH_SIZE, INTERACTIONS_LOG_FLUSH_SECONDS
+from db_pool import get_connection, run_db_async
+from psycopg2.extras import execute_values
 import subprocess
 import json
 from datetime import datetime
 from decimal import Decimal
-from typing import Dict, Any, Optional, Union
+from typing import Dict, Any, List, Optional, Union
 from utils import safe_str, get_israel_time
 
+# עמודות השורה המלאה - בסדר של build_complete_row
+COMPLETE_INSERT_COLUMNS = """
+    telegram_message_id, chat_id, full_system_prompts, user_msg, bot_msg,
+    
+    gpt_a_model, gpt_a_cost_agorot, gpt_a_processing_time, gpt_a_tokens_input, gpt_a_tokens_output, gpt_a_tokens_cached,
+    
+    gpt_b_activated, gpt_b_reply, gpt_b_model, gpt_b_cost_agorot, gpt_b_processing_time, 
+    gpt_b_tokens_input, gpt_b_tokens_output, gpt_b_tokens_cached,
+    
+    gpt_c_activated, gpt_c_reply, gpt_c_model, gpt_c_cost_agorot, gpt_c_processing_time,
+    gpt_c_tokens_input, gpt_c_tokens_output, gpt_c_tokens_cached,
+    
+    gpt_d_activated, gpt_d_reply, gpt_d_model, gpt_d_cost_agorot, gpt_d_processing_time,
+    gpt_d_tokens_input, gpt_d_tokens_output, gpt_d_tokens_cached,
+    
+    gpt_e_activated, gpt_e_reply, gpt_e_model, gpt_e_cost_agorot, gpt_e_processing_time,
+    gpt_e_tokens_input, gpt_e_tokens_output, gpt_e_tokens_cached, gpt_e_counter,
+    
+    timestamp, date_only, time_only, user_to_bot_response_time, background_processing_time,
+    history_user_messages_count, history_bot_messages_count,
+    
+    total_cost_agorot, source_commit_hash, admin_notification_text
+"""
+COMPLETE_INSERT_COLUMN_NAMES = tuple(name.strip() for name in COMPLETE_INSERT_COLUMNS.split(","))
+COMPLETE_BATCH_INSERT_SQL = f"INSERT INTO interactions_log ({COMPLETE_INSERT_COLUMNS}) VALUES %s RETURNING serial_number"
+
 class InteractionsLogger:
     """מחלקה לרישום מלא של כל אינטראקציה"""
     
     def __init__(self):
         self.config = get_config()
         self.db_url = self.config.get("DATABASE_EXTERNAL_URL") or self.config.get("DATABASE_URL")
+        self._commit_hash: Optional[str] = None  # נקבע פעם אחת לכל תהליך
+        self._schema_ready = False  # ensure_table_schema הצליח פעם אחת - אין צורך לבדוק שוב
+    
+    def prepare(self) -> bool:
+        """קריאה אחת בעלייה: בדיקת מבנה הטבלה וקביעת ה-commit hash (חוסם - להריץ ב-executor)"""
+        self.get_current_commit_hash()
+        return self.ensure_table_schema()
         
     def get_current_commit_hash(self) -> str:
-        """קבלת ה-commit hash הנוכחי"""
+        """קבלת ה-commit hash הנוכחי (מחושב פעם אחת - git לא משתנה בזמן ריצה)"""
+        if self._commit_hash is None:
+            self._commit_hash = os.getenv("RENDER_GIT_COMMIT", "")[:12] or self._read_git_commit_hash()
+        return self._commit_hash
+    
+    def _read_git_commit_hash(self) -> str:
         try:
             from simple_config import TimeoutConfig
             result = subprocess.run(['git', 'rev-parse', 'HEAD'], 
@@ -115,6 +160,147 @@ class InteractionsLogger:
         
         return (user_count, bot_count)
     
+    def build_complete_row(self, 
+                           chat_id: Union[str, int],
+                           telegram_message_id: Optional[str],
+                           user_msg: str,
+                           bot_msg: str,
+                           messages_for_gpt: list,
+                           gpt_results: Dict[str, Any],
+                           timing_data: Dict[str, float],
+                           admin_notification: Optional[str] = None,
+                           gpt_e_counter: Optional[str] = None) -> tuple:
+        """
+        הכנת שורת ערכים מלאה ל-interactions_log (בסדר של COMPLETE_INSERT_COLUMNS) - בלי גישה ל-DB
+        
+        Args: כמו log_complete_interaction
+        
+        Returns:
+            tuple: הערכים לשורה אחת
+        """
+        # 🔧 תיקון קריטי: שמירה בזמן ישראל תמיד!
+        now = get_israel_time()
+        commit_hash = self.get_current_commit_hash()
+        full_system_prompts = self.format_system_prompts(messages_for_gpt)
+        
+        # חילוץ נתוני GPT לכל סוג
+        gpt_data = {}
+        for gpt_type in ['a', 'b', 'c', 'd', 'e']:
+            gpt_data[gpt_type] = self.extract_gpt_data(gpt_type, gpt_results.get(gpt_type))
+        
+        # חישוב עלות כוללת
+        total_cost_agorot = self.calculate_total_cost(gpt_results)
+        
+        # חישוב זמני עיבוד
+        user_to_bot_time = timing_data.get('user_to_bot', 0)
+        total_time = timing_data.get('total', user_to_bot_time)
+        background_time = max(0, total_time - user_to_bot_time)
+        
+        # ספירת הודעות היסטוריה
+        history_user_count, history_bot_count = self.count_history_messages(messages_for_gpt)
+        
+        return (
+            telegram_message_id,
+            int(safe_str(chat_id)),
+            full_system_prompts,
+            user_msg,
+            bot_msg,
+            
+            # GPT-A
+            gpt_data['a']['model'],
+            gpt_data['a']['cost_agorot'],
+            gpt_data['a']['processing_time'],
+            gpt_data['a']['tokens_input'],
+            gpt_data['a']['tokens_output'],
+            gpt_data['a']['tokens_cached'],
+            
+            # GPT-B
+            gpt_data['b']['activated'],
+            gpt_data['b']['reply'],
+            gpt_data['b']['model'],
+            gpt_data['b']['cost_agorot'],
+            gpt_data['b']['processing_time'],
+            gpt_data['b']['tokens_input'],
+            gpt_data['b']['tokens_output'],
+            gpt_data['b']['tokens_cached'],
+            
+            # GPT-C
+            gpt_data['c']['activated'],
+            gpt_data['c']['reply'],
+            gpt_data['c']['model'],
+            gpt_data['c']['cost_agorot'],
+            gpt_data['c']['processing_time'],
+            gpt_data['c']['tokens_input'],
+            gpt_data['c']['tokens_output'],
+            gpt_data['c']['tokens_cached'],
+            
+            # GPT-D
+            gpt_data['d']['activated'],
+            gpt_data['d']['reply'],
+            gpt_data['d']['model'],
+            gpt_data['d']['cost_agorot'],
+            gpt_data['d']['processing_time'],
+            gpt_data['d']['tokens_input'],
+            gpt_data['d']['tokens_output'],
+            gpt_data['d']['tokens_cached'],
+            
+            # GPT-E
+            gpt_data['e']['activated'],
+            gpt_data['e']['reply'],
+            gpt_data['e']['model'],
+            gpt_data['e']['cost_agorot'],
+            gpt_data['e']['processing_time'],
+            gpt_data['e']['tokens_input'],
+            gpt_data['e']['tokens_output'],
+            gpt_data['e']['tokens_cached'],
+            gpt_e_counter,
+            
+            # זמנים
+            now,
+            now.date(),
+            now.time(),
+            user_to_bot_time,
+            background_time,
+            
+            # היסטוריה
+            history_user_count,
+            history_bot_count,
+            
+            # מטאדאטה
+            total_cost_agorot,
+            commit_hash,
+            admin_notification
+        )
+    
+    def insert_complete_rows(self, rows: List[tuple]) -> List[Optional[int]]:
+        """
+        כתיבת כמה שורות (מ-build_complete_row) ב-INSERT אחד מרובה שורות.
+        רץ ב-executor של ה-DB. מחזיר serial_number לכל שורה, באותו סדר.
+        """
+        if not rows:
+            return []
+        if not self.db_url:
+            print("❌ [InteractionsLogger] לא נמצא URL למסד הנתונים")
+            return [None] * len(rows)
+        if not self.ensure_table_schema():
+            raise RuntimeError("interactions_log schema check failed")
+        
+        conn = get_connection(self.db_url)
+        try:
+            cur = conn.cursor()
+            # 🔧 הגדרת timezone למסד הנתונים לזמן ישראל (פעם אחת לכל batch)
+            cur.execute("SET timezone TO 'Asia/Jerusalem'")
+            # Postgres מחזיר את RETURNING של INSERT ... VALUES לפי סדר השורות
+            result = execute_values(cur, COMPLETE_BATCH_INSERT_SQL, rows, page_size=len(rows), fetch=True)
+            conn.commit()
+            cur.close()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        return [row[0] for row in result]
+    
     def log_complete_interaction(self, 
                                 chat_id: Union[str, int],
                                 telegram_message_id: Optional[str],
@@ -126,7 +312,8 @@ class InteractionsLogger:
                                 admin_notification: Optional[str] = None,
                                 gpt_e_counter: Optional[str] = None) -> Optional[int]:
         """
-        רישום אינטראקציה מלאה לטבלה
+        רישום אינטראקציה מלאה לטבלה - מיד, בלי batch.
+        ⚡ מתוך קוד async עדיף log_interaction_async (interactions_writer).
         
         Args:
             chat_id: מזהה משתמש
@@ -147,163 +334,13 @@ class InteractionsLogger:
             print("❌ [InteractionsLogger] לא נמצא URL למסד הנתונים")
             return None
         
-        # וידוא שהטבלה קיימת עם השדות החדשים
-        if not self.ensure_table_schema():
-            print("❌ [InteractionsLogger] כשל בעדכון מבנה הטבלה")
-            return None
-        
         try:
-            conn = psycopg2.connect(self.db_url)
-            cur = conn.cursor()
-            
-            # 🔧 הגדרת timezone למסד הנתונים לזמן ישראל
-            cur.execute("SET timezone TO 'Asia/Jerusalem'")
-            
-            # הכנת נתונים בסיסיים
-            # 🔧 תיקון קריטי: שמירה בזמן ישראל תמיד!
-            from utils import get_israel_time
-            now = get_israel_time()
-            commit_hash = self.get_current_commit_hash()
-            full_system_prompts = self.format_system_prompts(messages_for_gpt)
-            
-            # חילוץ נתוני GPT לכל סוג
-            gpt_data = {}
-            for gpt_type in ['a', 'b', 'c', 'd', 'e']:
-                gpt_data[gpt_type] = self.extract_gpt_data(gpt_type, gpt_results.get(gpt_type))
-            
-            # חישוב עלות כוללת
-            total_cost_agorot = self.calculate_total_cost(gpt_results)
-            
-            # חישוב זמני עיבוד
-            user_to_bot_time = timing_data.get('user_to_bot', 0)
-            total_time = timing_data.get('total', user_to_bot_time)
-            background_time = max(0, total_time - user_to_bot_time)
-            
-            # ספירת הודעות היסטוריה
-            history_user_count, history_bot_count = self.count_history_messages(messages_for_gpt)
-            
-            # הכנת SQL
-            insert_sql = """
-            INSERT INTO interactions_log (
-                telegram_message_id, chat_id, full_system_prompts, user_msg, bot_msg,
-                
-                gpt_a_model, gpt_a_cost_agorot, gpt_a_processing_time, gpt_a_tokens_input, gpt_a_tokens_output, gpt_a_tokens_cached,
-                
-                gpt_b_activated, gpt_b_reply, gpt_b_model, gpt_b_cost_agorot, gpt_b_processing_time, 
-                gpt_b_tokens_input, gpt_b_tokens_output, gpt_b_tokens_cached,
-                
-                gpt_c_activated, gpt_c_reply, gpt_c_model, gpt_c_cost_agorot, gpt_c_processing_time,
-                gpt_c_tokens_input, gpt_c_tokens_output, gpt_c_tokens_cached,
-                
-                gpt_d_activated, gpt_d_reply, gpt_d_model, gpt_d_cost_agorot, gpt_d_processing_time,
-                gpt_d_tokens_input, gpt_d_tokens_output, gpt_d_tokens_cached,
-                
-                gpt_e_activated, gpt_e_reply, gpt_e_model, gpt_e_cost_agorot, gpt_e_processing_time,
-                gpt_e_tokens_input, gpt_e_tokens_output, gpt_e_tokens_cached, gpt_e_counter,
-                
-                timestamp, date_only, time_only, user_to_bot_response_time, background_processing_time,
-                history_user_messages_count, history_bot_messages_count,
-                
-                total_cost_agorot, source_commit_hash, admin_notification_text
-            ) VALUES (
-                %s, %s, %s, %s, %s,
-                %s, %s, %s, %s, %s, %s,
-                %s, %s, %s, %s, %s, %s, %s, %s,
-                %s, %s, %s, %s, %s, %s, %s, %s,
-                %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                %s, %s, %s, %s, %s,
-                %s, %s,
-                %s, %s, %s
-            ) RETURNING serial_number
-            """
-            
-            # הכנת הערכים
-            values = (
-                telegram_message_id,
-                int(safe_str(chat_id)),
-                full_system_prompts,
-                user_msg,
-                bot_msg,
-                
-                # GPT-A
-                gpt_data['a']['model'],
-                gpt_data['a']['cost_agorot'],
-                gpt_data['a']['processing_time'],
-                gpt_data['a']['tokens_input'],
-                gpt_data['a']['tokens_output'],
-                gpt_data['a']['tokens_cached'],
-                
-                # GPT-B
-                gpt_data['b']['activated'],
-                gpt_data['b']['reply'],
-                gpt_data['b']['model'],
-                gpt_data['b']['cost_agorot'],
-                gpt_data['b']['processing_time'],
-                gpt_data['b']['tokens_input'],
-                gpt_data['b']['tokens_output'],
-                gpt_data['b']['tokens_cached'],
-                
-                # GPT-C
-                gpt_data['c']['activated'],
-                gpt_data['c']['reply'],
-                gpt_data['c']['model'],
-                gpt_data['c']['cost_agorot'],
-                gpt_data['c']['processing_time'],
-                gpt_data['c']['tokens_input'],
-                gpt_data['c']['tokens_output'],
-                gpt_data['c']['tokens_cached'],
-                
-                # GPT-D
-                gpt_data['d']['activated'],
-                gpt_data['d']['reply'],
-                gpt_data['d']['model'],
-                gpt_data['d']['cost_agorot'],
-                gpt_data['d']['processing_time'],
-                gpt_data['d']['tokens_input'],
-                gpt_data['d']['tokens_output'],
-                gpt_data['d']['tokens_cached'],
-                
-                # GPT-E
-                gpt_data['e']['activated'],
-                gpt_data['e']['reply'],
-                gpt_data['e']['model'],
-                gpt_data['e']['cost_agorot'],
-                gpt_data['e']['processing_time'],
-                gpt_data['e']['tokens_input'],
-                gpt_data['e']['tokens_output'],
-                gpt_data['e']['tokens_cached'],
-                gpt_e_counter,
-                
-                # זמנים
-                now,
-                now.date(),
-                now.time(),
-                user_to_bot_time,
-                background_time,
-                
-                # היסטוריה
-                history_user_count,
-                history_bot_count,
-                
-                # מטאדאטה
-                total_cost_agorot,
-                commit_hash,
-                admin_notification
+            values = self.build_complete_row(
+                chat_id, telegram_message_id, user_msg, bot_msg, messages_for_gpt,
+                gpt_results, timing_data, admin_notification, gpt_e_counter
             )
-            
-            cur.execute(insert_sql, values)
-            serial_number = cur.fetchone()[0]
-            
-            conn.commit()
-            cur.close()
-            conn.close()
-            
-            print(f"✅ [InteractionsLogger] אינטראקציה #{serial_number} נרשמה בהצלחה")
-            print(f"   💰 עלות כוללת: {total_cost_agorot:.2f} אגורות")
-            print(f"   ⏱️ זמן תגובה: {user_to_bot_time:.2f}s | רקע: {background_time:.2f}s")
-            print(f"   📊 היסטוריה: {history_user_count} משתמש + {history_bot_count} בוט")
-            
+            serial_number = self.insert_complete_rows([values])[0]
+            print_logged_interaction(serial_number, values)
             return serial_number
             
         except Exception as e:
@@ -335,11 +372,10 @@ class InteractionsLogger:
             return None
         
         try:
-            conn = psycopg2.connect(self.db_url)
+            conn = get_connection(self.db_url)
             cur = conn.cursor()
             
             # 🔧 תיקון קריטי: שמירה בזמן ישראל תמיד!
-            from utils import get_israel_time
             now = get_israel_time()
             commit_hash = self.get_current_commit_hash()
             
@@ -378,12 +414,14 @@ class InteractionsLogger:
             return None
 
     def ensure_table_schema(self):
-        """וידוא שהטבלה קיימת עם השדות החדשים"""
+        """וידוא שהטבלה קיימת עם השדות החדשים (בודק מול ה-DB רק עד ההצלחה הראשונה)"""
         if not self.db_url:
             return False
+        if self._schema_ready:
+            return True
         
         try:
-            conn = psycopg2.connect(self.db_url)
+            conn = get_connection(self.db_url)
             cur = conn.cursor()
             
             # בדיקה אם הטבלה קיימת
@@ -495,6 +533,7 @@ class InteractionsLogger:
             conn.commit()
             cur.close()
             conn.close()
+            self._schema_ready = True
             return True
             
         except Exception as e:
@@ -516,6 +555,141 @@ def log_interaction(**kwargs) -> Optional[int]:
     logger = get_interactions_logger()
     return logger.log_complete_interaction(**kwargs)
 
+
+class InteractionsBatchWriter:
+    """
+    תור כתיבה ל-interactions_log: שורות מצטברות בזיכרון ונכתבות ב-INSERT אחד
+    כשמגיעים ל-batch_size או אחרי flush_interval שניות - מה שקודם.
+    כל submit ממתין לכתיבת ה-batch שלו ומקבל את ה-serial_number (או None אם הכתיבה נכשלה).
+    """
+    
+    def __init__(self, interactions_logger: Optional[InteractionsLogger] = None,
+                 batch_size: int = INTERACTIONS_LOG_BATCH_SIZE,
+                 flush_interval: float = INTERACTIONS_LOG_FLUSH_SECONDS):
+        self._interactions_logger = interactions_logger
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._pending: list = []  # (values, future)
+        self._batch_full: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._stats = {"queued": 0, "written": 0, "failed": 0, "batches": 0, "largest_batch": 0}
+    
+    @property
+    def interactions_logger(self) -> InteractionsLogger:
+        return self._interactions_logger or get_interactions_logger()
+    
+    async def start(self) -> bool:
+        """בדיקת הטבלה וה-commit hash פעם אחת (ב-executor) והפעלת לולאת הכתיבה"""
+        ready = await run_db_async(self.interactions_logger.prepare)
+        self._ensure_running()
+        return ready
+    
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._batch_full = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+    
+    async def submit(self, values: tuple) -> Optional[int]:
+        """הוספת שורה (מ-build_complete_row) והמתנה לכתיבה - מחזיר serial_number"""
+        self._ensure_running()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((values, future))
+        self._stats["queued"] += 1
+        if len(self._pending) >= self.batch_size:
+            self._batch_full.set()
+        return await future
+    
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._batch_full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_full.clear()
+            await self.flush()
+    
+    async def flush(self) -> int:
+        """כתיבת כל מה שממתין, ב-batches של batch_size. מחזיר כמה שורות נכתבו"""
+        written = 0
+        while self._pending:
+            batch = self._pending[:self.batch_size]
+            del self._pending[:self.batch_size]
+            try:
+                serials = await run_db_async(self.interactions_logger.insert_complete_rows, [values for values, _ in batch])
+                self._stats["batches"] += 1
+                self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+                self._stats["written"] += len(batch)
+                written += len(batch)
+                print(f"✅ [InteractionsLogger] {len(batch)} אינטראקציות נרשמו ב-batch אחד (#{serials[0]}-#{serials[-1]})")
+            except Exception as e:
+                serials = [None] * len(batch)
+                self._stats["failed"] += len(batch)
+                print(f"❌ [InteractionsLogger] שגיאה בכתיבת batch של {len(batch)} אינטראקציות: {e}")
+            for (_, future), serial_number in zip(batch, serials):
+                if not future.done():
+                    future.set_result(serial_number)
+        return written
+    
+    async def stop(self):
+        """עצירת לולאת הכתיבה וכתיבת מה שנשאר - לקריאה בכיבוי (batch באמצע כתיבה מסתיים, לא מבוטל)"""
+        if self._task is not None and not self._task.done():
+            self._stopping = True
+            self._batch_full.set()
+            await self._task
+        self._task = None
+        self._stopping = False
+        await self.flush()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats["pending"] = len(self._pending)
+        return stats
+
+
+# 🌐 מופע יחיד לכל התהליך
+interactions_writer = InteractionsBatchWriter()
+
+
+def interaction_record(serial_number: int, values: tuple) -> Dict[str, Any]:
+    """שורה מ-build_complete_row כ-dict לפי שמות העמודות (כולל serial_number) - למשל להתראת אדמין בלי SELECT"""
+    record = dict(zip(COMPLETE_INSERT_COLUMN_NAMES, values))
+    record["serial_number"] = serial_number
+    return record
+
+
+def print_logged_interaction(serial_number: Optional[int], values: tuple) -> None:
+    """הדפסת סיכום לשורה שנכתבה - הערכים נשלפים לפי שם עמודה, לא לפי מיקום"""
+    record = dict(zip(COMPLETE_INSERT_COLUMN_NAMES, values))
+    print(f"✅ [InteractionsLogger] אינטראקציה #{serial_number} נרשמה בהצלחה")
+    print(f"   💰 עלות כוללת: {record['total_cost_agorot']:.2f} אגורות")
+    print(f"   ⏱️ זמן תגובה: {record['user_to_bot_response_time']:.2f}s | רקע: {record['background_processing_time']:.2f}s")
+    print(f"   📊 היסטוריה: {record['history_user_messages_count']} משתמש + {record['history_bot_messages_count']} בוט")
+
+
+async def log_interaction_record_async(**kwargs) -> Optional[Dict[str, Any]]:
+    """כמו log_interaction_async, אבל מחזיר את הרשומה שנכתבה (interaction_record) או None"""
+    logger = get_interactions_logger()
+    if not logger.db_url:
+        print("❌ [InteractionsLogger] לא נמצא URL למסד הנתונים")
+        return None
+    try:
+        values = logger.build_complete_row(**kwargs)
+    except Exception as e:
+        print(f"❌ [InteractionsLogger] שגיאה בהכנת אינטראקציה לרישום: {e}")
+        return None
+    serial_number = await interactions_writer.submit(values)
+    if serial_number is None:
+        return None
+    print_logged_interaction(serial_number, values)
+    return interaction_record(serial_number, values)
+
+
+async def log_interaction_async(**kwargs) -> Optional[int]:
+    """כמו log_interaction, אבל דרך interactions_writer - כתיבה מקובצת בלי לחסום את ה-event loop"""
+    record = await log_interaction_record_async(**kwargs)
+    return record["serial_number"] if record else None
+
 def log_simple(chat_id: Union[str, int], user_msg: str, bot_msg: str, 
                telegram_message_id: Optional[str] = None) -> Optional[int]:
     """
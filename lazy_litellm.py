@@ -35,6 +35,11 @@ class LazyLiteLLM:
         self._ensure_loaded()
         return self._litellm.completion(*args, **kwargs)
     
+    async def acompletion(self, *args, **kwargs):
+        """Async completion - does not block the event loop"""
+        self._ensure_loaded()
+        return await self._litellm.acompletion(*args, **kwargs)
+    
     def embedding(self, *args, **kwargs):
         """Embedding function"""
         self._ensure_loaded()
@@ -45,6 +50,7 @@ _lazy_litellm_instance = LazyLiteLLM()
 
 # Export all important functions
 completion = _lazy_litellm_instance.completion
+acompletion = _lazy_litellm_instance.acompletion
 embedding = _lazy_litellm_instance.embedding
 
 # Export exceptions (if needed)
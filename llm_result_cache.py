@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+llm_result_cache.py - cache לתוצאות GPT-B (סיכום) ו-GPT-C (חילוץ שדות)
+=======================================================================
+
+GPT-B ו-GPT-C רצים על כל הודעה מתאימה, גם כשהקלט זהה לקלט שכבר ראינו ("תודה", "סבבה",
+משפט שחוזר) - ומחזירים בדיוק אותה תוצאה. התוצאה תלויה רק בשלב, במודל, בפרומפט ובקלט,
+ולא במשתמש, ולכן המפתח הוא sha256 של (שלב, מודל, hash הפרומפט, קלט מנורמל):
+
+- נרמול: רווחים מאוחדים, casefold - "  תודה " ו-"תודה" הם אותו מפתח
+- שינוי בפרומפט משנה את המפתח - אין צורך לנקות את ה-cache אחרי עדכון פרומפט
+- קלט ארוך מ-LLM_RESULT_CACHE_MAX_INPUT_CHARS לא נשמר (כמעט אף פעם לא חוזר)
+- LRU חסום בזיכרון עם TTL; במצב postgres (LLM_RESULT_CACHE_BACKEND=postgres) גם טבלת
+  llm_result_cache, משותפת בין workers ושורדת restart. הכתיבה לטבלה ברקע (write-behind),
+  הקריאה רק כשאין בזיכרון
+- נשמרות רק תוצאות תקינות (לא שגיאה, לא fallback של סיכום ברירת מחדל)
+
+שימוש:
+    from llm_result_cache import llm_result_cache
+    key = llm_result_cache.make_key("gpt_c", model, system_prompt, user_msg)
+    cached = await llm_result_cache.get_async(key)
+    ...
+    llm_result_cache.set(key, "gpt_c", {"extracted_fields": fields})
+"""
+
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import (
+    LLM_RESULT_CACHE_ENABLED,
+    LLM_RESULT_CACHE_TTL_SECONDS,
+    LLM_RESULT_CACHE_MAX_ENTRIES,
+    LLM_RESULT_CACHE_MAX_INPUT_CHARS,
+    LLM_RESULT_CACHE_BACKEND,
+)
+from simple_logger import logger
+
+_FLUSH_SECONDS = 5.0         # כתיבת תוצאות חדשות לטבלה
+_PURGE_EVERY_FLUSHES = 100   # מחיקת שורות שפג תוקפן אחת לכמה כתיבות
+
+
+def normalize_input(text: str) -> str:
+    return " ".join((text or "").split()).casefold()
+
+
+class LLMResultCache:
+    """LRU חסום עם TTL, ואופציונלית גם טבלה ב-Postgres"""
+
+    def __init__(self, enabled: bool = LLM_RESULT_CACHE_ENABLED, ttl_seconds: float = LLM_RESULT_CACHE_TTL_SECONDS,
+                 max_entries: int = LLM_RESULT_CACHE_MAX_ENTRIES, max_input_chars: int = LLM_RESULT_CACHE_MAX_INPUT_CHARS,
+                 backend: str = LLM_RESULT_CACHE_BACKEND, flush_interval: float = _FLUSH_SECONDS):
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self.max_input_chars = max_input_chars
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()  # key -> (expires_at, result)
+        self._pending: List[Tuple[str, str, Dict[str, Any]]] = []  # תוצאות שעוד לא נכתבו לטבלה
+        self._lock = threading.Lock()
+        self._table_ready = False
+        self._flushes_since_purge = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {"hits": 0, "db_hits": 0, "misses": 0, "stores": 0, "uncacheable": 0, "db_errors": 0}
+
+    def make_key(self, stage: str, model: str, prompt: str, text: str) -> Optional[str]:
+        """מפתח ה-cache, או None אם הקלט לא מתאים לשמירה (cache כבוי / ריק / ארוך מדי)"""
+        normalized = normalize_input(text)
+        if not self.enabled or not normalized or len(normalized) > self.max_input_chars:
+            with self._lock:
+                self._stats["uncacheable"] += 1
+            return None
+        prompt_hash = hashlib.sha256((prompt or "").encode("utf-8")).hexdigest()[:16]
+        raw = "\x1f".join((stage, model or "", prompt_hash, normalized))
+        return f"{stage}:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+
+    def _get_local(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() >= entry[0]:
+                if entry is not None:
+                    del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return copy.deepcopy(entry[1])
+
+    def _set_local(self, key: str, result: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, copy.deepcopy(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _get_db(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            self._ensure_table()
+            import db_manager
+            result = db_manager.get_llm_result_cache(key, self.ttl_seconds)
+        except Exception as e:
+            with self._lock:
+                self._stats["db_errors"] += 1
+            logger.warning(f"⚠️ [LLM_CACHE] קריאה מ-llm_result_cache נכשלה: {e}", source="llm_result_cache")
+            return None
+        if result is not None:
+            self._set_local(key, result)
+            with self._lock:
+                self._stats["db_hits"] += 1
+        return result
+
+    def _record_miss(self) -> None:
+        with self._lock:
+            self._stats["misses"] += 1
+
+    def get(self, key: Optional[str]) -> Optional[Dict[str, Any]]:
+        """תוצאה שמורה (עותק) או None. במצב postgres - שאילתה סינכרונית כשאין בזיכרון"""
+        if key is None:
+            return None
+        result = self._get_local(key)
+        if result is None and self.backend == "postgres":
+            result = self._get_db(key)
+        if result is None:
+            self._record_miss()
+        return result
+
+    async def get_async(self, key: Optional[str]) -> Optional[Dict[str, Any]]:
+        """כמו get, אבל השאילתה ל-DB (אם צריך) רצה ב-executor של ה-DB"""
+        if key is None:
+            return None
+        result = self._get_local(key)
+        if result is None and self.backend == "postgres":
+            from db_pool import run_db_async
+            result = await run_db_async(self._get_db, key)
+        if result is None:
+            self._record_miss()
+        return result
+
+    def set(self, key: Optional[str], stage: str, result: Dict[str, Any]) -> None:
+        """שמירת תוצאה תקינה - בזיכרון מיד, בטבלה ב-flush הבא (במצב postgres)"""
+        if key is None:
+            return
+        self._set_local(key, result)
+        with self._lock:
+            self._stats["stores"] += 1
+            if self.backend == "postgres":
+                self._pending.append((key, stage, copy.deepcopy(result)))
+        if self.backend == "postgres":
+            self._ensure_flusher()
+
+    def _ensure_table(self) -> None:
+        if self._table_ready:
+            return
+        import db_manager
+        db_manager.ensure_llm_result_cache_table()
+        self._table_ready = True
+
+    def _ensure_flusher(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._flush_loop, daemon=True, name="llm_result_cache_flush")
+            self._thread.start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self) -> int:
+        """כתיבת התוצאות החדשות לטבלה ב-INSERT אחד. מחזיר כמה נכתבו"""
+        with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, []
+        try:
+            self._ensure_table()
+            import db_manager
+            written = db_manager.upsert_llm_result_cache(batch)
+        except Exception as e:
+            # cache בלבד - לא מחזירים לתור, התוצאה עדיין שמורה בזיכרון
+            with self._lock:
+                self._stats["db_errors"] += 1
+            logger.warning(f"⚠️ [LLM_CACHE] כתיבה ל-llm_result_cache נכשלה ({len(batch)} תוצאות): {e}", source="llm_result_cache")
+            return 0
+        self._flushes_since_purge += 1
+        if self._flushes_since_purge >= _PURGE_EVERY_FLUSHES:
+            self._flushes_since_purge = 0
+            try:
+                db_manager.purge_llm_result_cache(self.ttl_seconds)
+            except Exception as e:
+                logger.warning(f"⚠️ [LLM_CACHE] ניקוי llm_result_cache נכשל: {e}", source="llm_result_cache")
+        return written
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._pending.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+            stats["pending_writes"] = len(self._pending)
+        lookups = stats["hits"] + stats["db_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["db_hits"]) / lookups, 3) if lookups else 0.0
+        stats["backend"] = self.backend
+        stats["enabled"] = self.enabled
+        return stats
+
+
+# 🌐 מופע יחיד לכל התהליך
+llm_result_cache = LLMResultCache()
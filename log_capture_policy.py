@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+log_capture_policy.py - מה נכנס ל-deployment_logs ומה לא
+=========================================================
+
+DatabaseStdoutCapture שומר כל שורה שנכתבת ל-stdout/stderr, והבוט מדפיס הרבה.
+CapturePolicy מחליט לכל שורה, לפני שנבנית רשומה, אם היא נשמרת:
+
+1. 🔁 כיווץ כפילויות - שורה זהה לקודמת מאותו מקור (בתוך DEPLOY_LOG_REPEAT_WINDOW_SECONDS)
+   לא נשמרת; שורת סיכום אחת "חזרה N פעמים" נרשמת כשמגיעה שורה אחרת, כשהחלון נגמר
+   (take_pending_repeats מטיימר) או ב-flush/כיבוי (take_pending_repeats(force=True))
+2. 🎲 דגימה - לפי רמה (DEPLOY_LOG_LEVEL_SAMPLE_RATES) ולפי מקור (DEPLOY_LOG_SOURCE_SAMPLE_RATES)
+3. 🪣 token bucket לכל מקור - DEPLOY_LOG_SOURCE_RATE_PER_SECOND שורות בשנייה, עם burst
+
+WARNING ומעלה לא נדגמות ולא מוגבלות (רק כיווץ כפילויות).
+
+פורמט הדגימה: "DEBUG=0.1,PRINT=0.5" / "python_logging_httpx=0.1" (חסר = 1.0)
+"""
+
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import (
+    DEPLOY_LOG_LEVEL_SAMPLE_RATES, DEPLOY_LOG_SOURCE_SAMPLE_RATES,
+    DEPLOY_LOG_SOURCE_RATE_PER_SECOND, DEPLOY_LOG_SOURCE_BURST, DEPLOY_LOG_REPEAT_WINDOW_SECONDS,
+)
+
+PRIORITY_LEVELS = ("WARNING", "ERROR", "CRITICAL")
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """"DEBUG=0.1, PRINT=0.5" -> {"DEBUG": 0.1, "PRINT": 0.5} (ערכים לא תקינים מדולגים)"""
+    rates = {}
+    for part in (spec or "").split(","):
+        name, sep, value = part.partition("=")
+        if not sep or not name.strip():
+            continue
+        try:
+            rates[name.strip()] = min(1.0, max(0.0, float(value)))
+        except ValueError:
+            continue
+    return rates
+
+
+@dataclass
+class CaptureDecision:
+    keep: bool
+    repeat_of: Optional[str] = None  # שורה קודמת שחזרה ודוכאה - לרשום סיכום לפני השורה הנוכחית
+    repeat_level: Optional[str] = None
+    repeat_count: int = 0
+
+
+class _TokenBucket:
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self.updated = now
+
+    def take(self, now: float) -> bool:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class CapturePolicy:
+    """החלטה לכל שורת לוג: לשמור / לדגום החוצה / להגביל / לכווץ כפילות"""
+
+    def __init__(self, level_rates: Optional[Dict[str, float]] = None,
+                 source_rates: Optional[Dict[str, float]] = None,
+                 rate_per_second: float = DEPLOY_LOG_SOURCE_RATE_PER_SECOND,
+                 burst: float = DEPLOY_LOG_SOURCE_BURST,
+                 repeat_window: float = DEPLOY_LOG_REPEAT_WINDOW_SECONDS,
+                 rng: Optional[random.Random] = None):
+        self.level_rates = parse_sample_rates(DEPLOY_LOG_LEVEL_SAMPLE_RATES) if level_rates is None else level_rates
+        self.source_rates = parse_sample_rates(DEPLOY_LOG_SOURCE_SAMPLE_RATES) if source_rates is None else source_rates
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.repeat_window = repeat_window
+        self._rng = rng or random.Random()
+        self._buckets: Dict[str, _TokenBucket] = {}
+        self._last_line: Dict[str, Tuple[str, str, float, int]] = {}  # source -> (message, level, first_seen, repeats)
+        self._lock = threading.Lock()
+        self._stats = {"kept": 0, "collapsed": 0, "sampled_out": 0, "rate_limited": 0}
+
+    def decide(self, level: str, source: str, message: str) -> CaptureDecision:
+        now = time.monotonic()
+        with self._lock:
+            # 🔁 כיווץ כפילויות - נספר עד שמגיעה שורה אחרת מאותו מקור (או שהחלון נגמר)
+            last = self._last_line.get(source)
+            if last and last[0] == message and last[1] == level and now - last[2] < self.repeat_window:
+                self._last_line[source] = (message, level, last[2], last[3] + 1)
+                self._stats["collapsed"] += 1
+                return CaptureDecision(keep=False)
+            decision = CaptureDecision(keep=True)
+            if last and last[3]:
+                decision.repeat_of, decision.repeat_level, decision.repeat_count = last[0], last[1], last[3]
+            self._last_line[source] = (message, level, now, 0)
+
+            if level not in PRIORITY_LEVELS:
+                # 🎲 דגימה - הנמוך מבין שיעור הרמה ושיעור המקור
+                rate = min(self.level_rates.get(level, 1.0), self.source_rates.get(source, 1.0))
+                if rate < 1.0 and self._rng.random() >= rate:
+                    self._stats["sampled_out"] += 1
+                    decision.keep = False
+                    return decision
+                # 🪣 הגבלת קצב לכל מקור
+                if self.rate_per_second > 0:
+                    bucket = self._buckets.get(source)
+                    if bucket is None:
+                        bucket = self._buckets[source] = _TokenBucket(self.rate_per_second, self.burst, now)
+                    if not bucket.take(now):
+                        self._stats["rate_limited"] += 1
+                        decision.keep = False
+                        return decision
+
+            self._stats["kept"] += 1
+            return decision
+
+    def take_pending_repeats(self, force: bool = False) -> List[Tuple[str, str, str, int]]:
+        """
+        סיכומי חזרות שעוד לא נרשמו, כדי ששורה שחזרה ואחריה שקט לא תיעלם:
+        [(source, message, level, repeats)] לכל מקור שהחלון שלו נגמר (או לכולם עם force).
+        המונה מתאפס - כל חזרה מסוכמת פעם אחת בלבד.
+        """
+        now = time.monotonic()
+        pending = []
+        with self._lock:
+            for source, (message, level, first_seen, repeats) in self._last_line.items():
+                if repeats and (force or now - first_seen >= self.repeat_window):
+                    pending.append((source, message, level, repeats))
+                    self._last_line[source] = (message, level, first_seen, 0)
+        return pending
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats)
@@ -64,6 +64,7 @@ except ImportError:
     class TelegramError(Exception): pass
     TELEGRAM_AVAILABLE = False
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 from bot_setup import setup_bot, migrate_data_to_sql_with_safety
 from message_handler import handle_message
@@ -82,6 +83,7 @@ def clear_gpt_c_html_log():
     return True
 
 # 🚀 יבוא מערכת הלוגים החדשה + הפעלת תפיסת פלט
+deployment_logger = None
 try:
     from deployment_logger import deployment_logger, log_info, log_error, log_warning
     DEPLOYMENT_LOGGER_AVAILABLE = True
@@ -248,6 +250,13 @@ async def lifespan(app: FastAPI):
     get_bot_app()
     log_memory_usage("after_bot_setup")
     
+    # 📨 תור התראות אדמין - מכאן והלאה התראות לא חוסמות את ה-event loop
+    try:
+        from admin_dispatcher import admin_dispatcher
+        await admin_dispatcher.start()
+    except Exception as e:
+        print(f"[STARTUP] ⚠️ שגיאה בהפעלת תור התראות אדמין: {e}")
+    
     try:
         health = health_check()
         if not all(health.values()):
@@ -256,6 +265,38 @@ async def lifespan(app: FastAPI):
         from traceback import format_exc
         send_error_notification(f"[STARTUP] שגיאה בבדיקת תקינות: {e}\n{format_exc()}")
     
+    # 🗂️ מיגרציית אינדקסים להיסטוריית צ'אט (CONCURRENTLY - לא חוסם כתיבות)
+    try:
+        from db_manager import ensure_chat_messages_indexes
+        from db_pool import run_db_async
+        await run_db_async(ensure_chat_messages_indexes)
+    except Exception as e:
+        print(f"[STARTUP] ⚠️ שגיאה ביצירת אינדקסים ל-chat_messages: {e}")
+
+    # 🧾 כתיבה מקובצת ל-interactions_log - בדיקת הטבלה וה-commit hash פעם אחת כאן
+    try:
+        from interactions_logger import interactions_writer
+        await interactions_writer.start()
+    except Exception as e:
+        print(f"[STARTUP] ⚠️ שגיאה בהכנת interactions_log: {e}")
+
+    # ⏳ תור משימות רקע - הפעלת workers ושחזור משימות שנשארו מהריצה הקודמת (אם BACKGROUND_JOBS_PERSIST)
+    try:
+        from background_jobs import background_jobs
+        import message_handler  # noqa: F401 - רושם את handler השחזור post_reply_recovery
+        restored = await background_jobs.start()
+        if restored:
+            print(f"[STARTUP] ♻️ שוחזרו {restored} משימות רקע")
+    except Exception as e:
+        print(f"[STARTUP] ⚠️ שגיאה בהפעלת תור משימות רקע: {e}")
+
+    # 📥 תור קליטת עדכוני webhook - ה-webhook מחזיר 200 מיד והעיבוד רץ כאן
+    try:
+        from update_ingestion import update_queue
+        await update_queue.start()
+    except Exception as e:
+        print(f"[STARTUP] ⚠️ שגיאה בהפעלת תור עדכוני webhook: {e}")
+
     # 🔍 בדיקה שקטה של מערכת משתמשים קריטיים
     try:
         print("[STARTUP] 🔍 בודק מערכת משתמשים קריטיים...")
@@ -383,8 +424,60 @@ async def lifespan(app: FastAPI):
     
     yield  # כאן האפליקציה רצה
     
-    # Shutdown logic (אם נדרש בעתיד)
+    # Shutdown logic
     print("🔄 FastAPI נכבה...")
+    try:
+        # קודם מסיימים הודעות שכבר התקבלו - הן מגישות משימות לתור הרקע
+        from update_ingestion import update_queue
+        await update_queue.stop()
+    except Exception as e:
+        print(f"⚠️ שגיאה בעצירת תור עדכוני webhook: {e}")
+    try:
+        from background_jobs import background_jobs
+        await background_jobs.stop()
+    except Exception as e:
+        print(f"⚠️ שגיאה בעצירת תור משימות רקע: {e}")
+    try:
+        # אחרי תור הרקע - משימות שהסתיימו עוד יכולות להוסיף שורות
+        from interactions_logger import interactions_writer
+        await interactions_writer.stop()
+    except Exception as e:
+        print(f"⚠️ שגיאה בכתיבת interactions_log אחרונה: {e}")
+    try:
+        # לוגים שעוד בתור של deployment_logs - ה-thread שלו daemon ולא ישרוד את היציאה
+        if deployment_logger is not None:
+            deployment_logger.flush()
+    except Exception as e:
+        print(f"⚠️ שגיאה בשטיפת deployment_logs: {e}")
+    try:
+        # פעילות משתמשים שעוד לא נכתבה ל-reminder_activity
+        from reminder_store import reminder_store
+        reminder_store.flush()
+    except Exception as e:
+        print(f"⚠️ שגיאה בשמירת פעילות תזכורות: {e}")
+    try:
+        # עלויות GPT שעוד לא נכתבו ל-billing_ledger
+        from billing_ledger import billing_ledger
+        billing_ledger.flush()
+    except Exception as e:
+        print(f"⚠️ שגיאה בשמירת מוני חיוב: {e}")
+    try:
+        # תוצאות GPT-B/C שעוד לא נכתבו ל-llm_result_cache (במצב postgres)
+        from llm_result_cache import llm_result_cache
+        llm_result_cache.flush()
+    except Exception as e:
+        print(f"⚠️ שגיאה בשמירת cache תוצאות GPT: {e}")
+    try:
+        # אחרון - כל השלבים הקודמים עוד יכולים לשלוח התראות
+        from admin_dispatcher import admin_dispatcher
+        await admin_dispatcher.stop()
+    except Exception as e:
+        print(f"⚠️ שגיאה בשליחת התראות אדמין אחרונות: {e}")
+    try:
+        from db_pool import close_all_pools
+        close_all_pools()
+    except Exception as e:
+        print(f"⚠️ שגיאה בסגירת חיבורי מסד הנתונים: {e}")
 
 app_fastapi = FastAPI(lifespan=lifespan)
 
@@ -400,10 +493,13 @@ __all__ = ['app_fastapi']
 async def webhook(request: Request):
     """
     נקודת הכניסה של FastAPI לכל הודעה מהטלגרם (webhook).
-    קולט עדכון, יוצר Update, ומעביר ל-handle_message.
+    קולט עדכון, יוצר Update ומכניס לתור העיבוד לפי צ'אט (update_ingestion) -
+    מחזיר 200 מיד בלי לחכות ל-handle_message, כך שטלגרם לא שולח שוב עדכונים בגלל ack איטי.
+    כשהתור מלא מוחזר 503 מיד - טלגרם שולח את העדכון שוב מאוחר יותר.
     """
     chat_id = None
     user_msg = None
+    update = None
     
     try:
         data = await request.json()
@@ -422,7 +518,10 @@ async def webhook(request: Request):
                     metadata={"message_preview": user_msg[:100] if user_msg else ""})
             
             # ℹ️  מנגנון deduplication כבר קיים ב-message_handler.py
-            await handle_message(update, context)
+            from update_ingestion import enqueue_update
+            if not await enqueue_update(handle_message, update, context):
+                # 🚫 תור העיבוד מלא - 503 כדי שטלגרם ישלח את העדכון שוב (לא ממתינים למקום)
+                return JSONResponse(status_code=503, content={"ok": False, "error": "update queue full"}, headers={"Retry-After": "1"})
         else:
             print("קיבלתי עדכון לא מוכר ב-webhook, מתעלם...")
             log_warning("Received unknown update type in webhook")
@@ -442,21 +541,9 @@ async def webhook(request: Request):
                      "traceback": error_details
                  })
         
-        # 🚨 הוספה: רישום בטוח למשתמש לרשימת התאוששות לפני כל טיפול אחר
-        try:
-            from notifications import safe_add_user_to_recovery_list
-            if chat_id:
-                safe_add_user_to_recovery_list(safe_str(chat_id), f"Webhook error: {str(ex)[:50]}", user_msg or "")
-        except Exception:
-            pass  # אל תיכשל בגלל זה
-        
-        # 🚨 התראה מיידית לאדמין עם פרטים מלאים
-        try:
-            from notifications import handle_critical_error
-            await handle_critical_error(ex, chat_id, user_msg, update if 'update' in locals() else None)
-        except Exception as notification_error:
-            print(f"❌ שגיאה בשליחת התראה: {notification_error}")
-            log_error(f"Failed to send error notification: {notification_error}")
+        # 🚨 רשימת התאוששות + התראה לאדמין (אותו טיפול כמו לשגיאה בעיבוד מהתור)
+        from update_ingestion import report_update_error
+        await report_update_error(ex, chat_id, user_msg, update)
         
         # ✅ תמיד מחזיר HTTP 200 לטלגרם!
         return {"ok": False, "error": str(ex)}
@@ -476,6 +563,14 @@ async def health_check():
     try:
         from chat_utils import health_check as utils_health_check
         from concurrent_monitor import get_performance_stats
+        from update_ingestion import update_queue
+        from background_jobs import background_jobs
+        from dedup_store import dedup_store
+        from interactions_logger import interactions_writer
+        from admin_dispatcher import admin_dispatcher
+        from gpt_utils import model_latency
+        from billing_ledger import billing_ledger
+        from llm_result_cache import llm_result_cache
         
         # בדיקות בסיסיות
         health = utils_health_check()
@@ -502,7 +597,15 @@ async def health_check():
                 "bot_username": bot_username,
                 "active_users": perf_stats.get("active_users", 0),
                 "total_requests": perf_stats.get("total_requests", 0),
-                "error_rate": perf_stats.get("error_rate", 0)
+                "error_rate": perf_stats.get("error_rate", 0),
+                "update_queue": update_queue.get_stats(),
+                "background_jobs": background_jobs.get_stats(),
+                "dedup": dedup_store.get_stats(),
+                "interactions_writer": interactions_writer.get_stats(),
+                "admin_dispatcher": admin_dispatcher.get_stats(),
+                "gpt_hedging": model_latency.get_stats(),
+                "billing_ledger": billing_ledger.get_stats(),
+                "llm_result_cache": llm_result_cache.get_stats()
             }
         }
     except Exception as e:
@@ -24,19 +24,23 @@ from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove  # type: i
 from telegram.ext import ContextTypes  # type: ignore
 from datetime import datetime
 # 🗑️ handle_secret_command הוסרה - עברנו לפקודות טלגרם רגילות
-from config import should_log_message_debug, should_log_debug_prints
+from config import should_log_message_debug, should_log_debug_prints, GPT_A_STREAMING_ENABLED, BACKGROUND_SUBMIT_TIMEOUT_SECONDS
 from messages import get_welcome_messages, get_retry_message_by_attempt, approval_text, approval_keyboard, APPROVE_BUTTON_TEXT, DECLINE_BUTTON_TEXT, code_approved_message, code_not_received_message, not_approved_message, nice_keyboard, nice_keyboard_message, remove_keyboard_message, full_access_message, error_human_funny_message, get_unsupported_message_response, get_code_request_message
 # 🗑️ הסרת כל הייבואים מ-sheets_handler - עברנו למסד נתונים!
 # ✅ החלפה לפונקציות מסד נתונים ו-profile_utils  
 import profile_utils as _pu
 from gpt_a_handler import get_main_response
-from gpt_b_handler import get_summary
-from gpt_c_handler import extract_user_info, should_run_gpt_c
+from gpt_b_handler import get_summary_async
+from gpt_c_handler import extract_user_info, extract_user_info_async, should_run_gpt_c
 from gpt_d_handler import smart_update_profile_with_gpt_d_async
 from gpt_utils import normalize_usage_dict
 from fields_dict import FIELDS_DICT
 from gpt_e_handler import execute_gpt_e_if_needed
 from concurrent_monitor import start_monitoring_user, update_user_processing_stage, end_monitoring_user
+from streaming_reply import StreamingReply, split_telegram_text
+from background_jobs import background_jobs, BackgroundJob
+from db_pool import run_db_async
+from dedup_store import dedup_store
 from notifications import mark_user_active
 from recovery_manager import add_user_to_recovery_list, update_last_message_time
 from chat_utils import should_send_time_greeting, get_time_greeting_instruction
@@ -147,6 +151,11 @@ async def _handle_holiday_check(update, chat_id, bot_reply):
     except Exception as holiday_err:
         logger.warning(f"⚠️ שגיאה בבדיקת חגים: {holiday_err}", source="message_handler")
 
+def _is_internal_message(text):
+    """הודעה פנימית (עדכון פרופיל / debug / admin) שאסור שתגיע למשתמש"""
+    return bool(text and ("[עדכון פרופיל]" in text or "[PROFILE_CHANGE]" in text or 
+                          (text.startswith("[") and "]" in text and any(keyword in text for keyword in ["עדכון", "debug", "admin", "system"]))))
+
 async def send_message(update, chat_id, text, is_bot_message=True, is_gpt_a_response=False):
     """
     שולחת הודעה למשתמש בטלגרם, כולל לוגים ועדכון היסטוריה.
@@ -156,8 +165,7 @@ async def send_message(update, chat_id, text, is_bot_message=True, is_gpt_a_resp
     """
     
     # 🚨 CRITICAL SECURITY CHECK: מנע שליחת הודעות פנימיות למשתמש!
-    if text and ("[עדכון פרופיל]" in text or "[PROFILE_CHANGE]" in text or 
-                 (text.startswith("[") and "]" in text and any(keyword in text for keyword in ["עדכון", "debug", "admin", "system"]))):
+    if _is_internal_message(text):
         logger.critical(f"🚨 BLOCKED INTERNAL MESSAGE TO USER! chat_id={safe_str(chat_id)} | text={text[:100]}", source="message_handler")
         print(f"🚨🚨🚨 CRITICAL: חסימת הודעה פנימית למשתמש! chat_id={safe_str(chat_id)}")
         return
@@ -172,35 +180,38 @@ async def send_message(update, chat_id, text, is_bot_message=True, is_gpt_a_resp
         max_retries = 3  # פחות ניסיונות
         timeout_seconds = [TimeoutConfig.TELEGRAM_SEND_TIMEOUT, TimeoutConfig.TELEGRAM_SEND_TIMEOUT * 1.5, TimeoutConfig.TELEGRAM_SEND_TIMEOUT * 2]  # timeouts מהירים יותר!
         
-        for attempt in range(max_retries + 1):
-            current_timeout = timeout_seconds[min(attempt, len(timeout_seconds) - 1)]
-            try:
-                # שליחה עם timeout מהיר
-                sent_message = await asyncio.wait_for(
-                    update.message.reply_text(formatted_text, parse_mode="Markdown"),
-                    timeout=current_timeout
-                )
+        # 📨 טלגרם מוגבל ל-4096 תווים להודעה - תשובה ארוכה נשלחת בכמה הודעות
+        for part in split_telegram_text(formatted_text):
+            for attempt in range(max_retries + 1):
+                current_timeout = timeout_seconds[min(attempt, len(timeout_seconds) - 1)]
+                try:
+                    # שליחה עם timeout מהיר
+                    sent_message = await asyncio.wait_for(
+                        update.message.reply_text(part, parse_mode="Markdown"),
+                        timeout=current_timeout
+                    )
                 
-                # 🔧 מדידת זמן דיוק של שליחה בפועל לטלגרם
-                telegram_send_time = time.time()
+                    # 🔧 מדידת זמן דיוק של שליחה בפועל לטלגרם (של החלק הראשון - מה שהמשתמש רואה קודם)
+                    if telegram_send_time is None:
+                        telegram_send_time = time.time()
                 
-                logger.info(f"✅ [TELEGRAM_REPLY] הצלחה בניסיון {attempt + 1} | chat_id={safe_str(chat_id)}", source="message_handler")
-                break  # הצלחה - יוצאים מהלולאה
+                    logger.info(f"✅ [TELEGRAM_REPLY] הצלחה בניסיון {attempt + 1} | chat_id={safe_str(chat_id)}", source="message_handler")
+                    break  # הצלחה - יוצאים מהלולאה
                 
-            except asyncio.TimeoutError:
-                if attempt < max_retries:
-                    logger.warning(f"⏰ [TIMEOUT] ניסיון {attempt + 1} נכשל אחרי {current_timeout}s", source="message_handler")
-                    continue
-                else:
-                    raise Exception(f"Telegram timeout after {max_retries + 1} attempts")
+                except asyncio.TimeoutError:
+                    if attempt < max_retries:
+                        logger.warning(f"⏰ [TIMEOUT] ניסיון {attempt + 1} נכשל אחרי {current_timeout}s", source="message_handler")
+                        continue
+                    else:
+                        raise Exception(f"Telegram timeout after {max_retries + 1} attempts")
                     
-            except Exception as e:
-                if attempt < max_retries and ("network" in str(e).lower() or "timeout" in str(e).lower()):
-                    continue
-                else:
-                    raise e
-        else:
-            raise Exception(f"Failed to send message after {max_retries + 1} attempts")
+                except Exception as e:
+                    if attempt < max_retries and ("network" in str(e).lower() or "timeout" in str(e).lower()):
+                        continue
+                    else:
+                        raise e
+            else:
+                raise Exception(f"Failed to send message after {max_retries + 1} attempts")
                      
     except Exception as e:
         logger.error(f"❌ [SEND_ERROR] שליחת הודעה נכשלה: {e}", source="message_handler")
@@ -223,10 +234,64 @@ async def send_message(update, chat_id, text, is_bot_message=True, is_gpt_a_resp
 
 
 
-async def handle_background_tasks(update, context, chat_id, user_msg, bot_reply, message_id, user_request_start_time, gpt_result, history_messages, messages_for_gpt, user_response_actual_time):
+async def _run_enrichment_stage(stage_name, coro, timeout, chat_id):
+    """הרצת שלב העשרה אחד עם תקרת זמן משלו - כישלון או timeout מחזירים None ולא עוצרים את שאר השלבים"""
+    start = time.time()
+    try:
+        result = await asyncio.wait_for(coro, timeout=timeout)
+        print(f"⏱️ [ENRICH] {stage_name}: {time.time() - start:.2f}s | chat_id={safe_str(chat_id)}")
+        return result
+    except asyncio.TimeoutError:
+        logger.warning(f"⏰ [ENRICH] {stage_name} חרג מ-{timeout}s | chat_id={safe_str(chat_id)}", source="message_handler")
+    except Exception as e:
+        logger.warning(f"[ENRICH] שגיאה ב-{stage_name}: {e} | chat_id={safe_str(chat_id)}", source="message_handler")
+    return None
+
+async def run_enrichment_pipeline(chat_id, user_msg, bot_reply, message_id=None, with_summary=True):
+    """
+    ⚡ גרף התלויות של העשרת ההודעה ברקע:
+        GPT-B (סיכום) ─┐
+        GPT-C (חילוץ) ─┼─ במקביל
+        GPT-E          ─┘
+        GPT-D ← מחכה רק ל-GPT-C
+    זמן כולל ≈ השלב הארוך ביותר (או C+D) במקום סכום כל השלבים.
+    מחזיר dict עם המפתחות b/c/d/e (None לשלב שלא רץ, נכשל או חרג מהזמן).
+    """
+    chat_id = safe_str(chat_id)
+    
+    async def _gpt_b():
+        if not with_summary or len(bot_reply or "") <= 100:
+            return None
+        return await _run_enrichment_stage("GPT-B", get_summary_async(user_msg, bot_reply, chat_id, message_id),
+                                           TimeoutConfig.GPT_B_STAGE_TIMEOUT, chat_id)
+    
+    async def _gpt_c():
+        if not should_run_gpt_c(user_msg):
+            return None
+        return await _run_enrichment_stage("GPT-C", extract_user_info_async(user_msg, chat_id, message_id),
+                                           TimeoutConfig.GPT_C_STAGE_TIMEOUT, chat_id)
+    
+    gpt_c_task = asyncio.create_task(_gpt_c())
+    
+    async def _gpt_d():
+        gpt_c_result = await gpt_c_task
+        return await _run_enrichment_stage("GPT-D", smart_update_profile_with_gpt_d_async(chat_id, user_msg, bot_reply, gpt_c_result),
+                                           TimeoutConfig.GPT_D_STAGE_TIMEOUT, chat_id)
+    
+    gpt_e = _run_enrichment_stage("GPT-E", execute_gpt_e_if_needed(chat_id), TimeoutConfig.GPT_E_STAGE_TIMEOUT, chat_id)
+    
+    start = time.time()
+    summary_result, gpt_d_result, gpt_e_result = await asyncio.gather(_gpt_b(), _gpt_d(), gpt_e)
+    results = {"b": summary_result, "c": gpt_c_task.result(), "d": gpt_d_result, "e": gpt_e_result}
+    print(f"⏱️ [ENRICH] העשרה הושלמה ב-{time.time() - start:.2f}s | chat_id={chat_id}")
+    return results
+
+async def handle_background_tasks(update, context, chat_id, user_msg, bot_reply, message_id, user_request_start_time, gpt_result, history_messages, messages_for_gpt, user_response_actual_time, conversation_context=None):
     """
     🔧 פונקציה חדשה: מטפלת בכל המשימות ברקע אחרי שהמשתמש קיבל תשובה
     זה מבטיח שהמשתמש מקבל תשובה מהר, וכל השאר קורה ברקע
+    
+    conversation_context: ConversationContext של הבקשה - מתעדכן אחרי השמירה במקום לטעון היסטוריה מחדש
     """
     try:
         # 🚀 שלב 0: עיבוד GPT-A ברקע (עלויות, מטריקות, לוגים)
@@ -275,7 +340,10 @@ async def handle_background_tasks(update, context, chat_id, user_msg, bot_reply,
         # 🔧 תיקון קריטי: החזרת שמירה לטבלת chat_messages!
         try:
             # עדכון ההיסטוריה המלא - כל ההודעות
-            update_chat_history(safe_str(chat_id), user_msg, bot_reply)
+            from chat_utils import update_chat_history_async
+            await update_chat_history_async(safe_str(chat_id), user_msg, bot_reply)
+            if conversation_context is not None:
+                conversation_context.record_saved_message(user_msg, bot_reply)
             logger.info(f"[BACKGROUND] היסטוריה עודכנה | chat_id={safe_str(chat_id)}", source="message_handler")
         except Exception as hist_err:
             logger.warning(f"[BACKGROUND] שגיאה בעדכון היסטוריה: {hist_err}", source="message_handler")
@@ -286,8 +354,11 @@ async def handle_background_tasks(update, context, chat_id, user_msg, bot_reply,
         # ❌ BAG FIX: אל לדרוס את history_messages המקורי שנשלח ל-GPT!
         # זה גורם ל"אין היסטוריה" בהתראה לאדמין
         try:
-            from chat_utils import get_chat_history_for_users
-            updated_history_messages = get_chat_history_for_users(safe_str(chat_id), limit=32)
+            if conversation_context is not None:
+                updated_history_messages = conversation_context.get_history_for_users()
+            else:
+                from chat_utils import get_chat_history_for_users_async
+                updated_history_messages = await get_chat_history_for_users_async(safe_str(chat_id), limit=32)
             # ✅ שמירת ההיסטוריה המקורית שנשלחה ל-GPT במשתנה נפרד
             original_history_messages = history_messages  # ההיסטוריה שבאמת נשלחה ל-GPT
             original_messages_for_gpt = messages_for_gpt  # ההודעות שבאמת נשלחו ל-GPT
@@ -302,33 +373,15 @@ async def handle_background_tasks(update, context, chat_id, user_msg, bot_reply,
             original_messages_for_gpt = messages_for_gpt
             updated_history_for_logging = history_messages  # ✅ נשתמש במקורי גם ללוגים
 
-        # שלב 2: הפעלת GPT-B ליצירת סיכום (אם התשובה ארוכה מספיק)
-        summary_result = None
-        summary_usage = {}
-        if len(bot_reply) > 100:
-            try:
-                summary_result = get_summary(user_msg, bot_reply, safe_str(chat_id), message_id)
-                if summary_result and isinstance(summary_result, dict):
-                    summary_usage = summary_result.get("usage", {})
-                    print(f"📝 [BACKGROUND] נוצר סיכום: {summary_result.get('summary', '')[:50]}...")
-            except Exception as summary_err:
-                logger.warning(f"[BACKGROUND] שגיאה ביצירת סיכום: {summary_err}", source="message_handler")
-        
-        # שלב 3: הפעלה במקביל של כל התהליכים
-        all_tasks = []
-        gpt_c_result = None
-        
-        if should_run_gpt_c(user_msg):
-            gpt_c_result = await asyncio.to_thread(extract_user_info, user_msg, safe_str(chat_id))
-        
-        all_tasks.append(smart_update_profile_with_gpt_d_async(safe_str(chat_id), user_msg, bot_reply, gpt_c_result))
-        all_tasks.append(execute_gpt_e_if_needed(safe_str(chat_id)))
-        
-        results = await asyncio.gather(*all_tasks, return_exceptions=True)
-        
-        # שחזור תוצאות GPT-D ו-GPT-E
-        gpt_d_result = results[0] if len(results) > 0 else None
-        gpt_e_result = results[1] if len(results) > 1 else None
+        # שלב 2+3: GPT-B, GPT-C ו-GPT-E במקביל, GPT-D אחרי GPT-C (כל שלב עם timeout משלו)
+        enrichment = await run_enrichment_pipeline(chat_id, user_msg, bot_reply, message_id)
+        summary_result = enrichment["b"]
+        summary_usage = summary_result.get("usage", {}) if isinstance(summary_result, dict) else {}
+        if isinstance(summary_result, dict):
+            print(f"📝 [BACKGROUND] נוצר סיכום: {summary_result.get('summary', '')[:50]}...")
+        gpt_c_result = enrichment["c"]
+        gpt_d_result = enrichment["d"]
+        gpt_e_result = enrichment["e"]
         
         # 🔧 **הועבר לסוף**: ההתראה לאדמין תישלח רק אחרי שכל הדברים הסתיימו
         
@@ -337,9 +390,12 @@ async def handle_background_tasks(update, context, chat_id, user_msg, bot_reply,
             # איסוף נתונים מלאים לרישום  
             # ✅ השתמש בפונקציה מהמסד נתונים
             from profile_utils import get_user_summary_fast
-            current_summary = get_user_summary_fast(safe_str(chat_id)) or ""
-            from chat_utils import get_chat_history_for_users
-            history_messages = get_chat_history_for_users(safe_str(chat_id), limit=32)
+            current_summary = await run_db_async(get_user_summary_fast, safe_str(chat_id)) or ""
+            if conversation_context is not None:
+                history_messages = conversation_context.get_history_for_users()
+            else:
+                from chat_utils import get_chat_history_for_users_async
+                history_messages = await get_chat_history_for_users_async(safe_str(chat_id), limit=32)
             
             # בניית הודעות מלאות לרישום
             messages_for_log = [{"role": "system", "content": SYSTEM_PROMPT}]
@@ -356,7 +412,7 @@ async def handle_background_tasks(update, context, chat_id, user_msg, bot_reply,
             
             # 🔥 רישום למסד החדש interactions_log - הטבלה המרכזית החדשה!
             try:
-                from interactions_logger import log_interaction
+                from interactions_logger import log_interaction_record_async
                 
                 # חישוב זמנים
                 total_background_time = time.time() - user_request_start_time
@@ -370,24 +426,27 @@ async def handle_background_tasks(update, context, chat_id, user_msg, bot_reply,
                     'a': gpt_result,
                     'b': summary_result,
                     'c': gpt_c_result,
-                    'd': results[0] if len(results) > 0 else None,
-                    'e': results[1] if len(results) > 1 else None
+                    'd': gpt_d_result,
+                    'e': gpt_e_result
                 }
                 
                 # חישוב מונה GPT-E
                 gpt_e_counter = None
                 if gpt_results['e'] and isinstance(gpt_results['e'], dict) and gpt_results['e'].get("success"):
                     try:
-                        from chat_utils import get_total_user_messages_count
+                        from chat_utils import get_total_user_messages_count_async
                         from gpt_e_handler import GPT_E_RUN_EVERY_MESSAGES
-                        total_messages = get_total_user_messages_count(safe_str(chat_id))
+                        if conversation_context is not None:
+                            total_messages = conversation_context.get_message_count()
+                        else:
+                            total_messages = await get_total_user_messages_count_async(safe_str(chat_id))
                         current_count = total_messages % GPT_E_RUN_EVERY_MESSAGES
                         gpt_e_counter = f"{current_count}/{GPT_E_RUN_EVERY_MESSAGES}"
                     except:
                         gpt_e_counter = None
                 
                 # 🔥 רישום האינטראקציה המלאה והחזרת מזהה לצורך התראה
-                interaction_id = log_interaction(
+                interaction_record = await log_interaction_record_async(
                     chat_id=chat_id,
                     telegram_message_id=str(message_id),
                     user_msg=user_msg,
@@ -398,13 +457,14 @@ async def handle_background_tasks(update, context, chat_id, user_msg, bot_reply,
                     gpt_e_counter=gpt_e_counter
                 )
                 
-                if interaction_id:
+                if interaction_record:
+                    interaction_id = interaction_record["serial_number"]
                     print(f"🔥 [INTERACTIONS_LOG] אינטראקציה #{interaction_id} נרשמה בטבלה המרכזית | chat_id={safe_str(chat_id)}")
                     
-                    # 🔥 שליחת התראה לאדמין מנתוני אמת
+                    # 🔥 שליחת התראה לאדמין מהרשומה שנכתבה (בלי לקרוא אותה שוב מהטבלה)
                     try:
-                        from admin_notifications import send_admin_notification_from_db
-                        send_admin_notification_from_db(interaction_id)
+                        from admin_notifications import send_admin_interaction_notification
+                        await run_db_async(send_admin_interaction_notification, interaction_record)
                         print(f"✅ [ADMIN_NOTIFICATION] התראה נשלחה מנתוני אמת | interaction_id={interaction_id}")
                     except Exception as admin_notif_err:
                         logger.warning(f"[ADMIN_NOTIFICATION] שגיאה בשליחת התראה: {admin_notif_err}", source="message_handler")
@@ -438,9 +498,9 @@ async def handle_background_tasks(update, context, chat_id, user_msg, bot_reply,
             ran_components = []
             if should_run_gpt_c(user_msg) and gpt_c_result is not None:
                 ran_components.append("GPT-C")
-            if len(results) > 0 and results[0] is not None:
+            if gpt_d_result is not None:
                 ran_components.append("GPT-D")
-            if len(results) > 1 and results[1] is not None:
+            if gpt_e_result is not None:
                 ran_components.append("GPT-E")
             
             if ran_components:
@@ -454,7 +514,7 @@ async def handle_background_tasks(update, context, chat_id, user_msg, bot_reply,
             from profile_utils import _detect_profile_changes, get_user_profile_fast, get_user_summary_fast
             
             # 🔧 תיקון: שמירת הפרופיל הישן לפני כל העדכונים
-            old_profile_before_updates = get_user_profile_fast(safe_str(chat_id))
+            old_profile_before_updates = await run_db_async(get_user_profile_fast, safe_str(chat_id))
             
             gpt_c_changes_list = []
             gpt_d_changes_list = []
@@ -473,7 +533,7 @@ async def handle_background_tasks(update, context, chat_id, user_msg, bot_reply,
                     })
             
             # GPT-D changes
-            gpt_d_res = results[0] if len(results) > 0 else None
+            gpt_d_res = gpt_d_result
             if gpt_d_res is not None and not isinstance(gpt_d_res, Exception):
                 updated_profile, usage = gpt_d_res if isinstance(gpt_d_res, tuple) else (None, {})
                 if updated_profile and isinstance(updated_profile, dict):
@@ -486,7 +546,7 @@ async def handle_background_tasks(update, context, chat_id, user_msg, bot_reply,
                         })
             
             # GPT-E changes
-            gpt_e_res = results[1] if len(results) > 1 else None
+            gpt_e_res = gpt_e_result
             gpt_e_counter = None
             if gpt_e_res is not None and not isinstance(gpt_e_res, Exception):
                 changes_dict = gpt_e_res.get("changes", {}) if isinstance(gpt_e_res, dict) else {}
@@ -502,10 +562,12 @@ async def handle_background_tasks(update, context, chat_id, user_msg, bot_reply,
                     
                     # הוספת קאונטר GPT-E
                     try:
-                        from chat_utils import get_user_stats_and_history
+                        from chat_utils import get_total_user_messages_count_async
                         from gpt_e_handler import GPT_E_RUN_EVERY_MESSAGES
-                        stats, _ = get_user_stats_and_history(safe_str(chat_id))
-                        total_messages = stats.get("total_messages", 0)
+                        if conversation_context is not None:
+                            total_messages = conversation_context.get_message_count()
+                        else:
+                            total_messages = await get_total_user_messages_count_async(safe_str(chat_id))
                         gpt_e_counter = f"{total_messages}/{GPT_E_RUN_EVERY_MESSAGES}"
                     except:
                         gpt_e_counter = None
@@ -513,7 +575,7 @@ async def handle_background_tasks(update, context, chat_id, user_msg, bot_reply,
             # שליחת התראה רק אם יש שינויים
             if gpt_c_changes_list or gpt_d_changes_list or gpt_e_changes_list:
                 # יצירת סיכום מהיר
-                current_summary = get_user_summary_fast(safe_str(chat_id)) or ""
+                current_summary = await run_db_async(get_user_summary_fast, safe_str(chat_id)) or ""
                 
                 try:
                     from admin_notifications import send_admin_notification
@@ -556,54 +618,32 @@ async def handle_background_tasks(update, context, chat_id, user_msg, bot_reply,
         logger.error(f"❌ [BACKGROUND] שגיאה במשימות ברקע: {ex}", source="message_handler")
         # לא נכשל אם המשימות ברקע נכשלות - המשתמש כבר קיבל תשובה
 
+async def recover_post_reply(chat_id, user_msg, bot_reply, message_id=None):
+    """
+    ♻️ שחזור משימת post_reply שלא הסתיימה לפני restart (נרשם ב-background_jobs).
+    בלי update/context של טלגרם אפשר רק להשלים את החיוני: שמירת ההיסטוריה (אם עוד לא נשמרה) ועדכון הפרופיל.
+    """
+    from db_manager import get_chat_history
+    from chat_utils import update_chat_history_async
+    
+    last_rows = await run_db_async(get_chat_history, safe_str(chat_id), 1)
+    if not last_rows or (last_rows[-1][0], last_rows[-1][1]) != (user_msg, bot_reply):
+        await update_chat_history_async(safe_str(chat_id), user_msg, bot_reply)
+    await run_background_processors(chat_id, user_msg, bot_reply)
+    logger.info(f"♻️ [BACKGROUND] משימת רקע שוחזרה | chat_id={safe_str(chat_id)} | message_id={message_id}", source="message_handler")
+
+background_jobs.register_handler("post_reply_recovery", recover_post_reply)
+
 async def run_background_processors(chat_id, user_msg, bot_reply):
     """
-    מפעיל את כל המעבדים ברקע במקביל - GPT-C, GPT-D, GPT-E
+    מפעיל את המעבדים ברקע - GPT-C ו-GPT-E במקביל, GPT-D אחרי GPT-C (בלי סיכום GPT-B)
     """
     try:
-        # רשימת משימות לביצוע במקביל
-        tasks = []
-        
-        # GPT-C - עדכון פרופיל משתמש (sync function, run separately)
-        gpt_c_task = None
-        if should_run_gpt_c(user_msg):
-            gpt_c_task = asyncio.create_task(asyncio.to_thread(extract_user_info, user_msg, safe_str(chat_id)))
-            
-        # GPT-D - עדכון חכם של פרופיל
-        tasks.append(smart_update_profile_with_gpt_d_async(safe_str(chat_id), user_msg, bot_reply))
-        
-        # GPT-E - אימוג'ים ותכונות מתקדמות
-        tasks.append(execute_gpt_e_if_needed(safe_str(chat_id)))
-        
-        # הפעלה במקביל של כל התהליכים ואיסוף תוצאות
-        all_tasks = []
-        if gpt_c_task:
-            all_tasks.append(gpt_c_task)
-        all_tasks.extend(tasks)
-        
-        results = []
-        if all_tasks:
-            results = await asyncio.gather(*all_tasks, return_exceptions=True)
+        results = await run_enrichment_pipeline(chat_id, user_msg, bot_reply, with_summary=False)
 
         # 🔍 לוג שקט לבדיקות (ללא הודעות לאדמין)
         if should_log_debug_prints():
-            ran_components = []
-            idx = 0
-            if gpt_c_task:
-                gpt_c_res = results[idx] if idx < len(results) else None
-                idx += 1
-                if gpt_c_res is not None and not isinstance(gpt_c_res, Exception):
-                    ran_components.append("GPT-C")
-            
-            gpt_d_res = results[idx] if idx < len(results) else None
-            idx += 1
-            if gpt_d_res is not None and not isinstance(gpt_d_res, Exception):
-                ran_components.append("GPT-D")
-            
-            gpt_e_res = results[idx] if idx < len(results) else None
-            if gpt_e_res is not None and not isinstance(gpt_e_res, Exception):
-                ran_components.append("GPT-E")
-            
+            ran_components = [name for key, name in (("c", "GPT-C"), ("d", "GPT-D"), ("e", "GPT-E")) if results.get(key) is not None]
             if ran_components:
                 print(f"[DEBUG] 🛠️ הרצת מעבדי פרופיל: {', '.join(ran_components)} | chat_id={safe_str(chat_id)}")
             
@@ -975,33 +1015,15 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         print("❌ [HANDLE_MESSAGE] כשל בחילוץ מידע מההודעה")
         return
     
-    # 🔧 מניעת כפילות - בדיקה אם ההודעה כבר טופלה
+    # 🔧 מניעת כפילות - בדיקה אם ההודעה כבר טופלה (dedup_store: O(1), חסום, אופציונלית משותף דרך Postgres)
     try:
         if chat_id and message_id:
-            # בדיקה אם ההודעה כבר טופלה (בתוך 5 שניות)
-            import time
-            current_time = time.time()
             message_key = f"{chat_id}_{message_id}"
-            
-            # שימוש ב-context.bot_data לאחסון הודעות שטופלו
-            if "processed_messages" not in context.bot_data:
-                context.bot_data["processed_messages"] = {}
-            
-            # ניקוי הודעות ישנות (יותר מ-10 שניות)
-            context.bot_data["processed_messages"] = {
-                k: v for k, v in context.bot_data["processed_messages"].items() 
-                if current_time - v < 10
-            }
-            
-            # בדיקה אם ההודעה כבר טופלה
-            if message_key in context.bot_data["processed_messages"]:
+            if await dedup_store.is_duplicate(message_key):
                 logger.info(f"[DUPLICATE] Message {message_id} for chat {safe_str(chat_id)} already processed - skipping", source="message_handler")
                 print(f"🔄 [DUPLICATE] Message {message_id} for chat {safe_str(chat_id)} already processed - skipping")
                 return
             
-            # סימון ההודעה כטופלת
-            context.bot_data["processed_messages"][message_key] = current_time
-            
     except Exception as e:
         logger.warning(f"[DUPLICATE_CHECK] Error in duplicate check: {e}", source="message_handler")
         # ממשיכים גם אם יש שגיאה בבדיקת כפילות
@@ -1064,10 +1086,20 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     
                     return
 
-        # 🚀 התחלת ניטור concurrent
+        logger.info(f"📩 התקבלה הודעה | chat_id={safe_str(chat_id)}, message_id={message_id}, תוכן={user_msg!r}", source="message_handler")
+        
+        # בדיקת הרשאות משתמש (לפני הכניסה - קובעת את מסלול העדיפות בתור העומס)
+        from db_manager import check_user_approved_status_db_async
+        from messages import approval_text, approval_keyboard, get_welcome_messages, get_code_request_message
+        
+        user_status_result = await check_user_approved_status_db_async(safe_str(chat_id))
+        user_status = user_status_result.get("status", "error") if isinstance(user_status_result, dict) else "error"
+        
+        # 🚀 התחלת ניטור concurrent - בעומס ממתינים בתור הוגן; משתמשים מאושרים קודמים ל-registration
         try:
             from concurrent_monitor import start_monitoring_user, end_monitoring_user
-            monitoring_result = await start_monitoring_user(safe_str(chat_id), safe_str(message_id), update)
+            admission_priority = "approved" if user_status == "approved" else "registration"
+            monitoring_result = await start_monitoring_user(safe_str(chat_id), safe_str(message_id), update, priority=admission_priority)
             if not monitoring_result:
                 overload_message = "⏳ הבוט עמוס כרגע. אנא נסה שוב בעוד מספר שניות."
                 await send_system_message(update, chat_id, overload_message)
@@ -1106,15 +1138,6 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             
             return
 
-        logger.info(f"📩 התקבלה הודעה | chat_id={safe_str(chat_id)}, message_id={message_id}, תוכן={user_msg!r}", source="message_handler")
-        
-        # בדיקת הרשאות משתמש
-        from db_manager import check_user_approved_status_db
-        from messages import approval_text, approval_keyboard, get_welcome_messages, get_code_request_message
-        
-        user_status_result = check_user_approved_status_db(safe_str(chat_id))
-        user_status = user_status_result.get("status", "error") if isinstance(user_status_result, dict) else "error"
-        
         if user_status == "not_found":
             # משתמש חדש לגמרי
             await handle_new_user_background(update, context, chat_id, user_msg)
@@ -1155,40 +1178,45 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
 
         # משתמש מאושר - שולח תשובה מיד
-        from db_manager import increment_user_message_count
-        increment_user_message_count(safe_str(chat_id))
+        from db_manager import increment_user_message_count_async
+        await increment_user_message_count_async(safe_str(chat_id))
         
         # 🔧 הוסר: ההתראה עכשיו נשלחת אוטומטית מתוך save_chat_message
         # אין צורך בקריאה נפרדת - כל הודעה שנשמרת = התראה לאדמין
         
         # קבלת תשובה מ-GPT
-        from gpt_a_handler import get_main_response
-        from chat_utils import get_balanced_history_for_gpt
-        
-        # בניית היסטוריה להקשר - 20 הודעות משתמש + 20 הודעות בוט עם סיכומי GPT-B
-        history_messages = get_balanced_history_for_gpt(safe_str(chat_id), user_limit=20, bot_limit=20)
-        
-        # 🔧 בניית הודעות מלאות עם כל הסיסטם פרומפטים
-        from chat_utils import build_complete_system_messages
+        from gpt_a_handler import get_main_response_async
+        from conversation_context import ConversationContext
         
-        # בניית כל הסיסטם פרומפטים במקום אחד
-        system_messages = build_complete_system_messages(safe_str(chat_id), user_msg, include_main_prompt=True)
+        # 🎯 הקשר שיחה לבקשה: היסטוריה, סיכום ומונה הודעות נטענים פעם אחת (ב-executor)
+        conversation = ConversationContext(chat_id, user_msg, approval_status=user_status_result)
+        await conversation.preload_async()
         
-        # בניית הודעות GPT מלאות
-        messages_for_gpt = system_messages.copy()
-        
-        # הוספת הודעות היסטוריה
-        if history_messages:
-            messages_for_gpt.extend(history_messages)
+        # בניית היסטוריה להקשר - 20 הודעות משתמש + 20 הודעות בוט עם סיכומי GPT-B
+        history_messages = conversation.get_balanced_history()
         
-        # הוספת הודעת המשתמש הנוכחית
-        messages_for_gpt.append({"role": "user", "content": user_msg})
+        # 🔧 בניית הודעות GPT מלאות: סיסטם פרומפטים, היסטוריה והודעת המשתמש הנוכחית
+        # 🧱 הסדר לפי GPT_A_PROMPT_LAYOUT - ב-cache_friendly החלקים היציבים קודם, לטובת prompt caching של הספק
+        from chat_utils import build_gpt_a_messages
+        messages_for_gpt = build_gpt_a_messages(safe_str(chat_id), user_msg, history_messages, context=conversation)
         
-        # קבלת תשובה מ-GPT
-        gpt_result = get_main_response(messages_for_gpt, safe_str(chat_id))
+        # קבלת תשובה מ-GPT - acompletion, ה-event loop ממשיך לשרת משתמשים אחרים בזמן ההמתנה
+        # ✍️ במצב סטרימינג ההודעה נשלחת אחרי באפר קצר ונערכת תוך כדי יצירה
+        streaming_reply = StreamingReply(update, chat_id, is_blocked=_is_internal_message) if GPT_A_STREAMING_ENABLED else None
+        try:
+            gpt_result = await get_main_response_async(
+                messages_for_gpt, safe_str(chat_id), context=conversation,
+                on_partial=streaming_reply.feed if streaming_reply else None
+            )
+        except BaseException:
+            if streaming_reply:
+                await streaming_reply.abort()
+            raise
         bot_reply = gpt_result.get("bot_reply") if isinstance(gpt_result, dict) else gpt_result
         
         if not bot_reply:
+            if streaming_reply:
+                await streaming_reply.abort()
             error_msg = error_human_funny_message()
             await send_system_message(update, chat_id, error_msg)
             await end_monitoring_user(safe_str(chat_id), False)
@@ -1199,7 +1227,10 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
 
         # �� שליחת התשובה למשתמש מיד!
-        telegram_send_time = await send_message(update, chat_id, bot_reply, is_bot_message=True, is_gpt_a_response=True)
+        # בסטרימינג: עריכה אחרונה עם הטקסט הנקי; אם עוד לא נשלח כלום - שליחה רגילה
+        telegram_send_time = await streaming_reply.finish(bot_reply) if streaming_reply else None
+        if telegram_send_time is None:
+            telegram_send_time = await send_message(update, chat_id, bot_reply, is_bot_message=True, is_gpt_a_response=True)
 
         # 🔧 מדידת זמן תגובה אמיתי מיד אחרי שליחה בפועל לטלגרם - זה הזמן האמיתי!
         if telegram_send_time:
@@ -1209,7 +1240,14 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             user_response_actual_time = time.time() - user_request_start_time
 
         # 🔧 כל השאר ברקע - המשתמש כבר קיבל תשובה!
-        asyncio.create_task(handle_background_tasks(update, context, chat_id, user_msg, bot_reply, message_id, user_request_start_time, gpt_result, history_messages, messages_for_gpt, user_response_actual_time))
+        # ⏳ דרך תור המשימות החסום (סדר לפי צ'אט, workers מוגבלים); כשהתור מלא - המתנה חסומה בזמן
+        # (זה ה-worker של הצ'אט - המתנה ארוכה הייתה עוצרת את ההודעות הבאות שלו) ואחריה המשימה נזרקת עם לוג
+        await background_jobs.submit(BackgroundJob(
+            "post_reply", safe_str(chat_id), handle_background_tasks,
+            args=(update, context, chat_id, user_msg, bot_reply, message_id, user_request_start_time, gpt_result, history_messages, messages_for_gpt, user_response_actual_time, conversation),
+            persist_as="post_reply_recovery",
+            persist_payload={"chat_id": safe_str(chat_id), "user_msg": user_msg, "bot_reply": bot_reply, "message_id": message_id},
+        ), timeout=BACKGROUND_SUBMIT_TIMEOUT_SECONDS)
         
     except Exception as ex:
         logger.error(f"❌ שגיאה בטיפול בהודעה: {ex}", source="message_handler")
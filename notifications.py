@@ -1,4 +1,5 @@
 """מרכז התראות, שגיאות ודיווחים לאדמין."""
+import html
 import json
 import os
 import re
@@ -43,7 +44,8 @@ import time
 from admin_notifications import (
     send_admin_notification,
     send_admin_notification_raw,
-    send_admin_alert
+    send_admin_alert,
+    deliver_admin_message
 )
 
 # 🔄 מסד נתונים במקום קבצים - תיקון מערכתי
@@ -327,19 +329,15 @@ def send_error_notification(error_message: str, chat_id: str = None, user_msg: s
         return msg
     if not isinstance(error_message, str):
         error_message = str(error_message)
-    text = f"🚨 שגיאה קריטית בבוט:\n<pre>{sanitize(error_message)}</pre>"
+    # ההודעה נשלחת כ-HTML - טקסט של משתמש/חריגה עם < או & היה מקבל 400 ומפיל את כל ה-digest
+    text = f"🚨 שגיאה קריטית בבוט:\n<pre>{html.escape(sanitize(error_message))}</pre>"
     if chat_id:
-        text += f"\nchat_id: {safe_str(chat_id)}"
+        text += f"\nchat_id: {html.escape(safe_str(chat_id))}"
     if user_msg:
-        text += f"\nuser_msg: {user_msg[:200]}"
+        text += f"\nuser_msg: {html.escape(user_msg[:200])}"
     try:
-        url = f"https://api.telegram.org/bot{ADMIN_BOT_TELEGRAM_TOKEN}/sendMessage"
-        payload = {
-            "chat_id": ADMIN_NOTIFICATION_CHAT_ID,
-            "text": text,
-            "parse_mode": "HTML"
-        }
-        requests.post(url, data=payload, timeout=TimeoutConfig.HTTP_REQUEST_TIMEOUT)
+        # דרך תור ההתראות - נקרא גם מתוך קוד async, ואסור לו לחכות לטלגרם
+        deliver_admin_message(text, urgent=True)
     except Exception as e:
         print(f"[ERROR] לא הצלחתי לשלוח שגיאה לאדמין: {e}")
 
@@ -353,13 +351,7 @@ def send_admin_notification_raw(message):
             logger.info(f"📨 [ADMIN_RAW] בסביבת בדיקה, לא שולח הודעה גולמית לאדמין: {message}")
             return
             
-        url = f"https://api.telegram.org/bot{ADMIN_BOT_TELEGRAM_TOKEN}/sendMessage"
-        payload = {
-            "chat_id": ADMIN_NOTIFICATION_CHAT_ID,
-            "text": message,
-            "parse_mode": "HTML"
-        }
-        requests.post(url, data=payload, timeout=TimeoutConfig.HTTP_REQUEST_TIMEOUT)
+        deliver_admin_message(message, coalesce=False)
     except Exception as e:
         print(f"[ERROR] לא הצלחתי לשלוח הודעה גולמית לאדמין: {e}")
 
@@ -399,12 +391,7 @@ def log_error_to_file(error_data, send_telegram=True):
                 f"משתמש: {error_data.get('chat_id', '')}\n"
                 f"הודעה: {str(error_data.get('user_msg', ''))[:80]}\n"
             )
-            url = f"https://api.telegram.org/bot{ADMIN_BOT_TELEGRAM_TOKEN}/sendMessage"
-            data = {
-                "chat_id": ADMIN_NOTIFICATION_CHAT_ID,
-                "text": msg
-            }
-            requests.post(url, data=data, timeout=TimeoutConfig.HTTP_REQUEST_TIMEOUT)
+            deliver_admin_message(msg, parse_mode=None)
     except Exception as e:
         print(f"💥 שגיאה ברישום שגיאה לקובץ: {e}")
 
@@ -617,36 +604,8 @@ from datetime import timedelta
 
 GENTLE_REMINDER_MESSAGE = "היי, רק רציתי לבדוק מה שלומך, מקווה שאתה בטוב. אין לחץ – פשוט רציתי להזכיר לך שאני כאן ואם בא לך לשתף אז... מה שלומך וזה?"
 REMINDER_INTERVAL_HOURS = 24
-REMINDER_STATE_FILE = os.path.join(os.path.dirname(__file__), "data", "reminder_state.json")
-_reminder_state = {}
-
-def _load_reminder_state():
-    """טוען מצב תזכורות מקובץ JSON."""
-    global _reminder_state
-    try:
-        if os.path.exists(REMINDER_STATE_FILE):
-            with open(REMINDER_STATE_FILE, 'r', encoding='utf-8') as f:
-                _reminder_state = json.load(f)
-                logger.debug(f"[REMINDER] Loaded {len(_reminder_state)} reminder states")
-        else:
-            _reminder_state = {}
-            logger.debug(f"[REMINDER] No reminder state file found, starting fresh")
-    except Exception as e:
-        logger.error(f"[REMINDER] Error loading reminder state: {e}")
-        _reminder_state = {}
-
-def _save_reminder_state():
-    """שומר מצב תזכורות לקובץ JSON."""
-    try:
-        # יצירת תיקיית data אם לא קיימת
-        os.makedirs(os.path.dirname(REMINDER_STATE_FILE), exist_ok=True)
-        
-        with open(REMINDER_STATE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(_reminder_state, f, ensure_ascii=False, indent=2)
-        
-        logger.debug(f"[REMINDER] Saved reminder state with {len(_reminder_state)} entries")
-    except Exception as e:
-        logger.error(f"[REMINDER] Error saving reminder state: {e}")
+# מצב התזכורות נשמר בטבלת reminder_activity (במקום data/reminder_state.json)
+from reminder_store import reminder_store
 
 # ==================== פונקציות ממשק ====================
 
@@ -654,20 +613,8 @@ def mark_user_active(chat_id: str):
     """
     מסמן שמשתמש פעיל (קיבל הודעה) - איפוס טיימר התזכורת
     """
-    global _reminder_state
     try:
-        current_time = get_israel_time()
-        _reminder_state[safe_str(chat_id)] = {
-            "last_activity": current_time.isoformat(),
-            "reminder_sent": False,
-            "reminder_delayed": False,
-            "inactive_since": None,
-            # רק לדיבאג - נוכחות המשתמש
-            "status": "active"
-        }
-        
-        # שמירה מידית של המצב החדש
-        _save_reminder_state()
+        reminder_store.mark_active(chat_id)  # בזיכרון בלבד - נכתב ל-DB ברקע
         
         logger.debug(f"[REMINDER] User {safe_str(chat_id)} marked as active", source="notifications")
         
@@ -681,19 +628,12 @@ def _is_allowed_time() -> bool:
 
 def _mark_reminder_delayed(chat_id: str) -> None:
     """מסמן שתזכורת נדחתה (בגלל שעה לא מתאימה)"""
-    global _reminder_state
-    if safe_str(chat_id) in _reminder_state:
-        _reminder_state[safe_str(chat_id)]["reminder_delayed"] = True
-        _save_reminder_state()
+    if reminder_store.mark_reminder_delayed(chat_id):
         logger.debug(f"[REMINDER] Reminder for user {safe_str(chat_id)} delayed due to time", source="notifications")
 
 def _mark_reminder_sent(chat_id: str) -> None:
-    """מסמן שתזכורת נשלחה"""
-    global _reminder_state
-    if safe_str(chat_id) in _reminder_state:
-        _reminder_state[safe_str(chat_id)]["reminder_sent"] = True
-        _reminder_state[safe_str(chat_id)]["reminder_delayed"] = False
-        _save_reminder_state()
+    """מסמן שתזכורת נשלחה - המשתמש לא יקבל תזכורת נוספת עד שיענה"""
+    reminder_store.mark_reminder_sent(chat_id)
 
 def _log_to_chat_history(chat_id: str) -> None:
     """רושם הודעת תזכורת להיסטוריה"""
@@ -753,17 +693,8 @@ async def send_gentle_reminder(chat_id: str) -> bool:
 
 def _mark_user_inactive(chat_id: str) -> None:
     """מסמן משתמש כלא פעיל (בעיקר אם חסם את הבוט)"""
-    global _reminder_state
     try:
-        current_time = get_israel_time()
-        _reminder_state[safe_str(chat_id)] = {
-            "last_activity": _reminder_state.get(safe_str(chat_id), {}).get("last_activity"),
-            "reminder_sent": False,
-            "reminder_delayed": False,
-            "inactive_since": current_time.isoformat(),
-            "status": "inactive"
-        }
-        _save_reminder_state()
+        reminder_store.mark_inactive(chat_id)
         logger.info(f"[REMINDER] User {safe_str(chat_id)} marked as inactive", source="notifications")
     except Exception as e:
         logger.error(f"[REMINDER] Error marking user {safe_str(chat_id)} as inactive: {e}", source="notifications")
@@ -775,7 +706,6 @@ def cleanup_inactive_users():
     """
     try:
         from config import CHAT_HISTORY_PATH
-        global _reminder_state
         
         if not os.path.exists(CHAT_HISTORY_PATH):
             logger.warning("[CLEANUP] Chat history file not found")
@@ -785,11 +715,8 @@ def cleanup_inactive_users():
         with open(CHAT_HISTORY_PATH, 'r', encoding='utf-8') as f:
             history_data = json.load(f)
         
-        _load_reminder_state()
-        
         # רשימת משתמשים לא פעילים
-        inactive_users = [chat_id for chat_id, state in _reminder_state.items() 
-                         if state.get("user_inactive")]
+        inactive_users = reminder_store.get_inactive_users()
         
         if not inactive_users:
             logger.info("[CLEANUP] No inactive users found")
@@ -816,102 +743,9 @@ def cleanup_inactive_users():
         logger.error(f"[CLEANUP] Error cleaning up inactive users: {e}")
 
 def auto_cleanup_old_users():
-    """ניקוי אוטומטי של משתמשים ישנים"""
+    """ניקוי אוטומטי של משתמשים ישנים - סימון כלא פעילים אחרי 60 יום בלי פעילות"""
     try:
-        now = get_israel_time()
-        
-        # וידוא timezone awareness
-        if now.tzinfo is None:
-            import pytz
-            israel_tz = pytz.timezone('Asia/Jerusalem')
-            now = israel_tz.localize(now)
-        
-        # סף של 60 יום לניקוי
-        cutoff_date = now - timedelta(days=60)
-        
-        cleanup_candidates = []
-        
-        # עבור על כל המשתמשים
-        for chat_id, user_state in _reminder_state.items():
-            try:
-                last_contact_str = user_state.get("last_contact")
-                if last_contact_str:
-                    try:
-                        # 🔧 תיקון: שימוש בפונקציה בטוחה
-                        last_contact_time = None
-                        if isinstance(last_contact_str, str):
-                            try:
-                                last_contact_time = datetime.fromisoformat(last_contact_str.replace("Z", "+00:00"))
-                            except ValueError:
-                                try:
-                                    last_contact_time = datetime.strptime(last_contact_str, "%Y-%m-%d %H:%M:%S")
-                                except ValueError:
-                                    pass
-                        elif isinstance(last_contact_str, datetime):
-                            last_contact_time = last_contact_str
-                        
-                        if last_contact_time:
-                            # וידוא timezone awareness
-                            if last_contact_time.tzinfo is None:
-                                import pytz
-                                israel_tz = pytz.timezone('Asia/Jerusalem')
-                                last_contact_time = israel_tz.localize(last_contact_time)
-                            
-                            if last_contact_time < cutoff_date:
-                                cleanup_candidates.append((chat_id, "old_user"))
-                    except (ValueError, TypeError) as e:
-                        logger.debug(f"[AUTO_CLEANUP] Error parsing last_contact for {chat_id}: {e}")
-                        cleanup_candidates.append((chat_id, "invalid_contact_time"))
-                
-                # בדיקת תזכורות שנשלחו מזמן
-                if user_state.get("reminder_sent"):
-                    reminder_time_str = user_state.get("sent_at")
-                    if reminder_time_str:
-                        try:
-                            # 🔧 תיקון: שימוש בפונקציה בטוחה
-                            reminder_time = None
-                            if isinstance(reminder_time_str, str):
-                                try:
-                                    reminder_time = datetime.fromisoformat(reminder_time_str.replace("Z", "+00:00"))
-                                except ValueError:
-                                    try:
-                                        reminder_time = datetime.strptime(reminder_time_str, "%Y-%m-%d %H:%M:%S")
-                                    except ValueError:
-                                        pass
-                            elif isinstance(reminder_time_str, datetime):
-                                reminder_time = reminder_time_str
-                            
-                            if reminder_time:
-                                # וידוא timezone awareness
-                                if reminder_time.tzinfo is None:
-                                    import pytz
-                                    israel_tz = pytz.timezone('Asia/Jerusalem')
-                                    reminder_time = israel_tz.localize(reminder_time)
-                                
-                                days_since_reminder = (now - reminder_time).days
-                                if days_since_reminder > 30:
-                                    cleanup_candidates.append((chat_id, f"no_response_to_reminder_{days_since_reminder}_days"))
-                        except (ValueError, TypeError) as e:
-                            logger.debug(f"[AUTO_CLEANUP] Error parsing reminder time for {chat_id}: {e}")
-                            pass
-                            
-            except ValueError:
-                # זמן לא תקין - מועמד לניקוי
-                cleanup_candidates.append((chat_id, "invalid_timestamp"))
-        
-        # סימון המשתמשים כלא פעילים
-        marked_count = 0
-        for chat_id, reason in cleanup_candidates:
-            _reminder_state[safe_str(chat_id)] = {
-                "user_inactive": True,
-                "marked_inactive_at": now.isoformat(),
-                "reason": f"auto_cleanup_{reason}"
-            }
-            marked_count += 1
-            logger.info(f"[AUTO_CLEANUP] Marked user {chat_id} as inactive: {reason}")
-        
-        # שמירת מצב
-        _save_reminder_state()
+        marked_count = reminder_store.mark_stale_inactive(60)
         
         if marked_count > 0:
             logger.info(f"[AUTO_CLEANUP] Marked {marked_count} users as inactive")
@@ -953,87 +787,32 @@ async def validate_user_before_reminder(chat_id: str) -> bool:
 async def check_and_send_gentle_reminders():
     """בדיקה ושליחת תזכורות עדינות"""
     try:
-        now = get_israel_time()
-        
-        # וידוא timezone awareness
-        if now.tzinfo is None:
-            import pytz
-            israel_tz = pytz.timezone('Asia/Jerusalem')
-            now = israel_tz.localize(now)
-        
         # בדיקת שעות מותרות
         if not _is_allowed_time():
             logger.debug("[REMINDER] Outside allowed hours", source="notifications")
             return 0
         
         # ניקוי אוטומטי
-        await auto_cleanup_old_users()
+        auto_cleanup_old_users()
         
-        # רענון מצב התזכורות
-        _load_reminder_state()  # 🔧 תיקון: שימוש בפונקציה קיימת
+        # מציאת מועמדים לתזכורת - שאילתה אחת מול האינדקס על last_activity
+        # (לא פעילים, לא ממתינים לתשובה לתזכורת קודמת, ללא פעילות REMINDER_INTERVAL_HOURS שעות)
+        reminder_candidates = reminder_store.get_due_users(idle_hours=REMINDER_INTERVAL_HOURS, max_idle_days=60)
+        reminders_sent = 0
         
-        # מציאת מועמדים לתזכורת
-        reminder_candidates = []
-        reminders_sent = 0  # 🔧 תיקון: הגדרת המשתנה
-        
-        for chat_id, user_state in _reminder_state.items():
+        for chat_id in reminder_candidates:
             try:
-                # דילוג על משתמשים לא פעילים
-                if user_state.get("user_inactive", False):
-                    continue
-                
-                # דילוג על משתמשים שכבר נשלחה להם תזכורת והם לא ענו
-                if user_state.get("reminder_sent_waiting_response", False):
-                    continue
+                logger.debug(f"[REMINDER] User {safe_str(chat_id)} needs reminder", source="notifications")
                 
-                # בדיקת זמן מגע אחרון
-                last_contact_str = user_state.get("last_contact")
-                if not last_contact_str:
+                # ✨ בדיקת תקפות המשתמש לפני שליחת תזכורת
+                is_valid = await validate_user_before_reminder(safe_str(chat_id))
+                if not is_valid:
+                    logger.debug(f"[REMINDER] User {safe_str(chat_id)} validation failed - skipping", source="notifications")
                     continue
                 
-                try:
-                    # 🔧 תיקון: שימוש בפונקציה בטוחה
-                    last_contact_time = None
-                    if isinstance(last_contact_str, str):
-                        try:
-                            last_contact_time = datetime.fromisoformat(last_contact_str.replace("Z", "+00:00"))
-                        except ValueError:
-                            try:
-                                last_contact_time = datetime.strptime(last_contact_str, "%Y-%m-%d %H:%M:%S")
-                            except ValueError:
-                                pass
-                    elif isinstance(last_contact_str, datetime):
-                        last_contact_time = last_contact_str
-                    
-                    if last_contact_time:
-                        # וידוא timezone awareness לשני התאריכים
-                        if last_contact_time.tzinfo is None:
-                            import pytz
-                            israel_tz = pytz.timezone('Asia/Jerusalem')
-                            last_contact_time = israel_tz.localize(last_contact_time)
-                        
-                        time_since_last = now - last_contact_time
-                        hours_since = time_since_last.total_seconds() / 3600
-                        
-                        # ✅ בדיקה: האם עברו מספיק שעות
-                        if time_since_last >= timedelta(hours=REMINDER_INTERVAL_HOURS):
-                            logger.debug(f"[REMINDER] User {safe_str(chat_id)} needs reminder ({hours_since:.1f}h since last contact)", source="notifications")
-                            
-                            # ✨ בדיקת תקפות המשתמש לפני שליחת תזכורת
-                            is_valid = await validate_user_before_reminder(safe_str(chat_id))
-                            if not is_valid:
-                                logger.debug(f"[REMINDER] User {safe_str(chat_id)} validation failed - skipping", source="notifications")
-                                continue
-                            
-                            success = await send_gentle_reminder(safe_str(chat_id))
-                            if success:
-                                reminders_sent += 1
-                        else:
-                            logger.debug(f"[REMINDER] User {safe_str(chat_id)} too recent ({hours_since:.1f}h < {REMINDER_INTERVAL_HOURS}h)", source="notifications")
-                            
-                except ValueError as e:
-                    logger.warning(f"[REMINDER] Invalid timestamp for user {safe_str(chat_id)}: {last_contact_str}", source="notifications")
-                    continue
+                success = await send_gentle_reminder(safe_str(chat_id))
+                if success:
+                    reminders_sent += 1
                     
             except Exception as user_error:
                 logger.warning(f"[REMINDER] Error checking user {safe_str(chat_id)}: {user_error}", source="notifications")
@@ -1050,9 +829,6 @@ async def gentle_reminder_background_task():
     """משימת רקע לבדיקת תזכורות כל שעה + ניקוי אוטומטי שבועי."""
     logger.info("[REMINDER] 🚀 Starting gentle reminder background task", source="notifications")
     
-    # 📂 טעינת מצב התזכורות בהתחלה
-    _load_reminder_state()
-    
     # מונה לניקוי שבועי (168 שעות = שבוע)
     hours_counter = 0
     
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+profile_cache.py - cache פרופילים בזיכרון: LRU חסום, TTL לכל רשומה, thread-safe
+================================================================================
+
+נכתב ונקרא גם מה-event loop וגם מ-threads של ה-executor (GPT-D), לכן כל הגישה
+עוברת דרך נעילה אחת. write-through: simple_data_manager.save_user_profile מעדכן
+את ה-cache אחרי כל שמירה מוצלחת, כך שקריאה אחרי כתיבה תמיד רואה את הנתון החדש.
+
+שימוש:
+    from profile_cache import profile_cache
+    profile = profile_cache.get(chat_id)     # None אם אין / פג תוקף
+    profile_cache.set(chat_id, profile)
+    profile_cache.invalidate(chat_id)
+    profile_cache.get_stats()
+
+🔧 הגדרות: PROFILE_CACHE_MAX_SIZE / PROFILE_CACHE_TTL_SECONDS ב-config.py
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from config import PROFILE_CACHE_MAX_SIZE, PROFILE_CACHE_TTL_SECONDS
+from user_friendly_errors import safe_str
+
+
+class ProfileCache:
+    """LRU עם TTL - מחזיר עותקים כדי ששינוי של קורא לא ידלוף ל-cache בלי שמירה"""
+
+    def __init__(self, max_size: int = PROFILE_CACHE_MAX_SIZE, ttl_seconds: float = PROFILE_CACHE_TTL_SECONDS):
+        self.max_size = max(1, max_size)
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # chat_id -> (expires_at, profile)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "writes": 0, "invalidations": 0}
+
+    def get(self, chat_id: Any) -> Optional[Dict]:
+        """פרופיל מה-cache (עותק) או None אם לא קיים / פג תוקף"""
+        key = safe_str(chat_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            expires_at, profile = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+        return copy.deepcopy(profile)
+
+    def set(self, chat_id: Any, profile: Dict) -> None:
+        """שמירה/עדכון רשומה; הרשומה הישנה ביותר נזרקת כשה-cache מלא"""
+        if profile is None:
+            self.invalidate(chat_id)
+            return
+        key = safe_str(chat_id)
+        value = copy.deepcopy(profile)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            self._stats["writes"] += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, chat_id: Any) -> bool:
+        """הסרת רשומה; מחזיר True אם הייתה קיימת"""
+        key = safe_str(chat_id)
+        with self._lock:
+            existed = self._entries.pop(key, None) is not None
+            if existed:
+                self._stats["invalidations"] += 1
+        return existed
+
+    def clear(self) -> None:
+        """ניקוי כל ה-cache"""
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, chat_id: Any) -> bool:
+        key = safe_str(chat_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and time.monotonic() < entry[0]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """מוני hit/miss/eviction לניטור"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["max_size"] = self.max_size
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
+
+
+# 🌐 מופע יחיד לכל התהליך
+profile_cache = ProfileCache()
@@ -16,8 +16,8 @@ from user_friendly_errors import safe_str, safe_chat_id
 from utils import get_israel_time
 from fields_dict import FIELDS_DICT, get_user_profile_fields
 
-# Cache פשוט לפרופילים
-_profile_cache = {}
+# Cache פרופילים - LRU חסום עם TTL ונעילה (ראה profile_cache.py)
+from profile_cache import profile_cache as _profile_cache
 
 def clear_profile_cache(chat_id: Any = None) -> None:
     """ניקוי cache פרופילים - פונקציה אחת פשוטה"""
@@ -29,8 +29,7 @@ def clear_profile_cache(chat_id: Any = None) -> None:
         else:
             # ניקוי פרופיל ספציפי
             safe_id = safe_str(chat_id)
-            if safe_id in _profile_cache:
-                del _profile_cache[safe_id]
+            if _profile_cache.invalidate(safe_id):
                 logger.debug(f"[CACHE_CLEAR] ניסה לנקות cache עבור משתמש {safe_id}", source="profile_utils")
                 
     except Exception as e:
@@ -42,8 +41,9 @@ def get_user_profile(chat_id: Any) -> Dict:
         safe_id = safe_str(chat_id)
         
         # בדיקה ב-cache קודם
-        if safe_id in _profile_cache:
-            return _profile_cache[safe_id]
+        cached_profile = _profile_cache.get(safe_id)
+        if cached_profile is not None:
+            return cached_profile
         
         # קבלה מהמסד נתונים
         from simple_data_manager import data_manager
@@ -52,7 +52,7 @@ def get_user_profile(chat_id: Any) -> Dict:
         
         if profile:
             # שמירה ב-cache
-            _profile_cache[safe_id] = profile
+            _profile_cache.set(safe_id, profile)
             return profile
         else:
             # יצירת פרופיל חדש
@@ -66,12 +66,9 @@ def get_user_profile(chat_id: Any) -> Dict:
                 'summary': ""
             }
             
-            # שמירה במסד נתונים
+            # שמירה במסד נתונים (write-through מעדכן גם את ה-cache)
             data_manager.save_user_profile(safe_id, new_profile)
             
-            # שמירה ב-cache
-            _profile_cache[safe_id] = new_profile
-            
             return new_profile
             
     except Exception as e:
@@ -95,8 +92,7 @@ def update_user_profile(chat_id: Any, updates: Dict) -> bool:
         success = data_manager.save_user_profile(safe_id, current_profile)
         
         if success:
-            # עדכון cache
-            _profile_cache[safe_id] = current_profile
+            # ה-cache עודכן ב-write-through של data_manager.save_user_profile
             logger.info(f"✅ פרופיל עודכן בהצלחה למשתמש {safe_id}", source="profile_utils")
             return True
         else:
@@ -117,8 +113,7 @@ def save_user_profile(chat_id: Any, profile_data: Dict) -> bool:
         success = data_manager.save_user_profile(safe_id, profile_data)
         
         if success:
-            # עדכון cache
-            _profile_cache[safe_id] = profile_data
+            # ה-cache עודכן ב-write-through של data_manager.save_user_profile
             logger.info(f"✅ פרופיל נשמר בהצלחה למשתמש {safe_id}", source="profile_utils")
             return True
         else:
@@ -321,10 +316,7 @@ def update_user_profile_fast(chat_id: Any, updates: Dict) -> bool:
         success = data_manager.update_user_profile_fast(safe_id, valid_updates)
         
         if success:
-            # ניקוי cache
-            if safe_id in _profile_cache:
-                del _profile_cache[safe_id]
-            
+            # ה-cache עודכן ב-write-through (הפרופיל הממוזג נשמר דרך data_manager.save_user_profile)
             logger.info(f"✅ פרופיל עודכן במהירות למשתמש {safe_id}", source="profile_utils")
             return True
         else:
@@ -530,7 +522,8 @@ def get_all_users_with_condition(condition: str) -> List[Dict]:
             logger.error("No database URL found", source="profile_utils")
             return []
         
-        conn = psycopg2.connect(DB_URL)
+        from db_pool import get_connection
+        conn = get_connection(DB_URL)
         cur = conn.cursor()
         
         # 🔧 תיקון: בדיקת קיום הטבלה תחילה
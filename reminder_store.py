@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+reminder_store.py - מצב תזכורות עדינות בטבלת reminder_activity
+================================================================
+
+במקום data/reminder_state.json (טעינה ושמירה של כל הקובץ בכל הודעה, בלי נעילה מול
+thread התזכורות), כל משתמש הוא שורה אחת עם אינדקס על last_activity:
+
+- mark_active - O(1): רק עדכון dict בזיכרון. thread רקע כותב את כל מה שהצטבר
+  ב-INSERT ... ON CONFLICT אחד כל REMINDER_ACTIVITY_FLUSH_SECONDS (write-behind)
+- get_due_users - שאילתה אחת "לא פעיל מאז X" מול האינדקס, במקום מעבר על כל המשתמשים
+- כל פעולה שתלויה בסדר (תזכורת נשלחה, סריקה) כותבת קודם את הפעילות הממתינה
+
+בשימוש הראשון, data/reminder_state.json הישן (אם קיים) מיובא פעם אחת - כולל מצב התזכורות - ומסומן .migrated.
+
+שימוש:
+    from reminder_store import reminder_store
+    reminder_store.mark_active(chat_id)
+    for chat_id in reminder_store.get_due_users(idle_hours=24):
+        ...
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from config import REMINDER_ACTIVITY_FLUSH_SECONDS
+from simple_logger import logger
+from user_friendly_errors import safe_str
+from utils import get_israel_time
+
+LEGACY_STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "reminder_state.json")
+
+
+def _now() -> datetime:
+    """זמן ישראל בלי tzinfo - כך נשמר בעמודות TIMESTAMP של הטבלה"""
+    return get_israel_time().replace(tzinfo=None)
+
+
+def _to_local_naive(value: str) -> Optional[datetime]:
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(get_israel_time().tzinfo).replace(tzinfo=None)
+    return parsed
+
+
+class ReminderActivityStore:
+    """מצב תזכורות לכל משתמש - Postgres + buffer כתיבה בזיכרון"""
+
+    def __init__(self, flush_interval: float = REMINDER_ACTIVITY_FLUSH_SECONDS,
+                 legacy_state_file: Optional[str] = LEGACY_STATE_FILE):
+        self.flush_interval = flush_interval
+        self.legacy_state_file = legacy_state_file
+        self._pending: Dict[str, datetime] = {}  # chat_id -> זמן הפעילות האחרון שעוד לא נכתב
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._table_ready = False
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {"marked": 0, "flushed": 0, "flushes": 0, "flush_errors": 0}
+
+    def mark_active(self, chat_id) -> None:
+        """המשתמש שלח/קיבל הודעה - מאפס המתנה לתזכורת (נכתב ל-DB ב-flush הבא)"""
+        with self._lock:
+            self._pending[safe_str(chat_id)] = _now()
+            self._stats["marked"] += 1
+        self._ensure_flusher()
+
+    def _ensure_flusher(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._flush_loop, daemon=True, name="reminder_activity_flush")
+            self._thread.start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def _ensure_table(self) -> None:
+        if self._table_ready:
+            return
+        import db_manager
+        db_manager.ensure_reminder_activity_table()
+        # הדגל נקבע רק אחרי ייבוא מוצלח - ייבוא שנכשל (DB) מנוסה שוב בפעולה הבאה
+        self._import_legacy_state()
+        self._table_ready = True
+
+    def _import_legacy_state(self) -> None:
+        """
+        ייבוא חד-פעמי של reminder_state.json הישן - פעילות אחרונה וגם מצב התזכורות
+        (ממתין לתשובה, דחייה, לא פעיל, מספר תזכורות), כדי שמי שכבר קיבל תזכורת או סומן
+        כלא פעיל לא יקבל תזכורת שוב אחרי המעבר. שגיאת DB נזרקת הלאה (ניסיון חוזר).
+        """
+        path = self.legacy_state_file
+        if not path or not os.path.exists(path):
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            # קובץ פגום לא יתוקן בניסיון חוזר - מדלגים עליו
+            logger.error(f"❌ [REMINDER_STORE] קריאת reminder_state.json נכשלה - לא מיובא: {e}", source="reminder_store")
+            return
+        rows = []
+        for chat_id, user_state in state.items():
+            user_state = user_state or {}
+            last_activity = _to_local_naive(user_state.get("last_activity") or user_state.get("last_contact"))
+            if not last_activity:
+                continue
+            inactive = bool(user_state.get("inactive", False))
+            rows.append((
+                chat_id,
+                last_activity,
+                int(user_state.get("reminders_sent") or 0),
+                _to_local_naive(user_state.get("last_reminder")),
+                bool(user_state.get("reminder_sent_waiting_response", False)),
+                bool(user_state.get("reminder_delayed", False)),
+                inactive,
+                _to_local_naive(user_state.get("inactive_since")) if inactive else None,
+                int(user_state.get("inactive_count") or 0),
+            ))
+        import db_manager
+        db_manager.import_legacy_reminder_state(rows)
+        os.replace(path, path + ".migrated")
+        logger.info(f"⏰ [REMINDER_STORE] יובאו {len(rows)} משתמשים מ-reminder_state.json", source="reminder_store")
+
+    def flush(self) -> int:
+        """כתיבת כל הפעילות שממתינה ב-upsert אחד. מחזיר כמה משתמשים נכתבו"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, {}
+            try:
+                self._ensure_table()
+                import db_manager
+                db_manager.upsert_reminder_activity(list(batch.items()))
+            except Exception as e:
+                # מחזירים ל-buffer (אם בינתיים נרשמה פעילות חדשה יותר - היא נשארת)
+                with self._lock:
+                    for chat_id, marked_at in batch.items():
+                        self._pending.setdefault(chat_id, marked_at)
+                    self._stats["flush_errors"] += 1
+                logger.error(f"❌ [REMINDER_STORE] כתיבת פעילות נכשלה ({len(batch)} משתמשים): {e}", source="reminder_store")
+                return 0
+            with self._lock:
+                self._stats["flushed"] += len(batch)
+                self._stats["flushes"] += 1
+            return len(batch)
+
+    def get_due_users(self, idle_hours: float = 24, max_idle_days: float = 30, limit: int = 100) -> List[str]:
+        """משתמשים שלא היו פעילים idle_hours שעות (ופחות מ-max_idle_days ימים) ולא ממתינים לתשובה לתזכורת"""
+        self.flush()
+        self._ensure_table()
+        import db_manager
+        now = _now()
+        due = db_manager.get_reminder_candidates(now - timedelta(hours=idle_hours), now - timedelta(days=max_idle_days), limit)
+        with self._lock:
+            # אם ה-flush נכשל - מי שפעיל בזיכרון לא מקבל תזכורת
+            return [chat_id for chat_id in due if chat_id not in self._pending]
+
+    def _update(self, chat_id, **changes) -> bool:
+        self.flush()  # פעילות שקדמה לעדכון חייבת להיכתב לפניו
+        self._ensure_table()
+        import db_manager
+        return db_manager.update_reminder_activity(safe_str(chat_id), **changes) > 0
+
+    def mark_reminder_sent(self, chat_id) -> bool:
+        return self._update(chat_id, sent_at=_now())
+
+    def mark_reminder_delayed(self, chat_id) -> bool:
+        return self._update(chat_id, delayed=True)
+
+    def mark_inactive(self, chat_id) -> bool:
+        """המשתמש חסם את הבוט / לא קיים"""
+        return self._update(chat_id, inactive_at=_now())
+
+    def mark_stale_inactive(self, days: float) -> int:
+        """סימון כל מי שלא היה פעיל days ימים כלא פעיל - מחזיר כמה סומנו"""
+        self.flush()
+        self._ensure_table()
+        import db_manager
+        now = _now()
+        return db_manager.mark_stale_reminder_users_inactive(now - timedelta(days=days), now)
+
+    def get_inactive_users(self) -> List[str]:
+        self._ensure_table()
+        import db_manager
+        return db_manager.get_inactive_reminder_users()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._pending)
+        return stats
+
+
+# 🌐 מופע יחיד לכל התהליך
+reminder_store = ReminderActivityStore()
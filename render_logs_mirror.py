@@ -14,8 +14,14 @@
 - מעקב אחר לוגים חדשים בלבד
 - אופטימיזציה לחיסכון ב-API calls
 
+⚡ שמירה: COPY לטבלה זמנית ו-INSERT ... ON CONFLICT DO NOTHING מול אינדקס ייחודי על
+mirror_hash (md5 של timestamp+message), וה-watermark נשמר ב-render_logs_mirror_state.
+ה-backfill של mirror_hash ובניית האינדקס רצים פעם אחת (_migrate_mirror_hash), לא בכל עלייה.
+ריצה = כמה פעולות set, לא 2 שאילתות לכל שורה.
+
 """
 
+import io
 import os
 import sys
 import time
@@ -24,10 +30,12 @@ import requests
 import threading
 import psycopg2
 import schedule
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional
 import signal
 
+from db_pool import copy_text_row
+
 # Import with fallback for missing modules
 try:
     from config import get_config, DB_URL
@@ -38,6 +46,11 @@ except ImportError:
     print("⚠️ Configuration modules not available - using fallback")
     CONFIG_AVAILABLE = False
 
+# מפתח הכפילות של שורת מירור - אותו ביטוי ב-INSERT וב-backfill של שורות ישנות
+MIRROR_HASH_SQL = "md5(timestamp::text || chr(10) || coalesce(message, ''))"
+MIRROR_BACKFILL_BATCH_SIZE = 5000  # שורות לכל UPDATE במיגרציה החד-פעמית של mirror_hash
+
+
 class RenderLogsMirror:
     """מערכת שיקוף לוגי Render בפריסה ויומית"""
     
@@ -98,6 +111,9 @@ class RenderLogsMirror:
             
             if table_exists:
                 print("✅ [MIRROR] טבלת deployment_logs קיימת")
+                self._ensure_mirror_schema(cur)
+                conn.commit()
+                self._migrate_mirror_hash(conn)
             else:
                 print("❌ [MIRROR] טבלת deployment_logs לא קיימת - יש ליצור אותה קודם")
                 
@@ -106,12 +122,97 @@ class RenderLogsMirror:
         except Exception as e:
             print(f"❌ [MIRROR] שגיאה בבדיקת טבלה: {e}")
     
+    def _ensure_mirror_schema(self, cur):
+        """עמודת mirror_hash וטבלת ה-watermark (idempotent וזול - רץ בכל עלייה)"""
+        cur.execute("ALTER TABLE deployment_logs ADD COLUMN IF NOT EXISTS mirror_hash TEXT")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS render_logs_mirror_state (
+                service_id TEXT PRIMARY KEY,
+                last_timestamp TIMESTAMP NOT NULL,
+                updated_at TIMESTAMP DEFAULT NOW()
+            )
+        """)
+    
+    def _mirror_index_state(self, cur) -> Optional[bool]:
+        """None - האינדקס הייחודי לא קיים, True - קיים ותקין, False - נשאר לא תקין מבנייה שנכשלה"""
+        cur.execute("""
+            SELECT i.indisvalid FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = 'uq_deployment_logs_mirror_hash'
+        """)
+        row = cur.fetchone()
+        return None if row is None else bool(row[0])
+    
+    def _migrate_mirror_hash(self, conn):
+        """
+        מיגרציה חד-פעמית: backfill של mirror_hash לשורות מירור ישנות ואינדקס ייחודי חלקי.
+        האינדקס התקין הוא הסימן שהמיגרציה הסתיימה - בעליות הבאות זו רק שאילתה אחת ל-pg_index.
+        ה-backfill רץ ב-batches חסומים (commit לכל batch) והאינדקס נבנה CONCURRENTLY מחוץ
+        לטרנזקציה, כך שהכתיבה ל-deployment_logs לא ננעלת לאורך כל הטבלה.
+        """
+        cur = conn.cursor()
+        index_state = self._mirror_index_state(cur)
+        conn.commit()
+        if index_state:
+            return
+        
+        # שורות מירור ישנות - hash לשורה אחת מכל כפילות (השאר נשארות NULL ומחוץ לאינדקס)
+        backfilled = 0
+        while True:
+            cur.execute(f"""
+                UPDATE deployment_logs SET mirror_hash = fresh.hash
+                FROM (
+                    SELECT DISTINCT ON (hash) id, hash FROM (
+                        SELECT id, {MIRROR_HASH_SQL} AS hash FROM deployment_logs
+                        WHERE source_module = 'render_api_mirror' AND mirror_hash IS NULL
+                    ) candidates
+                    WHERE NOT EXISTS (SELECT 1 FROM deployment_logs existing WHERE existing.mirror_hash = candidates.hash)
+                    ORDER BY hash, id
+                    LIMIT %s
+                ) fresh
+                WHERE deployment_logs.id = fresh.id
+            """, (MIRROR_BACKFILL_BATCH_SIZE,))
+            updated = cur.rowcount or 0
+            conn.commit()
+            backfilled += updated
+            if updated < MIRROR_BACKFILL_BATCH_SIZE:
+                break
+        if backfilled:
+            print(f"🔁 [MIRROR] backfill של mirror_hash ל-{backfilled} שורות ישנות")
+        
+        # CREATE INDEX CONCURRENTLY לא רץ בתוך טרנזקציה
+        conn.autocommit = True
+        try:
+            if index_state is False:
+                cur.execute("DROP INDEX CONCURRENTLY IF EXISTS uq_deployment_logs_mirror_hash")
+            cur.execute("""
+                CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_deployment_logs_mirror_hash
+                ON deployment_logs(mirror_hash) WHERE mirror_hash IS NOT NULL
+            """)
+        finally:
+            conn.autocommit = False
+        print("✅ [MIRROR] אינדקס mirror_hash נבנה")
+    
+    def _state_key(self) -> str:
+        return self.config.get('service_id') or 'default'
+    
     def _get_last_saved_time(self) -> Optional[datetime]:
-        """קבלת הזמן האחרון שנשמר במסד"""
+        """קבלת הזמן האחרון שנשמר במסד - מה-watermark, ואם אין (ריצה ראשונה) מ-MAX(timestamp)"""
         try:
             conn = psycopg2.connect(self.config['db_url'])
             cur = conn.cursor()
             
+            try:
+                cur.execute("SELECT last_timestamp FROM render_logs_mirror_state WHERE service_id = %s", (self._state_key(),))
+                row = cur.fetchone()
+            except Exception:
+                conn.rollback()
+                row = None
+            if row and row[0]:
+                conn.close()
+                print(f"📅 [MIRROR] watermark: {row[0]}")
+                return row[0]
+            
             cur.execute("""
                 SELECT MAX(timestamp) FROM deployment_logs 
                 WHERE source_module = 'render_api_mirror'
@@ -172,83 +273,100 @@ class RenderLogsMirror:
             self.error_count += 1
             return []
     
+    def _parse_log_entry(self, log_entry: Dict) -> tuple:
+        """לוג מ-Render -> (timestamp ב-UTC בלי tz, level, message)"""
+        timestamp = log_entry.get('timestamp')
+        message = log_entry.get('message', '') or ''
+        level = log_entry.get('level', 'INFO')
+        
+        # המרת timestamp
+        if timestamp:
+            if isinstance(timestamp, str):
+                # אם זה string, ננסה לפרש אותו
+                try:
+                    timestamp_dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+                except:
+                    timestamp_dt = datetime.now()
+            else:
+                timestamp_dt = timestamp
+        else:
+            timestamp_dt = datetime.now()
+        
+        # העמודה היא TIMESTAMP בלי אזור זמן - שומרים UTC (COPY מתעלם מ-offset)
+        if timestamp_dt.tzinfo is not None:
+            timestamp_dt = timestamp_dt.astimezone(timezone.utc).replace(tzinfo=None)
+        return timestamp_dt, level, message
+    
     def _save_logs_to_db(self, logs: List[Dict], sync_type: str = "manual") -> int:
-        """שמירת לוגים למסד הנתונים"""
+        """
+        שמירת לוגים למסד הנתונים - כמה פעולות set לכל ריצה, בלי קשר לכמות השורות:
+        COPY לטבלה זמנית -> INSERT ... ON CONFLICT DO NOTHING לפי mirror_hash -> עדכון watermark.
+        הכל בטרנזקציה אחת - ה-watermark מתקדם רק אם השורות נשמרו.
+        """
         if not logs:
             return 0
+        
+        buffer = io.StringIO()
+        latest = None
+        for log_entry in logs:
+            try:
+                timestamp_dt, level, message = self._parse_log_entry(log_entry)
+                metadata = json.dumps({'original_log': log_entry, 'sync_type': sync_type}, default=str)
+            except Exception as log_error:
+                print(f"⚠️ [MIRROR] שגיאה בפענוח לוג בודד: {log_error}")
+                continue
+            buffer.write(copy_text_row((timestamp_dt, level, message, metadata)))
+            latest = timestamp_dt if latest is None else max(latest, timestamp_dt)
+        if latest is None:
+            return 0
+        buffer.seek(0)
             
         try:
             conn = psycopg2.connect(self.config['db_url'])
-            cur = conn.cursor()
-            
-            saved_count = 0
-            
-            for log_entry in logs:
-                try:
-                    # חילוץ מידע מהלוג
-                    timestamp = log_entry.get('timestamp')
-                    message = log_entry.get('message', '')
-                    level = log_entry.get('level', 'INFO')
-                    
-                    # המרת timestamp
-                    if timestamp:
-                        if isinstance(timestamp, str):
-                            # אם זה string, ננסה לפרש אותו
-                            try:
-                                timestamp_dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                            except:
-                                timestamp_dt = datetime.now()
-                        else:
-                            timestamp_dt = timestamp
-                    else:
-                        timestamp_dt = datetime.now()
-                    
-                    # בדיקה שהלוג לא קיים כבר
-                    cur.execute("""
-                        SELECT COUNT(*) FROM deployment_logs 
-                        WHERE timestamp = %s AND message = %s AND source_module = 'render_api_mirror'
-                    """, (timestamp_dt, message))
-                    
-                    exists = cur.fetchone()[0]
-                    
-                    if exists == 0:
-                        # שמירת הלוג
-                        cur.execute("""
-                            INSERT INTO deployment_logs (
-                                timestamp, session_id, commit_hash, commit_message, 
-                                branch_name, deployment_id, environment, log_level, 
-                                source_module, source_function, source_line, message, 
-                                metadata, created_at
-                            ) VALUES (
-                                %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW()
-                            )
-                        """, (
-                            timestamp_dt,
-                            f'render_mirror_{sync_type}',
-                            'unknown',
-                            f'Mirror from Render API ({sync_type})',
-                            'main',
-                            f'render_api_sync_{sync_type}',
-                            'render',
-                            level,
-                            'render_api_mirror',
-                            f'sync_{sync_type}',
-                            0,
-                            message,
-                            json.dumps({'original_log': log_entry, 'sync_type': sync_type})
-                        ))
-                        
-                        saved_count += 1
-                        
-                except Exception as log_error:
-                    print(f"⚠️ [MIRROR] שגיאה בשמירת לוג בודד: {log_error}")
-                    continue
-            
-            conn.commit()
-            conn.close()
+            try:
+                cur = conn.cursor()
+                cur.execute("""
+                    CREATE TEMP TABLE render_logs_stage (
+                        timestamp TIMESTAMP, log_level TEXT, message TEXT, metadata JSONB
+                    ) ON COMMIT DROP
+                """)
+                cur.copy_expert("COPY render_logs_stage (timestamp, log_level, message, metadata) FROM STDIN", buffer)
+                cur.execute(f"""
+                    INSERT INTO deployment_logs (
+                        timestamp, session_id, commit_hash, commit_message, 
+                        branch_name, deployment_id, environment, log_level, 
+                        source_module, source_function, source_line, message, 
+                        metadata, created_at, mirror_hash
+                    )
+                    SELECT timestamp, %s, 'unknown', %s, 'main', %s, 'render', log_level,
+                           'render_api_mirror', %s, 0, message, metadata, NOW(), {MIRROR_HASH_SQL}
+                    FROM render_logs_stage
+                    ON CONFLICT (mirror_hash) WHERE mirror_hash IS NOT NULL DO NOTHING
+                """, (
+                    f'render_mirror_{sync_type}',
+                    f'Mirror from Render API ({sync_type})',
+                    f'render_api_sync_{sync_type}',
+                    f'sync_{sync_type}',
+                ))
+                saved_count = cur.rowcount
+                cur.execute("""
+                    INSERT INTO render_logs_mirror_state (service_id, last_timestamp, updated_at)
+                    VALUES (%s, %s, NOW())
+                    ON CONFLICT (service_id) DO UPDATE
+                    SET last_timestamp = GREATEST(render_logs_mirror_state.last_timestamp, EXCLUDED.last_timestamp),
+                        updated_at = NOW()
+                    RETURNING last_timestamp
+                """, (self._state_key(), latest))
+                self.last_saved_time = cur.fetchone()[0]
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
             
             if saved_count > 0:
-                print(f"💾 [MIRROR] נשמרו {saved_count} לוגים חדשים ({sync_type})")
+                print(f"💾 [MIRROR] נשמרו {saved_count} לוגים חדשים ({sync_type}, {len(logs) - saved_count} כבר קיימים)")
                 
             return saved_count
             
@@ -270,17 +388,11 @@ class RenderLogsMirror:
             
             if logs:
                 # שמירת לוגים למסד
+                # (מעדכן גם את last_saved_time מה-watermark)
                 saved_count = self._save_logs_to_db(logs, "deployment")
                 
                 if saved_count > 0:
                     self.total_logs_synced += saved_count
-                    
-                    # עדכון הזמן האחרון
-                    latest_log = max(logs, key=lambda x: x.get('timestamp', ''))
-                    if latest_log.get('timestamp'):
-                        self.last_saved_time = datetime.fromisoformat(
-                            latest_log['timestamp'].replace('Z', '+00:00')
-                        )
                 
                 print(f"✅ [MIRROR] סנכרון פריסה הושלם: {saved_count} לוגים חדשים")
                 return saved_count
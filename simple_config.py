@@ -41,6 +41,15 @@ class ProgressiveCommunication:
             return all_messages[latest_time]
         
         return "🤔 עוד רגע..."
+    
+    @classmethod
+    def get_queue_message(cls, position, eta_seconds):
+        """הודעה למשתמש שממתין בתור הכניסה (עומס) - מקום בתור וזמן המתנה משוער"""
+        if eta_seconds < 60:
+            eta_text = f"כ-{max(5, int(round(eta_seconds / 5.0)) * 5)} שניות"
+        else:
+            eta_text = f"כ-{int(round(eta_seconds / 60.0))} דקות"
+        return f"⏳ יש עומס כרגע - אתה במקום {position} בתור, זמן המתנה משוער {eta_text}. אני איתך עוד רגע!"
 
 class TimeoutConfig:
     """מחלקה לניהול כל הזמנים וtimeouts במערכת"""
@@ -59,9 +68,16 @@ class TimeoutConfig:
     DATABASE_CONNECTION_TIMEOUT = 10  # שניות לחיבור DB
     DATABASE_QUEUE_TIMEOUT = 1  # שניות לqueue של metrics
     DATABASE_QUEUE_TIMEOUT_MICRO = 0.001  # מילישניות לqueue מהיר
+    DATABASE_POOL_BORROW_TIMEOUT = 5  # שניות המתנה לחיבור פנוי מה-pool
+    DATABASE_POOL_HEALTH_CHECK_INTERVAL = 30  # שניות - חיבור שלא נוצל יותר מזה נבדק לפני השאלה
     
     # GPT timeouts
     GPT_PROCESSING_TIMEOUT = 120  # שניות לעיבוד GPT
+    # תקרות לשלבי העשרה ברקע (GPT-B/C/E במקביל, GPT-D אחרי GPT-C)
+    GPT_B_STAGE_TIMEOUT = 30  # שניות לסיכום GPT-B
+    GPT_C_STAGE_TIMEOUT = 30  # שניות לחילוץ פרופיל GPT-C
+    GPT_D_STAGE_TIMEOUT = 45  # שניות למיזוג פרופיל GPT-D (כולל DB)
+    GPT_E_STAGE_TIMEOUT = 60  # שניות ל-GPT-E (כולל טעינת היסטוריה)
     
     # Subprocess timeouts
     SUBPROCESS_TIMEOUT = 60  # שניות לפעולות subprocess כלליות
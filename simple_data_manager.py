@@ -17,6 +17,8 @@ from simple_config import TimeoutConfig
 
 # ייבוא הפונקציות המרכזיות מ-db_manager
 from db_manager import create_chat_messages_table_only, insert_chat_message_only
+from db_pool import get_connection
+from profile_cache import profile_cache
 
 # טעינת קונפיגורציה
 try:
@@ -30,14 +32,14 @@ except ImportError:
 def safe_db_connection():
     """
     🔒 Context Manager בטוח לחיבורי מסד נתונים
-    מונע דליפות זיכרון ומוודא סגירה תמיד
+    משאיל חיבור מה-pool המשותף (db_pool) ומוודא החזרה תמיד
     """
     conn = None
     try:
         if not DB_URL:
             raise Exception("No database URL found")
         
-        conn = psycopg2.connect(DB_URL)
+        conn = get_connection(DB_URL)
         yield conn
         
     except Exception as e:
@@ -49,7 +51,7 @@ def safe_db_connection():
                 pass
         raise e
     finally:
-        # תמיד סוגר את החיבור, גם במקרה של שגיאה
+        # תמיד מחזיר את החיבור ל-pool, גם במקרה של שגיאה
         if conn:
             try:
                 conn.close()
@@ -157,8 +159,10 @@ class SimpleDataManager:
                 
                 conn.commit()
                 cur.close()
-                
-                return True
+            
+            # 👤 write-through - רק אחרי commit מוצלח
+            profile_cache.set(chat_id, profile_data)
+            return True
                 
         except Exception as e:
             handle_database_error("save", chat_id, "profile")
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+streaming_reply.py - הצגת תשובת GPT-A בטלגרם תוך כדי יצירתה
+=============================================================
+
+במקום לחכות לתשובה המלאה ורק אז לשלוח, ההודעה הראשונה נשלחת אחרי באפר קצר
+(GPT_A_STREAM_FIRST_CHUNK_CHARS תווים או GPT_A_STREAM_FIRST_SEND_DELAY שניות מהטוקן הראשון),
+ומשם היא נערכת בקצב מווסת (GPT_A_STREAM_EDIT_INTERVAL) שמכבד את מגבלות ה-edit של טלגרם.
+
+שימוש:
+    reply = StreamingReply(update, chat_id)
+    gpt_result = await get_main_response_async(messages, chat_id, context=ctx, on_partial=reply.feed)
+    sent_at = await reply.finish(gpt_result["bot_reply"])   # עריכה אחרונה עם Markdown
+    if sent_at is None:
+        await send_message(update, chat_id, gpt_result["bot_reply"])   # לא נשלח / העריכה הסופית לא אושרה
+
+⚠️ עריכות ביניים נשלחות כטקסט רגיל (Markdown חלקי לא תקין), רק העריכה האחרונה עם parse_mode.
+⚠️ תשובה ארוכה מ-4096 תווים: ההודעה הנערכת מציגה את החלק הראשון והשאר נשלח בהודעות נוספות
+   (אותה חלוקה כמו ב-send_message - split_telegram_text).
+"""
+
+import asyncio
+import time
+from datetime import timedelta
+from typing import Callable, List, Optional
+
+from telegram.error import BadRequest, RetryAfter
+
+from config import GPT_A_STREAM_FIRST_CHUNK_CHARS, GPT_A_STREAM_FIRST_SEND_DELAY, GPT_A_STREAM_EDIT_INTERVAL
+from simple_config import TimeoutConfig
+from simple_logger import logger
+from user_friendly_errors import safe_str
+
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096
+STREAMING_CURSOR = " ▌"
+
+
+def split_telegram_text(text: str, limit: int = TELEGRAM_MAX_MESSAGE_LENGTH) -> List[str]:
+    """
+    חלוקת טקסט לחלקים של עד limit תווים (מגבלת טלגרם להודעה).
+    חותך בשבירת שורה האחרונה לפני הגבול, אחרת ברווח האחרון, ורק אם אין - באמצע מילה.
+    """
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit + 1)
+        if cut <= 0:
+            cut = text.rfind(" ", 0, limit + 1)
+        if cut <= 0:
+            cut = limit
+        parts.append(text[:cut].rstrip())
+        text = text[cut:].lstrip()
+    if text or not parts:
+        parts.append(text)
+    return parts
+
+
+def _retry_after_seconds(error: RetryAfter) -> float:
+    """RetryAfter.retry_after הוא int או timedelta (תלוי בגרסת python-telegram-bot)"""
+    retry_after = getattr(error, "retry_after", 1)
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after or 1)
+
+
+class StreamingReply:
+    """הודעת טלגרם אחת שמתעדכנת לפי הטקסט המצטבר מה-stream"""
+
+    def __init__(self, update, chat_id, is_blocked: Optional[Callable[[str], bool]] = None,
+                 first_chunk_chars: int = GPT_A_STREAM_FIRST_CHUNK_CHARS,
+                 first_send_delay: float = GPT_A_STREAM_FIRST_SEND_DELAY,
+                 edit_interval: float = GPT_A_STREAM_EDIT_INTERVAL):
+        self.update = update
+        self.chat_id = safe_str(chat_id)
+        self.is_blocked = is_blocked
+        self.first_chunk_chars = first_chunk_chars
+        self.first_send_delay = first_send_delay
+        self.edit_interval = edit_interval
+
+        self.sent_message = None
+        self.first_sent_at: Optional[float] = None
+        self.edits = 0
+        self._text = ""
+        self._first_token_at: Optional[float] = None
+        self._next_edit_at = 0.0
+        self._blocked = False
+        self._changed = asyncio.Event()
+        self._closed = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+
+    # ------------------------------------------------------------------
+    # הזנה מה-stream
+    # ------------------------------------------------------------------
+
+    def feed(self, text: str) -> None:
+        """עדכון הטקסט המצטבר - לא חוסם; השליחה והעריכות רצות ב-task נפרד"""
+        if self._blocked or self._closed.is_set() or not text:
+            return
+        if self.is_blocked and self.is_blocked(text):
+            # טקסט פנימי לא מוצג למשתמש גם חלקית - ההחלטה הסופית ב-finish/send_message
+            self._blocked = True
+            logger.warning(f"🚨 [STREAM] נעצר סטרימינג של הודעה פנימית | chat_id={self.chat_id}", source="streaming_reply")
+            return
+        if self._first_token_at is None:
+            self._first_token_at = time.time()
+        self._text = text
+        self._changed.set()
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        """שליחה ראשונה אחרי באפר קצר, ואז עריכה לכל היותר פעם ב-edit_interval"""
+        while not self._closed.is_set():
+            await self._changed.wait()
+            self._changed.clear()
+            if self._closed.is_set():
+                break
+
+            if self.sent_message is None:
+                first_token_at = self._first_token_at if self._first_token_at is not None else time.time()
+                wait = first_token_at + self.first_send_delay - time.time()
+                if len(self._text) < self.first_chunk_chars and wait > 0:
+                    try:
+                        await asyncio.wait_for(self._wait_for_chars(), timeout=wait)
+                    except asyncio.TimeoutError:
+                        pass
+                if self._closed.is_set():
+                    break
+                await self._send_first(self._text)
+            else:
+                wait = self._next_edit_at - time.time()
+                if wait > 0 and await self._closed_within(wait):
+                    break
+                try:
+                    await self._edit(self._text + STREAMING_CURSOR)
+                except Exception as e:
+                    logger.warning(f"⚠️ [STREAM] עריכת ביניים נכשלה: {e}", source="streaming_reply")
+
+    async def _wait_for_chars(self):
+        while len(self._text) < self.first_chunk_chars and not self._closed.is_set():
+            self._changed.clear()
+            await self._changed.wait()
+
+    async def _closed_within(self, seconds: float) -> bool:
+        """המתנה עד seconds שניות - מחזיר True אם finish/abort נקרא בינתיים"""
+        try:
+            await asyncio.wait_for(self._closed.wait(), timeout=seconds)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    # ------------------------------------------------------------------
+    # טלגרם
+    # ------------------------------------------------------------------
+
+    async def _send_first(self, text: str):
+        try:
+            self.sent_message = await asyncio.wait_for(
+                self.update.message.reply_text(text[:TELEGRAM_MAX_MESSAGE_LENGTH] + STREAMING_CURSOR),
+                timeout=TimeoutConfig.TELEGRAM_SEND_TIMEOUT
+            )
+            first_sent_at = time.time()
+            self.first_sent_at = first_sent_at
+            self._next_edit_at = first_sent_at + self.edit_interval
+            first_token_at = self._first_token_at if self._first_token_at is not None else first_sent_at
+            logger.info(f"✍️ [STREAM] הודעה ראשונה נשלחה אחרי {first_sent_at - first_token_at:.2f}s | chat_id={self.chat_id}", source="streaming_reply")
+        except Exception as e:
+            # בלי הודעה ראשונה - finish() יחזיר None והקורא ישלח את התשובה המלאה כרגיל
+            logger.warning(f"⚠️ [STREAM] שליחה ראשונה נכשלה: {e}", source="streaming_reply")
+            self._blocked = True
+
+    async def _edit(self, text: str, parse_mode: Optional[str] = None) -> bool:
+        text = text[:TELEGRAM_MAX_MESSAGE_LENGTH]
+        try:
+            await asyncio.wait_for(
+                self.sent_message.edit_text(text, parse_mode=parse_mode),
+                timeout=TimeoutConfig.TELEGRAM_SEND_TIMEOUT
+            )
+            self.edits += 1
+            self._next_edit_at = time.time() + self.edit_interval
+            return True
+        except RetryAfter as e:
+            # טלגרם ביקש להאט - דוחים את העריכה הבאה
+            self._next_edit_at = time.time() + _retry_after_seconds(e)
+            self._changed.set()
+            return False
+        except BadRequest as e:
+            if "not modified" in str(e).lower():
+                return True
+            raise
+
+    async def finish(self, final_text: Optional[str]) -> Optional[float]:
+        """
+        עצירת העריכות והצגת הטקסט הסופי (אחרי clean_bot_response) עם Markdown.
+        מחזיר את זמן השליחה הראשונה, או None אם שום דבר לא נשלח או שהעריכה הסופית לא אושרה -
+        ואז ההודעה החלקית (עם הסמן) נמחקת והקורא שולח את התשובה המלאה כרגיל.
+        """
+        await self._stop_flusher()
+        if self.sent_message is None or not final_text:
+            return None
+        if self.is_blocked and self.is_blocked(final_text):
+            await self._edit_or_ignore("...")
+            return None
+
+        parts = split_telegram_text(final_text)
+        confirmed = False
+        for attempt in range(2):
+            if attempt:
+                await asyncio.sleep(max(0.0, self._next_edit_at - time.time()))
+            try:
+                try:
+                    confirmed = await self._edit(parts[0], parse_mode="Markdown")
+                except BadRequest:
+                    # Markdown לא תקין (למשל כוכבית בודדת) - עריכה כטקסט רגיל
+                    confirmed = await self._edit(parts[0])
+            except Exception as e:
+                logger.error(f"❌ [STREAM] עריכה סופית נכשלה: {e}", source="streaming_reply")
+                break
+            if confirmed:
+                break
+
+        if not confirmed:
+            # בלי עריכה סופית המשתמש נשאר עם תשובה חתוכה שמסתיימת בסמן - מוחקים והקורא שולח הודעה מלאה
+            logger.warning(f"⚠️ [STREAM] העריכה הסופית לא אושרה - התשובה תישלח כהודעה חדשה | chat_id={self.chat_id}", source="streaming_reply")
+            await self._delete_or_ignore()
+            return None
+
+        # 📨 תשובה ארוכה מ-4096 תווים - ההמשך בהודעות נוספות (ההודעה הנערכת כבר מציגה את החלק הראשון)
+        for part in parts[1:]:
+            if not await self._send_continuation(part):
+                break
+        logger.info(f"📤 [STREAM] תשובה הושלמה | עריכות: {self.edits} | הודעות: {len(parts)} | chat_id={self.chat_id}", source="streaming_reply")
+        return self.first_sent_at
+
+    async def _send_continuation(self, text: str) -> bool:
+        try:
+            try:
+                await asyncio.wait_for(self.update.message.reply_text(text, parse_mode="Markdown"),
+                                       timeout=TimeoutConfig.TELEGRAM_SEND_TIMEOUT)
+            except BadRequest:
+                await asyncio.wait_for(self.update.message.reply_text(text),
+                                       timeout=TimeoutConfig.TELEGRAM_SEND_TIMEOUT)
+            return True
+        except Exception as e:
+            logger.error(f"❌ [STREAM] שליחת המשך התשובה נכשלה: {e} | chat_id={self.chat_id}", source="streaming_reply")
+            return False
+
+    async def abort(self):
+        """עצירה בלי עריכה סופית (למשל תשובה ריקה)"""
+        await self._stop_flusher()
+
+    async def _delete_or_ignore(self):
+        try:
+            await asyncio.wait_for(self.sent_message.delete(), timeout=TimeoutConfig.TELEGRAM_SEND_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"⚠️ [STREAM] מחיקת ההודעה החלקית נכשלה: {e}", source="streaming_reply")
+
+    async def _edit_or_ignore(self, text: str):
+        try:
+            await self._edit(text)
+        except Exception:
+            pass
+
+    async def _stop_flusher(self):
+        """סגירת ה-flusher - שליחה/עריכה שכבר בדרך מסתיימת (ולא נחתכת באמצע) כדי שלא תישלח הודעה כפולה"""
+        self._closed.set()
+        self._changed.set()
+        if self._flusher is not None:
+            try:
+                await self._flusher
+            except Exception as e:
+                logger.warning(f"⚠️ [STREAM] שגיאה בעצירת העדכונים: {e}", source="streaming_reply")
+            self._flusher = None
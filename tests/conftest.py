@@ -0,0 +1,37 @@
+"""
+conftest לבדיקות - בידוד stubs שבדיקות ישנות מתקינות ב-sys.modules בזמן import.
+
+test_age_message_persistence.py מחליף את psycopg2 / telegram / pytz במודולים מזויפים ברמת
+המודול (עוד לפני ה-skip ב-CI). בלי בידוד, כל קובץ בדיקה שנאסף אחריו ומייבא db_pool
+(ישירות או דרך מודול אחר) נכשל ב-import. כאן המודולים המקוריים חוזרים אחרי האיסוף של כל קובץ.
+"""
+import sys
+
+import pytest
+
+_STUBBED_MODULES = ("psycopg2", "telegram", "telegram.ext", "pytz")
+
+
+def _is_stub(module) -> bool:
+    """stub = Mock או ModuleType שנוצר ידנית (בלי spec) - לא מודול שיובא באמת"""
+    return getattr(module, "__spec__", None) is None
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_make_collect_report(collector):
+    if not isinstance(collector, pytest.Module):
+        yield
+        return
+    saved = {name: sys.modules.get(name) for name in _STUBBED_MODULES}
+    saved_timezone = getattr(saved["pytz"], "timezone", None)
+    yield
+    for name, module in saved.items():
+        current = sys.modules.get(name)
+        if current is module or not _is_stub(current):
+            continue
+        if module is None:
+            sys.modules.pop(name, None)
+        else:
+            sys.modules[name] = module
+    if saved["pytz"] is not None and saved_timezone is not None:
+        saved["pytz"].timezone = saved_timezone
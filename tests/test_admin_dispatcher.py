@@ -0,0 +1,147 @@
+"""בדיקות לתור התראות האדמין - איחוד ל-digest, הגבלת קצב, 429, submit מ-thread אחר והתראה מרשומה בזיכרון (בלי טלגרם אמיתי)"""
+import asyncio
+import os
+import sys
+import threading
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CI", "1")
+
+from admin_dispatcher import AdminNotificationDispatcher
+
+
+class _FakeResponse:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self._payload = payload or {}
+
+    def json(self):
+        return self._payload
+
+
+class _FakeClient:
+    def __init__(self, statuses=None):
+        self.sent = []
+        self.statuses = list(statuses or [])
+        self.closed = False
+
+    async def post(self, url, data=None):
+        self.sent.append(dict(data))
+        status = self.statuses.pop(0) if self.statuses else 200
+        return _FakeResponse(status, {"parameters": {"retry_after": 0.01}})
+
+    async def aclose(self):
+        self.closed = True
+
+
+def _dispatcher(client, **kwargs):
+    kwargs.setdefault("messages_per_minute", 6000)
+    kwargs.setdefault("burst", 10)
+    kwargs.setdefault("coalesce_seconds", 0.05)
+    return AdminNotificationDispatcher(bot_token="t", chat_id="1", client_factory=lambda: client, **kwargs)
+
+
+def test_not_running_returns_false():
+    assert _dispatcher(_FakeClient()).submit("x") is False
+
+
+def test_burst_is_coalesced_into_one_digest():
+    client = _FakeClient()
+
+    async def run():
+        dispatcher = _dispatcher(client)
+        await dispatcher.start()
+        for n in range(5):
+            assert dispatcher.submit(f"alert {n}")
+        dispatcher.submit("interaction", coalesce=False)
+        await asyncio.sleep(0.2)
+        await dispatcher.stop()
+        return dispatcher.get_stats()
+
+    stats = asyncio.run(run())
+    assert len(client.sent) == 2
+    assert "5 התראות" in client.sent[0]["text"] and "alert 4" in client.sent[0]["text"]
+    assert client.sent[1]["text"] == "interaction"
+    assert stats["digests"] == 1 and stats["messages_sent"] == 6 and client.closed
+
+
+def test_rate_limit_and_telegram_429():
+    client = _FakeClient(statuses=[429])
+
+    async def run():
+        dispatcher = _dispatcher(client, messages_per_minute=600, burst=1, coalesce_seconds=0)
+        await dispatcher.start()
+        dispatcher.submit("a", coalesce=False)
+        dispatcher.submit("b", coalesce=False)
+        await dispatcher.stop(drain_timeout=2)
+        return dispatcher.get_stats()
+
+    stats = asyncio.run(run())
+    assert [data["text"] for data in client.sent] == ["a", "a", "b"]
+    assert stats["telegram_429"] == 1 and stats["rate_limited_waits"] == 1 and stats["sent"] == 2
+
+
+def test_malformed_html_400_resends_digest_as_plain_text():
+    client = _FakeClient(statuses=[400])
+
+    async def run():
+        dispatcher = _dispatcher(client)
+        await dispatcher.start()
+        dispatcher.submit("<b>ok</b>")
+        dispatcher.submit("user typed a < b & c")
+        await asyncio.sleep(0.2)
+        await dispatcher.stop()
+        return dispatcher.get_stats()
+
+    stats = asyncio.run(run())
+    assert len(client.sent) == 2
+    assert client.sent[0]["parse_mode"] == "HTML" and "parse_mode" not in client.sent[1]
+    assert "<b>ok</b>" in client.sent[1]["text"] and "a < b & c" in client.sent[1]["text"]
+    assert stats["plain_text_fallbacks"] == 1 and stats["sent"] == 1 and stats["failed"] == 0
+
+
+def test_error_notification_escapes_user_and_exception_text(monkeypatch):
+    import notifications
+
+    delivered = []
+    monkeypatch.setattr(notifications, "deliver_admin_message", lambda text, **kwargs: delivered.append(text))
+    monkeypatch.setattr(notifications, "log_error_stat", lambda error_type: None)
+    notifications.send_error_notification("ValueError: <module> & co", chat_id="5", user_msg="<script>hi</script>")
+
+    assert "&lt;module&gt; &amp; co" in delivered[0]
+    assert "&lt;script&gt;hi&lt;/script&gt;" in delivered[0]
+    assert "<pre>" in delivered[0]
+
+
+def test_submit_from_other_thread():
+    client = _FakeClient()
+
+    async def run():
+        dispatcher = _dispatcher(client, coalesce_seconds=0)
+        await dispatcher.start()
+        results = []
+        thread = threading.Thread(target=lambda: results.append(dispatcher.submit("from thread", urgent=True)))
+        thread.start()
+        await asyncio.to_thread(thread.join)
+        await dispatcher.stop()
+        return results
+
+    assert asyncio.run(run()) == [True]
+    assert client.sent[0]["text"] == "from thread"
+
+
+def test_interaction_notification_from_memory_record():
+    from admin_notifications import format_interaction_notification
+    from interactions_logger import COMPLETE_INSERT_COLUMN_NAMES, interaction_record
+
+    values = {name: None for name in COMPLETE_INSERT_COLUMN_NAMES}
+    values.update(chat_id=123456789, user_msg="שלום", bot_msg="היי", gpt_a_processing_time=1.5,
+                  user_to_bot_response_time=2.0, background_processing_time=0.5, total_cost_agorot=3,
+                  history_user_messages_count=4, history_bot_messages_count=4,
+                  gpt_b_activated=True, gpt_b_reply="סיכום", timestamp=datetime(2025, 1, 1, 10, 0))
+    record = interaction_record(42, tuple(values[name] for name in COMPLETE_INSERT_COLUMN_NAMES))
+
+    text = format_interaction_notification(record, "פרופיל")
+    assert "XXXXX6789" in text and "שלום" in text and "סיכום" in text and "פרופיל" in text
+    assert "serial_number = 0000042" in text
@@ -11,6 +11,7 @@ if pytest is not None and (os.getenv("CI") or os.getenv("GITHUB_ACTIONS")):
 # -------- after potential skip --------
 import importlib
 import asyncio
+from unittest.mock import AsyncMock
 
 def _reload_module(mod_name):
     import sys
@@ -52,6 +53,7 @@ def test_admin_notification_focus_age(monkeypatch):
 
     # Patch the copies inside message_handler as well (import time copies)
     monkeypatch.setattr(mh, "extract_user_info", _fake_extract, raising=False)
+    monkeypatch.setattr(mh, "extract_user_info_async", AsyncMock(side_effect=_fake_extract), raising=False)
     monkeypatch.setattr(mh, "smart_update_profile_with_gpt_d_async", _fake_gpt_d_async, raising=False)
     monkeypatch.setattr(mh, "execute_gpt_e_if_needed", _fake_gpt_e_async, raising=False)
 
@@ -0,0 +1,110 @@
+"""בדיקות ל-admission control של ConcurrentMonitor - תור הוגן במקום דחייה, מסלולי עדיפות, סדר לפי צ'אט ומקביליות אדפטיבית"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CI", "1")
+
+import concurrent_monitor
+from concurrent_monitor import ConcurrentMonitor
+
+
+def _monitor(monkeypatch, max_users=1, max_wait=1.0):
+    # בלי התראות אדמין/טלגרם ובלי task ניקוי ברקע
+    monkeypatch.setattr(ConcurrentMonitor, "_send_rejection_alert", lambda self, *a: asyncio.sleep(0))
+    monkeypatch.setattr(ConcurrentMonitor, "_send_load_warning", lambda self: asyncio.sleep(0))
+    monkeypatch.setattr(ConcurrentMonitor, "_ensure_background_tasks_started", lambda self: asyncio.sleep(0))
+    monitor = ConcurrentMonitor(max_users)
+    monitor.max_wait_seconds = max_wait
+    monitor.min_concurrency = 1
+    return monitor
+
+
+def test_full_monitor_queues_instead_of_rejecting(monkeypatch):
+    monitor = _monitor(monkeypatch, max_users=1)
+
+    async def run():
+        assert await monitor.start_user_session("a", "1")
+        waiting = asyncio.create_task(monitor.start_user_session("b", "2"))
+        await asyncio.sleep(0.05)
+        queued = monitor.get_queue_length()
+        await monitor.end_user_session("a")
+        return queued, await waiting
+
+    queued, admitted = asyncio.run(run())
+    assert queued == 1
+    assert admitted is True
+    assert "b" in monitor.active_sessions
+    assert monitor.rejected_users == 0
+
+
+def test_rejects_only_after_max_wait(monkeypatch):
+    monitor = _monitor(monkeypatch, max_users=1, max_wait=0.05)
+
+    async def run():
+        await monitor.start_user_session("a", "1")
+        return await monitor.start_user_session("b", "2")
+
+    assert asyncio.run(run()) is False
+    assert monitor.rejected_users == 1
+    assert monitor.get_queue_length() == 0
+
+
+def test_approved_lane_is_weighted_over_registration(monkeypatch):
+    monitor = _monitor(monkeypatch, max_users=1)
+    monitor.approved_weight = 2
+    admitted = []
+
+    async def enter(chat_id, priority):
+        if await monitor.start_user_session(chat_id, "m", priority=priority):
+            admitted.append(chat_id)
+
+    async def run():
+        await monitor.start_user_session("busy", "0")
+        tasks = [asyncio.create_task(enter("r1", "registration"))]
+        await asyncio.sleep(0)
+        tasks += [asyncio.create_task(enter(f"a{i}", "approved")) for i in range(3)]
+        await asyncio.sleep(0.02)
+        finished = "busy"
+        for _ in range(4):
+            await monitor.end_user_session(finished)
+            await asyncio.sleep(0.01)
+            finished = admitted[-1]
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert admitted == ["a0", "a1", "r1", "a2"]
+
+
+def test_same_chat_waits_for_its_previous_session(monkeypatch):
+    monitor = _monitor(monkeypatch, max_users=5)
+
+    async def run():
+        await monitor.start_user_session("a", "1")
+        second = asyncio.create_task(monitor.start_user_session("a", "2"))
+        await asyncio.sleep(0.02)
+        still_first = monitor.active_sessions["a"].message_id
+        await monitor.end_user_session("a")
+        await second
+        return still_first, monitor.active_sessions["a"].message_id
+
+    assert asyncio.run(run()) == ("1", "2")
+
+
+def test_concurrency_limit_adapts_to_latency(monkeypatch):
+    monitor = _monitor(monkeypatch, max_users=20)
+    monitor.min_concurrency = 5
+    monitor.target_latency = 10
+    monkeypatch.setattr(concurrent_monitor.TimeoutConfig, "CONCURRENT_CLEANUP_INTERVAL", 0)
+
+    monitor._adapt_concurrency(40)
+    assert monitor.concurrency_limit == 15
+    for _ in range(10):
+        monitor._adapt_concurrency(40)
+    assert monitor.concurrency_limit == 5
+
+    for _ in range(30):
+        monitor._adapt_concurrency(1)
+    assert monitor.concurrency_limit == 20
+    assert monitor.estimate_wait_seconds(1) > 0
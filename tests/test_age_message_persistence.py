@@ -8,7 +8,7 @@ import tempfile
 import importlib
 import asyncio
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from types import ModuleType
 from unittest.mock import Mock
 
@@ -141,6 +141,7 @@ class TestAgeMessagePersistence(unittest.TestCase):
 
                             # Patch internal copies for safety
                             message_handler.extract_user_info = _fake_extract  # type: ignore
+                            message_handler.extract_user_info_async = AsyncMock(side_effect=_fake_extract)  # type: ignore
                             message_handler.smart_update_profile_with_gpt_d_async = _fake_gpt_d_async  # type: ignore
                             message_handler.execute_gpt_e_if_needed = _fake_gpt_e_async  # type: ignore
 
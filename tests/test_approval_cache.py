@@ -0,0 +1,102 @@
+"""בדיקות ל-approval_cache - שאילתה אחת לכמה הודעות, negative caching, וביטול בכתיבה (בלי DB אמיתי)"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CI", "1")
+
+import db_manager
+from approval_cache import approval_cache, ApprovalCache
+
+
+class _FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rowcount = 0
+        self._row = None
+
+    def execute(self, sql, params=()):
+        if sql.strip().startswith("SELECT code_approve, approved"):
+            self.db["selects"] += 1
+            self._row = self.db["rows"].get(params[0])
+        elif sql.startswith("UPDATE user_profiles SET approved = TRUE"):
+            row = self.db["rows"].get(params[1])
+            if row:
+                self.db["rows"][params[1]] = (row[0], True)
+                self.rowcount = 1
+
+    def fetchone(self):
+        return self._row
+
+    def close(self):
+        pass
+
+
+class _FakeConn:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self):
+        return _FakeCursor(self.db)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _fake_db(monkeypatch, rows):
+    db = {"rows": rows, "selects": 0}
+    monkeypatch.setattr(db_manager, "get_connection", lambda: _FakeConn(db))
+    monkeypatch.setattr(db_manager, "validate_chat_id", lambda chat_id: chat_id)
+    approval_cache.clear()
+    return db
+
+
+def test_repeated_checks_hit_cache(monkeypatch):
+    db = _fake_db(monkeypatch, {"111": ("1234", True)})
+    for _ in range(5):
+        assert db_manager.check_user_approved_status_db("111") == {"status": "approved"}
+    assert db["selects"] == 1
+
+    async def run():
+        return await db_manager.check_user_approved_status_db_async("111")
+
+    assert asyncio.run(run()) == {"status": "approved"}
+    assert db["selects"] == 1
+
+
+def test_approve_invalidates_pending_status(monkeypatch):
+    db = _fake_db(monkeypatch, {"222": ("5678", False)})
+    assert db_manager.check_user_approved_status_db("222")["status"] == "pending_approval"
+    assert db_manager.check_user_approved_status_db("222")["status"] == "pending_approval"
+    assert db["selects"] == 1
+
+    assert db_manager.approve_user_db_new("222")["success"] is True
+    assert db_manager.check_user_approved_status_db("222")["status"] == "approved"
+    assert db["selects"] == 2
+
+
+def test_unknown_users_are_negatively_cached_with_short_ttl(monkeypatch):
+    clock = {"now": 100.0}
+    import approval_cache as ac
+    monkeypatch.setattr(ac.time, "monotonic", lambda: clock["now"])
+    cache = ApprovalCache(ttl_seconds=300, negative_ttl_seconds=30, max_size=10)
+
+    cache.set("1", "not_found")
+    cache.set("2", "approved")
+    cache.set("3", "error")
+    clock["now"] += 31
+    assert cache.get("1") is None
+    assert cache.get("2") == "approved"
+    assert cache.get("3") is None
+
+
+def test_read_started_before_invalidate_is_not_cached():
+    cache = ApprovalCache(ttl_seconds=300, negative_ttl_seconds=30, max_size=10)
+    generation = cache.generation
+    cache.invalidate("9")  # כתיבה שהסתיימה בזמן שהשאילתה רצה
+    cache.set("9", "pending_code", generation)
+    assert cache.get("9") is None
@@ -0,0 +1,200 @@
+"""בדיקות לתור משימות הרקע - סדר לפי צ'אט, הגבלת מקביליות, backpressure, retry ושחזור (בלי DB אמיתי)"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CI", "1")
+
+import db_manager
+from background_jobs import BackgroundJob, BackgroundJobQueue
+
+
+def test_per_chat_order_and_worker_limit():
+    order = {"a": [], "b": []}
+    running = {"now": 0, "max": 0}
+
+    async def job(chat, n):
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        await asyncio.sleep(0.01)
+        order[chat].append(n)
+        running["now"] -= 1
+
+    async def run():
+        queue = BackgroundJobQueue(max_size=50, workers=2, persist=False)
+        for n in range(4):
+            for chat in ("a", "b", "c"):
+                if chat in order:
+                    await queue.submit(BackgroundJob("t", chat, job, args=(chat, n)))
+                else:
+                    await queue.submit(BackgroundJob("t", f"{chat}{n}", job, args=("a", 100 + n)))
+        await queue.stop(drain_timeout=5)
+        return queue.get_stats()
+
+    stats = asyncio.run(run())
+    assert order["b"] == [0, 1, 2, 3]
+    assert [n for n in order["a"] if n < 100] == [0, 1, 2, 3]
+    assert running["max"] <= 2
+    assert stats["completed"] == 12 and stats["pending"] == 0
+
+
+def test_submit_waits_when_queue_is_full():
+    async def run():
+        release = asyncio.Event()
+        queue = BackgroundJobQueue(max_size=2, workers=1, persist=False)
+
+        async def blocker():
+            await release.wait()
+
+        await queue.submit(BackgroundJob("t", "1", blocker))
+        await queue.submit(BackgroundJob("t", "2", blocker))
+        third = asyncio.create_task(queue.submit(BackgroundJob("t", "3", blocker)))
+        await asyncio.sleep(0.05)
+        blocked = not third.done()
+        release.set()
+        await asyncio.wait_for(third, timeout=1)
+        await queue.stop(drain_timeout=1)
+        return blocked, queue.get_stats()
+
+    blocked, stats = asyncio.run(run())
+    assert blocked
+    assert stats["backpressure_waits"] == 1
+    assert stats["completed"] == 3
+
+
+def test_submit_with_timeout_sheds_instead_of_running_outside_the_queue():
+    async def run():
+        release = asyncio.Event()
+        ran = []
+        queue = BackgroundJobQueue(max_size=1, workers=1, persist=False)
+
+        async def blocker():
+            await release.wait()
+
+        async def post_reply():
+            ran.append("post_reply")
+
+        await queue.submit(BackgroundJob("t", "1", blocker))
+        shed = await asyncio.wait_for(queue.submit(BackgroundJob("post_reply", "1", post_reply), timeout=0.05), timeout=1)
+        immediate = await queue.submit(BackgroundJob("post_reply", "2", post_reply), timeout=0)
+        release.set()
+        await queue.stop(drain_timeout=1)
+        return shed, immediate, ran, queue.get_stats()
+
+    shed, immediate, ran, stats = asyncio.run(run())
+    assert shed is False and immediate is False
+    assert ran == []
+    assert stats["shed"] == 2 and stats["waiting"] == 0 and stats["pending"] == 0
+
+
+def test_submit_with_timeout_takes_a_slot_freed_in_time():
+    async def run():
+        release = asyncio.Event()
+        queue = BackgroundJobQueue(max_size=1, workers=1, persist=False)
+
+        async def blocker():
+            await release.wait()
+
+        async def noop():
+            pass
+
+        await queue.submit(BackgroundJob("t", "1", blocker))
+        asyncio.get_running_loop().call_later(0.02, release.set)
+        accepted = await queue.submit(BackgroundJob("t", "2", noop), timeout=1)
+        await queue.stop(drain_timeout=1)
+        return accepted, queue.get_stats()
+
+    accepted, stats = asyncio.run(run())
+    assert accepted is True
+    assert stats["completed"] == 2 and stats["shed"] == 0
+
+
+def test_new_submit_does_not_jump_ahead_of_waiting_one():
+    async def run():
+        release = asyncio.Event()
+        order = []
+        queue = BackgroundJobQueue(max_size=1, workers=1, persist=False)
+
+        async def blocker():
+            await release.wait()
+
+        async def record(n):
+            order.append(n)
+
+        await queue.submit(BackgroundJob("t", "chat", blocker))
+        waiting = asyncio.create_task(queue.submit(BackgroundJob("t", "chat", record, args=(1,))))
+        await asyncio.sleep(0.02)
+        rejected = not queue.try_submit(BackgroundJob("t", "chat", record, args=(2,)))
+        release.set()
+        await asyncio.wait_for(waiting, timeout=1)
+        await queue.submit(BackgroundJob("t", "chat", record, args=(2,)))
+        await queue.stop(drain_timeout=1)
+        return rejected, order
+
+    rejected, order = asyncio.run(run())
+    assert rejected
+    assert order == [1, 2]
+
+
+def test_failed_job_is_retried_before_next_job_of_same_chat():
+    calls = []
+
+    async def flaky():
+        calls.append("flaky")
+        if calls.count("flaky") < 3:
+            raise RuntimeError("temporary")
+
+    async def after():
+        calls.append("after")
+
+    async def run():
+        queue = BackgroundJobQueue(max_size=10, workers=2, retry_base_delay=0.01, persist=False)
+        await queue.submit(BackgroundJob("t", "chat", flaky, max_attempts=3))
+        await queue.submit(BackgroundJob("t", "chat", after))
+        await queue.stop(drain_timeout=2)
+        return queue.get_stats()
+
+    stats = asyncio.run(run())
+    assert calls == ["flaky", "flaky", "flaky", "after"]
+    assert stats["retried"] == 2 and stats["failed"] == 0
+
+
+def test_persisted_jobs_are_deleted_on_success_and_restored(monkeypatch):
+    table = {}
+
+    def fake_save(job_type, chat_id, payload):
+        job_id = len(table) + 1
+        table[job_id] = (job_id, job_type, chat_id, payload, 0)
+        return job_id
+
+    monkeypatch.setattr(db_manager, "save_background_job", fake_save)
+    monkeypatch.setattr(db_manager, "delete_background_job", lambda job_id: table.pop(job_id, None))
+    monkeypatch.setattr(db_manager, "update_background_job_attempts", lambda job_id, attempts: None)
+    monkeypatch.setattr(db_manager, "load_pending_background_jobs", lambda limit=1000: list(table.values()))
+    restored = []
+
+    async def recover(chat_id, text):
+        restored.append((chat_id, text))
+
+    async def done():
+        pass
+
+    async def run():
+        queue = BackgroundJobQueue(max_size=10, workers=1, persist=True)
+        queue.register_handler("recover", recover)
+        await queue.submit(BackgroundJob("t", "1", done, persist_as="recover", persist_payload={"chat_id": "1", "text": "x"}))
+        await queue.stop(drain_timeout=1)
+        assert table == {}
+
+        # משימה שנשארה ב-DB מריצה קודמת
+        table[7] = (7, "recover", "2", {"chat_id": "2", "text": "שלום"}, 0)
+        fresh = BackgroundJobQueue(max_size=10, workers=1, persist=True)
+        fresh.register_handler("recover", recover)
+        count = await fresh.start()
+        await fresh.stop(drain_timeout=1)
+        return count
+
+    assert asyncio.run(run()) == 1
+    assert restored == [("2", "שלום")]
+    assert table == {}
@@ -0,0 +1,37 @@
+"""בדיקות להיסטוריה המאוזנת ל-GPT - שאילתה אחת ובחירת ההודעות האחרונות מכל תפקיד"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CI", "1")
+
+import chat_utils
+
+
+def test_balanced_history_uses_single_query_and_respects_ranks(monkeypatch):
+    start = datetime(2025, 1, 1)
+    # (user_msg, bot_msg, timestamp, user_rank, bot_rank) - כפי שהשאילתה מחזירה, מהישן לחדש
+    rows = [
+        ("ישן", "תשובה ישנה", start, 3, 3),
+        ("", "הודעה יזומה", start + timedelta(minutes=1), 2, 2),
+        ("אמצע", "תשובה אמצעית", start + timedelta(minutes=2), 2, 1),
+        ("אחרון", None, start + timedelta(minutes=3), 1, 0),
+    ]
+    calls = []
+
+    def fake_rows(chat_id, user_limit, bot_limit):
+        calls.append((chat_id, user_limit, bot_limit))
+        return rows
+
+    monkeypatch.setattr(chat_utils, "get_balanced_chat_rows", fake_rows)
+
+    history = chat_utils.get_balanced_history_for_gpt("123", user_limit=2, bot_limit=2)
+
+    assert calls == [("123", 2, 2)]
+    assert history == [
+        {"role": "assistant", "content": "הודעה יזומה"},
+        {"role": "user", "content": "אמצע"},
+        {"role": "assistant", "content": "תשובה אמצעית"},
+        {"role": "user", "content": "אחרון"},
+    ]
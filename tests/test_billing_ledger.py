@@ -0,0 +1,119 @@
+"""בדיקות לספר החיובים - הוספה אטומית משותפת לכמה workers, החזרה לתור בכישלון ו-BillingProtection מעליו (בלי DB אמיתי)"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CI", "1")
+
+import db_manager
+import gpt_utils
+from billing_ledger import BillingLedger
+from gpt_utils import BillingProtection
+
+
+def _fake_db(monkeypatch, fail=False):
+    table = {}
+    calls = {"increments": 0, "selects": 0}
+
+    def fake_increment(deltas):
+        if fail:
+            raise RuntimeError("db down")
+        calls["increments"] += 1
+        for key, amount in deltas.items():
+            table[key] = table.get(key, 0.0) + amount
+        return {key: table[key] for key in deltas}
+
+    def fake_totals(keys):
+        calls["selects"] += 1
+        return {key: table[key] for key in keys if key in table}
+
+    monkeypatch.setattr(db_manager, "ensure_billing_ledger_table", lambda: None)
+    monkeypatch.setattr(db_manager, "increment_billing_ledger", fake_increment)
+    monkeypatch.setattr(db_manager, "get_billing_ledger_totals", fake_totals)
+    return table, calls
+
+
+def _ledger():
+    ledger = BillingLedger(flush_interval=3600)
+    ledger._ensure_flusher = lambda: None  # ה-flush בבדיקות ידני בלבד
+    return ledger
+
+
+def test_adds_are_buffered_and_written_in_one_increment(monkeypatch):
+    table, calls = _fake_db(monkeypatch)
+    ledger = _ledger()
+    for _ in range(4):
+        ledger.add("usd:day:2025-01-20", 0.25)
+    assert ledger.get("usd:day:2025-01-20") == 1.0
+    assert table == {}
+
+    assert ledger.flush() == 1
+    assert calls["increments"] == 1
+    assert table == {"usd:day:2025-01-20": 1.0}
+    assert ledger.get("usd:day:2025-01-20") == 1.0
+    assert ledger.flush() == 0
+
+
+def test_workers_see_each_others_spend_after_flush(monkeypatch):
+    table, _ = _fake_db(monkeypatch)
+    worker_a, worker_b = _ledger(), _ledger()
+    worker_a.add("usd:month:2025-01", 3.0)
+    worker_b.add("usd:month:2025-01", 2.0)
+    worker_a.flush()
+    worker_b.flush()
+    assert table["usd:month:2025-01"] == 5.0
+    assert worker_b.get("usd:month:2025-01") == 5.0
+    # worker_a רואה את ההוצאה של b ב-flush הבא, גם בלי הוספות משלו
+    assert worker_a.get("usd:month:2025-01") == 3.0
+    worker_a.flush()
+    assert worker_a.get("usd:month:2025-01") == 5.0
+
+
+def test_failed_flush_keeps_amounts_pending(monkeypatch):
+    _fake_db(monkeypatch, fail=True)
+    ledger = _ledger()
+    ledger.add("usd:day:2025-01-20", 1.5)
+    assert ledger.flush() == 0
+    ledger.add("usd:day:2025-01-20", 0.5)
+    assert ledger.get("usd:day:2025-01-20") == 2.0
+    stats = ledger.get_stats()
+    assert stats["pending_keys"] == 1 and stats["flush_errors"] == 1
+
+    table, _ = _fake_db(monkeypatch)
+    assert ledger.flush() == 1
+    assert table == {"usd:day:2025-01-20": 2.0}
+
+
+def test_billing_protection_uses_shared_ledger(monkeypatch):
+    table, _ = _fake_db(monkeypatch)
+    ledger = _ledger()
+    guard = BillingProtection(daily_limit_usd=1.0, monthly_limit_usd=10.0, ledger=ledger)
+    status = guard.add_cost(0.9, "some-model", "paid")
+    assert status["daily_usage"] == 0.9 and "⚠️ השימוש היומי מעל 80%" in status["warnings"]
+    assert guard.get_alert_level()[0] == "warning"
+    ledger.flush()
+
+    # restart: מופע חדש טוען את ההוצאה מה-DB ולא מתחיל מאפס
+    restarted = BillingProtection(daily_limit_usd=1.0, monthly_limit_usd=10.0, ledger=_ledger())
+    daily_key, _ = restarted._get_current_keys()
+    restarted.ledger.get(f"usd:day:{daily_key}")
+    restarted.ledger.flush()
+    assert restarted.get_current_status()["daily_usage"] == 0.9
+    restarted.add_cost(0.2, "some-model", "paid")
+    assert restarted.get_alert_level()[0] == "critical"
+
+
+def test_free_model_daily_counts_live_in_ledger(monkeypatch):
+    _fake_db(monkeypatch)
+    ledger = _ledger()
+    monkeypatch.setattr(gpt_utils, "billing_ledger", ledger)
+    monkeypatch.setitem(gpt_utils.config, "FREE_MODELS", ["free-a", "free-b"])
+    monkeypatch.setitem(gpt_utils.config, "FREE_MODEL_DAILY_LIMIT", 3)
+
+    limits = gpt_utils._load_daily_limits()
+    gpt_utils._record_free_model_call("free-a", limits)
+    gpt_utils._record_free_model_call("free-b", limits, exhausted=True)
+    ledger.flush()
+
+    reloaded = gpt_utils._load_daily_limits()
+    assert reloaded["free-a"] == 1 and reloaded["free-b"] == 3
@@ -0,0 +1,117 @@
+"""בדיקות לעימוד keyset של היסטוריית צ'אט ולמיגרציית האינדקסים (בלי מסד נתונים אמיתי)"""
+import os
+import sys
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CI", "1")
+
+import db_manager
+import db_pool
+
+
+class _FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self._result = []
+
+    def execute(self, sql, params=None):
+        self.conn.executed.append((" ".join(sql.split()), params))
+        self.conn.autocommit_seen.append(self.conn.autocommit)
+        if "FROM chat_messages" in sql:
+            chat_id, *rest = params
+            limit = rest[-1]
+            rows = sorted(self.conn.rows, key=lambda r: (r[3], r[0]), reverse=True)
+            if len(rest) == 3:
+                rows = [r for r in rows if (r[3], r[0]) < (rest[0], rest[1])]
+            self._result = rows[:limit]
+        elif "pg_index" in sql:
+            self._result = list(self.conn.index_rows)
+
+    def fetchall(self):
+        return self._result
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def close(self):
+        pass
+
+
+class _FakeConn:
+    def __init__(self, rows=(), index_rows=()):
+        self.rows = list(rows)
+        self.index_rows = index_rows
+        self.executed = []
+        self.autocommit_seen = []
+        self.autocommit = False
+
+    def cursor(self):
+        return _FakeCursor(self)
+
+    def close(self):
+        pass
+
+
+def _rows(count):
+    start = datetime(2025, 1, 1)
+    return [(i, f"user {i}", f"bot {i}", start + timedelta(minutes=i)) for i in range(1, count + 1)]
+
+
+def test_pages_walk_backwards_without_overlap(monkeypatch):
+    conn = _FakeConn(_rows(7))
+    monkeypatch.setattr(db_manager, "get_connection", lambda: conn)
+
+    first, cursor = db_manager.get_chat_history_page("123", limit=3)
+    assert [r[0] for r in first] == [5, 6, 7]
+    second, cursor = db_manager.get_chat_history_page("123", limit=3, before=cursor)
+    assert [r[0] for r in second] == [2, 3, 4]
+    last, cursor = db_manager.get_chat_history_page("123", limit=3, before=cursor)
+    assert [r[0] for r in last] == [1]
+    assert cursor is None
+
+    # השאילתה נשענת על הסמן ולא על OFFSET
+    assert all("OFFSET" not in sql for sql, _ in conn.executed)
+
+
+def test_index_migration_skips_valid_and_rebuilds_invalid(monkeypatch):
+    valid = _FakeConn(index_rows=[(True,)])
+    monkeypatch.setattr(db_manager, "get_connection", lambda: valid)
+    assert db_manager.ensure_chat_messages_indexes() == []
+
+    invalid = _FakeConn(index_rows=[(False,)])
+    monkeypatch.setattr(db_manager, "get_connection", lambda: invalid)
+    assert db_manager.ensure_chat_messages_indexes() == list(db_manager.CHAT_MESSAGES_INDEXES)
+    statements = [sql for sql, _ in invalid.executed]
+    assert any(sql.startswith("DROP INDEX CONCURRENTLY") for sql in statements)
+    assert any(sql.startswith("CREATE INDEX CONCURRENTLY") for sql in statements)
+    assert all(invalid.autocommit_seen)
+    assert invalid.autocommit is False  # חוזר לקדמותו לפני החזרה ל-pool
+
+
+def test_index_migration_sets_autocommit_on_the_pooled_raw_connection(monkeypatch):
+    raw = _FakeConn(index_rows=[(False,)])
+    released = []
+    pooled = db_pool.PooledConnection(SimpleNamespace(release=lambda conn, discard=False: released.append(conn)), raw)
+    monkeypatch.setattr(db_manager, "get_connection", lambda: pooled)
+
+    db_manager.ensure_chat_messages_indexes()
+
+    ddl = [seen for (sql, _), seen in zip(raw.executed, raw.autocommit_seen) if "CONCURRENTLY" in sql]
+    assert ddl and all(ddl)
+    assert raw.autocommit is False
+    assert released == [raw]
+
+
+def test_per_save_table_check_runs_no_index_ddl():
+    class _Cursor:
+        def __init__(self):
+            self.executed = []
+
+        def execute(self, sql, params=None):
+            self.executed.append(sql)
+
+    cursor = _Cursor()
+    db_manager.create_chat_messages_table_only(cursor)
+    assert cursor.executed == [db_manager.CHAT_MESSAGES_SCHEMA]
@@ -0,0 +1,63 @@
+"""בדיקות ל-ConversationContext - כל נתון נטען פעם אחת ומתעדכן במקום אחרי שמירה"""
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CI", "1")
+
+import chat_utils
+import db_manager
+import profile_utils
+from conversation_context import ConversationContext
+
+
+def _patch_sources(monkeypatch, calls):
+    rows = [("שלום", "היי, מה שלומך?", datetime(2025, 1, 5, 10, 0))]
+
+    def fake_history(chat_id, limit=100):
+        calls.append("history")
+        return list(rows)
+
+    def fake_balanced(chat_id, user_limit=20, bot_limit=20):
+        calls.append("balanced")
+        return [{"role": "user", "content": "שלום"}]
+
+    def fake_count(chat_id):
+        calls.append("count")
+        return 9
+
+    def fake_summary(chat_id):
+        calls.append("summary")
+        return "סיכום"
+
+    monkeypatch.setattr(db_manager, "get_chat_history", fake_history)
+    monkeypatch.setattr(chat_utils, "get_chat_history", fake_history)
+    monkeypatch.setattr(chat_utils, "get_balanced_history_for_gpt", fake_balanced)
+    monkeypatch.setattr(chat_utils, "get_total_user_messages_count", fake_count)
+    monkeypatch.setattr(profile_utils, "get_user_summary_fast", fake_summary)
+
+
+def test_context_loads_each_source_once(monkeypatch):
+    calls = []
+    _patch_sources(monkeypatch, calls)
+
+    ctx = ConversationContext("123", "מה נשמע").preload()
+    chat_utils.build_complete_system_messages("123", "מה נשמע", context=ctx)
+    ctx.get_balanced_history()
+    ctx.get_history_for_users()
+
+    assert sorted(calls) == ["balanced", "count", "history", "summary"]
+    assert ctx.db_reads == 4
+
+
+def test_record_saved_message_updates_in_place(monkeypatch):
+    calls = []
+    _patch_sources(monkeypatch, calls)
+
+    ctx = ConversationContext("123", "מה נשמע").preload()
+    ctx.record_saved_message("מה נשמע", "הכל טוב")
+
+    assert ctx.get_message_count() == 10
+    assert [m["content"] for m in ctx.get_history_for_users()][-2:] == ["מה נשמע", "הכל טוב"]
+    assert calls.count("history") == 1
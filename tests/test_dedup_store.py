@@ -0,0 +1,71 @@
+"""בדיקות ל-dedup_store - תפוגה לפי TTL, תקרת זיכרון ומצב postgres (עם DB מדומה)"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CI", "1")
+
+import db_manager
+import dedup_store as ds
+from dedup_store import DedupStore
+
+
+def test_duplicate_within_ttl_and_expiry(monkeypatch):
+    clock = {"now": 1000.0}
+    monkeypatch.setattr(ds.time, "monotonic", lambda: clock["now"])
+    store = DedupStore(ttl_seconds=10, max_entries=100, backend="memory")
+
+    assert store.check_and_mark("1_1") is False
+    assert store.check_and_mark("1_1") is True
+    clock["now"] += 11
+    assert store.check_and_mark("1_2") is False
+    # המפתח הישן פג ונזרק בזמן ההכנסה של החדש
+    assert len(store) == 1
+    assert store.check_and_mark("1_1") is False
+    assert store.get_stats()["expired"] == 1
+
+
+def test_max_entries_evicts_oldest():
+    store = DedupStore(ttl_seconds=60, max_entries=3, backend="memory")
+    for i in range(5):
+        store.check_and_mark(f"k{i}")
+    assert len(store) == 3
+    assert store.check_and_mark("k4") is True
+    assert store.check_and_mark("k0") is False
+    assert store.get_stats()["evicted"] >= 2
+
+
+def test_postgres_backend_detects_duplicate_from_other_worker(monkeypatch):
+    claimed_keys = {"1_9"}  # worker אחר כבר טיפל בהודעה הזו
+    monkeypatch.setattr(db_manager, "ensure_processed_updates_table", lambda: None)
+    monkeypatch.setattr(db_manager, "purge_processed_updates", lambda ttl: 0)
+
+    def fake_claim(key, ttl):
+        if key in claimed_keys:
+            return False
+        claimed_keys.add(key)
+        return True
+
+    monkeypatch.setattr(db_manager, "claim_processed_update", fake_claim)
+    store = DedupStore(ttl_seconds=60, max_entries=100, backend="postgres")
+
+    async def run():
+        return [await store.is_duplicate(k) for k in ("1_8", "1_9", "1_8")]
+
+    assert asyncio.run(run()) == [False, True, True]
+    assert store.get_stats()["db_duplicates"] == 1
+
+
+def test_postgres_failure_falls_back_to_memory(monkeypatch):
+    def broken(*_a):
+        raise RuntimeError("db down")
+
+    monkeypatch.setattr(db_manager, "ensure_processed_updates_table", broken)
+    store = DedupStore(ttl_seconds=60, max_entries=100, backend="postgres")
+
+    async def run():
+        return [await store.is_duplicate("1_1"), await store.is_duplicate("1_1")]
+
+    assert asyncio.run(run()) == [False, True]
+    assert store.get_stats()["db_errors"] == 1
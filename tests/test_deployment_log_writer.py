@@ -0,0 +1,102 @@
+"""בדיקות ל-BatchedLogWriter - COPY מקובץ, זריקה בעומס עם מקום שמור ל-WARNING, חיבור מחדש ו-flush (בלי DB אמיתי)"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CI", "1")
+
+from deployment_logger import BatchedLogWriter, DEPLOY_LOG_COLUMNS
+
+
+class _FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def copy_expert(self, sql, buffer):
+        if self.conn.fail:
+            raise RuntimeError("connection lost")
+        self.conn.copies.append((sql, buffer.read().splitlines()))
+
+    def close(self):
+        pass
+
+
+class _FakeConn:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.copies = []
+        self.closed = False
+
+    def cursor(self):
+        return _FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def _entry(message, level="PRINT"):
+    entry = {column: None for column in DEPLOY_LOG_COLUMNS}
+    entry.update({"log_level": level, "message": message, "session_id": "s1", "memory_mb": 101.6})
+    return entry
+
+
+def test_rows_are_copied_in_one_batch_over_one_connection():
+    connections = []
+
+    def connect():
+        connections.append(_FakeConn())
+        return connections[-1]
+
+    writer = BatchedLogWriter(connect, max_size=100, batch_size=50, flush_interval=0.05)
+    for n in range(5):
+        writer.put(_entry(f"line {n}\twith tab"))
+    writer.put(_entry("multi\nline"))
+    writer.start()
+    assert writer.flush(timeout=2)
+
+    assert len(connections) == 1
+    sql, lines = connections[0].copies[0]
+    assert sql.startswith("COPY deployment_logs (timestamp, session_id")
+    assert len(lines) == 6
+    fields = lines[0].split("\t")
+    assert len(fields) == len(DEPLOY_LOG_COLUMNS)
+    assert fields[DEPLOY_LOG_COLUMNS.index("message")] == "line 0\\twith tab"
+    assert fields[DEPLOY_LOG_COLUMNS.index("memory_mb")] == "102"
+    assert fields[DEPLOY_LOG_COLUMNS.index("user_id")] == "\\N"
+    assert lines[5].split("\t")[DEPLOY_LOG_COLUMNS.index("message")] == "multi\\nline"
+    assert writer.get_stats()["written"] == 6
+
+
+def test_saturated_queue_drops_prints_but_keeps_warnings_and_reports_drops():
+    conn = _FakeConn()
+    writer = BatchedLogWriter(lambda: conn, max_size=3, batch_size=50, flush_interval=0.05)
+    accepted = [writer.put(_entry(f"p{n}")) for n in range(5)]
+    assert accepted == [True, True, True, False, False]
+    assert writer.put(_entry("boom", level="ERROR"))
+
+    writer.start()
+    assert writer.flush(timeout=2)
+    messages = [line.split("\t")[DEPLOY_LOG_COLUMNS.index("message")] for _, lines in conn.copies for line in lines]
+    assert messages[:4] == ["p0", "p1", "p2", "boom"]
+    assert "dropped 2 log rows" in messages[4]
+    assert writer.get_stats()["dropped"] == 2
+
+
+def test_failed_copy_reconnects_for_next_batch():
+    connections = [_FakeConn(fail=True), _FakeConn()]
+    opened = []
+
+    def connect():
+        opened.append(connections[len(opened)])
+        return opened[-1]
+
+    writer = BatchedLogWriter(connect, max_size=10, batch_size=10, flush_interval=0.01)
+    assert writer.write_batch([_entry("a")]) is False
+    assert connections[0].closed
+    assert writer.write_batch([_entry("b")]) is True
+    assert len(connections[1].copies) == 1
+    stats = writer.get_stats()
+    assert stats["failed"] == 1 and stats["written"] == 1
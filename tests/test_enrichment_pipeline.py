@@ -0,0 +1,65 @@
+"""בדיקות לגרף ההעשרה ברקע - GPT-B/C/E במקביל, GPT-D מחכה ל-GPT-C, timeout לכל שלב (בלי LLM ובלי DB)"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CI", "1")
+
+import message_handler as mh
+
+
+def _patch_stages(monkeypatch, events, delays):
+    async def stage(name, result):
+        events.append(f"{name}-start")
+        await asyncio.sleep(delays[name])
+        events.append(f"{name}-end")
+        return result
+
+    async def fake_b(user_msg, bot_reply, chat_id, message_id=None):
+        return await stage("b", {"summary": "סיכום", "usage": {}})
+
+    async def fake_c(user_msg, chat_id, message_id=None):
+        return await stage("c", {"extracted_fields": {"age": "30"}})
+
+    async def fake_d(chat_id, user_msg, bot_reply, gpt_c_result=None):
+        assert gpt_c_result == {"extracted_fields": {"age": "30"}}
+        return await stage("d", ({"age": "30"}, {}))
+
+    async def fake_e(chat_id):
+        return await stage("e", {"changes": {}})
+
+    monkeypatch.setattr(mh, "get_summary_async", fake_b)
+    monkeypatch.setattr(mh, "extract_user_info_async", fake_c)
+    monkeypatch.setattr(mh, "smart_update_profile_with_gpt_d_async", fake_d)
+    monkeypatch.setattr(mh, "execute_gpt_e_if_needed", fake_e)
+    monkeypatch.setattr(mh, "should_run_gpt_c", lambda _msg: True)
+
+
+def test_stages_run_in_parallel_and_gpt_d_waits_for_gpt_c(monkeypatch):
+    events = []
+    _patch_stages(monkeypatch, events, {"b": 0.2, "c": 0.1, "d": 0.1, "e": 0.2})
+
+    started = time.monotonic()
+    results = asyncio.run(mh.run_enrichment_pipeline("chat-1", "אני בן 30", "x" * 150))
+    elapsed = time.monotonic() - started
+
+    # B, C ו-E מתחילים יחד; D מתחיל רק אחרי ש-C הסתיים
+    assert set(events[:3]) == {"b-start", "c-start", "e-start"}
+    assert events.index("d-start") > events.index("c-end")
+    assert elapsed < 0.35
+    assert results["b"]["summary"] == "סיכום"
+    assert results["d"] == ({"age": "30"}, {})
+
+
+def test_slow_stage_times_out_without_blocking_others(monkeypatch):
+    events = []
+    _patch_stages(monkeypatch, events, {"b": 0.01, "c": 0.01, "d": 0.01, "e": 1})
+    monkeypatch.setattr(mh.TimeoutConfig, "GPT_E_STAGE_TIMEOUT", 0.05)
+
+    results = asyncio.run(mh.run_enrichment_pipeline("chat-1", "אני בן 30", "קצר"))
+    assert results["e"] is None
+    # תשובה קצרה - אין סיכום
+    assert results["b"] is None and "b-start" not in events
+    assert results["c"] == {"extracted_fields": {"age": "30"}}
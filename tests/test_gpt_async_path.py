@@ -0,0 +1,111 @@
+"""בדיקות לנתיב ה-LLM האסינכרוני (litellm.acompletion) - מקביליות, timeout ו-fallback, בלי קריאות רשת"""
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CI", "1")
+
+import gpt_a_handler
+import gpt_c_handler
+import gpt_utils
+
+
+def _fake_response(content, model="stub-model"):
+    usage = SimpleNamespace(prompt_tokens=10, completion_tokens=5, total_tokens=15)
+    return SimpleNamespace(
+        id="resp-1",
+        model=model,
+        usage=usage,
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+    )
+
+
+class _FakeContext:
+    def __init__(self, count):
+        self.count = count
+        self.calls = 0
+
+    def get_message_count(self):
+        self.calls += 1
+        return self.count
+
+
+def test_acompletion_with_timeout_raises_on_slow_model(monkeypatch):
+    async def slow_acompletion(**_params):
+        await asyncio.sleep(1)
+
+    monkeypatch.setattr(gpt_utils.litellm, "acompletion", slow_acompletion)
+
+    async def run():
+        await gpt_utils.acompletion_with_timeout({"model": "m", "messages": []}, timeout=0.05)
+
+    try:
+        asyncio.run(run())
+    except asyncio.TimeoutError:
+        pass
+    else:
+        raise AssertionError("expected asyncio.TimeoutError")
+
+
+def test_main_response_calls_run_concurrently(monkeypatch):
+    async def fake_acompletion(completion_params, timeout=None):
+        await asyncio.sleep(0.2)
+        return _fake_response("תשובה", completion_params["model"])
+
+    monkeypatch.setattr(gpt_a_handler, "acompletion_with_timeout", fake_acompletion)
+    messages = [{"role": "user", "content": "שלום"}]
+
+    async def run():
+        contexts = [_FakeContext(3) for _ in range(5)]
+        started = time.monotonic()
+        results = await asyncio.gather(*[
+            gpt_a_handler.get_main_response_async(messages, f"chat-{i}", context=ctx)
+            for i, ctx in enumerate(contexts)
+        ])
+        return results, contexts, time.monotonic() - started
+
+    results, contexts, elapsed = asyncio.run(run())
+    assert [r["bot_reply"] for r in results] == ["תשובה"] * 5
+    # חמש קריאות של 0.2 שניות רצות במקביל - לא 1 שנייה בטור
+    assert elapsed < 0.6
+    # מספר ההודעות נלקח מההקשר ולא מה-DB
+    assert all(ctx.calls == 1 for ctx in contexts)
+
+
+def test_main_response_timeout_returns_busy_reply(monkeypatch):
+    async def hanging_acompletion(completion_params, timeout=None):
+        raise asyncio.TimeoutError()
+
+    notifications = []
+    monkeypatch.setattr(gpt_a_handler, "acompletion_with_timeout", hanging_acompletion)
+    monkeypatch.setattr(gpt_a_handler, "send_error_notification", lambda **kw: notifications.append(kw))
+
+    result = asyncio.run(gpt_a_handler.get_main_response_async(
+        [{"role": "user", "content": "שלום"}], "chat-1", context=_FakeContext(3), timeout=1
+    ))
+    assert result["model"] == "timeout"
+    assert result["error"] == "timeout"
+    assert notifications and notifications[0]["error_type"] == "gpt_a_timeout_error"
+
+
+def test_extract_user_info_async_falls_back_on_rate_limit(monkeypatch):
+    if "gpt_c" not in gpt_c_handler.GPT_FALLBACK_MODELS:
+        monkeypatch.setitem(gpt_c_handler.GPT_FALLBACK_MODELS, "gpt_c", "fallback-model")
+    models = []
+
+    async def fake_acompletion(completion_params, timeout=None):
+        models.append(completion_params["model"])
+        if len(models) == 1:
+            raise Exception("429 rate limit exceeded")
+        return _fake_response('{"age": "35"}', completion_params["model"])
+
+    monkeypatch.setattr(gpt_c_handler, "acompletion_with_timeout", fake_acompletion)
+    monkeypatch.setattr(gpt_c_handler, "_log_gpt_c_call", lambda *a, **k: None)
+
+    result = asyncio.run(gpt_c_handler.extract_user_info_async("אני בן 35", "chat-1"))
+    assert result["extracted_fields"] == {"age": "35"}
+    assert result["fallback_used"] is True
+    assert models == [gpt_c_handler.GPT_MODELS["gpt_c"], gpt_c_handler.GPT_FALLBACK_MODELS["gpt_c"]]
@@ -0,0 +1,129 @@
+"""בדיקות למרוץ hedged בין מודלים - גיבוי אחרי השהיה, ביטול המפסידים, כישלון, מגבלת חיוב, בלי מרוץ ספקולטיבי למודל בתשלום ו-GPT-A (בלי קריאות רשת)"""
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CI", "1")
+
+import gpt_a_handler
+import gpt_utils
+from gpt_utils import ModelLatencyTracker, hedged_completion
+
+
+def _tracker():
+    return ModelLatencyTracker(default_delay=0.05, min_delay=0.01, max_delay=1, min_samples=3)
+
+
+def _fake_call(delays, cancelled=None, failing=()):
+    async def call(params):
+        model = params["model"]
+        try:
+            await asyncio.sleep(delays[model])
+        except asyncio.CancelledError:
+            if cancelled is not None:
+                cancelled.append(model)
+            raise
+        if model in failing:
+            raise RuntimeError(f"{model} down")
+        return SimpleNamespace(model=model)
+    return call
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    cancelled = []
+    tracker = _tracker()
+
+    async def run():
+        started = time.monotonic()
+        response, params = await hedged_completion(
+            [("slow", False), ("fast", False)], {"messages": []},
+            call=_fake_call({"slow": 2, "fast": 0.01}, cancelled), tracker=tracker)
+        return response, params, time.monotonic() - started
+
+    response, params, elapsed = asyncio.run(run())
+    assert params["model"] == "fast" and response.model == "fast"
+    assert elapsed < 0.5
+    assert cancelled == ["slow"]
+    stats = tracker.get_stats()
+    assert stats["hedges_launched"] == 1 and stats["hedge_wins"] == 1 and stats["wins_by_model"] == {"fast": 1}
+
+
+def test_fast_primary_does_not_hedge():
+    tracker = _tracker()
+    _, params = asyncio.run(hedged_completion(
+        [("a", False), ("b", False)], {}, call=_fake_call({"a": 0.001, "b": 0}), tracker=tracker))
+    assert params["model"] == "a"
+    assert tracker.get_stats()["hedges_launched"] == 0
+
+
+def test_failure_launches_next_immediately_and_hedge_delay_uses_percentile():
+    tracker = ModelLatencyTracker(default_delay=5, min_delay=0.01, max_delay=10, min_samples=3, percentile=0.9)
+    for seconds in (0.1, 0.2, 0.3):
+        tracker.record("a", seconds)
+    assert tracker.hedge_delay("a") == 0.3
+
+    async def run():
+        started = time.monotonic()
+        _, params = await hedged_completion(
+            [("broken", False), ("ok", False)], {},
+            call=_fake_call({"broken": 0, "ok": 0.01}, failing={"broken"}), tracker=tracker)
+        return params, time.monotonic() - started
+
+    params, elapsed = asyncio.run(run())
+    assert params["model"] == "ok" and elapsed < 1
+
+
+def test_paid_models_respect_billing_limits(monkeypatch):
+    monkeypatch.setattr(gpt_utils.billing_guard, "get_alert_level", lambda: ("critical", "over"))
+    tracker = _tracker()
+    try:
+        asyncio.run(hedged_completion(
+            [("free", False), ("paid", True)], {},
+            call=_fake_call({"free": 0, "paid": 0}, failing={"free"}), tracker=tracker))
+    except RuntimeError as e:
+        assert "free down" in str(e)
+    else:
+        raise AssertionError("paid model should not have been used")
+    assert tracker.get_stats()["paid_skipped"] == 1
+
+
+def test_paid_model_is_never_raced_speculatively(monkeypatch):
+    monkeypatch.setattr(gpt_utils.billing_guard, "get_alert_level", lambda: ("ok", ""))
+    launched = []
+    call = _fake_call({"slow": 0.3, "paid": 0})
+
+    async def tracking_call(params):
+        launched.append(params["model"])
+        return await call(params)
+
+    tracker = _tracker()
+    _, params = asyncio.run(hedged_completion([("slow", False), ("paid", True)], {}, call=tracking_call, tracker=tracker))
+    assert params["model"] == "slow"
+    assert launched == ["slow"]
+    assert tracker.get_stats()["hedges_launched"] == 0
+
+    launched.clear()
+    call = _fake_call({"slow": 0.05, "paid": 0}, failing={"slow"})
+    _, params = asyncio.run(hedged_completion([("slow", False), ("paid", True)], {}, call=tracking_call, tracker=_tracker()))
+    assert params["model"] == "paid"
+    assert launched == ["slow", "paid"]
+
+
+def test_gpt_a_reports_winning_model(monkeypatch):
+    fallback = gpt_a_handler.MODEL_ROUTES["gpt_a"]["fallback1"]
+    monkeypatch.setattr(gpt_utils, "model_latency", _tracker())
+    monkeypatch.setattr(gpt_a_handler, "GPT_HEDGE_ENABLED", True)
+
+    async def fake_acompletion(completion_params, timeout=None):
+        if completion_params["model"] != fallback:
+            await asyncio.sleep(2)
+        usage = SimpleNamespace(prompt_tokens=1, completion_tokens=1, total_tokens=2)
+        return SimpleNamespace(usage=usage, choices=[SimpleNamespace(message=SimpleNamespace(content="היי"))])
+
+    monkeypatch.setattr(gpt_a_handler, "acompletion_with_timeout", fake_acompletion)
+    params = {"model": "primary-model", "messages": []}
+    result = asyncio.run(gpt_a_handler._execute_gpt_call_async(params, [], timeout=5))
+    assert result["model"] == fallback and params["model"] == fallback
@@ -0,0 +1,124 @@
+"""בדיקות לכתיבה המקובצת ל-interactions_log - batch לפי גודל/זמן, serial לכל שורה, והכנה חד-פעמית (בלי DB אמיתי)"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CI", "1")
+
+import interactions_logger
+from interactions_logger import InteractionsBatchWriter, InteractionsLogger
+
+
+class _FakeLogger:
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+        self.next_serial = 100
+
+    def prepare(self):
+        return True
+
+    def insert_complete_rows(self, rows):
+        if self.fail:
+            raise RuntimeError("db down")
+        self.batches.append(list(rows))
+        serials = list(range(self.next_serial, self.next_serial + len(rows)))
+        self.next_serial += len(rows)
+        return serials
+
+
+def test_rows_are_written_in_batches_with_serial_per_row():
+    fake = _FakeLogger()
+
+    async def run():
+        writer = InteractionsBatchWriter(fake, batch_size=3, flush_interval=0.05)
+        serials = await asyncio.gather(*(writer.submit((f"row{n}",)) for n in range(5)))
+        await writer.stop()
+        return serials, writer.get_stats()
+
+    serials, stats = asyncio.run(run())
+    assert serials == [100, 101, 102, 103, 104]
+    assert [len(batch) for batch in fake.batches] == [3, 2]
+    assert fake.batches[0][0] == ("row0",)
+    assert stats["batches"] == 2 and stats["written"] == 5 and stats["pending"] == 0
+
+
+def test_failed_batch_returns_none_and_stop_flushes_leftovers():
+    fake = _FakeLogger(fail=True)
+
+    async def run():
+        writer = InteractionsBatchWriter(fake, batch_size=10, flush_interval=0.01)
+        result = await writer.submit(("x",))
+        fake.fail = False
+        writer._pending.append((("late",), asyncio.get_running_loop().create_future()))
+        await writer.stop()
+        return result, writer.get_stats()
+
+    result, stats = asyncio.run(run())
+    assert result is None
+    assert stats["failed"] == 1
+    assert fake.batches == [[("late",)]]
+
+
+def test_schema_and_commit_hash_are_resolved_once(monkeypatch):
+    calls = {"git": 0, "connect": 0}
+
+    class _Result:
+        returncode = 0
+        stdout = "abcdef1234567890\n"
+
+    def fake_run(*args, **kwargs):
+        calls["git"] += 1
+        return _Result()
+
+    class _Cursor:
+        def execute(self, sql, params=None):
+            pass
+
+        def fetchone(self):
+            return (True,)
+
+        def fetchall(self):
+            return [(c,) for c in ("gpt_a_tokens_cached", "gpt_b_tokens_cached", "gpt_c_tokens_cached",
+                                   "gpt_d_tokens_cached", "gpt_e_tokens_cached",
+                                   "history_user_messages_count", "history_bot_messages_count")]
+
+        def close(self):
+            pass
+
+    class _Conn:
+        def cursor(self):
+            return _Cursor()
+
+        def commit(self):
+            pass
+
+        def close(self):
+            pass
+
+    def fake_connect(dsn=None):
+        calls["connect"] += 1
+        return _Conn()
+
+    monkeypatch.delenv("RENDER_GIT_COMMIT", raising=False)
+    monkeypatch.setattr(interactions_logger.subprocess, "run", fake_run)
+    monkeypatch.setattr(interactions_logger, "get_connection", fake_connect)
+    il = InteractionsLogger()
+    il.db_url = "postgresql://fake"
+
+    assert il.prepare() is True
+    assert il.prepare() is True
+    assert il.get_current_commit_hash() == "abcdef123456"
+    assert calls == {"git": 1, "connect": 1}
+
+
+def test_logged_summary_reads_values_by_column_name(capsys):
+    values = tuple(float(n) for n in range(len(interactions_logger.COMPLETE_INSERT_COLUMN_NAMES)))
+    names = interactions_logger.COMPLETE_INSERT_COLUMN_NAMES
+    interactions_logger.print_logged_interaction(7, values)
+
+    out = capsys.readouterr().out
+    assert f"{values[names.index('total_cost_agorot')]:.2f} אגורות" in out
+    assert f"זמן תגובה: {values[names.index('user_to_bot_response_time')]:.2f}s" in out
+    assert f"{values[names.index('history_user_messages_count')]} משתמש" in out
@@ -0,0 +1,97 @@
+"""בדיקות ל-cache תוצאות GPT-B/GPT-C - מפתח מנורמל, דילוג על קריאת LLM, תוצאות פגומות לא נשמרות ומצב postgres (בלי DB ורשת)"""
+import asyncio
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CI", "1")
+
+import db_manager
+import gpt_b_handler
+import gpt_c_handler
+from llm_result_cache import LLMResultCache
+
+
+def _response(content, model="fake-model"):
+    usage = SimpleNamespace(prompt_tokens=10, completion_tokens=5, total_tokens=15, prompt_tokens_details=None)
+    return SimpleNamespace(id="r1", model=model, usage=usage,
+                           choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def _patch_llm(monkeypatch, module, content):
+    calls = []
+
+    async def fake_acompletion(completion_params, timeout=None):
+        calls.append(completion_params["messages"][-1]["content"])
+        return _response(content)
+
+    cache = LLMResultCache(enabled=True, backend="memory")
+    monkeypatch.setattr(module, "llm_result_cache", cache)
+    monkeypatch.setattr(module, "acompletion_with_timeout", fake_acompletion)
+    monkeypatch.setattr(module, "calculate_gpt_cost", lambda **kwargs: {"cost_total": 0.001})
+    return calls, cache
+
+
+def test_key_normalizes_input_and_tracks_prompt_and_length():
+    cache = LLMResultCache(enabled=True, max_input_chars=20, backend="memory")
+    key = cache.make_key("gpt_c", "m", "PROMPT", "  תודה   רבה ")
+    assert key == cache.make_key("gpt_c", "m", "PROMPT", "תודה רבה")
+    assert key != cache.make_key("gpt_c", "m", "PROMPT v2", "תודה רבה")
+    assert key != cache.make_key("gpt_b", "m", "PROMPT", "תודה רבה")
+    assert cache.make_key("gpt_c", "m", "PROMPT", "א" * 21) is None
+    assert LLMResultCache(enabled=False).make_key("gpt_c", "m", "PROMPT", "תודה") is None
+
+
+def test_gpt_c_repeat_skips_llm_and_returns_private_copy(monkeypatch):
+    monkeypatch.setattr(gpt_c_handler, "_log_gpt_c_call", lambda *args, **kwargs: None)
+    calls, cache = _patch_llm(monkeypatch, gpt_c_handler, '{"age": 30}')
+
+    first = asyncio.run(gpt_c_handler.extract_user_info_async("אני בן 30", "1"))
+    first["extracted_fields"]["age"] = 99
+    second = asyncio.run(gpt_c_handler.extract_user_info_async(" אני  בן 30", "2"))
+
+    assert calls == ["אני בן 30"]
+    assert second["extracted_fields"] == {"age": 30} and second["cache_hit"] is True
+    assert cache.get_stats()["hit_rate"] == 0.5
+
+
+def test_gpt_c_unparseable_reply_is_not_cached(monkeypatch):
+    monkeypatch.setattr(gpt_c_handler, "_log_gpt_c_call", lambda *args, **kwargs: None)
+    calls, cache = _patch_llm(monkeypatch, gpt_c_handler, "לא JSON")
+    for _ in range(2):
+        result = asyncio.run(gpt_c_handler.extract_user_info_async("אני בן 30", "1"))
+        assert result["extracted_fields"] == {}
+    assert len(calls) == 2 and cache.get_stats()["stores"] == 0
+
+
+def test_gpt_b_repeat_skips_llm(monkeypatch):
+    import gpt_jsonl_logger
+    monkeypatch.setattr(gpt_jsonl_logger.GPTJSONLLogger, "log_gpt_call", staticmethod(lambda *args, **kwargs: None))
+    calls, _ = _patch_llm(monkeypatch, gpt_b_handler, "סיכום קצר")
+    results = [asyncio.run(gpt_b_handler.get_summary_async("היי", "שלום! מה שלומך?", "1")) for _ in range(2)]
+    assert len(calls) == 1
+    assert [r["summary"] for r in results] == ["סיכום קצר", "סיכום קצר"]
+    assert results[1]["cache_hit"] is True and results[1]["usage"] == {}
+
+
+def test_postgres_backend_writes_behind_and_reads_on_local_miss(monkeypatch):
+    table = {}
+    monkeypatch.setattr(db_manager, "ensure_llm_result_cache_table", lambda: None)
+    monkeypatch.setattr(db_manager, "upsert_llm_result_cache",
+                        lambda entries: table.update({key: json.loads(json.dumps(result)) for key, _, result in entries}) or len(entries))
+    monkeypatch.setattr(db_manager, "get_llm_result_cache", lambda key, ttl: table.get(key))
+
+    writer = LLMResultCache(enabled=True, backend="postgres")
+    writer._ensure_flusher = lambda: None  # ה-flush בבדיקות ידני בלבד
+    key = writer.make_key("gpt_c", "m", "PROMPT", "תודה")
+    writer.set(key, "gpt_c", {"extracted_fields": {}})
+    assert table == {}
+    assert writer.flush() == 1
+
+    other_worker = LLMResultCache(enabled=True, backend="postgres")
+    assert other_worker.get(key) == {"extracted_fields": {}}
+    assert other_worker.get(key) == {"extracted_fields": {}}
+    stats = other_worker.get_stats()
+    assert stats["db_hits"] == 1 and stats["hits"] == 1 and stats["misses"] == 0
@@ -0,0 +1,126 @@
+"""בדיקות ל-CapturePolicy - כיווץ כפילויות, דגימה לפי רמה/מקור, token bucket, ו-psutil רק ל-WARNING ומעלה"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CI", "1")
+
+import log_capture_policy
+from log_capture_policy import CapturePolicy, parse_sample_rates
+
+
+def test_parse_sample_rates_clamps_and_skips_bad_parts():
+    assert parse_sample_rates("DEBUG=0.1, PRINT=2, bad, X=oops") == {"DEBUG": 0.1, "PRINT": 1.0}
+
+
+def test_repeated_lines_collapse_into_one_summary():
+    policy = CapturePolicy(level_rates={}, source_rates={}, rate_per_second=0)
+    decisions = [policy.decide("PRINT", "terminal_stdout", "same line") for _ in range(5)]
+    assert [d.keep for d in decisions] == [True, False, False, False, False]
+
+    after = policy.decide("PRINT", "terminal_stdout", "other line")
+    assert after.keep
+    assert (after.repeat_of, after.repeat_level, after.repeat_count) == ("same line", "PRINT", 4)
+    # מקור אחר לא מושפע מהשורה הקודמת
+    assert policy.decide("PRINT", "terminal_stderr", "other line").repeat_of is None
+
+
+def test_pending_repeats_are_summarized_after_window_or_on_force(monkeypatch):
+    clock = {"now": 10.0}
+    monkeypatch.setattr(log_capture_policy.time, "monotonic", lambda: clock["now"])
+    policy = CapturePolicy(level_rates={}, source_rates={}, rate_per_second=0, repeat_window=30)
+    for _ in range(3):
+        policy.decide("PRINT", "a", "quiet after this")
+    policy.decide("PRINT", "b", "b line")
+    policy.decide("PRINT", "b", "b line")
+
+    assert policy.take_pending_repeats() == []
+    assert policy.take_pending_repeats(force=True) == [("a", "quiet after this", "PRINT", 2), ("b", "b line", "PRINT", 1)]
+    # כל חזרה מסוכמת פעם אחת - גם לא שוב כשמגיעה שורה אחרת
+    assert policy.take_pending_repeats(force=True) == []
+    assert policy.decide("PRINT", "a", "new line").repeat_of is None
+
+    policy.decide("PRINT", "a", "new line")
+    clock["now"] += 31
+    assert policy.take_pending_repeats() == [("a", "new line", "PRINT", 1)]
+
+
+def test_sampling_by_level_and_source_never_touches_warnings():
+    policy = CapturePolicy(level_rates={"DEBUG": 0.0}, source_rates={"noisy": 0.0}, rate_per_second=0)
+    assert not policy.decide("DEBUG", "general", "d").keep
+    assert not policy.decide("INFO", "noisy", "i").keep
+    assert policy.decide("ERROR", "noisy", "e").keep
+    assert policy.decide("INFO", "general", "i").keep
+    assert policy.get_stats()["sampled_out"] == 2
+
+
+def test_token_bucket_limits_each_source(monkeypatch):
+    clock = {"now": 50.0}
+    monkeypatch.setattr(log_capture_policy.time, "monotonic", lambda: clock["now"])
+    policy = CapturePolicy(level_rates={}, source_rates={}, rate_per_second=1, burst=3)
+
+    kept = [policy.decide("PRINT", "a", f"line {n}").keep for n in range(5)]
+    assert kept == [True, True, True, False, False]
+    assert policy.decide("WARNING", "a", "still kept").keep
+    assert policy.decide("PRINT", "b", "own bucket").keep
+    clock["now"] += 1.0
+    assert policy.decide("PRINT", "a", "refilled").keep
+    assert policy.get_stats()["rate_limited"] == 2
+
+
+def test_deployment_logger_samples_metrics_only_for_warnings(monkeypatch):
+    from deployment_logger import deployment_logger
+
+    rows = []
+    metric_calls = []
+
+    class _Writer:
+        def accepts(self, level):
+            return True
+
+        def put(self, entry):
+            rows.append(entry)
+
+        def record_drop(self):
+            pass
+
+    monkeypatch.setattr(deployment_logger, "writer", _Writer())
+    monkeypatch.setattr(deployment_logger, "capture_policy", CapturePolicy(level_rates={}, source_rates={}, rate_per_second=0))
+    monkeypatch.setattr(deployment_logger, "_get_system_metrics", lambda: metric_calls.append(1) or {"memory_mb": 1, "cpu_percent": 0.0})
+
+    deployment_logger.log("hello", "PRINT", "terminal_stdout")
+    deployment_logger.log("hello", "PRINT", "terminal_stdout")
+    deployment_logger.warning("bad thing", source="terminal_stdout")
+
+    assert [r["message"] for r in rows] == ["hello", "🔁 [REPEATED x1] hello", "bad thing"]
+    assert rows[0]["source_module"] == "terminal_stdout" and rows[0]["memory_mb"] is None
+    assert rows[2]["source_module"] == os.path.basename(__file__)
+    assert len(metric_calls) == 1
+
+
+def test_deployment_logger_flush_writes_pending_repeat_summary(monkeypatch):
+    from deployment_logger import deployment_logger
+
+    rows = []
+
+    class _Writer:
+        def accepts(self, level):
+            return True
+
+        def put(self, entry):
+            rows.append(entry)
+
+        def record_drop(self):
+            pass
+
+        def flush(self, timeout):
+            return True
+
+    monkeypatch.setattr(deployment_logger, "writer", _Writer())
+    monkeypatch.setattr(deployment_logger, "capture_policy", CapturePolicy(level_rates={}, source_rates={}, rate_per_second=0))
+
+    for _ in range(3):
+        deployment_logger.log("stuck", "PRINT", "terminal_stdout")
+    assert deployment_logger.flush()
+
+    assert [r["message"] for r in rows] == ["stuck", "🔁 [REPEATED x2] stuck"]
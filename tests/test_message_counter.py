@@ -0,0 +1,73 @@
+"""בדיקות למונה ההודעות המתוחזק - קידום בטרנזקציית השמירה וקריאה בלי COUNT(*)"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CI", "1")
+
+import chat_utils
+import db_manager
+
+
+class _FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = 0
+
+    def execute(self, sql, params=None):
+        self.conn.log.append(" ".join(sql.split()))
+
+    def fetchone(self):
+        return self.conn.results.pop(0) if self.conn.results else None
+
+    def close(self):
+        pass
+
+
+class _FakeConn:
+    def __init__(self, results=()):
+        self.log = []
+        self.results = list(results)
+
+    def cursor(self):
+        return _FakeCursor(self)
+
+    def commit(self):
+        self.log.append("COMMIT")
+
+    def close(self):
+        pass
+
+
+def test_save_bumps_counter_in_same_transaction(monkeypatch):
+    conn = _FakeConn(results=[(17,)])
+    monkeypatch.setattr(db_manager, "get_connection", lambda: conn)
+
+    assert db_manager.save_chat_message("123", "שלום", "היי") == 17
+
+    bump = next(i for i, sql in enumerate(conn.log) if "total_messages_count + 1" in sql)
+    assert bump < conn.log.index("COMMIT")
+
+
+def test_bot_only_message_does_not_bump_counter(monkeypatch):
+    conn = _FakeConn(results=[(18,)])
+    monkeypatch.setattr(db_manager, "get_connection", lambda: conn)
+
+    db_manager.save_chat_message("123", "", "הודעה יזומה")
+    assert not any("total_messages_count + 1" in sql for sql in conn.log)
+
+
+def test_total_count_reads_counter_without_full_scan(monkeypatch):
+    conn = _FakeConn(results=[(42,)])
+    monkeypatch.setattr("db_pool.get_connection", lambda: conn)
+
+    assert chat_utils.get_total_user_messages_count("123") == 42
+    assert not any("COUNT(*)" in sql for sql in conn.log)
+
+
+def test_uninitialized_counter_falls_back_to_count(monkeypatch):
+    conn = _FakeConn(results=[(None,), (5,)])
+    monkeypatch.setattr("db_pool.get_connection", lambda: conn)
+
+    assert chat_utils.get_total_user_messages_count("123") == 5
+    assert any("COUNT(*)" in sql for sql in conn.log)
@@ -99,6 +99,7 @@ def test_message_flow_smoke_test():
         
         with patch('chat_utils.get_balanced_history_for_gpt') as mock_history, \
              patch('gpt_a_handler.get_main_response') as mock_gpt, \
+             patch('gpt_a_handler.get_main_response_async', new_callable=AsyncMock) as mock_gpt_async, \
              patch('message_handler.send_message') as mock_send, \
              patch('message_handler.handle_background_tasks') as mock_bg:
             
@@ -113,6 +114,7 @@ def test_message_flow_smoke_test():
                 "gpt_pure_latency": 2.5,
                 "background_data": {}
             }
+            mock_gpt_async.return_value = mock_gpt.return_value
             
             mock_send.return_value = None
             mock_bg.return_value = None
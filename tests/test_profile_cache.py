@@ -0,0 +1,99 @@
+"""בדיקות ל-ProfileCache - LRU חסום, TTL, עותקים ו-write-through"""
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CI", "1")
+
+import profile_cache as profile_cache_module
+from profile_cache import ProfileCache
+
+
+def test_lru_eviction_keeps_recently_used():
+    cache = ProfileCache(max_size=2, ttl_seconds=60)
+    cache.set("1", {"name": "א"})
+    cache.set("2", {"name": "ב"})
+    assert cache.get("1") == {"name": "א"}  # "1" הופך לאחרון בשימוש
+    cache.set("3", {"name": "ג"})
+
+    assert cache.get("2") is None
+    assert cache.get("1") == {"name": "א"}
+    stats = cache.get_stats()
+    assert stats["evictions"] == 1
+    assert stats["size"] == 2
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(profile_cache_module.time, "monotonic", lambda: now[0])
+    cache = ProfileCache(max_size=10, ttl_seconds=5)
+    cache.set("1", {"age": 30})
+
+    now[0] += 4
+    assert cache.get("1") == {"age": 30}
+    now[0] += 2
+    assert cache.get("1") is None
+    assert cache.get_stats()["expirations"] == 1
+
+
+def test_returned_profile_is_a_copy():
+    cache = ProfileCache(max_size=10, ttl_seconds=60)
+    cache.set("1", {"prefs": {"tone": "רך"}})
+
+    profile = cache.get("1")
+    profile["prefs"]["tone"] = "אחר"
+    assert cache.get("1") == {"prefs": {"tone": "רך"}}
+
+
+def test_concurrent_writers_stay_bounded():
+    cache = ProfileCache(max_size=50, ttl_seconds=60)
+
+    def writer(offset):
+        for i in range(200):
+            cache.set(str(offset * 1000 + i), {"i": i})
+            cache.get(str(offset * 1000 + i // 2))
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(cache) == 50
+    assert cache.get_stats()["writes"] == 800
+
+
+def test_save_user_profile_writes_through(monkeypatch):
+    import simple_data_manager
+
+    class _Cursor:
+        def execute(self, *args):
+            pass
+
+        def fetchone(self):
+            return (1,)
+
+        def close(self):
+            pass
+
+    class _Conn:
+        def cursor(self):
+            return _Cursor()
+
+        def commit(self):
+            pass
+
+        def rollback(self):
+            pass
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(simple_data_manager, "DB_URL", "postgresql://fake")
+    monkeypatch.setattr(simple_data_manager, "get_connection", lambda dsn: _Conn())
+    simple_data_manager.profile_cache.invalidate("555")
+
+    assert simple_data_manager.data_manager.save_user_profile("555", {"summary": "חדש"})
+    assert simple_data_manager.profile_cache.get("555") == {"summary": "חדש"}
+    simple_data_manager.profile_cache.invalidate("555")
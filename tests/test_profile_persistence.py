@@ -11,6 +11,7 @@ if pytest is not None and (os.getenv("CI") or os.getenv("GITHUB_ACTIONS")):
 # Only after potential skip – import heavy modules
 import json
 import importlib
+from unittest.mock import AsyncMock
 from utils import safe_str
 
 def _reload_module(mod_name):
@@ -122,6 +123,7 @@ def test_admin_notification_on_profile_update(monkeypatch):
 
     # פתרון 2: מוק של message_handler copies
     monkeypatch.setattr(mh, "extract_user_info", _fake_extract, raising=False)
+    monkeypatch.setattr(mh, "extract_user_info_async", AsyncMock(side_effect=_fake_extract), raising=False)
     monkeypatch.setattr(mh, "smart_update_profile_with_gpt_d_async", _fake_gpt_d_async, raising=False)
     monkeypatch.setattr(mh, "execute_gpt_e_if_needed", _fake_gpt_e_async, raising=False)
 
@@ -303,6 +305,7 @@ def test_admin_notification_content_on_profile_update(monkeypatch):
 
     # Patch copies inside message_handler as well (already imported as mh)
     monkeypatch.setattr(mh, "extract_user_info", _fake_extract_loc, raising=False)
+    monkeypatch.setattr(mh, "extract_user_info_async", AsyncMock(side_effect=_fake_extract_loc), raising=False)
     monkeypatch.setattr(mh, "smart_update_profile_with_gpt_d_async", _fake_gpt_d_async_loc, raising=False)
     monkeypatch.setattr(mh, "execute_gpt_e_if_needed", _fake_gpt_e_async_loc, raising=False)
 
@@ -362,6 +365,7 @@ def test_admin_notification_age_update(monkeypatch):
 
     # Patch copies inside message_handler
     monkeypatch.setattr(mh, "extract_user_info", _fake_extract_age, raising=False)
+    monkeypatch.setattr(mh, "extract_user_info_async", AsyncMock(side_effect=_fake_extract_age), raising=False)
     monkeypatch.setattr(mh, "smart_update_profile_with_gpt_d_async", _fake_gpt_d_async_age, raising=False)
     monkeypatch.setattr(mh, "execute_gpt_e_if_needed", _fake_gpt_e_async_age, raising=False)
 
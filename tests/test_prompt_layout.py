@@ -0,0 +1,67 @@
+"""בדיקות לסדר ההודעות ל-GPT-A - תחילית יציבה ל-prompt caching, מצב legacy וחילוץ cached_tokens (בלי קריאות רשת)"""
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CI", "1")
+
+import chat_utils
+from gpt_utils import extract_cached_tokens, normalize_usage_dict
+
+HISTORY = [{"role": "user", "content": "שלום"}, {"role": "assistant", "content": "היי"}]
+
+
+def _fake_registry(monkeypatch, greeting):
+    def registry(context=None):
+        def entry(name, content, order, stable):
+            return {"name": name, "condition": lambda c, m: True, "content": lambda c, m: content,
+                    "order": order, "stable": stable, "description": name}
+        return [
+            entry("main_prompt", "MAIN", 1, True),
+            entry("user_summary", "SUMMARY", 2, True),
+            entry("time_greeting", greeting, 3, False),
+            entry("weekday_context", "", 4, False),
+        ]
+    monkeypatch.setattr(chat_utils, "get_system_prompts_registry", registry)
+
+
+def test_cache_friendly_layout_puts_volatile_parts_after_history(monkeypatch):
+    _fake_registry(monkeypatch, "בוקר טוב")
+    messages = chat_utils.build_gpt_a_messages("1", "מה נשמע", HISTORY, layout="cache_friendly")
+    assert [m["content"] for m in messages] == ["MAIN", "SUMMARY", "שלום", "היי", "בוקר טוב", "מה נשמע"]
+
+
+def test_prefix_is_identical_when_dynamic_context_changes(monkeypatch):
+    _fake_registry(monkeypatch, "בוקר טוב")
+    morning = chat_utils.build_gpt_a_messages("1", "מה נשמע", HISTORY, layout="cache_friendly")
+    _fake_registry(monkeypatch, "ערב טוב")
+    evening = chat_utils.build_gpt_a_messages("1", "ומה עכשיו", HISTORY, layout="cache_friendly")
+    assert morning[:4] == evening[:4]
+    assert morning[4:] != evening[4:]
+
+
+def test_legacy_layout_keeps_system_prompts_first(monkeypatch):
+    _fake_registry(monkeypatch, "בוקר טוב")
+    messages = chat_utils.build_gpt_a_messages("1", "מה נשמע", HISTORY, layout="legacy")
+    assert [m["content"] for m in messages] == ["MAIN", "SUMMARY", "בוקר טוב", "שלום", "היי", "מה נשמע"]
+
+
+def test_default_layout_is_legacy_unless_configured(monkeypatch):
+    _fake_registry(monkeypatch, "בוקר טוב")
+    monkeypatch.setattr(chat_utils, "GPT_A_PROMPT_LAYOUT", "legacy")
+    assert chat_utils.build_gpt_a_messages("1", "מה נשמע", HISTORY) == chat_utils.build_gpt_a_messages("1", "מה נשמע", HISTORY, layout="legacy")
+    if "GPT_A_PROMPT_LAYOUT" not in os.environ:
+        import config
+        assert config.GPT_A_PROMPT_LAYOUT == "legacy"
+
+
+def test_cached_tokens_are_found_in_every_provider_shape():
+    assert extract_cached_tokens(SimpleNamespace(prompt_tokens_details=SimpleNamespace(cached_tokens=1024))) == 1024
+    assert extract_cached_tokens(SimpleNamespace(prompt_tokens_details=None, cache_read_input_tokens=512)) == 512
+    assert extract_cached_tokens({"prompt_tokens_details": {"cached_tokens": 256}}) == 256
+    assert extract_cached_tokens({"prompt_tokens": 10}) == 0
+
+    usage = SimpleNamespace(prompt_tokens=2000, completion_tokens=50, total_tokens=2050,
+                            prompt_tokens_details=SimpleNamespace(cached_tokens=1536))
+    assert normalize_usage_dict(usage, "gpt-4o")["cached_tokens"] == 1536
@@ -0,0 +1,142 @@
+"""בדיקות למצב התזכורות - buffer פעילות בזיכרון, upsert מקובץ, החזרה לתור בכישלון וייבוא JSON ישן (בלי DB אמיתי)"""
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CI", "1")
+
+import db_manager
+from reminder_store import ReminderActivityStore
+
+
+def _fake_db(monkeypatch, fail=False):
+    calls = {"upserts": [], "candidates": [], "imports": []}
+
+    def fake_upsert(activity):
+        if fail:
+            raise RuntimeError("db down")
+        calls["upserts"].append(list(activity))
+
+    def fake_candidates(inactive_before, active_after, limit=100):
+        calls["candidates"].append((inactive_before, active_after, limit))
+        return ["1", "2"]
+
+    def fake_import(rows):
+        if fail:
+            raise RuntimeError("db down")
+        calls["imports"].append(list(rows))
+        return len(rows)
+
+    monkeypatch.setattr(db_manager, "ensure_reminder_activity_table", lambda: None)
+    monkeypatch.setattr(db_manager, "import_legacy_reminder_state", fake_import)
+    monkeypatch.setattr(db_manager, "upsert_reminder_activity", fake_upsert)
+    monkeypatch.setattr(db_manager, "get_reminder_candidates", fake_candidates)
+    return calls
+
+
+def _store():
+    store = ReminderActivityStore(flush_interval=3600, legacy_state_file=None)
+    store._ensure_flusher = lambda: None  # ה-flush בבדיקות ידני בלבד
+    return store
+
+
+def test_mark_active_is_buffered_and_collapsed(monkeypatch):
+    calls = _fake_db(monkeypatch)
+    store = _store()
+    for _ in range(5):
+        store.mark_active(1)
+    store.mark_active("2")
+    assert calls["upserts"] == []
+
+    assert store.flush() == 2
+    assert len(calls["upserts"]) == 1
+    assert sorted(chat_id for chat_id, _ in calls["upserts"][0]) == ["1", "2"]
+    assert store.flush() == 0
+    assert store.get_stats()["pending"] == 0
+
+
+def test_failed_flush_keeps_activity_pending(monkeypatch):
+    _fake_db(monkeypatch, fail=True)
+    store = _store()
+    store.mark_active("1")
+    assert store.flush() == 0
+    stats = store.get_stats()
+    assert stats["pending"] == 1 and stats["flush_errors"] == 1
+    # מי שעדיין ממתין לכתיבה לא מקבל תזכורת
+    assert store.get_due_users() == ["2"]
+
+
+def test_get_due_users_flushes_first(monkeypatch):
+    calls = _fake_db(monkeypatch)
+    store = _store()
+    store.mark_active("9")
+    assert store.get_due_users(idle_hours=24, max_idle_days=30, limit=5) == ["1", "2"]
+    assert len(calls["upserts"]) == 1
+    inactive_before, active_after, limit = calls["candidates"][0]
+    assert limit == 5 and active_after < inactive_before
+
+
+def _legacy_store(tmp_path, state):
+    legacy = tmp_path / "reminder_state.json"
+    legacy.write_text(json.dumps(state), encoding="utf-8")
+    store = ReminderActivityStore(flush_interval=3600, legacy_state_file=str(legacy))
+    store._ensure_flusher = lambda: None
+    return store, legacy
+
+
+def test_legacy_json_is_imported_once(monkeypatch, tmp_path):
+    calls = _fake_db(monkeypatch)
+    store, legacy = _legacy_store(tmp_path, {
+        "1": {"last_activity": "2025-01-01T10:00:00+02:00"},
+        "2": {"inactive": True},
+    })
+
+    store.get_due_users()
+    store.get_due_users()
+    assert [row[0] for row in calls["imports"][0]] == ["1"]
+    assert len(calls["imports"]) == 1
+    assert not legacy.exists() and (tmp_path / "reminder_state.json.migrated").exists()
+
+
+def test_legacy_reminder_flags_are_imported(monkeypatch, tmp_path):
+    calls = _fake_db(monkeypatch)
+    store, _ = _legacy_store(tmp_path, {
+        "1": {
+            "last_activity": "2025-01-01T10:00:00+02:00",
+            "reminder_sent_waiting_response": True,
+            "reminders_sent": 1,
+            "last_reminder": "2025-01-03T10:00:00+02:00",
+        },
+        "2": {
+            "last_contact": "2024-11-01T10:00:00+02:00",
+            "reminders_sent": 2,
+            "inactive": True,
+            "inactive_since": "2024-12-01T10:00:00+02:00",
+            "inactive_count": 1,
+        },
+    })
+
+    store.get_due_users()
+    rows = {row[0]: row for row in calls["imports"][0]}
+    _, _, sent, last_reminder, waiting, delayed, inactive, inactive_since, inactive_count = rows["1"]
+    assert (sent, waiting, delayed, inactive, inactive_count) == (1, True, False, False, 0)
+    assert last_reminder is not None and inactive_since is None
+    _, _, sent, _, waiting, _, inactive, inactive_since, inactive_count = rows["2"]
+    assert (sent, waiting, inactive, inactive_count) == (2, False, True, 1)
+    assert inactive_since is not None
+
+
+def test_failed_legacy_import_is_retried(monkeypatch, tmp_path):
+    _fake_db(monkeypatch, fail=True)
+    store, legacy = _legacy_store(tmp_path, {"1": {"last_activity": "2025-01-01T10:00:00+02:00"}})
+    with pytest.raises(RuntimeError):
+        store.get_due_users()
+    assert legacy.exists() and not store._table_ready
+
+    calls = _fake_db(monkeypatch)
+    store.get_due_users()
+    assert [row[0] for row in calls["imports"][0]] == ["1"]
+    assert store._table_ready and not legacy.exists()
@@ -0,0 +1,135 @@
+"""בדיקות לשמירת המירור של Render - COPY לטבלה זמנית ומספר קבוע של שאילתות לכל ריצה, ו-watermark (בלי DB אמיתי)"""
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CI", "1")
+
+import render_logs_mirror
+
+
+class _FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rowcount = 0
+        self._last = None
+
+    def execute(self, sql, params=None):
+        self.db["statements"].append(" ".join(sql.split()))
+        self._last = (sql, params)
+        if "INSERT INTO deployment_logs" in sql:
+            self.rowcount = len(self.db["staged"]) - self.db["already_saved"]
+
+    def copy_expert(self, sql, buffer):
+        self.db["copy_sql"] = sql
+        self.db["staged"] = buffer.read().splitlines()
+
+    def fetchone(self):
+        sql, params = self._last
+        if "RETURNING last_timestamp" in sql:
+            return (params[1],)
+        if "information_schema" in sql:
+            return (False,)
+        if "MAX(timestamp)" in sql:
+            return (None,)
+        return None
+
+
+class _FakeConn:
+    autocommit = False
+
+    def __init__(self, db, cursor_factory=_FakeCursor):
+        self.db = db
+        self.cursor_factory = cursor_factory
+
+    def cursor(self):
+        return self.cursor_factory(self.db)
+
+    def commit(self):
+        self.db["commits"] += 1
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_save_is_constant_number_of_statements_and_advances_watermark(monkeypatch):
+    db = {"statements": [], "staged": [], "already_saved": 1, "commits": 0}
+    monkeypatch.setattr(render_logs_mirror.psycopg2, "connect", lambda *a, **k: _FakeConn(db))
+    mirror = render_logs_mirror.RenderLogsMirror()
+    db["statements"].clear()
+
+    logs = [
+        {"timestamp": f"2026-10-18T10:{n:02d}:00Z", "message": f"line {n}\twith tab", "level": "INFO"}
+        for n in range(20)
+    ]
+    logs.append({"timestamp": "2026-10-18T13:30:00+03:00", "message": "israel time", "level": "ERROR"})
+
+    saved = mirror._save_logs_to_db(logs, "deployment")
+
+    assert saved == 20
+    assert len(db["statements"]) == 3  # temp table, INSERT ... ON CONFLICT, watermark
+    assert "ON CONFLICT (mirror_hash) WHERE mirror_hash IS NOT NULL DO NOTHING" in db["statements"][1]
+    assert db["copy_sql"].startswith("COPY render_logs_stage")
+    assert len(db["staged"]) == 21
+    assert db["staged"][0].split("\t")[2] == "line 0\\twith tab"
+    # 13:30 שעון ישראל = 10:30 UTC, וזה גם ה-watermark החדש
+    assert db["staged"][-1].split("\t")[0] == "2026-10-18T10:30:00"
+    assert mirror.last_saved_time == datetime(2026, 10, 18, 10, 30)
+    assert db["commits"] == 1
+
+
+class _MigrationCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rowcount = 0
+        self._last = ""
+
+    def execute(self, sql, params=None):
+        sql = " ".join(sql.split())
+        self._last = sql
+        self.db["statements"].append((sql, self.db["conn"].autocommit))
+        if sql.startswith("UPDATE deployment_logs SET mirror_hash"):
+            self.rowcount = self.db["update_rowcounts"].pop(0)
+
+    def fetchone(self):
+        if "information_schema" in self._last:
+            return (True,)
+        if "pg_index" in self._last:
+            return self.db["index_row"]
+        return (None,)
+
+
+def _run_startup(monkeypatch, index_row, update_rowcounts=()):
+    db = {"statements": [], "commits": 0, "index_row": index_row, "update_rowcounts": list(update_rowcounts)}
+    db["conn"] = _FakeConn(db, cursor_factory=_MigrationCursor)
+    monkeypatch.setattr(render_logs_mirror.psycopg2, "connect", lambda *a, **k: db["conn"])
+    monkeypatch.setattr(render_logs_mirror, "MIRROR_BACKFILL_BATCH_SIZE", 2)
+    render_logs_mirror.RenderLogsMirror()
+    return db["statements"]
+
+
+def test_mirror_hash_migration_runs_in_batches_and_builds_index_concurrently(monkeypatch):
+    statements = _run_startup(monkeypatch, index_row=None, update_rowcounts=[2, 2, 1])
+
+    updates = [sql for sql, _ in statements if sql.startswith("UPDATE deployment_logs SET mirror_hash")]
+    assert len(updates) == 3
+    index_sql = [(sql, autocommit) for sql, autocommit in statements if "CREATE UNIQUE INDEX" in sql]
+    assert len(index_sql) == 1
+    assert "CONCURRENTLY" in index_sql[0][0] and index_sql[0][1] is True
+
+
+def test_mirror_hash_migration_is_skipped_once_index_is_valid(monkeypatch):
+    statements = _run_startup(monkeypatch, index_row=(True,))
+
+    assert not any(sql.startswith("UPDATE") or "CREATE UNIQUE INDEX" in sql for sql, _ in statements)
+
+
+def test_invalid_index_from_failed_build_is_rebuilt(monkeypatch):
+    statements = _run_startup(monkeypatch, index_row=(False,), update_rowcounts=[0])
+
+    ddl = [sql for sql, autocommit in statements if "INDEX CONCURRENTLY" in sql and autocommit]
+    assert ddl[0].startswith("DROP INDEX CONCURRENTLY") and ddl[1].startswith("CREATE UNIQUE INDEX CONCURRENTLY")
@@ -0,0 +1,179 @@
+"""בדיקות לסטרימינג של GPT-A לטלגרם - באפר ראשון, ויסות עריכות ועריכה סופית, בלי טלגרם ובלי LLM אמיתיים"""
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CI", "1")
+
+from telegram.error import BadRequest
+
+import gpt_a_handler
+from streaming_reply import StreamingReply, STREAMING_CURSOR, TELEGRAM_MAX_MESSAGE_LENGTH, split_telegram_text
+
+
+class _FakeSentMessage:
+    def __init__(self, log, reject_markdown=False, fail_edits_after=None):
+        self.log = log
+        self.reject_markdown = reject_markdown
+        self.fail_edits_after = fail_edits_after
+
+    async def edit_text(self, text, parse_mode=None):
+        if self.fail_edits_after is not None and sum(e[0] == "edit" for e in self.log) >= self.fail_edits_after:
+            raise RuntimeError("telegram down")
+        if parse_mode == "Markdown" and self.reject_markdown:
+            raise BadRequest("Can't parse entities")
+        self.log.append(("edit", text, parse_mode))
+
+    async def delete(self):
+        self.log.append(("delete", None, None))
+
+
+class _FakeUpdate:
+    def __init__(self, reject_markdown=False, fail_edits_after=None):
+        self.log = []
+        self.reject_markdown = reject_markdown
+        self.fail_edits_after = fail_edits_after
+        self.message = self
+
+    async def reply_text(self, text, **_kwargs):
+        self.log.append(("send", text, None))
+        return _FakeSentMessage(self.log, self.reject_markdown, self.fail_edits_after)
+
+
+def _reply(update, **kwargs):
+    params = {"first_chunk_chars": 10, "first_send_delay": 0.05, "edit_interval": 0.1}
+    params.update(kwargs)
+    return StreamingReply(update, "chat-1", **params)
+
+
+def test_first_message_then_throttled_edits_then_final_markdown():
+    update = _FakeUpdate()
+
+    async def run():
+        reply = _reply(update)
+        text = ""
+        for i in range(30):
+            text += f"מילה{i} "
+            reply.feed(text)
+            await asyncio.sleep(0.01)
+        return await reply.finish(text.strip())
+
+    sent_at = asyncio.run(run())
+    assert sent_at is not None
+    sends = [e for e in update.log if e[0] == "send"]
+    edits = [e for e in update.log if e[0] == "edit"]
+    assert len(sends) == 1 and sends[0][1].endswith(STREAMING_CURSOR)
+    # 30 עדכונים ב-0.3 שניות עם מרווח 0.1 - רק מעט עריכות ביניים
+    assert len(edits) <= 4
+    assert edits[-1] == ("edit", "מילה0 " + " ".join(f"מילה{i}" for i in range(1, 30)), "Markdown")
+
+
+def test_finish_before_first_send_leaves_sending_to_caller():
+    update = _FakeUpdate()
+
+    async def run():
+        reply = _reply(update, first_send_delay=5)
+        reply.feed("היי")
+        return await reply.finish("היי")
+
+    assert asyncio.run(run()) is None
+    assert update.log == []
+
+
+def test_final_edit_falls_back_to_plain_text_on_bad_markdown():
+    update = _FakeUpdate(reject_markdown=True)
+
+    async def run():
+        reply = _reply(update, first_chunk_chars=1)
+        reply.feed("שלום *עולם")
+        await asyncio.sleep(0.02)
+        return await reply.finish("שלום *עולם")
+
+    assert asyncio.run(run()) is not None
+    assert update.log[-1] == ("edit", "שלום *עולם", None)
+
+
+def test_unconfirmed_final_edit_hands_reply_back_to_caller():
+    update = _FakeUpdate(fail_edits_after=0)
+
+    async def run():
+        reply = _reply(update, first_chunk_chars=1)
+        reply.feed("שלום עו")
+        await asyncio.sleep(0.02)
+        return await reply.finish("שלום עולם")
+
+    # הקורא שולח את התשובה המלאה; ההודעה החלקית עם הסמן נמחקת
+    assert asyncio.run(run()) is None
+    assert update.log[0][0] == "send" and update.log[-1][0] == "delete"
+
+
+def test_reply_longer_than_telegram_limit_continues_in_new_messages():
+    update = _FakeUpdate()
+    paragraph = "שורה ארוכה של תשובה " * 20
+    final_text = "\n".join([paragraph] * 30)  # ~12,000 תווים
+
+    async def run():
+        reply = _reply(update, first_chunk_chars=1)
+        reply.feed(final_text[:50])
+        await asyncio.sleep(0.02)
+        return await reply.finish(final_text)
+
+    assert asyncio.run(run()) is not None
+    final_edit = [e for e in update.log if e[0] == "edit"][-1]
+    continuations = [e for e in update.log if e[0] == "send"][1:]
+    shown = [final_edit[1]] + [text for _, text, _ in continuations]
+    assert len(shown) == 3
+    assert all(len(text) <= TELEGRAM_MAX_MESSAGE_LENGTH for text in shown)
+    # שום תוכן לא נחתך - החלקים יחד הם התשובה המלאה
+    assert "".join(shown).replace("\n", "").replace(" ", "") == final_text.replace("\n", "").replace(" ", "")
+
+
+def test_split_telegram_text_prefers_line_breaks():
+    assert split_telegram_text("קצר") == ["קצר"]
+    assert split_telegram_text("אאא\nבבב גגג", limit=8) == ["אאא", "בבב גגג"]
+    assert split_telegram_text("א" * 10, limit=4) == ["אאאא", "אאאא", "אא"]
+
+
+def test_internal_text_is_never_streamed():
+    update = _FakeUpdate()
+
+    async def run():
+        reply = _reply(update, first_chunk_chars=1, is_blocked=lambda text: text.startswith("[admin]"))
+        reply.feed("[admin] פרטים פנימיים")
+        await asyncio.sleep(0.02)
+        return await reply.finish("[admin] פרטים פנימיים")
+
+    assert asyncio.run(run()) is None
+    assert update.log == []
+
+
+def _chunk(content=None, usage=None):
+    choices = [SimpleNamespace(delta=SimpleNamespace(content=content))] if usage is None else []
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+def test_main_response_streams_partials_and_returns_clean_reply(monkeypatch):
+    usage = SimpleNamespace(prompt_tokens=12, completion_tokens=4, total_tokens=16)
+    pieces = ["שלום", " לך", "\n--- Self-correction: הערה פנימית"]
+
+    async def fake_acompletion(**params):
+        assert params["stream"] is True
+
+        async def gen():
+            for piece in pieces:
+                yield _chunk(piece)
+            yield _chunk(usage=usage)
+        return gen()
+
+    monkeypatch.setattr(gpt_a_handler.litellm, "acompletion", fake_acompletion)
+    partials = []
+
+    result = asyncio.run(gpt_a_handler.get_main_response_async(
+        [{"role": "user", "content": "היי"}], None, on_partial=partials.append
+    ))
+    assert partials == ["שלום", "שלום לך", "שלום לך"]
+    assert result["bot_reply"] == "שלום לך"
+    assert result["usage"]["total_tokens"] == 16
+    assert result["raw_gpt_result"]["streamed"] is True
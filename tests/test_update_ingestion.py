@@ -0,0 +1,85 @@
+"""בדיקות לקליטת עדכוני webhook - ack מיידי, סדר לפי צ'אט, דחייה מיידית כשהתור מלא (בלי טלגרם אמיתי)"""
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CI", "1")
+
+import update_ingestion
+from background_jobs import BackgroundJobQueue
+
+
+def _update(chat_id, text):
+    return SimpleNamespace(message=SimpleNamespace(chat_id=chat_id, text=text))
+
+
+def test_enqueue_returns_before_processing_and_keeps_chat_order(monkeypatch):
+    monkeypatch.setattr(update_ingestion, "update_queue", BackgroundJobQueue(max_size=10, workers=3, persist=False))
+    handled = []
+
+    async def slow_handler(update, _context):
+        await asyncio.sleep(0.05)
+        handled.append((update.message.chat_id, update.message.text))
+
+    async def run():
+        queued = [await update_ingestion.enqueue_update(slow_handler, _update(1, f"m{i}"), None) for i in range(3)]
+        queued.append(await update_ingestion.enqueue_update(slow_handler, _update(2, "x"), None))
+        # ה-ack לא מחכה לעיבוד
+        nothing_handled_yet = handled == []
+        await update_ingestion.update_queue.stop(drain_timeout=2)
+        return queued, nothing_handled_yet
+
+    queued, nothing_handled_yet = asyncio.run(run())
+    assert queued == [True, True, True, True]
+    assert nothing_handled_yet
+    assert [text for chat, text in handled if chat == 1] == ["m0", "m1", "m2"]
+    assert (2, "x") in handled
+
+
+def test_full_queue_rejects_without_waiting(monkeypatch):
+    monkeypatch.setattr(update_ingestion, "update_queue", BackgroundJobQueue(max_size=1, workers=1, persist=False))
+    handled = []
+
+    async def run():
+        release = asyncio.Event()
+
+        async def blocking_handler(update, _context):
+            await release.wait()
+            handled.append(update.message.text)
+
+        first = await update_ingestion.enqueue_update(blocking_handler, _update(1, "m0"), None)
+        # התור רווי (m0 תקוע אצל ה-worker) - ה-ack חוזר מיד ולא ממתין למקום
+        second = await asyncio.wait_for(update_ingestion.enqueue_update(blocking_handler, _update(1, "m1"), None), timeout=0.5)
+        release.set()
+        await update_ingestion.update_queue.stop(drain_timeout=1)
+        return first, second, update_ingestion.update_queue.get_stats()
+
+    first, second, stats = asyncio.run(run())
+    assert (first, second) == (True, False)
+    assert stats["rejected"] == 1
+    # m1 נדחה (טלגרם ישלח שוב) - לא עובד ולא עקף את m0
+    assert handled == ["m0"]
+
+
+def test_handler_error_is_reported(monkeypatch):
+    monkeypatch.setattr(update_ingestion, "update_queue", BackgroundJobQueue(max_size=5, workers=1, persist=False))
+    reported = []
+
+    async def fake_report(ex, chat_id=None, user_msg=None, update=None):
+        reported.append((str(ex), chat_id, user_msg))
+
+    async def broken_handler(_update, _context):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(update_ingestion, "report_update_error", fake_report)
+
+    async def run():
+        await update_ingestion.enqueue_update(broken_handler, _update(7, "שלום"), None)
+        await update_ingestion.update_queue.stop(drain_timeout=1)
+        return update_ingestion.update_queue.get_stats()
+
+    stats = asyncio.run(run())
+    assert reported == [("boom", 7, "שלום")]
+    assert stats["completed"] == 1 and stats["failed"] == 0
@@ -11,7 +11,7 @@ import importlib
 import asyncio
 import inspect
 from typing import Dict, List, Tuple
-from unittest.mock import patch, Mock
+from unittest.mock import patch, Mock, AsyncMock
 from types import ModuleType
 
 # Skip immediately in CI for secret-dependent tests
@@ -199,6 +199,7 @@ def test_age_saved_from_user_message():
 
                     message_handler = _reload_module("message_handler")
                     message_handler.extract_user_info = _fake_extract
+                    message_handler.extract_user_info_async = AsyncMock(side_effect=_fake_extract)
                     message_handler.smart_update_profile_with_gpt_d_async = _fake_gpt_d_async
                     message_handler.execute_gpt_e_if_needed = _fake_gpt_e_async
 
@@ -240,6 +241,7 @@ def test_admin_notification_focus_age(monkeypatch):
 
     import message_handler as mh
     monkeypatch.setattr(mh, "extract_user_info", _fake_extract, raising=False)
+    monkeypatch.setattr(mh, "extract_user_info_async", AsyncMock(side_effect=_fake_extract), raising=False)
     monkeypatch.setattr(mh, "smart_update_profile_with_gpt_d_async", _fake_gpt_d_async, raising=False)
     monkeypatch.setattr(mh, "execute_gpt_e_if_needed", _fake_gpt_e_async, raising=False)
 
@@ -297,6 +299,7 @@ def test_admin_notification_on_profile_update(monkeypatch):
 
     message_handler = _reload_module("message_handler")
     monkeypatch.setattr(message_handler, "extract_user_info", _fake_extract, raising=False)
+    monkeypatch.setattr(message_handler, "extract_user_info_async", AsyncMock(side_effect=_fake_extract), raising=False)
     monkeypatch.setattr(message_handler, "smart_update_profile_with_gpt_d_async", _fake_gpt_d_async, raising=False)
     monkeypatch.setattr(message_handler, "execute_gpt_e_if_needed", _fake_gpt_e_async, raising=False)
 
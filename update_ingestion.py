@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+update_ingestion.py - קליטת עדכוני טלגרם מה-webhook בלי לחכות לעיבוד
+====================================================================
+
+ה-webhook רק מפענח את העדכון, מכניס אותו לתור ומחזיר 200 מיד - טלגרם מקבל ack
+בזמן קבוע ולא שולח את אותו עדכון שוב בגלל תשובה איטית (GPT-A).
+
+העיבוד עצמו (handle_message) רץ ב-BackgroundJobQueue נפרד מתור משימות הרקע:
+- סדר לפי צ'אט - הודעות של אותו משתמש מעובדות אחת אחרי השנייה, לפי סדר ההגעה
+- WEBHOOK_WORKERS הודעות לכל היותר מעובדות במקביל (צ'אטים שונים)
+- כשהתור מלא (WEBHOOK_QUEUE_MAX_SIZE) העדכון נדחה וה-webhook מחזיר 503 - טלגרם שולח אותו
+  שוב מאוחר יותר. לא ממתינים למקום (זה היה מעכב את ה-ack) ולא מעבדים ישירות (זה היה עוקף
+  הודעות קודמות של אותו צ'אט שעוד ממתינות בתור)
+
+⚠️ תור נפרד מ-background_jobs בכוונה: handle_message מגיש משימות ל-background_jobs,
+   ו-worker שממתין למקום בתור של עצמו היה יכול להיתקע.
+"""
+
+import traceback
+
+from background_jobs import BackgroundJob, BackgroundJobQueue
+from config import WEBHOOK_QUEUE_MAX_SIZE, WEBHOOK_WORKERS
+from simple_logger import logger
+from user_friendly_errors import safe_str
+
+update_queue = BackgroundJobQueue(max_size=WEBHOOK_QUEUE_MAX_SIZE, workers=WEBHOOK_WORKERS, persist=False)
+
+
+async def report_update_error(ex, chat_id=None, user_msg=None, update=None):
+    """טיפול אחיד בשגיאה בעיבוד עדכון: לוג, רשימת התאוששות והתראה לאדמין"""
+    logger.error(f"❌ [INGEST] שגיאה בעיבוד עדכון: {ex}\n{traceback.format_exc()}", source="update_ingestion")
+
+    # 🚨 רישום בטוח למשתמש לרשימת התאוששות לפני כל טיפול אחר
+    try:
+        from notifications import safe_add_user_to_recovery_list
+        if chat_id:
+            safe_add_user_to_recovery_list(safe_str(chat_id), f"Webhook error: {str(ex)[:50]}", user_msg or "")
+    except Exception:
+        pass  # אל תיכשל בגלל זה
+
+    # 🚨 התראה מיידית לאדמין עם פרטים מלאים
+    try:
+        from notifications import handle_critical_error
+        await handle_critical_error(ex, chat_id, user_msg, update)
+    except Exception as notification_error:
+        logger.error(f"❌ [INGEST] שגיאה בשליחת התראה: {notification_error}", source="update_ingestion")
+
+
+async def process_update(handler, update, context, chat_id=None, user_msg=None):
+    """הרצת handler על עדכון אחד - שגיאות מטופלות כאן כי אין כבר webhook שמחכה לתשובה"""
+    try:
+        await handler(update, context)
+    except Exception as ex:
+        await report_update_error(ex, chat_id, user_msg, update)
+
+
+async def enqueue_update(handler, update, context) -> bool:
+    """
+    הכנסת עדכון לתור העיבוד לפי צ'אט - לעולם לא ממתין.
+    מחזיר True אם העדכון נכנס לתור, False אם התור מלא - ה-webhook מחזיר אז 503 כדי שטלגרם ינסה שוב.
+    """
+    chat_id = update.message.chat_id if update.message else None
+    user_msg = getattr(update.message, "text", None) if update.message else None
+    job = BackgroundJob(
+        "telegram_update",
+        safe_str(chat_id) if chat_id is not None else None,
+        process_update,
+        args=(handler, update, context, chat_id, user_msg),
+        max_attempts=1,  # handle_message שולח הודעות למשתמש - ניסיון חוזר עלול לשלוח תשובה כפולה
+    )
+    if update_queue.try_submit(job):
+        return True
+
+    # 🚫 לא ממתינים למקום (מעכב את ה-ack) ולא מעבדים ישירות (עוקף הודעות קודמות של אותו צ'אט)
+    logger.warning(f"⚠️ [INGEST] תור העדכונים מלא ({update_queue.max_size}) - העדכון נדחה, טלגרם ישלח שוב | chat_id={safe_str(chat_id)}", source="update_ingestion")
+    return False